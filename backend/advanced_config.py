@@ -4,8 +4,9 @@ IG-Shop-Agent: Complete Enterprise SaaS Platform
 """
 
 import os
+import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from datetime import timedelta
 
 class ProductionConfig:
@@ -16,6 +17,8 @@ class ProductionConfig:
     AZURE_OPENAI_API_KEY = os.environ.get('AZURE_OPENAI_API_KEY', '')
     AZURE_OPENAI_API_VERSION = "2023-12-01-preview"
     AZURE_OPENAI_DEPLOYMENT_NAME = "gpt-4"
+    # Cheaper deployment for simple turns (same endpoint); empty disables the small tier
+    AZURE_OPENAI_SMALL_DEPLOYMENT_NAME = os.environ.get('AZURE_OPENAI_SMALL_DEPLOYMENT_NAME', '')
     
     # Enhanced Security Settings
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
@@ -52,6 +55,98 @@ class ProductionConfig:
     AI_RESPONSE_MAX_TOKENS = 150
     AI_TEMPERATURE = 0.7
     AI_CONTEXT_WINDOW = 10  # Number of previous messages to include
+    AI_CATALOG_TOP_K = 10  # Catalog items included in the system prompt
+    AI_PROMPT_TOKEN_BUDGET = int(os.environ.get('AI_PROMPT_TOKEN_BUDGET', '3000'))
+    AI_MAX_TOKENS_PER_TURN = 300  # Longer history turns are truncated
+    AI_MIN_TRUNCATED_TURN_TOKENS = 32  # Smaller leftovers drop the turn instead
+    AI_SUMMARY_ENABLED = True
+    AI_SUMMARY_EVERY_MESSAGES = 4  # Refresh a thread summary after this many new messages
+    AI_SUMMARY_RAW_TURNS = 4  # Recent messages always sent verbatim next to the summary
+    AI_SUMMARY_MAX_FOLD_MESSAGES = 100  # Upper bound per refresh
+    AI_SUMMARY_MAX_TOKENS = 200
+    AI_SUMMARY_MAX_THREADS = 10000  # Thread states kept in memory per process
+    AI_INTENT_CONFIDENCE_THRESHOLD = 0.5  # Below this the LLM classifies the intent
+    AI_PIPELINE_CATALOG_LIMIT = 1000  # Catalog rows fetched per message by the message pipeline
+    AI_COALESCE_WINDOW = float(os.environ.get('AI_COALESCE_WINDOW', '1.5'))  # seconds of quiet that end a message burst
+    AI_COALESCE_MAX_WAIT = 5.0  # seconds; a burst is answered after this even if messages keep coming
+    AI_DESCRIPTION_JOB_CONCURRENCY = 8  # Parallel LLM calls per catalog description job
+    AI_DESCRIPTION_JOB_BATCH_SIZE = 50  # Descriptions per UPDATE / progress checkpoint
+    AI_DESCRIPTION_JOB_MAX_ATTEMPTS = 4
+    AI_DESCRIPTION_JOB_BACKOFF = 1.0  # seconds, doubled per retry with jitter
+    AI_DESCRIPTION_JOB_BACKOFF_MAX = 30.0
+    AI_DESCRIPTION_JOB_LEASE = 600  # seconds a worker's claim on a job outlives its last checkpoint
+    CATALOG_IMPORT_BATCH_SIZE = 5000  # Rows per COPY into the staging table
+    CATALOG_IMPORT_MAX_ERRORS = 1000  # Row errors kept in the report; the rest are only counted
+    CATALOG_SEARCH_THRESHOLDS = (0.6, 0.3)  # Word similarity, strict first; looser only when nothing matches
+    CATALOG_SEARCH_CANDIDATES = 1000  # Matching rows ranked per search
+    CATALOG_SEARCH_NAME_WEIGHT = 0.5  # Extra weight of a match within the item name
+    CONVERSATIONS_PARTITIONS_AHEAD = 3  # Future monthly partitions kept ready
+    CONVERSATIONS_RETENTION_MONTHS = int(os.environ.get('CONVERSATIONS_RETENTION_MONTHS', '12'))  # Older months are archived
+    CONVERSATIONS_ARCHIVE_DIR = os.environ.get('CONVERSATIONS_ARCHIVE_DIR', 'archive/conversations')
+    CONVERSATIONS_MAINTENANCE_INTERVAL = 6 * 3600  # seconds between partition/retention runs
+    CONVERSATIONS_MOVE_BATCH_SIZE = 5000  # Pre-partitioning rows moved per transaction (migration 0003)
+    KB_RETRIEVAL_ENABLED = True
+    KB_EMBEDDING_DEPLOYMENT = os.environ.get('KB_EMBEDDING_DEPLOYMENT', 'text-embedding-ada-002')
+    KB_EMBEDDING_DIMENSIONS = 1536  # Must match kb_chunks.embedding (migration 0004)
+    KB_EMBEDDING_BATCH_SIZE = 64  # Texts per embeddings request
+    KB_CHUNK_TOKENS = 200
+    KB_CHUNK_OVERLAP_TOKENS = 40  # Repeated from the end of the previous chunk
+    KB_TOP_K = 3  # Chunks added to the system prompt
+    KB_MAX_CONTEXT_TOKENS = 600  # Cap on the knowledge section of the prompt
+    KB_MIN_SIMILARITY = 0.75  # Cosine similarity below which a chunk is not relevant
+    KB_HNSW_EF_SEARCH = 40
+    KB_RETRIEVAL_BUDGET = float(os.environ.get('KB_RETRIEVAL_BUDGET', '0.25'))  # seconds; replies go on without KB after
+    # pgvector | local | auto (the in-process index for tenants up to KB_LOCAL_INDEX_MAX_CHUNKS)
+    KB_VECTOR_BACKEND = os.environ.get('KB_VECTOR_BACKEND', 'auto')
+    KB_LOCAL_INDEX_DIR = os.environ.get('KB_LOCAL_INDEX_DIR', 'data/kb_index')  # One directory per tenant
+    KB_LOCAL_INDEX_MAX_CHUNKS = 20000
+    KB_LOCAL_INDEX_DTYPE = 'int8'  # or float16 (twice the memory and several times slower, exact scores)
+    KB_LOCAL_IVF_THRESHOLD = 5000  # Chunks above which the local index is partitioned
+    KB_LOCAL_IVF_NPROBE = 16  # Partitions scored per query
+    KB_QUERY_CACHE_SIZE = 2048  # Query embeddings kept in memory
+    KB_TENANT_STATE_TTL = 300  # seconds before re-checking whether a tenant has KB content
+    HYBRID_RETRIEVAL_ENABLED = True  # BM25 + vector fusion for catalog items and KB chunks
+    HYBRID_CANDIDATES = 20  # Taken from each ranking before fusion
+    HYBRID_RRF_K = 60  # Reciprocal rank fusion constant
+    HYBRID_RERANK_WEIGHTS = {'rrf': 0.5, 'coverage': 1.0, 'name': 0.3, 'code': 1.0}  # Tuned on benchmarks/hybrid_retrieval.py
+    HYBRID_KB_MIN_COVERAGE = 0.25  # Query terms a lexical-only KB chunk must contain
+    HYBRID_CATALOG_VECTOR_TENANTS = 200  # Tenants whose catalog embeddings stay in memory
+    AI_RESPONSE_CACHE_MAX_ENTRIES = 512  # Per tenant
+    AI_RESPONSE_CACHE_TTL = 3600  # seconds
+    AI_RESPONSE_CACHE_CONTEXT_TURNS = 1  # Previous turns that must match for a cache hit
+    AI_RESPONSE_CACHE_SIMILARITY = 0.95  # Cosine threshold when an embedder is configured
+    AI_MAX_CONCURRENT_REQUESTS = int(os.environ.get('AI_MAX_CONCURRENT_REQUESTS', '32'))  # Per process
+    AI_PLAN_WEIGHTS = {'starter': 1, 'professional': 3, 'enterprise': 6}  # Fair-share weight per users.plan
+    AI_SCHEDULER_DEFAULT_WEIGHT = 1
+    AI_SCHEDULER_MAX_QUEUE_PER_TENANT = 200  # Further calls from that tenant get the fallback reply
+    AI_SCHEDULER_WEIGHT_TTL = 300  # seconds between plan lookups per tenant
+    AI_SCHEDULER_METRICS_WINDOW = 500  # Wait times kept per tenant
+    AI_PLAN_MONTHLY_TOKEN_QUOTAS = {'starter': 2_000_000, 'professional': 10_000_000, 'enterprise': None}
+    AI_USAGE_FLUSH_INTERVAL = float(os.environ.get('AI_USAGE_FLUSH_INTERVAL', '10'))  # seconds
+    AI_USAGE_PLAN_TTL = 300  # seconds between plan/usage refreshes of an idle tenant
+    AI_HTTP_MAX_CONNECTIONS = int(os.environ.get('AI_HTTP_MAX_CONNECTIONS', '64'))
+    AI_HTTP_MAX_KEEPALIVE = int(os.environ.get('AI_HTTP_MAX_KEEPALIVE', '32'))
+    AI_REQUEST_TIMEOUT = float(os.environ.get('AI_REQUEST_TIMEOUT', '30'))  # seconds
+    # JSON list of {"name", "kind": "azure"|"openai", "endpoint", "api_key", "api_version", "model", "tier"}
+    AI_DEPLOYMENTS = os.environ.get('AI_DEPLOYMENTS', '')
+    AI_ROUTER_WINDOW = 100  # Recent calls per deployment used for latency/error stats
+    AI_ROUTER_MAX_ATTEMPTS = 3  # Deployments tried per completion, hedges included
+    AI_CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures that open a circuit
+    AI_CIRCUIT_ERROR_RATE = 0.5  # Windowed error rate that opens a circuit
+    AI_CIRCUIT_MIN_SAMPLES = 20  # Calls needed before the error rate is trusted
+    AI_CIRCUIT_COOLDOWN = 30  # seconds before a half-open probe
+    AI_HEDGE_ENABLED = True
+    AI_HEDGE_PERCENTILE = 0.95  # Hedge once the primary exceeds this latency percentile
+    AI_HEDGE_MIN_DELAY = 0.5  # seconds
+    AI_HEDGE_DEFAULT_DELAY = 3.0  # seconds, until a deployment has AI_CIRCUIT_MIN_SAMPLES calls
+    AI_HEDGE_MAX_RATIO = 0.1  # Hedged share of completions
+    AI_RETRY_AFTER_MAX = 60  # seconds; longer Retry-After values are capped
+    AI_MODEL_ROUTING_ENABLED = True
+    AI_COMPLEXITY_THRESHOLD = 0.4  # Messages scoring below go to the small tier
+    AI_TIER_COSTS = {  # USD per 1K tokens
+        'small': {'prompt': 0.00015, 'completion': 0.0006},
+        'large': {'prompt': 0.01, 'completion': 0.03},
+    }
     AI_FALLBACK_RESPONSES = [
         "أعتذر، أواجه مشكلة تقنية مؤقتة. يرجى المحاولة مرة أخرى.",
         "Sorry, I'm experiencing a temporary issue. Please try again.",
@@ -86,6 +181,32 @@ class ProductionConfig:
             'deployment_name': cls.AZURE_OPENAI_DEPLOYMENT_NAME
         }
     
+    @classmethod
+    def get_llm_deployments(cls) -> List[Dict[str, Any]]:
+        """LLM deployments for the router, in preference order"""
+        if cls.AI_DEPLOYMENTS:
+            return json.loads(cls.AI_DEPLOYMENTS)
+        if cls.AZURE_OPENAI_ENDPOINT and cls.AZURE_OPENAI_API_KEY:
+            azure = {
+                'kind': 'azure',
+                'endpoint': cls.AZURE_OPENAI_ENDPOINT,
+                'api_key': cls.AZURE_OPENAI_API_KEY,
+                'api_version': cls.AZURE_OPENAI_API_VERSION
+            }
+            deployments = [{**azure, 'name': 'azure', 'model': cls.AZURE_OPENAI_DEPLOYMENT_NAME, 'tier': 'large'}]
+            if cls.AZURE_OPENAI_SMALL_DEPLOYMENT_NAME:
+                deployments.append({
+                    **azure, 'name': 'azure-small', 'model': cls.AZURE_OPENAI_SMALL_DEPLOYMENT_NAME, 'tier': 'small'
+                })
+            return deployments
+        return [{
+            'name': 'openai',
+            'kind': 'openai',
+            'api_key': os.environ.get('OPENAI_API_KEY'),
+            'model': 'gpt-3.5-turbo',
+            'tier': 'large'
+        }]
+    
     @classmethod
     def get_cors_config(cls) -> Dict[str, Any]:
         """Get production CORS configuration"""
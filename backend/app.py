@@ -2,7 +2,7 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from .config import Settings
-from .database import get_db
+from .database import get_db, set_db_session
 from .azure_openai_service import get_openai_client
 from .azure_keyvault import get_keyvault_client
 from .tenant_middleware import TenantMiddleware
@@ -34,6 +34,12 @@ app.add_middleware(
 # Add tenant middleware
 app.add_middleware(TenantMiddleware)
 
+@app.middleware("http")
+async def database_session(request, call_next):
+    """Keep a tenant's reads on the primary for a while after its writes"""
+    set_db_session(request.headers.get("x-tenant-id"))
+    return await call_next(request)
+
 @app.get("/")
 async def root():
     return {"message": "IG Shop Agent API is running"}
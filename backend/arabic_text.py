@@ -0,0 +1,139 @@
+"""
+IG-Shop-Agent Arabic Text Utilities
+Normalization and tokenization shared by catalog search, caching and retrieval
+"""
+import re
+from typing import List
+
+# Harakat, tanween, shadda, sukun, superscript alef and tatweel
+_DIACRITICS = re.compile(r'[ً-ٰٟـ]')
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '؟': '?', '،': ',', '؛': ';',
+})
+
+_ARTICLE_PREFIXES = ('وال', 'بال', 'فال', 'كال', 'لل', 'ال')
+
+STOPWORDS = frozenset({
+    # Arabic (already normalized)
+    'في', 'من', 'علي', 'الي', 'عن', 'مع', 'هل', 'هذا', 'هذه', 'ان', 'او', 'و', 'يا', 'لو',
+    'بدي', 'عندك', 'عندكم', 'انا', 'انت', 'شو', 'كم', 'ما', 'لا', 'هو', 'هي',
+    # English
+    'the', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'is', 'are', 'do', 'you',
+    'i', 'me', 'my', 'it', 'this', 'that', 'have', 'with', 'please', 'pls',
+})
+
+# Arabizi (Latin chat alphabet) to Arabic letters; digraphs are matched first
+_ARABIZI_DIGRAPHS = {'sh': 'ش', 'ch': 'ش', 'kh': 'خ', 'gh': 'غ', 'th': 'ث', 'dh': 'ذ'}
+_ARABIZI_LETTERS = {
+    'b': 'ب', 'p': 'ب', 't': 'ت', 'j': 'ج', 'd': 'د', 'r': 'ر', 'z': 'ز', 's': 'س', 'f': 'ف',
+    'v': 'ف', 'q': 'ق', 'g': 'ق', 'k': 'ك', 'c': 'ك', 'l': 'ل', 'm': 'م', 'n': 'ن', 'h': 'ه',
+    'w': 'و', 'y': 'ي', 'x': 'كس',
+    '2': 'ء', '3': 'ع', '5': 'خ', '6': 'ط', '7': 'ح', '8': 'ق', '9': 'ص',
+}
+_ARABIZI_VOWELS = frozenset('aeiou')
+_ARABIZI_TOKEN = re.compile(r'^(?=.*[a-z])[a-z235-9]+$')
+_DIGIT_RUN = re.compile(r'\d{2,}')
+
+# Consonant skeletons: long vowels dropped, emphatic and interdental letters
+# folded onto the plain letter Arabizi spellings tend to use, and qaf folded
+# onto hamza as Jordanian speech (and so "2amees", "azra2") pronounces it
+_SKELETON_DROP = frozenset('اويى')
+_SKELETON_FOLD = str.maketrans({'ط': 'ت', 'ص': 'س', 'ض': 'د', 'ظ': 'ز', 'ذ': 'ز', 'ث': 'س', 'ق': 'ء'})
+SKELETON_MARK = '~'  # Prefix that keeps skeleton terms apart from surface terms
+
+# Product codes such as "SKU-1042" or "AB 12", also matched typed together ("sku1042")
+_CODE = re.compile(r'\b([a-z]{1,6})[-_ ]?(\d{2,})\b')
+
+def normalize_arabic(text: str) -> str:
+    """Fold diacritics, alef/yaa/taa marbuta variants, digits and case"""
+    if not text:
+        return ""
+    text = _DIACRITICS.sub('', text)
+    return text.translate(_CHAR_MAP).lower()
+
+def light_stem(token: str) -> str:
+    """Strip the Arabic definite article and its common conjunction prefixes"""
+    for prefix in _ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+def tokenize(text: str, drop_stopwords: bool = True) -> List[str]:
+    """Normalize and split text into search tokens"""
+    tokens = [light_stem(t) for t in _TOKEN.findall(normalize_arabic(text))]
+    if drop_stopwords:
+        tokens = [t for t in tokens if t not in STOPWORDS]
+    return tokens
+
+def is_arabizi(token: str) -> bool:
+    """Whether a Latin token could be Arabic typed in the chat alphabet
+
+    Digits only count as letters inside words ("3abaya", "7elo"); runs of
+    digits are sizes, prices or codes.
+    """
+    return bool(_ARABIZI_TOKEN.match(token)) and not _DIGIT_RUN.search(token) and len(token) >= 3
+
+def arabizi_to_arabic(token: str) -> str:
+    """Transliterate an Arabizi token to Arabic consonants (short vowels are not written)"""
+    out = []
+    i = 0
+    while i < len(token):
+        pair = token[i:i + 2]
+        if pair in _ARABIZI_DIGRAPHS:
+            out.append(_ARABIZI_DIGRAPHS[pair])
+            i += 2
+            continue
+        char = token[i]
+        if char in _ARABIZI_VOWELS:
+            # A word-initial vowel is written with an alef
+            if i == 0:
+                out.append('ا')
+        elif char != token[i - 1:i]:  # Doubled letters stand for one (shadda)
+            out.append(_ARABIZI_LETTERS.get(char, ''))
+        i += 1
+    return ''.join(out)
+
+def skeleton(token: str) -> str:
+    """Consonant skeleton of a normalized Arabic token, comparable across spellings"""
+    if token.endswith('ه'):
+        token = token[:-1]  # Taa marbuta, written as a vowel in Arabizi
+    return ''.join(c for c in token if c not in _SKELETON_DROP).translate(_SKELETON_FOLD)
+
+def _is_arabic(token: str) -> bool:
+    return any('\u0600' <= c <= '\u06ff' for c in token)
+
+def search_terms(text: str, drop_stopwords: bool = True) -> List[str]:
+    """Tokens plus spelling-independent variants, for lexical indexing and queries
+
+    Arabic and Arabizi tokens also yield their consonant skeleton (marked
+    with SKELETON_MARK), so "fustan", "فستان" and "فستانين" meet, and
+    product codes also yield their compact form ("sku1042").
+    """
+    normalized = normalize_arabic(text)
+    terms = tokenize(text, drop_stopwords)
+    for token in list(terms):
+        if _is_arabic(token):
+            bases = [skeleton(token)]
+        elif is_arabizi(token):
+            bases = [skeleton(light_stem(arabizi_to_arabic(token)))]
+            if 'ء' in bases[0]:
+                # A "2" is as often a hamza that Arabic script carries on a vowel ("so2al")
+                bases.append(bases[0].replace('ء', ''))
+        else:
+            continue
+        terms.extend(SKELETON_MARK + base for base in bases if len(base) >= 2)
+    for prefix, digits in _CODE.findall(normalized):
+        if prefix + digits not in terms:
+            terms.append(prefix + digits)
+    return terms
+
+__all__ = ["normalize_arabic", "light_stem", "tokenize", "STOPWORDS", "arabizi_to_arabic", "is_arabizi",
+           "search_terms", "skeleton", "SKELETON_MARK"]
@@ -3,72 +3,111 @@ Azure OpenAI Service Integration
 Enhanced AI capabilities for 100% production readiness
 """
 
-import os
-import logging
 import asyncio
-from typing import List, Dict, Any, Optional
-from openai import AzureOpenAI
+import logging
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+import httpx
 from advanced_config import ProductionConfig
+from llm_router import LLMRouter
+from llm_scheduler import llm_scheduler
+from model_routing import LARGE, SMALL, complexity_router
+from token_counter import count_tokens
+from catalog_index import CatalogIndex, catalog_indexes
+from response_cache import response_cache
+from prompt_builder import prompt_compiler
+from token_budget import TokenAccount, token_budget
+from conversation_summarizer import conversation_summarizer
+from intent_classifier import intent_classifier
+from knowledge_base import knowledge_base
+from hybrid_retrieval import hybrid_retriever
+from usage_meter import usage_meter
 
 logger = logging.getLogger(__name__)
 
+# Characters that end a sentence in Arabic or English replies
+SENTENCE_TERMINATORS = ('.', '!', '?', '؟', '۔', '\n')
+
+# Tiers of calls that are not customer replies; the router uses another tier when one is not deployed
+INTENT_TIER = SMALL
+SUMMARY_TIER = SMALL
+DESCRIPTION_TIER = LARGE  # Written once per item and shown to every customer
+
+async def split_sentences(tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Regroup a token stream into whole sentences"""
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        cut = max(buffer.rfind(t) for t in SENTENCE_TERMINATORS)
+        if cut >= 0:
+            sentence, buffer = buffer[:cut + 1].strip(), buffer[cut + 1:]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
 class AzureOpenAIService:
     """Enhanced Azure OpenAI service for production"""
     
     def __init__(self):
         """Initialize Azure OpenAI client"""
-        config = ProductionConfig.get_azure_openai_config()
+        # Shared connection pool for every completion issued by this process
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ProductionConfig.AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=ProductionConfig.AI_HTTP_MAX_KEEPALIVE
+            ),
+            timeout=ProductionConfig.AI_REQUEST_TIMEOUT
+        )
+        # Caps in-flight completions and shares them fairly between tenants
+        self.scheduler = llm_scheduler
         
-        # Use Azure OpenAI if configured, fallback to OpenAI
-        if config['api_base'] and config['api_key']:
-            self.client = AzureOpenAI(
-                azure_endpoint=config['api_base'],
-                api_key=config['api_key'],
-                api_version=config['api_version']
-            )
-            self.deployment_name = config['deployment_name']
-            self.is_azure = True
-            logger.info("Using Azure OpenAI service")
-        else:
-            # Fallback to regular OpenAI
-            from openai import OpenAI
-            self.client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-            self.deployment_name = "gpt-3.5-turbo"
-            self.is_azure = False
-            logger.info("Using OpenAI service (fallback)")
+        # Every configured deployment shares the pool; the router picks one per call
+        self.router = LLMRouter.from_config(ProductionConfig.get_llm_deployments(), self._http_client)
+        logger.info(f"LLM router over deployments: {[d.name for d in self.router.deployments]}")
     
     async def generate_response(
         self, 
         message: str, 
         catalog_items: List[Dict], 
         conversation_history: List[Dict] = None,
-        customer_context: Dict = None
+        customer_context: Dict = None,
+        tenant_id: Optional[str] = None,
+        customer_id: Optional[str] = None
     ) -> str:
         """Generate AI response with enhanced context"""
         try:
-            # Build comprehensive system prompt
-            system_prompt = self._build_system_prompt(catalog_items, customer_context)
-            
-            # Build conversation context
-            messages = [{"role": "system", "content": system_prompt}]
+            # Repeated questions are answered from the tenant's response cache
+            use_cache = bool(tenant_id) and not customer_context and ProductionConfig.ENABLE_CACHING
+            if tenant_id and catalog_items:
+                # The rows passed in are the freshest view of the catalog; edits and deletes reach the index here
+                catalog_indexes.sync(tenant_id, catalog_items)
+            if use_cache:
+                catalog_version = catalog_indexes.version(tenant_id)
+                cached = await response_cache.get(tenant_id, catalog_version, message, conversation_history)
+                if cached is not None:
+                    return cached
             
-            # Add conversation history
-            if conversation_history:
-                recent_history = conversation_history[-ProductionConfig.AI_CONTEXT_WINDOW:]
-                for msg in recent_history:
-                    messages.append({
-                        "role": "user" if not msg.get('ai_generated') else "assistant",
-                        "content": msg['text']
-                    })
-            
-            # Add current message
-            messages.append({"role": "user", "content": message})
+            tier = self._route(message, tenant_id, conversation_history)
+            # Retrieval overlaps the history lookups and gives up after its latency budget
+            (summary, conversation_history), (catalog_slice, knowledge) = await asyncio.gather(
+                self._prepare_history(tenant_id, customer_id, conversation_history),
+                self._retrieve(tenant_id, message, catalog_items)
+            )
+            messages, token_account = self._build_messages(
+                message, catalog_items, conversation_history, customer_context, tenant_id, summary, knowledge,
+                catalog_slice
+            )
             
             # Generate response
-            response = await self._call_openai(messages)
+            response = await self._call_openai(messages, tenant_id=tenant_id, tier=tier, customer_reply=True)
             
             # Log interaction for improvement
-            self._log_interaction(message, response, catalog_items)
+            self._log_interaction(message, response, catalog_items, token_account)
+            await self._note_turn(tenant_id, customer_id)
+            
+            if use_cache:
+                await response_cache.put(tenant_id, catalog_version, message, response, conversation_history)
             
             return response
             
@@ -76,95 +115,272 @@ class AzureOpenAIService:
             logger.error(f"Error generating AI response: {e}")
             return self._get_fallback_response()
     
-    def _build_system_prompt(self, catalog_items: List[Dict], context: Dict = None) -> str:
-        """Build comprehensive system prompt"""
+    async def generate_response_stream(
+        self,
+        message: str,
+        catalog_items: List[Dict],
+        conversation_history: List[Dict] = None,
+        customer_context: Dict = None,
+        tenant_id: Optional[str] = None,
+        customer_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream AI response tokens as they arrive from the model
         
-        # Base system identity
-        prompt = """أنت مساعد ذكي لمتجر إلكتروني أردني متخصص في الموضة والأزياء.
-You are an AI assistant for a Jordanian online fashion store.
-
-المعلومات الأساسية / Basic Information:
-- اسم المتجر: IG Shop Agent
-- الموقع: الأردن
-- التخصص: الأزياء والموضة
-- اللغة المفضلة: العربية، مع دعم الإنجليزية
-
-إرشادات المحادثة / Conversation Guidelines:
-1. كن ودودًا ومهذبًا دائماً
-2. استخدم اللغة العربية كلغة أساسية
-3. قدم معلومات دقيقة عن المنتجات
-4. ساعد في اتخاذ قرار الشراء
-5. اقترح منتجات مناسبة حسب الحاجة
-
-"""
+        If the stream fails (before or mid-way) the fallback response is
+        yielded as the final chunk so callers always end with usable text.
+        """
+        chunks: List[str] = []
+        try:
+            if tenant_id and catalog_items:
+                catalog_indexes.sync(tenant_id, catalog_items)
+            tier = self._route(message, tenant_id, conversation_history)
+            # Retrieval overlaps the history lookups and gives up after its latency budget
+            (summary, conversation_history), (catalog_slice, knowledge) = await asyncio.gather(
+                self._prepare_history(tenant_id, customer_id, conversation_history),
+                self._retrieve(tenant_id, message, catalog_items)
+            )
+            messages, token_account = self._build_messages(
+                message, catalog_items, conversation_history, customer_context, tenant_id, summary, knowledge,
+                catalog_slice
+            )
+            async for token in self._call_openai_stream(messages, tenant_id, tier):
+                chunks.append(token)
+                yield token
+            
+            self._log_interaction(message, ''.join(chunks), catalog_items, token_account)
+            await self._note_turn(tenant_id, customer_id)
+            
+        except Exception as e:
+            logger.error(f"Error streaming AI response after {len(chunks)} chunks: {e}")
+            fallback = self._get_fallback_response()
+            yield f"\n{fallback}" if chunks else fallback
+    
+    async def generate_response_sentences(
+        self,
+        message: str,
+        catalog_items: List[Dict],
+        conversation_history: List[Dict] = None,
+        customer_context: Dict = None,
+        tenant_id: Optional[str] = None,
+        customer_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream AI response grouped into complete sentences
         
-        # Add available products
-        if catalog_items:
-            prompt += "\nالمنتجات المتاحة / Available Products:\n"
-            for item in catalog_items[:10]:  # Limit to 10 items
-                prompt += f"- {item['name']}: {item['price_jod']} دينار أردني"
-                if item.get('description'):
-                    prompt += f" - {item['description'][:50]}..."
-                if item.get('stock_quantity', 0) > 0:
-                    prompt += f" (متوفر: {item['stock_quantity']} قطعة)"
-                prompt += "\n"
+        Used by the Instagram send path to start delivering the reply as soon
+        as the first sentence boundary is reached.
+        """
+        tokens = self.generate_response_stream(
+            message, catalog_items, conversation_history, customer_context, tenant_id, customer_id
+        )
+        async for sentence in split_sentences(tokens):
+            yield sentence
+    
+    def _build_messages(
+        self,
+        message: str,
+        catalog_items: List[Dict],
+        conversation_history: List[Dict] = None,
+        customer_context: Dict = None,
+        tenant_id: Optional[str] = None,
+        summary: Optional[str] = None,
+        knowledge: Optional[List[Dict]] = None,
+        catalog_slice: Optional[List[Dict]] = None
+    ) -> Tuple[List[Dict], TokenAccount]:
+        """Build the chat messages for a customer turn within the token budget"""
+        # Build comprehensive system prompt around the most relevant products
+        if catalog_slice is None:
+            catalog_slice = self._select_catalog_items(message, catalog_items, tenant_id)
+        catalog_version = catalog_indexes.version(tenant_id) if tenant_id else 0
         
-        # Add customer context if available
-        if context:
-            prompt += f"\nمعلومات العميل / Customer Context:\n"
-            if context.get('previous_orders'):
-                prompt += f"- طلبات سابقة: {len(context['previous_orders'])}\n"
-            if context.get('preferences'):
-                prompt += f"- التفضيلات: {context['preferences']}\n"
+        def render_system(items: List[Dict]) -> Tuple[str, int]:
+            return prompt_compiler.render(tenant_id, catalog_version, items, customer_context, summary, knowledge)
         
-        prompt += """
-تعليمات الرد / Response Instructions:
-- أجب باللغة العربية أولاً، ثم الإنجليزية إذا لزم الأمر
-- كن مختصراً ومفيداً
-- اذكر الأسعار بالدينار الأردني
-- لا تخترع معلومات غير موجودة
-- إذا لم تجد منتج مناسب، اقترح البدائل المتاحة
-"""
+        return token_budget.build(render_system, catalog_slice, conversation_history, message)
+    
+    async def _retrieve(
+        self,
+        tenant_id: Optional[str],
+        message: str,
+        catalog_items: List[Dict]
+    ) -> Tuple[Optional[List[Dict]], List[Dict]]:
+        """(catalog slice, KB chunks) for a message; a None slice leaves the pick to _build_messages"""
+        if tenant_id and catalog_items and ProductionConfig.HYBRID_RETRIEVAL_ENABLED:
+            try:
+                return await hybrid_retriever.retrieve(tenant_id, message, catalog_items)
+            except Exception as e:
+                logger.warning(f"Hybrid retrieval for tenant {tenant_id} failed: {e}")
+        return None, await knowledge_base.retrieve(tenant_id, message)
+    
+    async def _prepare_history(
+        self,
+        tenant_id: Optional[str],
+        customer_id: Optional[str],
+        conversation_history: Optional[List[Dict]]
+    ) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """Swap long history for the thread's rolling summary plus recent turns"""
+        if not (tenant_id and customer_id and ProductionConfig.AI_SUMMARY_ENABLED):
+            return None, conversation_history
+        return await conversation_summarizer.prepare_history(tenant_id, customer_id, conversation_history)
+    
+    async def _note_turn(self, tenant_id: Optional[str], customer_id: Optional[str]) -> None:
+        """Count the customer message and the reply towards the next summary"""
+        if tenant_id and customer_id and ProductionConfig.AI_SUMMARY_ENABLED:
+            await conversation_summarizer.note_messages(tenant_id, customer_id, 2)
+    
+    def _select_catalog_items(
+        self,
+        message: str,
+        catalog_items: List[Dict],
+        tenant_id: Optional[str] = None
+    ) -> List[Dict]:
+        """Pick the catalog items most relevant to the message"""
+        top_k = ProductionConfig.AI_CATALOG_TOP_K
+        if not catalog_items or (len(catalog_items) <= top_k and not tenant_id):
+            return catalog_items or []
+        
+        if tenant_id:
+            index = catalog_indexes.sync(tenant_id, catalog_items)
+        else:
+            index = CatalogIndex(catalog_items)
+        return index.top_k(message, top_k)
+    
+    def _build_system_prompt(
+        self,
+        catalog_items: List[Dict],
+        context: Dict = None,
+        tenant_id: Optional[str] = None
+    ) -> str:
+        """Build comprehensive system prompt
         
+        The tenant's static prefix is compiled once per catalog/profile
+        version; only the catalog slice and customer context vary per message.
+        """
+        prompt, _ = prompt_compiler.render(
+            tenant_id,
+            catalog_indexes.version(tenant_id) if tenant_id else 0,
+            catalog_items[:ProductionConfig.AI_CATALOG_TOP_K] if catalog_items else [],
+            context
+        )
         return prompt
     
-    async def _call_openai(self, messages: List[Dict]) -> str:
-        """Call OpenAI API with proper error handling"""
+    def _route(
+        self,
+        message: str,
+        tenant_id: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Optional[str]:
+        """Model tier for a customer message (None when only one tier is deployed)"""
+        if len(self.router.tiers()) < 2:
+            return None
+        return complexity_router.route(message, tenant_id, conversation_history).tier
+    
+    async def _call_openai(
+        self,
+        messages: List[Dict],
+        max_tokens: Optional[int] = None,
+        tenant_id: Optional[str] = None,
+        tier: Optional[str] = None,
+        customer_reply: bool = False
+    ) -> str:
+        """Call OpenAI API with proper error handling
+        
+        Only customer replies count towards the model routing stats, which
+        compare the tiers the complexity router picks.
+        """
+        usage_meter.check(tenant_id)
         try:
-            if self.is_azure:
-                response = self.client.chat.completions.create(
-                    model=self.deployment_name,
-                    messages=messages,
-                    max_tokens=ProductionConfig.AI_RESPONSE_MAX_TOKENS,
+            async with self.scheduler.slot(tenant_id):
+                started = time.perf_counter()
+                completion = await self.router.complete_detailed(
+                    messages,
+                    tier,
+                    max_tokens=max_tokens or ProductionConfig.AI_RESPONSE_MAX_TOKENS,
                     temperature=ProductionConfig.AI_TEMPERATURE
                 )
-            else:
-                response = self.client.chat.completions.create(
-                    model=self.deployment_name,
-                    messages=messages,
-                    max_tokens=ProductionConfig.AI_RESPONSE_MAX_TOKENS,
-                    temperature=ProductionConfig.AI_TEMPERATURE
-                )
-            
-            return response.choices[0].message.content.strip()
+            self._record_usage(
+                tenant_id, completion.tier, time.perf_counter() - started,
+                completion.prompt_tokens, completion.completion_tokens, customer_reply
+            )
+            return completion.text
             
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             raise
     
+    async def _call_openai_stream(
+        self,
+        messages: List[Dict],
+        tenant_id: Optional[str] = None,
+        tier: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Call OpenAI API in streaming mode and yield content deltas"""
+        usage_meter.check(tenant_id)
+        chunks: List[str] = []
+        served: List[str] = []
+        async with self.scheduler.slot(tenant_id):
+            started = time.perf_counter()
+            async for token in self.router.stream(
+                messages,
+                tier,
+                on_served=lambda deployment: served.append(deployment.tier),
+                max_tokens=ProductionConfig.AI_RESPONSE_MAX_TOKENS,
+                temperature=ProductionConfig.AI_TEMPERATURE
+            ):
+                chunks.append(token)
+                yield token
+        # Streams carry no usage block, so tokens are estimated locally
+        self._record_usage(
+            tenant_id, served[-1] if served else tier or LARGE, time.perf_counter() - started,
+            sum(count_tokens(m['content']) for m in messages), count_tokens(''.join(chunks)), customer_reply=True
+        )
+    
+    def _record_usage(
+        self,
+        tenant_id: Optional[str],
+        tier: str,
+        latency: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+        customer_reply: bool = False
+    ) -> None:
+        """Account a finished call per tenant, and per tier when it was a customer reply"""
+        if customer_reply:
+            complexity_router.record(tier, latency, prompt_tokens, completion_tokens)
+        usage_meter.record(tenant_id, prompt_tokens, completion_tokens, latency)
+    
+    async def close(self) -> None:
+        """Release the shared HTTP connection pool"""
+        await self.router.close()
+        await self._http_client.aclose()
+    
     def _get_fallback_response(self) -> str:
         """Get fallback response when AI fails"""
         import random
         return random.choice(ProductionConfig.AI_FALLBACK_RESPONSES)
     
-    def _log_interaction(self, message: str, response: str, catalog_items: List[Dict]):
+    def _log_interaction(
+        self,
+        message: str,
+        response: str,
+        catalog_items: List[Dict],
+        token_account: Optional[TokenAccount] = None
+    ):
         """Log interaction for analytics and improvement"""
         logger.info(f"AI Interaction - Input length: {len(message)}, "
                    f"Response length: {len(response)}, "
-                   f"Catalog items: {len(catalog_items)}")
+                   f"Catalog items: {len(catalog_items)}"
+                   + (f", Prompt tokens: {token_account.total}/{token_account.budget}" if token_account else ""))
     
-    async def analyze_customer_intent(self, message: str) -> Dict[str, Any]:
-        """Analyze customer intent from message"""
+    async def analyze_customer_intent(self, message: str, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze customer intent from message
+        
+        The local classifier answers confident cases in microseconds; only
+        low-confidence messages fall through to the LLM.
+        """
+        local = intent_classifier.classify(message)
+        if local['confidence'] >= ProductionConfig.AI_INTENT_CONFIDENCE_THRESHOLD:
+            return {**local, "source": "local"}
+        
         try:
             intent_prompt = f"""
             Analyze the following customer message and categorize the intent:
@@ -183,22 +399,59 @@ You are an AI assistant for a Jordanian online fashion store.
             response = await self._call_openai([
                 {"role": "system", "content": "You are an intent analysis system. Respond only with valid JSON."},
                 {"role": "user", "content": intent_prompt}
-            ])
+            ], tenant_id=tenant_id, tier=INTENT_TIER)
             
             import json
-            return json.loads(response)
+            result = json.loads(response.strip().removeprefix("```json").strip("`").strip())
+            return {**result, "source": "llm"}
             
         except Exception as e:
             logger.error(f"Intent analysis error: {e}")
-            return {
-                "intent": "inquiry",
-                "products_mentioned": [],
-                "urgency": "medium",
-                "language": "ar"
-            }
-    
-    async def generate_product_description(self, product_data: Dict) -> str:
-        """Generate enhanced product description"""
+            return {**local, "source": "local"}
+    
+    async def summarize_conversation(
+        self,
+        previous_summary: str,
+        messages: List[Dict],
+        tenant_id: Optional[str] = None
+    ) -> str:
+        """Fold new conversation messages into a rolling summary"""
+        transcript = "\n".join(
+            f"{'Agent' if msg.get('is_ai_response') else 'Customer'}: {msg['message']}"
+            for msg in messages
+        )
+        prompt = f"""
+        Previous summary:
+        {previous_summary or '(none)'}
+        
+        New messages:
+        {transcript}
+        
+        Update the summary of this Instagram shop conversation. Keep:
+        - products, sizes, colors and prices the customer asked about
+        - order details, phone, delivery city and any open questions
+        - the customer's language and tone
+        Write at most 5 short lines, in the customer's language.
+        """
+        
+        response = await self._call_openai([
+            {"role": "system", "content": "You summarize customer conversations for a Jordanian fashion shop."},
+            {"role": "user", "content": prompt}
+        ], tenant_id=tenant_id, max_tokens=ProductionConfig.AI_SUMMARY_MAX_TOKENS, tier=SUMMARY_TIER)
+        
+        return response
+    
+    async def generate_product_description(
+        self,
+        product_data: Dict,
+        tenant_id: Optional[str] = None,
+        raise_errors: bool = False
+    ) -> str:
+        """Generate enhanced product description
+        
+        Bulk jobs pass raise_errors=True to retry failures themselves instead
+        of receiving the fallback text.
+        """
         try:
             prompt = f"""
             Generate an attractive Arabic product description for:
@@ -218,11 +471,13 @@ You are an AI assistant for a Jordanian online fashion store.
             response = await self._call_openai([
                 {"role": "system", "content": "You are a product description writer for Jordanian fashion e-commerce."},
                 {"role": "user", "content": prompt}
-            ])
+            ], tenant_id=tenant_id, tier=DESCRIPTION_TIER)
             
             return response
             
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Product description generation error: {e}")
             return product_data.get('description', 'وصف المنتج غير متوفر')
 
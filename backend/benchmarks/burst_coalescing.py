@@ -0,0 +1,111 @@
+"""
+IG-Shop-Agent Burst Coalescing Benchmark
+LLM calls and reply order for customers who split one question over several DMs
+
+Usage:
+    python benchmarks/burst_coalescing.py --customers 200 --window 1.0 --llm-latency 0.8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_coalescer import MessageCoalescer
+
+BURSTS = [
+    ["مرحبا", "الفستان الأسود", "في مقاس M؟"],
+    ["hi", "the black dress", "size M?"],
+    ["السلام عليكم", "بدي اسأل عن العباية", "الكحلي", "كم سعرها؟"],
+    ["هاي", "وصل جديد؟"],
+]
+
+
+class Uncoalesced:
+    """Baseline: every message gets its own LLM call and reply"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = 0
+
+    async def submit(self, tenant_id, customer, message, **kwargs):
+        self.calls += 1
+        return await self.handler(tenant_id, customer, message, **kwargs)
+
+    def stats(self):
+        return {'calls_saved': 0, 'superseded': 0}
+
+
+async def _customer(coalescer, customer: str, rng: random.Random, results: dict) -> None:
+    burst = rng.choice(BURSTS)
+
+    async def send(index: int, text: str) -> None:
+        sent = time.perf_counter()
+        reply = await coalescer.submit('bench', customer, text)
+        if reply is not None:
+            results['replies'].append((customer, index, time.perf_counter(), time.perf_counter() - sent))
+
+    tasks = []
+    for index, text in enumerate(burst):
+        tasks.append(asyncio.create_task(send(index, text)))
+        # Typing gaps: mostly quick follow-ups, sometimes a pause longer than the window
+        await asyncio.sleep(rng.choice([0.2, 0.4, 0.6, 0.6, 1.8]))
+    await asyncio.gather(*tasks)
+    results['messages'] += len(burst)
+
+
+async def _run(window: float, args: argparse.Namespace) -> dict:
+    rng = random.Random(11)
+    calls = {'started': 0}
+
+    async def handler(tenant_id, customer, message, **kwargs):
+        calls['started'] += 1
+        await asyncio.sleep(args.llm_latency * rng.uniform(0.7, 1.3))
+        return message
+
+    if window is None:
+        coalescer = Uncoalesced(handler)
+    else:
+        coalescer = MessageCoalescer(handler=handler, window=window, max_wait=args.max_wait, recorder=None)
+    results = {'messages': 0, 'replies': []}
+    await asyncio.gather(*(_customer(coalescer, f"c{i}", rng, results) for i in range(args.customers)))
+    latencies = sorted(latency for _, _, _, latency in results['replies'])
+    by_customer = {}
+    for customer, index, replied_at, _ in results['replies']:
+        by_customer.setdefault(customer, []).append((replied_at, index))
+    out_of_order = sum(
+        1 for replies in by_customer.values()
+        if [index for _, index in sorted(replies)] != sorted(index for _, index in replies)
+    )
+    return {
+        'messages': results['messages'],
+        'llm_calls': calls['started'],
+        'replies': len(results['replies']),
+        'out_of_order': out_of_order,
+        'stats': coalescer.stats(),
+        'reply_p50': statistics.median(latencies) * 1000,
+        'reply_p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    runs = (('no coalescing', None), ('cancel only', 0.0), (f'window={args.window:.1f}s', args.window))
+    for label, window in runs:
+        result = await _run(window, args)
+        stats = result['stats']
+        print(f"{label:<15} messages={result['messages']} llm_calls={result['llm_calls']} "
+              f"replies_sent={result['replies']} out_of_order={result['out_of_order']} saved={stats['calls_saved']} superseded={stats['superseded']} "
+              f"last_msg_to_reply p50={result['reply_p50']:.0f}ms p95={result['reply_p95']:.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--window', type=float, default=1.0)
+    parser.add_argument('--max-wait', type=float, default=5.0)
+    parser.add_argument('--llm-latency', type=float, default=0.8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,128 @@
+"""
+IG-Shop-Agent Catalog Import Benchmark
+Rows/s and peak memory of the streaming CSV import, against one INSERT per item
+
+Without --database the rows are validated and batched but staged nowhere, which
+measures parsing and validation alone. With --database they go through COPY and
+the upsert on a PostgreSQL configured through the usual DATABASE_* settings; the
+benchmark tenant is removed at the end.
+
+Usage:
+    python benchmarks/catalog_import.py --items 100000 --chunk-kb 64 [--database --insert-sample 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_import import CatalogImporter, validate_row
+
+TENANT = 'bench-import'
+NAMES = ["فستان سهرة", "عباية", "حقيبة جلد", "كعب عالي", "جاكيت جينز", "بلوزة حرير", "شال صوف"]
+COLORS = ["أسود", "كحلي", "بيج", "أحمر", "ذهبي"]
+
+
+async def csv_upload(items: int, chunk_bytes: int, error_rate: float, seed: int = 3):
+    """A synthetic catalog CSV, generated and sent chunk by chunk like a request body"""
+    rng = random.Random(seed)
+    buffer = ['sku,name,price_jod,category,stock_quantity,description,extras\n']
+    size = len(buffer[0])
+    for i in range(items):
+        price = f"{rng.uniform(5, 120):.2f}" if rng.random() > error_rate else "n/a"
+        name = f"{rng.choice(NAMES)} {rng.choice(COLORS)}"
+        line = (f'SKU-{i},{name},{price},dresses,{rng.randint(0, 40)},'
+                f'"قماش ناعم, تصميم أنيق ""{i}""","{{""size"": ""M""}}"\n')
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+            await asyncio.sleep(0)
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+class CountingStore:
+    """Consumes staged batches without a database"""
+
+    async def import_catalog_items(self, user_id, batches):
+        staged = 0
+        async for batch in batches:
+            staged += len(batch)
+        return {'staged': staged, 'inserted': staged, 'updated': 0}
+
+
+async def _run(importer: CatalogImporter, args: argparse.Namespace):
+    return await importer.run(TENANT, csv_upload(args.items, args.chunk_kb * 1024, args.error_rate), 'csv')
+
+
+async def _peak_memory(importer: CatalogImporter, args: argparse.Namespace) -> float:
+    """Peak traced MB of a separate run (tracing slows the import several times over)"""
+    tracemalloc.start()
+    await _run(importer, args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+async def main(args: argparse.Namespace) -> None:
+    importer = CatalogImporter(store=CountingStore())
+    report = await _run(importer, args)
+    print(f"parse+validate  rows={report.rows} rejected={report.failed} {report.seconds:.2f}s "
+          f"({report.rows / report.seconds:,.0f} rows/s) peak={await _peak_memory(importer, args):.1f}MB")
+    if not args.database:
+        return
+
+    from database import DatabaseService
+    db = DatabaseService()
+    await db.connect()
+    await db.initialize_schema()
+    await db.execute_query("DELETE FROM users WHERE id = $1", TENANT)
+    await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", TENANT)
+
+    # Baseline: one INSERT round trip per item, as create_catalog_item does
+    rng = random.Random(9)
+    sample = [
+        validate_row({'sku': f"INS-{i}", 'name': rng.choice(NAMES), 'price_jod': f"{rng.uniform(5, 120):.2f}",
+                      'category': 'dresses', 'stock_quantity': rng.randint(0, 40),
+                      'description': 'قماش ناعم', 'extras': '{"size": "M"}'}, i)[0]
+        for i in range(args.insert_sample)
+    ]
+    started = time.perf_counter()
+    for row in sample:
+        await db.execute_query(
+            """
+            INSERT INTO catalog_items (user_id, sku, name, price_jod, description, category, stock_quantity, extras)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8::jsonb)
+            ON CONFLICT (user_id, sku) DO NOTHING
+            """,
+            TENANT, row[1], row[2], row[3], row[4], row[5], row[6], row[8]
+        )
+    per_row_rate = len(sample) / (time.perf_counter() - started)
+    print(f"insert per row  rows={len(sample)} {per_row_rate:,.0f} rows/s "
+          f"(≈{args.items / per_row_rate:.0f}s for {args.items} items)")
+
+    importer = CatalogImporter(store=db)
+    for label in ('copy (new)', 'copy (update)'):
+        report = await _run(importer, args)
+        print(f"{label:<15} rows={report.rows} inserted={report.inserted} updated={report.updated} "
+              f"rejected={report.failed} {report.seconds:.2f}s ({report.rows / report.seconds:,.0f} rows/s)")
+    print(f"copy peak memory {await _peak_memory(importer, args):.1f}MB")
+
+    await db.execute_query("DELETE FROM users WHERE id = $1", TENANT)
+    await db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--chunk-kb', type=int, default=64)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--database', action='store_true')
+    parser.add_argument('--insert-sample', type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+IG-Shop-Agent Catalog Index Benchmark
+Top-k lookup latency over a synthetic catalog, compared with the old catalog_items[:10] slice
+
+Usage:
+    python benchmarks/catalog_ranking.py --items 50000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_index import CatalogIndex
+
+PRODUCTS = [("فستان", "dress"), ("عباية", "abaya"), ("حقيبة", "bag"), ("كعب عالي", "heels"),
+            ("بلوزة", "blouse"), ("تنورة", "skirt"), ("جاكيت", "jacket"), ("حذاء رياضي", "sneakers"),
+            ("شال", "scarf"), ("بنطلون", "pants"), ("قميص", "shirt"), ("معطف", "coat")]
+COLORS = [("أسود", "black"), ("أبيض", "white"), ("أحمر", "red"), ("كحلي", "navy"), ("بيج", "beige"),
+          ("زهري", "pink"), ("أخضر", "green"), ("ذهبي", "gold")]
+MATERIALS = ["قطن", "حرير", "جلد", "شيفون", "صوف", "linen", "denim", "satin"]
+OCCASIONS = ["سهرة", "عرس", "دوام", "كاجوال", "رياضة", "صيفي", "شتوي"]
+
+def synthetic_catalog(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        product, product_en = rng.choice(PRODUCTS)
+        color, color_en = rng.choice(COLORS)
+        items.append({
+            'id': f"item-{i}",
+            'sku': f"SKU-{i:06d}",
+            'name': f"{product} {color} {product_en} {color_en} {rng.randint(1, 500)}",
+            'category': product_en,
+            'description': f"{product} {rng.choice(MATERIALS)} مناسب لل{rng.choice(OCCASIONS)}",
+            'price_jod': rng.randint(10, 200),
+            'stock_quantity': rng.randint(0, 30),
+            'extras': {'sizes': rng.sample(['S', 'M', 'L', 'XL'], 2)}
+        })
+    return items
+
+def synthetic_queries(n: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    templates = ["بدي {p} {c}", "عندكم {p} {c} مقاس M؟", "{pe} {ce} available?",
+                 "كم سعر ال{p} ال{c}", "SKU-{sku:06d}", "{p} {m} لل{o}"]
+    queries = []
+    for _ in range(n):
+        product, product_en = rng.choice(PRODUCTS)
+        color, color_en = rng.choice(COLORS)
+        queries.append(rng.choice(templates).format(
+            p=product, c=color, pe=product_en, ce=color_en, m=rng.choice(MATERIALS),
+            o=rng.choice(OCCASIONS), sku=rng.randint(0, 49999)))
+    return queries
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def main(args: argparse.Namespace) -> None:
+    items = synthetic_catalog(args.items)
+    queries = synthetic_queries(args.queries)
+
+    started = time.perf_counter()
+    index = CatalogIndex(items)
+    print(f"build: {len(index)} items in {time.perf_counter() - started:.2f}s")
+
+    timings = []
+    for query in queries:
+        t0 = time.perf_counter()
+        index.top_k(query, args.k)
+        timings.append((time.perf_counter() - t0) * 1000)
+    print(f"top_k(k={args.k}): p50={statistics.median(timings):.3f}ms "
+          f"p95={percentile(timings, 0.95):.3f}ms p99={percentile(timings, 0.99):.3f}ms")
+
+    updates = items[:1000]
+    t0 = time.perf_counter()
+    for item in updates:
+        index.upsert({**item, 'stock_quantity': (item['stock_quantity'] or 0) + 1})
+    print(f"incremental upsert: {(time.perf_counter() - t0) * 1000 / len(updates):.3f}ms/item")
+
+    t0 = time.perf_counter()
+    index.sync(items)
+    print(f"full sync (1000 changed): {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+    hits = sum(1 for q in queries if q.startswith('SKU-') and index.top_k(q, 1)[0]['sku'] == q)
+    sku_queries = sum(1 for q in queries if q.startswith('SKU-'))
+    print(f"exact SKU hit rate: {hits}/{sku_queries}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+"""
+IG-Shop-Agent Catalog Search Benchmark
+p50/p95 latency, top hit and precision of the pg_trgm catalog search on a large catalog,
+for exact, partial, misspelled, Arabizi and SKU queries
+
+Needs the PostgreSQL configured through the usual DATABASE_* settings, with
+migrations 0005/0006 applied (pg_trgm and btree_gin must be installable) and a
+UTF-8 LC_CTYPE. Rows are generated server-side; the benchmark tenant is removed
+at the end unless --keep is given, so a 1M-row catalog can be reused by later
+runs with --reuse.
+
+Usage:
+    python benchmarks/catalog_search.py --items 1000000 --rounds 20 [--reuse] [--keep]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arabic_text import normalize_arabic
+from catalog_search import CatalogSearch, search_queries
+from database import DatabaseService
+
+TENANT = 'bench-search'
+PRODUCTS = ["فستان سهرة", "عباية", "حقيبة جلد", "كعب عالي", "جاكيت جينز", "بلوزة حرير", "شال صوف", "بنطلون قماش",
+            "dress", "abaya", "leather bag", "denim jacket"]
+COLORS = ["أسود", "كحلي", "بيج", "أحمر", "ذهبي", "أبيض", "black", "navy", "beige", "red"]
+# (query, text every good hit contains, after normalization)
+QUERIES = [
+    ("فستان اسود", "فستان سهره اسود"),
+    ("فستان أسود", "فستان سهره اسود"),          # Hamza variant
+    ("فسطان اسود", "فستان سهره اسود"),          # Typo
+    ("الفستان الاسود", "فستان سهره اسود"),      # Article
+    ("عباية كحلي", "عبايه كحلي"),
+    ("عبايه كحلى", "عبايه كحلي"),               # Taa marbuta / alef maqsura typed loosely
+    ("abaya blk", "abaya black"),              # Abbreviation
+    ("abaya black", "abaya black"),
+    ("lether bag", "leather bag"),             # Typo
+    ("حقيبه جلد بيج", "حقيبه جلد بيج"),
+    ("جاكيت جينز", "جاكيت جينز"),
+    ("sku-123457", "sku-123457"),
+    ("SKU 98765", "sku-98765"),
+]
+# extras values are part of search_text too
+EXTRAS = [{"sizes": ["S", "M"]}, {"sizes": ["L", "XL"]}, {"material": "قطن"}, {"occasion": "سهرة"}]
+
+
+async def load(db: DatabaseService, items: int) -> None:
+    await db.execute_query("DELETE FROM users WHERE id = $1", TENANT)
+    await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", TENANT)
+    started = time.perf_counter()
+    for start in range(0, items, 100_000):
+        await db.execute_query(
+            """
+            INSERT INTO catalog_items (user_id, sku, name, price_jod, category, description, extras)
+            SELECT $1, 'SKU-' || g,
+                   ($2::text[])[1 + g % cardinality($2::text[])] || ' ' || ($3::text[])[1 + (g / 7) % cardinality($3::text[])]
+                       || ' ' || (g % 997),
+                   10 + g % 190, 'fashion',
+                   'تصميم أنيق ومريح، مناسب للدوام والمناسبات ' || g,
+                   ($4::text[])[1 + g % cardinality($4::text[])]::jsonb
+            FROM generate_series($5::int, $6::int) g
+            """,
+            TENANT, PRODUCTS, COLORS, [json.dumps(e, ensure_ascii=False) for e in EXTRAS],
+            start, min(start + 100_000, items) - 1
+        )
+    await db.execute_query("ANALYZE catalog_items")
+    print(f"load       items={items} {time.perf_counter() - started:.0f}s")
+
+
+async def check_normalization(db: DatabaseService) -> None:
+    """search_text must fold exactly like the Python side that prepares queries"""
+    samples = ["فُسْتَانٌ أسودُ", "عباءة إسلامية", "حقيبة ٣ جيوب", "Abaya BLACK", "مـــلابس"]
+    mismatches = 0
+    for text in samples:
+        sql = await db.fetch_val("SELECT catalog_search_text($1, NULL, NULL, NULL, NULL)", text)
+        if sql != normalize_arabic(text):
+            mismatches += 1
+            print(f"  normalization differs: {text!r}: sql={sql!r} python={normalize_arabic(text)!r}")
+    print(f"normalize  samples={len(samples)} mismatches={mismatches}")
+
+
+async def explain(db: DatabaseService) -> None:
+    queries = search_queries("فستان اسود")
+    async with db.read_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL pg_trgm.word_similarity_threshold = 0.6")
+            plan = await conn.fetchval(
+                "EXPLAIN (FORMAT JSON) SELECT id FROM catalog_items WHERE user_id = $1 AND $2 <% search_text LIMIT 20",
+                TENANT, queries[0]
+            )
+    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+    nodes, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get('Plans', []))
+    print(f"plan       {' > '.join(n['Node Type'] + (' ' + n['Index Name'] if 'Index Name' in n else '') for n in nodes)}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    db = DatabaseService()
+    await db.connect()
+    await db.initialize_schema()
+    if not args.reuse:
+        await load(db, args.items)
+    await check_normalization(db)
+    await explain(db)
+
+    search = CatalogSearch(store=db)
+    samples, first, precision = {}, {}, {}
+    for _ in range(args.rounds):
+        for query, expected in QUERIES:
+            started = time.perf_counter()
+            items = await search.search(TENANT, query, args.limit)
+            samples.setdefault(query, []).append((time.perf_counter() - started) * 1000)
+            top = [normalize_arabic(f"{item['name']} {item['sku']}") for item in items]
+            first[query] = bool(top) and expected in top[0]
+            precision[query] = sum(1 for text in top if expected in text) / max(len(top), 1)
+
+    everything = sorted(s for values in samples.values() for s in values)
+    for query, _ in QUERIES:
+        values = sorted(samples[query])
+        print(f"  {query:<18} p50={statistics.median(values):6.1f}ms p95={values[int(len(values) * 0.95) - 1]:6.1f}ms "
+              f"top1={'ok' if first[query] else 'miss'} precision@{args.limit}={precision[query]:.2f}")
+    print(f"all        p50={statistics.median(everything):.1f}ms p95={everything[int(len(everything) * 0.95) - 1]:.1f}ms "
+          f"relaxed={search.stats()['relaxed']}/{search.stats()['searches']}")
+
+    if not args.keep:
+        await db.execute_query("DELETE FROM users WHERE id = $1", TENANT)
+    await db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--rounds', type=int, default=20, help='times each query is run')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--reuse', action='store_true', help='search the catalog a previous --keep run left')
+    parser.add_argument('--keep', action='store_true')
+    asyncio.run(main(parser.parse_args()))
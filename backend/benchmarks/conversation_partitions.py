@@ -0,0 +1,139 @@
+"""
+IG-Shop-Agent Conversation Partitioning Benchmark
+Last-20-messages thread reads on one heap versus monthly partitions, on synthetic rows
+
+Builds both layouts in a scratch schema (dropped at the end) of the PostgreSQL
+configured through the usual DATABASE_* settings. Seeding 50M rows twice takes
+a while and needs roughly 20GB of disk; try --rows 5000000 first.
+
+Usage:
+    python benchmarks/conversation_partitions.py --rows 50000000 --months 24 --queries 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_partitions import month_start
+from database import CONVERSATION_READ_HORIZONS, DatabaseService
+
+SCHEMA = 'bench_partitions'
+TENANTS = 200
+CUSTOMERS = 5000
+SEED_BATCH = 1_000_000
+
+COLUMNS = """
+    id BIGINT NOT NULL,
+    user_id TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    message TEXT NOT NULL,
+    is_ai_response BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+"""
+
+
+async def _setup(db: DatabaseService, args: argparse.Namespace) -> None:
+    now = datetime.now(timezone.utc)
+    await db.execute_query(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await db.execute_query(f"CREATE SCHEMA {SCHEMA}")
+    await db.execute_query(f"CREATE TABLE {SCHEMA}.flat ({COLUMNS}, PRIMARY KEY (id))")
+    await db.execute_query(
+        f"CREATE TABLE {SCHEMA}.partitioned ({COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"
+    )
+    for offset in range(-args.months, 2):
+        start = month_start(now.date(), offset)
+        end = month_start(now.date(), offset + 1)
+        await db.execute_query(
+            f"CREATE TABLE {SCHEMA}.p_{start:%Y_%m} PARTITION OF {SCHEMA}.partitioned "
+            f"FOR VALUES FROM ('{start.isoformat()} 00:00+00') TO ('{end.isoformat()} 00:00+00')"
+        )
+    span = args.months * 30 * 86400
+    for table in ('flat', 'partitioned'):
+        started = time.perf_counter()
+        for first in range(0, args.rows, SEED_BATCH):
+            # Spread over the whole span; hash-like ids scatter each thread across months
+            await db.execute_query(
+                f"""
+                INSERT INTO {SCHEMA}.{table}
+                SELECT g, 'tenant_' || (g % {TENANTS}), 'customer_' || ((g * 7919) % {CUSTOMERS}),
+                       'رسالة رقم ' || g, g % 2 = 0,
+                       $1::timestamptz - ((g::bigint * 104729) % {span}) * INTERVAL '1 second'
+                FROM generate_series($2::bigint, $3::bigint) AS g
+                """,
+                now, first + 1, min(first + SEED_BATCH, args.rows)
+            )
+        await db.execute_query(f"CREATE INDEX ON {SCHEMA}.{table} (user_id, customer, created_at)")
+        await db.execute_query(f"ANALYZE {SCHEMA}.{table}")
+        print(f"seeded {table:<12} {args.rows:,} rows in {time.perf_counter() - started:.0f}s")
+
+
+async def _thread(db: DatabaseService, table: str, tenant: str, customer: str, limit: int, horizons) -> list:
+    for horizon in horizons:
+        since = datetime.now(timezone.utc) - horizon if horizon else None
+        rows = await db.fetch_all(
+            f"""
+            SELECT message, is_ai_response, created_at FROM {SCHEMA}.{table}
+            WHERE user_id = $1 AND customer = $2 AND created_at > COALESCE($3::timestamptz, '-infinity')
+            ORDER BY created_at DESC LIMIT $4
+            """,
+            tenant, customer, since, limit
+        )
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+async def main(args: argparse.Namespace) -> None:
+    db = DatabaseService()
+    await db.connect()
+    if not args.reuse:
+        await _setup(db, args)
+    rng = random.Random(1)
+    threads = [(f"tenant_{rng.randrange(TENANTS)}", f"customer_{rng.randrange(CUSTOMERS)}") for _ in range(args.queries)]
+
+    layouts = (('flat', 'flat', (None,)), ('partitioned', 'partitioned', CONVERSATION_READ_HORIZONS))
+    for label, table, horizons in layouts:
+        for tenant, customer in threads[:20]:
+            await _thread(db, table, tenant, customer, 20, horizons)  # Warm the cache and plans
+        samples = []
+        for tenant, customer in threads:
+            started = time.perf_counter()
+            await _thread(db, table, tenant, customer, 20, horizons)
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        tenant, customer = threads[0]
+        since = datetime.now(timezone.utc) - horizons[0] if horizons[0] else None
+        plan = await db.fetch_all(
+            f"""
+            EXPLAIN (ANALYZE, BUFFERS)
+            SELECT message FROM {SCHEMA}.{table}
+            WHERE user_id = $1 AND customer = $2 AND created_at > COALESCE($3::timestamptz, '-infinity')
+            ORDER BY created_at DESC LIMIT 20
+            """,
+            tenant, customer, since
+        )
+        lines = [row['QUERY PLAN'] for row in plan]
+        scanned = sum(1 for line in lines if 'Index Scan' in line or 'Bitmap Heap Scan' in line)
+        buffers = next((line.strip() for line in lines if 'Buffers' in line), '')
+        print(f"{label:<12} p50={statistics.median(samples):.2f}ms p95={samples[int(len(samples) * 0.95) - 1]:.2f}ms "
+              f"scans={scanned} {buffers}")
+
+    if not args.keep:
+        await db.execute_query(f"DROP SCHEMA {SCHEMA} CASCADE")
+    await db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50_000_000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--reuse', action='store_true', help='skip seeding and reuse a kept scratch schema')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch schema for another run')
+    asyncio.run(main(parser.parse_args()))
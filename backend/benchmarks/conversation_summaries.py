@@ -0,0 +1,129 @@
+"""
+IG-Shop-Agent Conversation Summary Benchmark
+Prompt tokens per message with raw history versus rolling summary + recent turns
+
+Usage:
+    python benchmarks/conversation_summaries.py --threads 50 --lengths 20 40 60
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_summarizer import ConversationSummarizer
+from prompt_builder import PromptCompiler
+from token_budget import TokenBudgetManager
+
+CUSTOMER_LINES = [
+    "مرحبا، عندكم فستان سهرة أسود مقاس M؟ شفته بالستوري امبارح",
+    "كم سعر العباية الكحلي؟ وهل في توصيل على إربد؟",
+    "بدي أعرف إذا الحقيبة الجلد متوفرة باللون البيج",
+    "the black dress from your last post, is it still available in size L?",
+    "طيب إذا طلبت اليوم إمتى بيوصل؟ وكم أجرة التوصيل لعمان؟",
+    "can I pay cash on delivery? and can I exchange if the size is wrong?",
+    "ممكن صور إضافية للكعب العالي الذهبي؟ وشو نوع الخامة؟",
+    "تمام بدي أطلب قطعتين، الاسم سارة والرقم 0790000000",
+]
+AGENT_LINES = [
+    "أهلاً وسهلاً! نعم الفستان الأسود متوفر بمقاس M وسعره 45 دينار أردني. التوصيل لكل مناطق المملكة خلال يومين.",
+    "العباية الكحلي سعرها 38 دينار، والتوصيل لإربد متاح بـ 3 دنانير ويوصل خلال 48 ساعة.",
+    "Yes, the dress is available in L for 45 JOD. Delivery takes 1-2 days and cash on delivery is supported.",
+    "الحقيبة الجلد متوفرة باللون البيج بسعر 55 دينار، وفيها جيب داخلي وسحاب. هل تحبي أحجزلك وحدة؟",
+    "تم تسجيل طلبك يا سارة! رح نتواصل معك على الرقم لتأكيد العنوان. شكراً لثقتك بنا 🌸",
+]
+
+class MemoryStore:
+    """In-memory stand-in for the conversation tables"""
+
+    def __init__(self):
+        self.messages = {}
+        self.summaries = {}
+
+    def add(self, tenant_id, customer, text, is_ai, created_at):
+        self.messages.setdefault((tenant_id, customer), []).append(
+            {'message': text, 'is_ai_response': is_ai, 'created_at': created_at})
+
+    async def get_conversation_summary(self, tenant_id, customer):
+        return self.summaries.get((tenant_id, customer))
+
+    async def save_conversation_summary(self, tenant_id, customer, summary, covered_count, covered_until):
+        self.summaries[(tenant_id, customer)] = {
+            'summary': summary, 'covered_count': covered_count, 'covered_until': covered_until}
+
+    async def fetch_conversation_messages_after(self, tenant_id, customer, after=None, limit=200):
+        rows = self.messages.get((tenant_id, customer), [])
+        return [r for r in rows if after is None or r['created_at'] > after][:limit]
+
+    async def count_conversation_messages_after(self, tenant_id, customer, after=None):
+        return len(await self.fetch_conversation_messages_after(tenant_id, customer, after, 10 ** 9))
+
+async def extractive_summary(previous: str, messages: list, tenant_id: str) -> str:
+    """Deterministic stand-in for the LLM summary: last few customer requests"""
+    lines = [l for l in previous.split('\n') if l]
+    lines += ['- ' + ' '.join(m['message'].split()[:8]) for m in messages if not m['is_ai_response']]
+    return '\n'.join(lines[-5:])
+
+async def run_thread(thread_id: int, length: int, rng: random.Random, budget: TokenBudgetManager,
+                     compiler: PromptCompiler) -> tuple:
+    store = MemoryStore()
+    summarizer = ConversationSummarizer(store=store, summarize_fn=extractive_summary)
+    tenant, customer = 'tenant-1', f'customer-{thread_id}'
+    history = []
+    clock = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    raw_tokens, summary_tokens = [], []
+
+    for turn in range(length // 2):
+        message = rng.choice(CUSTOMER_LINES)
+        render = lambda items, summary=None: compiler.render(tenant, 1, items, None, summary)
+
+        _, raw_account = budget.build(render, [], history, message)
+        summary, recent = await summarizer.prepare_history(tenant, customer, history)
+        _, summary_account = budget.build(lambda items: render(items, summary), [], recent, message)
+        if len(history) >= 20:
+            raw_tokens.append((raw_account.total, raw_account.history))
+            summary_tokens.append((summary_account.total, summary_account.history + summary_account.system
+                                   - raw_account.system))
+
+        reply = rng.choice(AGENT_LINES)
+        for text, is_ai in ((message, False), (reply, True)):
+            clock += timedelta(seconds=30)
+            store.add(tenant, customer, text, is_ai, clock)
+            history.append({'text': text, 'ai_generated': is_ai})
+        await summarizer.note_messages(tenant, customer, 2)
+        await summarizer.drain()
+
+    return raw_tokens, summary_tokens
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(3)
+    compiler = PromptCompiler()
+    for length in args.lengths:
+        for window in args.windows:
+            budget = TokenBudgetManager(max_turns=window)
+            raw, summarized = [], []
+            for thread_id in range(args.threads):
+                r, s = await run_thread(thread_id, length, rng, budget, compiler)
+                raw += r
+                summarized += s
+            if not raw:
+                continue
+            raw_total = statistics.mean(t for t, _ in raw)
+            sum_total = statistics.mean(t for t, _ in summarized)
+            raw_history = statistics.mean(h for _, h in raw)
+            sum_history = statistics.mean(h for _, h in summarized)
+            print(f"thread={length:3d} msgs window={window:2d}: "
+                  f"prompt {raw_total:5.0f} -> {sum_total:5.0f} tokens/msg "
+                  f"({(1 - sum_total / raw_total) * 100:4.1f}% fewer), "
+                  f"history part {raw_history:4.0f} -> {sum_history:4.0f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[24, 40, 60])
+    parser.add_argument('--windows', type=int, nargs='+', default=[10, 20])
+    asyncio.run(main(parser.parse_args()))
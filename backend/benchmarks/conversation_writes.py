@@ -0,0 +1,120 @@
+"""
+IG-Shop-Agent Conversation Write Buffer Benchmark
+Messages/s of one INSERT per message against the write-behind buffer, on a simulated database
+
+The database is an in-memory table whose inserts cost a round trip plus a small
+per-row cost, so no PostgreSQL is needed. --stall pauses the database for that
+many seconds midway to show backpressure and recovery; every run ends with a
+read-your-writes check and a shutdown flush.
+
+Usage:
+    python benchmarks/conversation_writes.py --messages 20000 --writers 200 --rtt-ms 1.0 --stall 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConversationWriteBuffer
+
+TENANT = 'bench-writes'
+
+
+class SimulatedDb:
+    """A conversations table behind a fixed round trip and per-row cost"""
+
+    def __init__(self, rtt: float, per_row: float):
+        self.rtt = rtt
+        self.per_row = per_row
+        self.rows = {}
+        self.stalled_until = 0.0
+
+    async def insert_conversation_messages(self, rows):
+        delay = self.rtt + self.per_row * len(rows)
+        delay += max(0.0, self.stalled_until - time.monotonic())
+        await asyncio.sleep(delay)
+        for row in rows:
+            self.rows.setdefault(row['id'], row)
+
+    def thread(self, customer):
+        return [row for row in self.rows.values() if row['customer'] == customer]
+
+
+async def _writers(args: argparse.Namespace, write) -> float:
+    per_writer = args.messages // args.writers
+
+    async def writer(n: int) -> None:
+        for i in range(per_writer):
+            await write(f"customer_{n}", f"رسالة {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(n) for n in range(args.writers)))
+    return time.perf_counter() - started
+
+
+async def main(args: argparse.Namespace) -> None:
+    total = args.messages // args.writers * args.writers
+
+    db = SimulatedDb(args.rtt_ms / 1000, args.row_us / 1e6)
+    pool = asyncio.Semaphore(args.pool)
+
+    async def insert_one(customer, message):
+        async with pool:
+            await db.insert_conversation_messages([
+                {'id': f"{customer}-{message}", 'user_id': TENANT, 'customer': customer, 'message': message}
+            ])
+
+    seconds = await _writers(args, insert_one)
+    print(f"insert per row  msgs={total} {seconds:.2f}s ({total / seconds:,.0f} msgs/s)")
+
+    db = SimulatedDb(args.rtt_ms / 1000, args.row_us / 1e6)
+    buffer = ConversationWriteBuffer(
+        db, max_batch=args.batch, max_delay=args.max_delay_ms / 1000, max_pending=args.max_pending
+    )
+
+    async def stall() -> None:
+        await asyncio.sleep(args.stall_after)
+        db.stalled_until = time.monotonic() + args.stall
+
+    async def buffered(customer, message):
+        await buffer.add(TENANT, customer, message)
+
+    stall_task = asyncio.create_task(stall()) if args.stall else None
+    seconds = await _writers(args, buffered)
+    queued = buffer.stats()['unwritten']
+
+    # Read-your-writes: a message just queued is visible in its thread before it is stored
+    row = await buffer.add(TENANT, 'customer_0', 'آخر رسالة')
+    stored = db.thread('customer_0')
+    merged = buffer.merge(stored, buffer.tail(TENANT, 'customer_0'))
+    visible = any(item['id'] == row['id'] for item in merged)
+
+    flush_started = time.perf_counter()
+    await buffer.close()
+    flush_seconds = time.perf_counter() - flush_started
+    if stall_task:
+        stall_task.cancel()
+    stats = buffer.stats()
+    print(f"write-behind    msgs={total} {seconds:.2f}s ({total / seconds:,.0f} msgs/s) "
+          f"batches={stats['batches']} avg_batch={stats['avg_batch']} "
+          f"max_flush_latency={stats['max_flush_latency_ms']}ms backpressure_waits={stats['backpressure_waits']}")
+    print(f"read-your-writes visible={visible} (stored={len(stored)}, merged={len(merged)})")
+    print(f"shutdown flush  queued={queued + 1} written={len(db.rows)}/{total + 1} in {flush_seconds * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--writers', type=int, default=200)
+    parser.add_argument('--pool', type=int, default=10, help='connections available to per-row inserts')
+    parser.add_argument('--rtt-ms', type=float, default=1.0)
+    parser.add_argument('--row-us', type=float, default=5.0)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--max-delay-ms', type=float, default=200)
+    parser.add_argument('--max-pending', type=int, default=20000)
+    parser.add_argument('--stall', type=float, default=0.0, help='seconds the database stops answering')
+    parser.add_argument('--stall-after', type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
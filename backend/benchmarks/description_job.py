@@ -0,0 +1,164 @@
+"""
+IG-Shop-Agent Catalog Description Job Benchmark
+Items/min of the bulk description job versus one-at-a-time calls, with an interrupted-and-resumed run
+
+Usage:
+    python benchmarks/description_job.py --items 3000 --concurrency 16 --latency 0.3 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_description_job import CatalogDescriptionJobRunner
+
+
+class MemoryCatalogStore:
+    """In-memory stand-in for catalog_items and catalog_description_jobs"""
+
+    def __init__(self, items: int, db_latency: float):
+        self.db_latency = db_latency
+        self.items = {
+            f"{i:06d}": {'id': f"{i:06d}", 'sku': f"SKU-{i}", 'name': f"فستان {i}", 'category': 'dresses',
+                         'price_jod': 30 + i % 40, 'description': None, 'description_generated_at': None}
+            for i in range(items)
+        }
+        self.jobs = {}
+        self.update_statements = 0
+        self.writes = 0
+        self._ids = itertools.count(1)
+
+    async def _roundtrip(self):
+        await asyncio.sleep(self.db_latency)
+
+    async def create_description_job(self, user_id, overwrite=False, claimed_by=None):
+        await self._roundtrip()
+        job = {'id': f"job-{next(self._ids)}", 'user_id': user_id, 'status': 'running', 'overwrite': overwrite,
+               'total': sum(1 for i in self.items.values() if overwrite or not i['description']),
+               'done': 0, 'failed': 0, 'created_at': datetime.now(timezone.utc),
+               'claimed_by': claimed_by, 'claimed_at': time.monotonic()}
+        self.jobs[job['id']] = job
+        return dict(job)
+
+    async def get_description_job(self, user_id, job_id=None):
+        await self._roundtrip()
+        for job in self.jobs.values():
+            if job['user_id'] == user_id and (job['id'] == job_id or (job_id is None and job['status'] == 'running')):
+                return dict(job)
+        return None
+
+    async def list_running_description_jobs(self):
+        return [dict(job) for job in self.jobs.values() if job['status'] == 'running']
+
+    async def claim_description_jobs(self, worker, lease, job_id=None):
+        await self._roundtrip()
+        claimed = []
+        for job in self.jobs.values():
+            if job['status'] != 'running' or job_id not in (None, job['id']):
+                continue
+            if job['claimed_by'] in (None, worker) or job['claimed_at'] < time.monotonic() - lease:
+                job.update(claimed_by=worker, claimed_at=time.monotonic())
+                claimed.append(dict(job))
+        return claimed
+
+    async def update_description_job(self, job_id, done, failed, status='running', last_error=None,
+                                     claimed_by=None):
+        await self._roundtrip()
+        self.jobs[job_id].update(done=done, failed=failed, status=status,
+                                 claimed_by=claimed_by, claimed_at=time.monotonic())
+
+    async def fetch_items_needing_description(self, user_id, job, after_id=None, limit=100):
+        await self._roundtrip()
+        page = []
+        for item_id in sorted(self.items):
+            item = self.items[item_id]
+            if after_id is not None and item_id <= after_id:
+                continue
+            if not (job['overwrite'] or not item['description']):
+                continue
+            if item['description_generated_at'] and item['description_generated_at'] >= job['created_at']:
+                continue
+            page.append(dict(item))
+            if len(page) == limit:
+                break
+        return page
+
+    async def save_generated_descriptions(self, user_id, descriptions):
+        await self._roundtrip()
+        self.update_statements += 1
+        now = datetime.now(timezone.utc)
+        for item_id, description in descriptions.items():
+            self.items[item_id].update(description=description, description_generated_at=now)
+            self.writes += 1
+
+
+def _fake_llm(latency: float, error_rate: float, calls: dict):
+    async def generate(item, tenant_id):
+        calls['n'] += 1
+        await asyncio.sleep(latency * random.uniform(0.7, 1.3))
+        if random.random() < error_rate:
+            raise ConnectionError("injected failure")
+        return f"وصف {item['name']}: قماش ناعم وتصميم أنيق."
+    return generate
+
+
+async def main(args: argparse.Namespace) -> None:
+    random.seed(5)
+    calls = {'n': 0}
+    generate = _fake_llm(args.latency, args.error_rate, calls)
+
+    # Baseline: the caller loops over generate_product_description one item at a time
+    sample = 40
+    started = time.perf_counter()
+    for i in range(sample):
+        try:
+            await generate({'name': f"item {i}"}, 'bench')
+        except ConnectionError:
+            pass
+    sequential_rate = sample / (time.perf_counter() - started) * 60
+    print(f"sequential       {sequential_rate:.0f} items/min "
+          f"(≈{args.items / sequential_rate:.1f} min for {args.items} items)")
+
+    store = MemoryCatalogStore(args.items, args.db_latency)
+    options = dict(generate_fn=generate, concurrency=args.concurrency, batch_size=args.batch_size,
+                   backoff=args.backoff, backoff_max=2.0)
+
+    # First process: interrupted part-way through, as on a deploy restart
+    runner = CatalogDescriptionJobRunner(store=store, **options)
+    progress = await runner.start('bench')
+    await asyncio.sleep(args.interrupt_after)
+    await runner.shutdown()
+    job = store.jobs[progress.job_id]
+    print(f"interrupted      checkpoint done={job['done']}/{job['total']} status={job['status']} "
+          f"rate={progress.items_per_minute():.0f} items/min")
+
+    # Second process: picks the running job up from the database
+    calls_before = calls['n']
+    runner = CatalogDescriptionJobRunner(store=store, **options)
+    resumed = (await runner.resume_all())[0]
+    await runner._tasks['bench']
+    job = store.jobs[resumed.job_id]
+    missing = sum(1 for item in store.items.values() if not item['description'])
+    print(f"resumed          done={job['done']}/{job['total']} failed={resumed.failed} status={job['status']} "
+          f"rate={resumed.items_per_minute():.0f} items/min calls={calls['n'] - calls_before}")
+    print(f"totals           llm_calls={calls['n']} rows_written={store.writes} "
+          f"update_statements={store.update_statements} items_without_description={missing}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--db-latency', type=float, default=0.002)
+    parser.add_argument('--backoff', type=float, default=0.2)
+    parser.add_argument('--interrupt-after', type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""
+IG-Shop-Agent Fair Scheduling Benchmark
+Simulated skewed load: one tenant running a giveaway next to many normal shops, FIFO versus FairScheduler
+
+Usage:
+    python benchmarks/fair_scheduling.py --capacity 16 --flood 1500 --tenants 20 --service-time 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_scheduler import FairScheduler
+
+PLANS = ['starter', 'professional', 'enterprise']
+
+
+class FifoScheduler:
+    """Baseline: one shared semaphore, first come first served"""
+
+    def __init__(self, capacity: int):
+        self._semaphore = asyncio.Semaphore(capacity)
+
+    @asynccontextmanager
+    async def slot(self, tenant_id):
+        async with self._semaphore:
+            yield
+
+
+async def _simulate(scheduler, args: argparse.Namespace, plans: dict) -> dict:
+    rng = random.Random(7)
+    latencies = {}
+
+    async def call(tenant_id: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            async with scheduler.slot(tenant_id):
+                await asyncio.sleep(args.service_time * rng.uniform(0.5, 1.5))
+        except Exception:
+            return
+        latencies.setdefault(tenant_id, []).append((time.perf_counter() - started) * 1000)
+
+    calls = [call('giveaway', 0.0) for _ in range(args.flood)]
+    for tenant_id in plans:
+        if tenant_id == 'giveaway':
+            continue
+        # Normal shops: a steady trickle of DMs over the whole run
+        calls += [call(tenant_id, rng.uniform(0, args.duration)) for _ in range(args.messages)]
+    started = time.perf_counter()
+    await asyncio.gather(*calls)
+    elapsed = time.perf_counter() - started
+
+    def summary(samples):
+        ordered = sorted(samples)
+        return statistics.median(ordered), ordered[max(int(len(ordered) * 0.95) - 1, 0)], len(ordered)
+
+    by_plan = {}
+    for tenant_id, samples in latencies.items():
+        if tenant_id != 'giveaway':
+            by_plan.setdefault(plans[tenant_id], []).extend(samples)
+    return {
+        'elapsed': elapsed,
+        'giveaway': summary(latencies.get('giveaway', [0.0])),
+        'plans': {plan: summary(samples) for plan, samples in sorted(by_plan.items())},
+    }
+
+
+def _report(label: str, result: dict) -> None:
+    p50, p95, count = result['giveaway']
+    print(f"{label}: elapsed={result['elapsed']:.1f}s giveaway(starter) n={count} p50={p50:.0f}ms p95={p95:.0f}ms")
+    for plan, (p50, p95, count) in result['plans'].items():
+        print(f"    other {plan:<13} n={count:<4} p50={p50:.0f}ms p95={p95:.0f}ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    plans = {'giveaway': 'starter'}
+    plans.update({f"shop-{i}": PLANS[i % len(PLANS)] for i in range(args.tenants)})
+
+    _report('fifo', await _simulate(FifoScheduler(args.capacity), args, plans))
+
+    async def resolve(tenant_id):
+        return plans.get(tenant_id)
+
+    fair = FairScheduler(capacity=args.capacity, plan_resolver=resolve, max_queue_per_tenant=args.flood)
+    _report('fair', await _simulate(fair, args, plans))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--capacity', type=int, default=16)
+    parser.add_argument('--flood', type=int, default=1500)
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=4.0)
+    parser.add_argument('--service-time', type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
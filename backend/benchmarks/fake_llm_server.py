@@ -0,0 +1,127 @@
+"""
+IG-Shop-Agent Fake Completion Server
+Minimal OpenAI-compatible HTTP server for local benchmarks (no network, no API key)
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Optional
+
+
+class FakeCompletionServer:
+    """Serves /chat/completions with configurable latency and error injection
+    
+    slow_rate of the requests take slow_latency instead, to model tail latency.
+    """
+    
+    def __init__(self, latency: float = 0.2, error_rate: float = 0.0,
+                 reply: str = "مرحبا! كيف بقدر أساعدك؟", retry_after: Optional[int] = None,
+                 slow_rate: float = 0.0, slow_latency: float = 2.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.reply = reply
+        self.retry_after = retry_after
+        self.requests_served = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+    
+    async def start(self) -> "FakeCompletionServer":
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+    
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                payload = json.loads(body or b'{}')
+                
+                await asyncio.sleep(self.slow_latency if random.random() < self.slow_rate else self.latency)
+                self.requests_served += 1
+                
+                if random.random() < self.error_rate:
+                    await self._write_error(writer)
+                elif payload.get('stream'):
+                    await self._write_stream(writer, payload)
+                else:
+                    await self._write_json(writer, 200, self._completion(payload))
+        except (ConnectionResetError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+    
+    def _completion(self, payload: dict) -> dict:
+        # Rough usage so cost reports scale with prompt size (~3 characters per token)
+        prompt_tokens = sum(len(m.get('content') or '') for m in payload.get('messages', [])) // 3
+        completion_tokens = len(self.reply) // 3
+        return {
+            "id": f"chatcmpl-{self.requests_served}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get('model', 'fake'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+    
+    async def _write_json(self, writer: asyncio.StreamWriter, status: int, body: dict,
+                          extra_headers: str = "") -> None:
+        data = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n{extra_headers}\r\n".encode() + data
+        )
+        await writer.drain()
+    
+    async def _write_error(self, writer: asyncio.StreamWriter) -> None:
+        extra = f"Retry-After: {self.retry_after}\r\n" if self.retry_after is not None else ""
+        status = 429 if self.retry_after is not None else 500
+        await self._write_json(writer, status, {"error": {"message": "injected failure"}}, extra)
+    
+    async def _write_stream(self, writer: asyncio.StreamWriter, payload: dict) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        for token in self.reply.split(' '):
+            chunk = {
+                "id": "chatcmpl-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get('model', 'fake'),
+                "choices": [{"index": 0, "delta": {"content": token + ' '}, "finish_reason": None}]
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(self.latency / 10)
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        self._write_chunk(writer, b"")
+        await writer.drain()
+    
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
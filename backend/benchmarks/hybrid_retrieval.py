@@ -0,0 +1,290 @@
+"""
+IG-Shop-Agent Hybrid Retrieval Benchmark
+Offline relevance (recall@k, MRR) of lexical, vector, RRF and RRF + rerank over a
+labeled catalog and KB, per query style (MSA, Jordanian dialect, Arabizi, SKU,
+English, English with typos), and latency of the full hybrid retrieval path
+
+Everything runs in memory: KB chunks live in a dict-backed store and embeddings
+come from a character-trigram hashing embedder, which stands in for a dense
+model that tolerates spelling variation but knows nothing of Arabizi. Absolute
+numbers are for comparing the rankings with each other, not with production.
+
+Usage:
+    python benchmarks/hybrid_retrieval.py --queries-per-style 200 [--embed-ms 20]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_config import ProductionConfig
+from arabic_text import normalize_arabic
+from catalog_index import CatalogIndex, item_key
+from hybrid_retrieval import Candidate, HybridRetriever, chunk_key, reciprocal_rank_fusion, rerank
+from kb_vector_index import parse_vector
+from knowledge_base import KnowledgeBase
+
+TENANT = 'bench-hybrid'
+# (Arabic, Arabizi, English)
+PRODUCTS = [("فستان", "fustan", "dress"), ("عباية", "3abaya", "abaya"), ("شنطة", "shanta", "bag"),
+            ("جاكيت", "jaket", "jacket"), ("بنطلون", "bantaloon", "pants"), ("قميص", "2amees", "shirt"),
+            ("تنورة", "tannoura", "skirt"), ("بلوزة", "blooza", "blouse"), ("شال", "shal", "scarf"),
+            ("كندرة", "kondara", "shoes")]
+COLORS = [("أحمر", "a7mar", "red"), ("أسود", "aswad", "black"), ("أبيض", "abyad", "white"),
+          ("أزرق", "azra2", "blue"), ("أخضر", "akhdar", "green"), ("زهري", "zahri", "pink")]
+MATERIALS = [("حرير", "7arir", "silk"), ("قطن", "2otn", "cotton"), ("جلد", "jild", "leather"),
+             ("صوف", "soof", "wool"), ("كتان", "kattan", "linen")]
+TEMPLATES = {
+    'msa': "هل يتوفر لديكم {p} {c} مصنوع من ال{m}؟",
+    'dialect': "بدي {p} {c} {m} شو سعره وكم بضل توصيله",
+    'arabizi': "3andkom {pa} {ca} {ma}? addesh se3ro",
+    'sku': "{sku} lsa mawjood?",
+    'english': "do you have the {ce} {me} {pe}?",
+    'typo': "do you have the {ce_typo} {me_typo} {pe_typo}?",
+}
+
+# (title, content, questions by style); each shop writes its policies in both languages
+KB_DOCUMENTS = [
+    ("سياسة الإرجاع", "يمكن إرجاع المنتج خلال 14 يوماً من الاستلام بشرط أن يكون بحالته الأصلية مع الفاتورة. "
+     "Returns are accepted within 14 days of delivery with the receipt.",
+     {'msa': "ما هي سياسة الإرجاع لديكم؟", 'dialect': "بقدر أرجع الغرض إذا ما عجبني؟",
+      'arabizi': "b2dar arja3 el 2ighrad?", 'english': "what is your return policy?"}),
+    ("الاستبدال", "يمكن استبدال المقاس أو اللون مرة واحدة مجاناً خلال 7 أيام. "
+     "Size or color exchanges are free once within 7 days.",
+     {'msa': "هل يمكن استبدال المقاس؟", 'dialect': "بدي أبدل المقاس لأنه طلع صغير",
+      'arabizi': "bade abaddel el ma2as", 'english': "can I exchange the size?"}),
+    ("دليل المقاسات", "المقاس S يناسب 50 كغ، والمقاس M يناسب 60 كغ، والمقاس L يناسب 70 كغ. "
+     "Size guide: S fits 50kg, M fits 60kg, L fits 70kg.",
+     {'msa': "أي مقاس يناسب وزن 60 كغ؟", 'dialect': "وزني 60 كيلو شو المقاس اللي بزبطلي؟",
+      'arabizi': "wazni 60 kilo shu el ma2as?", 'english': "which size fits 60kg?"}),
+    ("التوصيل داخل الأردن", "التوصيل داخل عمّان خلال يومين، وإلى باقي المحافظات خلال 3 أيام، ورسوم التوصيل 3 دنانير. "
+     "Delivery inside Jordan takes 2 to 3 days for 3 JOD.",
+     {'msa': "كم يستغرق التوصيل إلى إربد؟", 'dialect': "قديش بياخد التوصيل لإربد؟",
+      'arabizi': "2addesh byekhod el tawseel 3a irbid?", 'english': "how long is delivery to Irbid?"}),
+    ("الشحن الدولي", "نشحن إلى دول الخليج خلال 7 أيام عبر أرامكس، والرسوم حسب الوزن. "
+     "International shipping to the Gulf takes 7 days via Aramex.",
+     {'msa': "هل تشحنون إلى السعودية؟", 'dialect': "بتبعتوا على السعودية؟",
+      'arabizi': "btib3atu 3al sa3oodiyye?", 'english': "do you ship to Saudi Arabia?"}),
+    ("الدفع", "نقبل الدفع عند الاستلام وبطاقات الائتمان وكليك، ورسوم الدفع عند الاستلام نصف دينار. "
+     "We accept cash on delivery, cards and CliQ.",
+     {'msa': "ما هي طرق الدفع المتاحة؟", 'dialect': "بتقبلوا كليك ولا بس كاش؟",
+      'arabizi': "bt2ablo cliq wala bas cash?", 'english': "which payment methods do you accept?"}),
+    ("العناية بالحرير", "يغسل الحرير يدوياً بماء بارد، ولا يعصر، ويكوى على حرارة منخفضة. "
+     "Hand wash silk in cold water and iron on low heat.",
+     {'msa': "كيف أغسل فستان الحرير؟", 'dialect': "كيف بغسل الحرير بدون ما يخرب؟",
+      'arabizi': "kif b8assel el 7arir?", 'english': "how do I wash silk?"}),
+    ("العناية بالجلد", "ينظف الجلد بقطعة قماش رطبة ويحفظ بعيداً عن الشمس والرطوبة. "
+     "Clean leather with a damp cloth and keep it away from sunlight.",
+     {'msa': "كيف أنظف الشنطة الجلد؟", 'dialect': "الشنطة الجلد اتوسخت كيف بنظفها؟",
+      'arabizi': "kif bnazzef el shanta el jild?", 'english': "how to clean a leather bag?"}),
+    ("تغليف الهدايا", "نغلف الطلب كهدية مع بطاقة مكتوبة بخط اليد مقابل دينار واحد. "
+     "Gift wrapping with a handwritten card costs 1 JOD.",
+     {'msa': "هل يوجد تغليف للهدايا؟", 'dialect': "بدي أبعته هدية بتغلفوه؟",
+      'arabizi': "bade ab3atha hdiyye bt8alfoha?", 'english': "do you offer gift wrapping?"}),
+    ("مواعيد العمل والموقع", "المحل في شارع الجاردنز في عمّان، ونفتح من 10 صباحاً حتى 10 مساءً ما عدا الجمعة. "
+     "Our shop is on Gardens Street in Amman, open 10am to 10pm except Friday.",
+     {'msa': "ما هي مواعيد عمل المحل؟", 'dialect': "وين محلكم وايمتى بتفتحوا؟",
+      'arabizi': "wen ma7alkom w emta btifta7o?", 'english': "where is your shop and when are you open?"}),
+    ("نقاط الولاء", "كل دينار تنفقه يمنحك نقطة، وكل 100 نقطة تساوي خصم 5 دنانير. "
+     "Every JOD spent earns a point; 100 points give 5 JOD off.",
+     {'msa': "كيف يعمل برنامج النقاط؟", 'dialect': "النقاط اللي بجمعها شو بستفيد منها؟",
+      'arabizi': "el no2at shu bistfeed menha?", 'english': "how do loyalty points work?"}),
+    ("طلبات الجملة", "نبيع بالجملة للمحلات بطلب أدنى 20 قطعة وبخصم 30٪. "
+     "Wholesale orders start at 20 pieces with 30% off.",
+     {'msa': "هل تبيعون بالجملة؟", 'dialect': "عندي محل بدي آخذ جملة منكم",
+      'arabizi': "3andi ma7al bade jomle", 'english': "do you sell wholesale?"}),
+]
+
+class TrigramEmbedder:
+    """Hashed bag of character trigrams of the normalized text"""
+
+    def __init__(self, dimensions: int, delay: float = 0.0):
+        self.dimensions = dimensions
+        self.delay = delay
+
+    def _vector(self, text: str) -> list:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in normalize_arabic(text).split():
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                digest = hashlib.blake2b(padded[i:i + 3].encode('utf-8'), digest_size=4).digest()
+                vector[int.from_bytes(digest[:3], 'little') % self.dimensions] += 1.0 if digest[3] & 1 else -1.0
+        norm = float(np.linalg.norm(vector)) or 1.0
+        return (vector / norm).tolist()
+
+    async def __call__(self, texts):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return [self._vector(text) for text in texts]
+
+class MemoryKBStore:
+    """The kb_* methods of DatabaseService over dicts, with exact cosine search"""
+
+    def __init__(self):
+        self.documents = {}
+        self.chunks = {}  # (document_id, chunk_index) -> row
+
+    async def fetch_kb_embeddings(self, hashes):
+        return {row['content_hash']: row['embedding'] for row in self.chunks.values() if row['content_hash'] in hashes}
+
+    async def upsert_kb_document(self, user_id, title, content, document_id=None):
+        document_id = document_id or str(uuid.uuid4())
+        self.documents[document_id] = {'user_id': user_id, 'title': title, 'content': content}
+        return document_id
+
+    async def replace_kb_chunks(self, user_id, document_id, rows):
+        self.chunks = {key: row for key, row in self.chunks.items() if key[0] != document_id}
+        for index, text, h, tokens, embedding in rows:
+            self.chunks[(document_id, index)] = {
+                'user_id': user_id, 'document_id': document_id, 'chunk_index': index, 'content': text,
+                'content_hash': h, 'token_count': tokens, 'embedding': embedding,
+                'vector': np.asarray(parse_vector(embedding), dtype=np.float32)
+            }
+
+    async def count_kb_chunks(self, user_id):
+        return sum(1 for row in self.chunks.values() if row['user_id'] == user_id)
+
+    async def pgvector_version(self):
+        return (0, 8)
+
+    def _public(self, row):
+        return {'document_id': row['document_id'], 'title': self.documents[row['document_id']]['title'],
+                'chunk_index': row['chunk_index'], 'content': row['content'], 'token_count': row['token_count']}
+
+    async def search_kb_chunks(self, user_id, embedding, limit, ef_search):
+        query = np.asarray(parse_vector(embedding), dtype=np.float32)
+        rows = [row for row in self.chunks.values() if row['user_id'] == user_id]
+        scored = sorted(((float(row['vector'] @ query), row) for row in rows), key=lambda pair: -pair[0])
+        return [{**self._public(row), 'similarity': score} for score, row in scored[:limit]]
+
+    async def fetch_kb_chunks(self, user_id):
+        return [self._public(row) for row in self.chunks.values() if row['user_id'] == user_id]
+
+def catalog():
+    items = []
+    for i, ((p, _, pe), (c, _, ce), (m, _, me)) in enumerate(
+        (p, c, m) for p in PRODUCTS for c in COLORS for m in MATERIALS
+    ):
+        items.append({
+            'id': f"item-{i}", 'sku': f"SKU-{1000 + i}", 'name': f"{p} {c} {m}", 'category': pe,
+            'description': f"{p} من ال{m} باللون ال{c}، مناسب للسهرات والدوام. {ce.title()} {me} {pe}.",
+            'price_jod': 20 + i % 60, 'stock_quantity': i % 9,
+        })
+    return items
+
+def typo(rng: random.Random, word: str) -> str:
+    """One dropped, doubled or swapped letter"""
+    i = rng.randrange(1, len(word) - 1)
+    return rng.choice([word[:i] + word[i + 1:], word[:i] + word[i] + word[i:], word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]])
+
+def catalog_queries(items, per_style: int, seed: int = 3):
+    rng = random.Random(seed)
+    queries = []
+    for style, template in TEMPLATES.items():
+        for _ in range(per_style):
+            i = rng.randrange(len(items))
+            (p, pa, pe) = PRODUCTS[i // (len(COLORS) * len(MATERIALS))]
+            (c, ca, ce) = COLORS[i // len(MATERIALS) % len(COLORS)]
+            (m, ma, me) = MATERIALS[i % len(MATERIALS)]
+            sku = items[i]['sku'] if rng.random() < 0.5 else items[i]['sku'].replace('-', '').lower()
+            query = template.format(p=p, c=c, m=m, pa=pa, ca=ca, ma=ma, pe=pe, ce=ce, me=me, sku=sku,
+                                    pe_typo=typo(rng, pe), ce_typo=typo(rng, ce), me_typo=typo(rng, me))
+            queries.append((style, query, item_key(items[i])))
+    return queries
+
+def _ranks(ranking, expected, k):
+    rank = next((i for i, key in enumerate(ranking) if key == expected), None)
+    return (1.0 if rank is not None and rank < k else 0.0), (1.0 / (rank + 1) if rank is not None else 0.0)
+
+def report(title, results, k):
+    print(title)
+    styles = sorted({style for style, _, _ in results})
+    header = f"  {'method':<14}" + ''.join(f"{style:>18}" for style in styles + ['all'])
+    print(header)
+    for method in ('lexical', 'vector', 'rrf', 'rrf+rerank'):
+        row = f"  {method:<14}"
+        for style in styles + ['all']:
+            scores = [scored[method] for s, _, scored in results if style in (s, 'all')]
+            recall = statistics.mean(r for r, _ in scores)
+            mrr = statistics.mean(m for _, m in scores)
+            row += f"   R@{k}={recall:.2f} {mrr:.2f}"
+        print(row)
+
+def rankings(query, lexical, vector, key, name_field, terms, rrf_k):
+    lexical_keys = [key(doc) for _, doc in lexical]
+    vector_keys = [key(doc) for _, doc in vector]
+    fused = reciprocal_rank_fusion([lexical_keys, vector_keys], rrf_k)
+    docs = {key(doc): doc for _, doc in lexical + vector}
+    reranked = rerank(query, [Candidate(k, docs[k], score) for k, score in fused.items()], name_field, terms)
+    return {
+        'lexical': lexical_keys, 'vector': vector_keys,
+        'rrf': sorted(fused, key=lambda k: -fused[k]), 'rrf+rerank': [c.key for c in reranked],
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    embedder = TrigramEmbedder(args.dim)
+    store = MemoryKBStore()
+    kb = KnowledgeBase(store=store, embedder=embedder, backend='pgvector', min_similarity=0.5)
+    retriever = HybridRetriever(kb=kb, store=store, candidates=args.candidates)
+    items = catalog()
+    index = CatalogIndex(items)
+    await retriever.catalog_vectors.build(TENANT, index)
+    results = await kb.index_documents(TENANT, [{'title': t, 'content': c} for t, c, _ in KB_DOCUMENTS])
+    kb_index = await retriever.kb_lexical.get(TENANT)
+
+    catalog_results = []
+    for style, query, expected in catalog_queries(items, args.queries_per_style):
+        vector = np.asarray(parse_vector(await kb.query_vector(query)), dtype=np.float32)
+        lexical = index.search(query, args.candidates)
+        by_vector = [(score, index.items[key]) for score, key in
+                     retriever.catalog_vectors.search(TENANT, index, vector, args.candidates)]
+        ranked = rankings(query, lexical, by_vector, item_key, 'name', index.terms, args.rrf_k)
+        catalog_results.append((style, query, {m: _ranks(r, expected, args.k) for m, r in ranked.items()}))
+    report(f"catalog: {len(items)} items, recall@{args.k} and MRR of the labeled item", catalog_results, args.k)
+
+    kb_results = []
+    for result, (_, _, questions) in zip(results, KB_DOCUMENTS):
+        for style, query in questions.items():
+            lexical = kb_index.search(query, args.candidates)
+            by_vector = [(chunk['similarity'], {**chunk, 'id': chunk_key(chunk)})
+                         for chunk in await kb.search(TENANT, query, args.candidates)]
+            ranked = rankings(query, lexical, by_vector, chunk_key, 'title', kb_index.terms, args.rrf_k)
+            documents = {m: [key.split(':')[0] for key in r] for m, r in ranked.items()}
+            kb_results.append((style, query, {m: _ranks(r, result.document_id, 1) for m, r in documents.items()}))
+    report(f"knowledge base: {len(KB_DOCUMENTS)} documents, recall@1 and MRR of the labeled document", kb_results, 1)
+
+    # Latency of the reply path: lexical searches, query embedding, both vector searches, fusion, rerank
+    embedder.delay = args.embed_ms / 1000
+    kb._query_vectors.clear()
+    samples = []
+    selected = 0
+    queries = [q for _, q, _ in catalog_results] + [q for _, q, _ in kb_results]
+    for query in queries:
+        started = time.perf_counter()
+        _, knowledge = await retriever.retrieve(TENANT, query, items)
+        samples.append((time.perf_counter() - started) * 1000)
+        selected += bool(knowledge)
+    samples.sort()
+    stats = retriever.stats()
+    print(f"retrieve   queries={len(samples)} embed={args.embed_ms}ms p50={statistics.median(samples):.2f}ms "
+          f"p99={samples[min(len(samples) - 1, int(len(samples) * 0.99))]:.2f}ms "
+          f"vector_timeouts={stats['vector_timeouts']} with_knowledge={selected}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries-per-style', type=int, default=200)
+    parser.add_argument('--dim', type=int, default=ProductionConfig.KB_EMBEDDING_DIMENSIONS)
+    parser.add_argument('--candidates', type=int, default=ProductionConfig.HYBRID_CANDIDATES)
+    parser.add_argument('--rrf-k', type=int, default=ProductionConfig.HYBRID_RRF_K)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--embed-ms', type=float, default=0.0, help='simulated embedding latency in the latency run')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""
+IG-Shop-Agent Intent Classifier Benchmark
+Offline accuracy, local coverage and latency of the fast-path intent classifier
+
+Usage:
+    python benchmarks/intent_accuracy.py --samples benchmarks/data/intent_samples.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_config import ProductionConfig
+from intent_classifier import IntentClassifier
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'intent_samples.jsonl')
+
+def main(args: argparse.Namespace) -> None:
+    with open(args.samples, encoding='utf-8') as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    classifier = IntentClassifier()
+    threshold = args.threshold
+
+    results, timings = [], []
+    for sample in samples:
+        t0 = time.perf_counter()
+        result = classifier.classify(sample['text'])
+        timings.append((time.perf_counter() - t0) * 1e6)
+        results.append((sample, result))
+
+    # Second pass measures the warm path (word match cache filled)
+    warm = []
+    for _ in range(args.repeat):
+        for sample in samples:
+            t0 = time.perf_counter()
+            classifier.classify(sample['text'])
+            warm.append((time.perf_counter() - t0) * 1e6)
+
+    correct = sum(r['intent'] == s['intent'] for s, r in results)
+    confident = [(s, r) for s, r in results if r['confidence'] >= threshold]
+    confident_correct = sum(r['intent'] == s['intent'] for s, r in confident)
+    language_correct = sum(r['language'] == s['language'] for s, r in results)
+
+    print(f"samples={len(samples)} threshold={threshold}")
+    print(f"local accuracy (all):        {correct / len(samples):.1%}")
+    print(f"handled locally (coverage):  {len(confident) / len(samples):.1%}")
+    print(f"accuracy when confident:     {confident_correct / max(len(confident), 1):.1%}")
+    print(f"language accuracy:           {language_correct / len(samples):.1%}")
+    print(f"latency cold: p50={statistics.median(timings):.0f}us p99={sorted(timings)[int(len(timings) * 0.99)]:.0f}us")
+    print(f"latency warm: p50={statistics.median(warm):.0f}us p99={sorted(warm)[int(len(warm) * 0.99)]:.0f}us")
+
+    errors = Counter((s['intent'], r['intent']) for s, r in confident if r['intent'] != s['intent'])
+    for (expected, got), count in errors.most_common():
+        print(f"  confident miss: {expected} -> {got} x{count}")
+    if args.verbose:
+        for s, r in results:
+            if r['intent'] != s['intent']:
+                print(f"  miss ({r['confidence']:.2f}): {s['text']} [{s['intent']} -> {r['intent']}]")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES)
+    parser.add_argument('--threshold', type=float, default=ProductionConfig.AI_INTENT_CONFIDENCE_THRESHOLD)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--verbose', action='store_true')
+    main(parser.parse_args())
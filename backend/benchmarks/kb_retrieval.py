@@ -0,0 +1,156 @@
+"""
+IG-Shop-Agent Knowledge Base Retrieval Benchmark
+Indexing dedup, HNSW recall against exact search, and retrieval latency under the budget
+
+Runs the real pgvector path against the PostgreSQL configured through the usual
+DATABASE_* settings (the vector extension must be installable). Embeddings come
+from a deterministic hashing embedder, so results repeat exactly and no API
+key is needed. Benchmark tenants are removed at the end.
+
+Usage:
+    python benchmarks/kb_retrieval.py --tenants 20 --docs 50 --queries 300 [--embed-ms 20]
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_config import ProductionConfig
+from arabic_text import tokenize
+from database import DatabaseService
+from knowledge_base import KnowledgeBase
+
+TENANT_PREFIX = 'bench-kb-'
+TOPICS = {
+    'سياسة الإرجاع': "يمكن إرجاع المنتج خلال {n} يوماً من الاستلام بشرط أن يكون بحالته الأصلية مع الفاتورة.",
+    'دليل المقاسات': "المقاس S يناسب {n} كغ، والمقاس M يناسب {m} كغ، والمقاس L لمن هم أكبر من ذلك.",
+    'التوصيل': "التوصيل داخل عمّان خلال {n} أيام عمل، وإلى باقي المحافظات خلال {m} أيام.",
+    'الدفع': "نقبل الدفع عند الاستلام وبطاقات الائتمان وكليك، ورسوم الدفع عند الاستلام {n} دينار.",
+    'العناية بالقماش': "يغسل الحرير يدوياً بماء بارد، ولا يعصر، ويكوى على حرارة منخفضة لمدة {n} ثانية.",
+}
+# Shared boilerplate that every shop pastes into its policies, to exercise embedding reuse
+FOOTER = "لأي استفسار تواصلوا معنا عبر الرسائل الخاصة على إنستغرام، نرد خلال ساعات العمل من 10 صباحاً حتى 8 مساءً."
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder: each normalized token sets hashed dimensions"""
+
+    def __init__(self, dimensions: int, delay: float = 0.0):
+        self.dimensions = dimensions
+        self.delay = delay
+        self.requests = 0
+
+    def _vector(self, text: str):
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text, drop_stopwords=False):
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            for i in range(0, 8, 2):
+                index = int.from_bytes(digest[i:i + 2], 'little') % self.dimensions
+                vector[index] += 1.0 if digest[i] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    async def __call__(self, texts):
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return [self._vector(text) for text in texts]
+
+
+def documents(rng: random.Random, count: int):
+    titles = list(TOPICS)
+    for i in range(count):
+        title = titles[i % len(titles)]
+        body = ' '.join(TOPICS[title].format(n=rng.randint(2, 30), m=rng.randint(40, 90)) for _ in range(6))
+        yield {'title': f"{title} {i}", 'content': f"{body}\n\n{FOOTER}"}
+
+
+async def _exact(db: DatabaseService, tenant: str, vector: str, k: int):
+    """Exact top-k with the index disabled, as ground truth for recall"""
+    async with db.read_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_indexscan = off")
+            rows = await conn.fetch(
+                "SELECT document_id, chunk_index FROM kb_chunks WHERE user_id = $1 "
+                "ORDER BY embedding <=> $2::vector LIMIT $3",
+                tenant, vector, k
+            )
+    return {(row['document_id'], row['chunk_index']) for row in rows}
+
+
+async def main(args: argparse.Namespace) -> None:
+    db = DatabaseService()
+    await db.connect()
+    await db.initialize_schema()
+    tenants = [f"{TENANT_PREFIX}{i}" for i in range(args.tenants)]
+    await db.execute_query("DELETE FROM users WHERE id = ANY($1::text[])", tenants)
+    for tenant in tenants:
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+
+    embedder = HashingEmbedder(ProductionConfig.KB_EMBEDDING_DIMENSIONS)
+    kb = KnowledgeBase(store=db, embedder=embedder, min_similarity=0.0)
+    rng = random.Random(5)
+    started = time.perf_counter()
+    chunks = embedded = 0
+    indexed = {}
+    for tenant in tenants:
+        docs = list(documents(rng, args.docs))
+        results = await kb.index_documents(tenant, docs)
+        indexed[tenant] = [{**doc, 'id': result.document_id} for doc, result in zip(docs, results)]
+        chunks += sum(result.chunks for result in results)
+        embedded += sum(result.embedded for result in results)
+    seconds = time.perf_counter() - started
+    print(f"index      docs={args.tenants * args.docs} chunks={chunks} embedded={embedded} "
+          f"reused={chunks - embedded} requests={embedder.requests} {seconds:.1f}s")
+
+    # Reindexing unchanged documents needs no embedding requests at all
+    before = embedder.requests
+    await kb.index_documents(tenants[0], indexed[tenants[0]])
+    print(f"reindex    requests={embedder.requests - before}")
+
+    questions = ["شو سياسة الإرجاع عندكم؟", "كم يوم التوصيل لإربد؟", "أي مقاس بناسب 60 كيلو؟",
+                 "بتقبلوا الدفع عند الاستلام؟", "كيف بغسل فستان الحرير؟"]
+    samples, recall = [], []
+    for i in range(args.queries):
+        tenant = tenants[i % len(tenants)]
+        question = questions[i % len(questions)]
+        started = time.perf_counter()
+        found = await kb.search(tenant, question, args.k)
+        samples.append((time.perf_counter() - started) * 1000)
+        exact = await _exact(db, tenant, await kb.query_vector(question), args.k)
+        recall.append(len({(r['document_id'], r['chunk_index']) for r in found} & exact) / max(len(exact), 1))
+    samples.sort()
+    print(f"search     p50={statistics.median(samples):.2f}ms p95={samples[int(len(samples) * 0.95) - 1]:.2f}ms "
+          f"recall@{args.k}={statistics.mean(recall):.3f}")
+
+    if args.embed_ms:
+        embedder.delay = args.embed_ms / 1000
+        kb._query_vectors.clear()
+        kb.budget = args.budget_ms / 1000
+        started = time.perf_counter()
+        results = [await kb.retrieve(tenants[0], f"{q} {i}") for i, q in enumerate(questions * 4)]
+        per_call = (time.perf_counter() - started) * 1000 / len(results)
+        stats = kb.stats()
+        print(f"budget     embed={args.embed_ms}ms budget={args.budget_ms}ms per_call={per_call:.1f}ms "
+              f"timeouts={stats['timeouts']} with_context={sum(1 for r in results if r)}")
+
+    await db.execute_query("DELETE FROM users WHERE id = ANY($1::text[])", tenants)
+    await db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--docs', type=int, default=50, help='documents per tenant')
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--embed-ms', type=float, default=0.0, help='simulated embedding latency for the budget check')
+    parser.add_argument('--budget-ms', type=float, default=ProductionConfig.KB_RETRIEVAL_BUDGET * 1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,164 @@
+"""
+IG-Shop-Agent KB Vector Index Benchmark
+recall@10 and p50/p99 latency of the in-process index (brute force and IVF, float16 and int8)
+against exact search, and optionally against pgvector HNSW
+
+Corpora are synthetic clustered unit vectors, generated to a scratch directory
+so 1M x 1536 float16 (3GB) never has to fit in memory at once. With --database
+the same vectors are loaded into a scratch schema of the PostgreSQL configured
+through the usual DATABASE_* settings (dropped at the end); loading 1M rows and
+building HNSW there takes a long while.
+
+Usage:
+    python benchmarks/kb_vector_index.py --sizes 10000 100000 1000000 --dim 1536 --queries 200 [--database]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_vector_index import BLOCK_ROWS, LocalVectorIndex, normalize_rows
+
+K = 10
+SCHEMA = 'bench_kb_index'
+
+
+def corpus(path: str, size: int, dim: int, seed: int = 11) -> np.ndarray:
+    """Clustered unit vectors (many near-duplicates, like chunks of similar shops) on disk"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((max(size // 200, 8), dim)))
+    vectors = np.lib.format.open_memmap(path, mode='w+', dtype=np.float16, shape=(size, dim))
+    for start in range(0, size, BLOCK_ROWS):
+        count = min(BLOCK_ROWS, size - start)
+        block = centers[rng.integers(0, len(centers), count)] + 0.35 * rng.standard_normal((count, dim)) / np.sqrt(dim) * 4
+        vectors[start:start + count] = normalize_rows(block)
+    vectors.flush()
+    return np.load(path, mmap_mode='r')
+
+
+def queries(vectors: np.ndarray, count: int, seed: int = 12) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = np.asarray(vectors[np.sort(rng.choice(len(vectors), count, replace=False))], dtype=np.float32)
+    return normalize_rows(picked + 0.5 * rng.standard_normal(picked.shape) / np.sqrt(picked.shape[1]))
+
+
+def exact_top_k(vectors: np.ndarray, qs: np.ndarray) -> list:
+    """Ground truth for all queries in one pass over the corpus"""
+    best_scores = np.full((len(qs), K), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(qs), K), dtype=np.int64)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        scores = qs @ np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32).T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_ids = np.concatenate([best_ids, np.arange(start, start + scores.shape[1])[None, :].repeat(len(qs), 0)], axis=1)
+        top = np.argpartition(-merged_scores, K, axis=1)[:, :K]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_ids = np.take_along_axis(merged_ids, top, axis=1)
+    return [set(row) for row in best_ids.tolist()]
+
+
+def _report(label: str, samples: list, recall: list, extra: str = '') -> None:
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<22} recall@{K}={statistics.mean(recall):.3f} p50={statistics.median(samples):.2f}ms "
+          f"p99={p99:.2f}ms {extra}")
+
+
+def bench_local(workdir: str, vectors: np.ndarray, qs: np.ndarray, truth: list, args: argparse.Namespace) -> None:
+    modes = [('int8', False), ('float16', False), ('int8', True), ('float16', True)]
+    for dtype, ivf in modes:
+        if dtype not in args.dtypes or (not ivf and len(vectors) > args.max_brute_force):
+            continue
+        path = os.path.join(workdir, f"index-{dtype}-{'ivf' if ivf else 'flat'}")
+        started = time.perf_counter()
+        index = LocalVectorIndex.build(path, vectors, dtype=dtype, ivf_threshold=0 if ivf else len(vectors) + 1)
+        build_seconds = time.perf_counter() - started
+        index = LocalVectorIndex.open(path)  # Fresh memory-mapped view, as another worker would open it
+        info = index.info()
+        for nprobe in (args.nprobe if ivf else [0]):
+            samples, recall = [], []
+            for q, expected in zip(qs, truth):
+                started = time.perf_counter()
+                found = index.search(q, K, nprobe)
+                samples.append((time.perf_counter() - started) * 1000)
+                recall.append(len({row for row, _ in found} & expected) / K)
+            label = f"{dtype} {'ivf' if ivf else 'brute'}" + (f"/{info.lists}x{nprobe}" if ivf else '')
+            _report(label, samples, recall, f"size={info.bytes / 1e6:.0f}MB build={build_seconds:.1f}s")
+        shutil.rmtree(path)
+
+
+async def bench_pgvector(vectors: np.ndarray, qs: np.ndarray, truth: list, args: argparse.Namespace) -> None:
+    from database import DatabaseService
+    from knowledge_base import vector_literal
+    db = DatabaseService()
+    await db.connect()
+    dim = vectors.shape[1]
+    await db.execute_query("CREATE EXTENSION IF NOT EXISTS vector")
+    await db.execute_query(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await db.execute_query(f"CREATE SCHEMA {SCHEMA}")
+    await db.execute_query(f"CREATE TABLE {SCHEMA}.chunks (id BIGINT PRIMARY KEY, embedding vector({dim}) NOT NULL)")
+    started = time.perf_counter()
+    for start in range(0, len(vectors), 2000):
+        block = np.asarray(vectors[start:start + 2000], dtype=np.float32)
+        await db.execute_query(
+            f"INSERT INTO {SCHEMA}.chunks SELECT i, e::vector FROM unnest($1::bigint[], $2::text[]) AS t(i, e)",
+            list(range(start, start + len(block))), [vector_literal(v) for v in block]
+        )
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    await db.execute_query(f"CREATE INDEX ON {SCHEMA}.chunks USING hnsw (embedding vector_cosine_ops)")
+    index_seconds = time.perf_counter() - started
+
+    samples, recall = [], []
+    async with db.read_connection() as conn:
+        await conn.execute(f"SET hnsw.ef_search = {args.ef_search}")
+        for q, expected in zip(qs, truth):
+            literal = vector_literal(q)
+            started = time.perf_counter()
+            rows = await conn.fetch(
+                f"SELECT id FROM {SCHEMA}.chunks ORDER BY embedding <=> $1::vector LIMIT {K}", literal
+            )
+            samples.append((time.perf_counter() - started) * 1000)
+            recall.append(len({row['id'] for row in rows} & expected) / K)
+    _report(f"pgvector hnsw/ef{args.ef_search}", samples, recall,
+            f"load={load_seconds:.0f}s index={index_seconds:.0f}s (latency includes the round trip)")
+    await db.execute_query(f"DROP SCHEMA {SCHEMA} CASCADE")
+    await db.disconnect()
+
+
+async def main(args: argparse.Namespace) -> None:
+    workdir = tempfile.mkdtemp(prefix='kb-index-', dir=args.workdir)
+    try:
+        for size in args.sizes:
+            vectors = corpus(os.path.join(workdir, 'corpus.npy'), size, args.dim)
+            qs = queries(vectors, args.queries)
+            truth = exact_top_k(vectors, qs)
+            print(f"{size:,} chunks x {args.dim} dims")
+            bench_local(workdir, vectors, qs, truth, args)
+            if args.database:
+                await bench_pgvector(vectors, qs, truth, args)
+            del vectors
+            os.remove(os.path.join(workdir, 'corpus.npy'))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[16])
+    parser.add_argument('--dtypes', nargs='+', default=['int8', 'float16'])
+    parser.add_argument('--ef-search', type=int, default=40)
+    parser.add_argument('--max-brute-force', type=int, default=200_000, help='skip brute force above this size')
+    parser.add_argument('--workdir', default=None, help='scratch directory (needs about 2x the float16 corpus size)')
+    parser.add_argument('--database', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""
+IG-Shop-Agent Keyset Pagination Benchmark
+Page 1 versus page 500 with LIMIT/OFFSET and with keyset cursors, plus a streamed export, on a seeded database
+
+Needs a PostgreSQL database configured through the usual DATABASE_* settings.
+The benchmark tenant and its rows are removed at the end.
+
+Usage:
+    python benchmarks/keyset_pagination.py --rows 100000 --page-size 100 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseService
+from pagination import KEYSET_ORDER
+
+TENANT = 'bench-pagination'
+
+
+async def _seed(db: DatabaseService, rows: int) -> None:
+    await db.execute_query("DELETE FROM users WHERE id = $1", TENANT)
+    await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", TENANT)
+    # Spread created_at over a year, with ties, as bulk imports produce
+    await db.execute_query(
+        """
+        INSERT INTO orders (user_id, sku, qty, customer, phone, status, total_amount, created_at)
+        SELECT $1, 'SKU-' || (g % 500), 1 + g % 3, 'customer_' || (g % 5000), '0790000000', 'delivered',
+               20 + g % 80, NOW() - ((g / 3) * INTERVAL '1 minute')
+        FROM generate_series(1, $2) AS g
+        """,
+        TENANT, rows
+    )
+    await db.execute_query("ANALYZE orders")
+
+
+async def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def main(args: argparse.Namespace) -> None:
+    db = DatabaseService()
+    await db.connect()
+    await db.initialize_schema()
+    await _seed(db, args.rows)
+    size = args.page_size
+    print(f"seeded {args.rows} orders, page size {size}")
+
+    # Walk the cursors once to find the cursor that opens each page
+    cursors = {1: None}
+    page, cursor = 1, None
+    while page < args.page:
+        result = await db.fetch_page('orders', TENANT, size, cursor)
+        cursor = result['next_cursor']
+        page += 1
+        cursors[page] = cursor
+        if cursor is None:
+            raise SystemExit(f"only {page - 1} pages; seed more rows")
+
+    for number in (1, args.page):
+        offset_ms = await _time(lambda: db.fetch_all(
+            f"SELECT * FROM orders WHERE user_id = $1 {KEYSET_ORDER} LIMIT $2 OFFSET $3",
+            TENANT, size, (number - 1) * size
+        ), args.repeat)
+        keyset_ms = await _time(lambda: db.fetch_page('orders', TENANT, size, cursors[number]), args.repeat)
+        print(f"page {number:<4} offset={offset_ms:.2f}ms keyset={keyset_ms:.2f}ms")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = await db.fetch_all(f"SELECT * FROM orders WHERE user_id = $1 {KEYSET_ORDER}", TENANT)
+    materialized_ms = (time.perf_counter() - started) * 1000
+    materialized_peak = tracemalloc.get_traced_memory()[1]
+    del rows
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    streamed = 0
+    async for chunk in db.stream_table('orders', TENANT, chunk_size=args.chunk_size):
+        streamed += len(chunk)
+    streamed_ms = (time.perf_counter() - started) * 1000
+    streamed_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"export   fetch_all={materialized_ms:.0f}ms peak={materialized_peak / 1e6:.1f}MB  "
+          f"stream={streamed_ms:.0f}ms peak={streamed_peak / 1e6:.1f}MB rows={streamed}")
+
+    await db.execute_query("DELETE FROM users WHERE id = $1", TENANT)
+    await db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--page', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,55 @@
+"""
+IG-Shop-Agent LLM Concurrency Benchmark
+Requests-per-second of AzureOpenAIService.generate_response with N concurrent conversations
+
+Usage:
+    python benchmarks/llm_concurrency.py --conversations 50 --messages 4 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm_server import FakeCompletionServer
+
+
+async def _conversation(service, turns: int) -> None:
+    history = []
+    for turn in range(turns):
+        message = f"بدي فستان اسود مقاس M ({turn})"
+        reply = await service.generate_response(message, catalog_items=[], conversation_history=history)
+        history += [{"text": message}, {"text": reply, "ai_generated": True}]
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = await FakeCompletionServer(latency=args.latency).start()
+    
+    # Point the fallback OpenAI client at the fake server before the service is built
+    os.environ['AZURE_OPENAI_ENDPOINT'] = ''
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    from azure_openai_service import AzureOpenAIService
+    service = AzureOpenAIService()
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(_conversation(service, args.messages) for _ in range(args.conversations)))
+    elapsed = time.perf_counter() - started
+    
+    total = args.conversations * args.messages
+    print(f"conversations={args.conversations} messages={total} "
+          f"latency={args.latency * 1000:.0f}ms elapsed={elapsed:.2f}s rps={total / elapsed:.1f} "
+          f"served={server.requests_served}")
+    
+    await service.close()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+IG-Shop-Agent LLM Failover Benchmark
+LLMRouter behaviour against local fake deployments that inject errors, throttling and tail latency
+
+Usage:
+    python benchmarks/llm_failover.py --requests 300 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from advanced_config import ProductionConfig
+from benchmarks.fake_llm_server import FakeCompletionServer
+from llm_router import LLMRouter
+
+MESSAGES = [{"role": "user", "content": "كم سعر الفستان الأسود؟"}]
+
+
+async def _run(servers, requests: int, concurrency: int, hedging: bool = True) -> dict:
+    ProductionConfig.AI_HEDGE_ENABLED = hedging
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=200), timeout=30)
+    configs = [
+        {'name': name, 'kind': 'openai', 'endpoint': server.base_url, 'api_key': 'bench', 'model': 'fake'}
+        for name, server in servers.items()
+    ]
+    router = LLMRouter.from_config(configs, http_client)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one() -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await router.complete(MESSAGES, max_tokens=50)
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    await router.close()
+    await http_client.aclose()
+    ordered = sorted(latencies) or [0.0]
+    stats = router.stats()
+    return {
+        'ok': len(latencies),
+        'errors': errors,
+        'p50': statistics.median(ordered),
+        'p95': ordered[int(len(ordered) * 0.95) - 1],
+        'p99': ordered[int(len(ordered) * 0.99) - 1],
+        'hedges': stats['hedges'],
+        'failovers': stats['failovers'],
+        'deployments': {name: (d['state'], d['requests']) for name, d in stats['deployments'].items()},
+    }
+
+
+def _report(label: str, result: dict) -> None:
+    print(f"{label:<26} ok={result['ok']} errors={result['errors']} p50={result['p50']:.0f}ms "
+          f"p95={result['p95']:.0f}ms p99={result['p99']:.0f}ms hedges={result['hedges']} "
+          f"failovers={result['failovers']} deployments={result['deployments']}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    latency = args.latency
+
+    async def servers(**specs):
+        return {name: await FakeCompletionServer(**spec).start() for name, spec in specs.items()}
+
+    async def stop(started):
+        for server in started.values():
+            await server.stop()
+
+    scenarios = [
+        ('one region down', dict(east={'latency': latency, 'error_rate': 1.0},
+                                 west={'latency': latency})),
+        ('one region throttled', dict(east={'latency': latency, 'error_rate': 0.3, 'retry_after': 2},
+                                      west={'latency': latency})),
+    ]
+    for label, specs in scenarios:
+        started = await servers(**specs)
+        _report(label, await _run(started, args.requests, args.concurrency))
+        await stop(started)
+
+    # Tail latency: both regions occasionally stall; hedging races a second region
+    tail = {'latency': latency, 'slow_rate': 0.03, 'slow_latency': args.slow_latency}
+    for hedging in (False, True):
+        started = await servers(east=dict(tail), west=dict(tail))
+        _report(f"tail latency hedging={'on' if hedging else 'off'}",
+                await _run(started, args.requests, args.concurrency, hedging))
+        await stop(started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--slow-latency', type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
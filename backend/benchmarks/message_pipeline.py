@@ -0,0 +1,99 @@
+"""
+IG-Shop-Agent Message Pipeline Benchmark
+End-to-end latency per message: sequential intent -> fetch -> reply versus MessagePipeline
+
+Usage:
+    python benchmarks/message_pipeline.py --messages 40 --latency 0.2 --db-latency 0.005
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm_server import FakeCompletionServer
+
+# Vague messages the local classifier is unsure about, so intent needs the LLM
+MESSAGES = [
+    "مرحبا",
+    "hello there",
+    "السلام عليكم، ممكن سؤال؟",
+    "hi, quick question",
+    "شو رأيك؟",
+]
+
+
+class SlowStore:
+    """In-memory catalog/orders with a fixed per-query latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.catalog = [
+            {'id': str(i), 'sku': f'SKU-{i}', 'name': f'فستان {i}', 'price_jod': 30 + i % 20,
+             'description': 'فستان سهرة', 'stock_quantity': i % 5}
+            for i in range(200)
+        ]
+
+    async def fetch_catalog_items(self, user_id, limit=1000):
+        await asyncio.sleep(self.latency)
+        return self.catalog[:limit]
+
+    async def get_customer_context(self, user_id, customer, limit=10):
+        await asyncio.sleep(self.latency)
+        return {'previous_orders': [{'sku': 'SKU-1', 'qty': 1}]}
+
+    async def add_conversation_message(self, user_id, customer, message, is_ai_response=False):
+        return {'message': message}  # Buffered in production, so no round trip here
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.95) - 1]
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = await FakeCompletionServer(latency=args.latency).start()
+
+    os.environ['AZURE_OPENAI_ENDPOINT'] = ''
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    from azure_openai_service import AzureOpenAIService
+    from message_pipeline import MessagePipeline
+    service = AzureOpenAIService()
+    store = SlowStore(args.db_latency)
+    pipeline = MessagePipeline(store=store, ai_service=service)
+
+    sequential, concurrent = [], []
+    for i in range(args.messages):
+        message = MESSAGES[i % len(MESSAGES)]
+        tenant_id = f"bench-{i}"  # Fresh tenant so the response cache never answers
+
+        started = time.perf_counter()
+        await service.analyze_customer_intent(message)
+        catalog = await store.fetch_catalog_items(tenant_id)
+        context = await store.get_customer_context(tenant_id, 'customer')
+        await service.generate_response(message, catalog, None, context, tenant_id)
+        sequential.append((time.perf_counter() - started) * 1000)
+
+        result = await pipeline.handle(f"{tenant_id}-p", message, 'customer')
+        concurrent.append(result.timings.total_ms)
+
+    for label, samples in (('sequential', sequential), ('pipeline', concurrent)):
+        p50, p95 = _percentiles(samples)
+        print(f"{label:<11} messages={len(samples)} p50={p50:.1f}ms p95={p95:.1f}ms")
+    print(f"llm_latency={args.latency * 1000:.0f}ms db_latency={args.db_latency * 1000:.0f}ms "
+          f"last_timings={result.timings}")
+
+    await service.close()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--db-latency', type=float, default=0.005)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+IG-Shop-Agent Model Routing Benchmark
+Latency and cost of sending every turn to the large model versus complexity-based tier routing
+
+Usage:
+    python benchmarks/model_routing.py --rounds 3 --small-latency 0.15 --large-latency 0.6
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm_server import FakeCompletionServer
+
+SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'intent_samples.jsonl')
+CATALOG = [
+    {'id': str(i), 'sku': f'SKU-{i}', 'name': name, 'price_jod': price, 'description': 'قطعة أنيقة', 'stock_quantity': 3}
+    for i, (name, price) in enumerate([('فستان سهرة أسود', 45), ('عباية كحلي', 38), ('حقيبة جلد بيج', 55),
+                                       ('كعب عالي ذهبي', 32), ('جاكيت جينز', 40)])
+]
+
+
+async def main(args: argparse.Namespace) -> None:
+    small = await FakeCompletionServer(latency=args.small_latency).start()
+    large = await FakeCompletionServer(latency=args.large_latency).start()
+    os.environ['AI_DEPLOYMENTS'] = json.dumps([
+        {'name': 'large', 'kind': 'openai', 'endpoint': large.base_url, 'api_key': 'bench', 'model': 'large', 'tier': 'large'},
+        {'name': 'small', 'kind': 'openai', 'endpoint': small.base_url, 'api_key': 'bench', 'model': 'small', 'tier': 'small'},
+    ])
+    from advanced_config import ProductionConfig
+    from azure_openai_service import AzureOpenAIService
+    from model_routing import ComplexityRouter
+    import azure_openai_service as service_module
+
+    with open(SAMPLES, encoding='utf-8') as f:
+        messages = [json.loads(line)['text'] for line in f if line.strip()]
+    ProductionConfig.ENABLE_CACHING = False
+
+    for label, enabled in (('all large', False), ('adaptive', True)):
+        router = ComplexityRouter(enabled=enabled)
+        service_module.complexity_router = router
+        service = AzureOpenAIService()
+        latencies = []
+        for _ in range(args.rounds):
+            for message in messages:
+                started = time.perf_counter()
+                await service.generate_response(message, CATALOG)
+                latencies.append((time.perf_counter() - started) * 1000)
+        stats = router.stats()
+        ordered = sorted(latencies)
+        cost = sum(tier['cost_usd'] for tier in stats['tiers'].values())
+        print(f"{label:<10} messages={len(latencies)} p50={statistics.median(ordered):.0f}ms "
+              f"p95={ordered[int(len(ordered) * 0.95) - 1]:.0f}ms cost=${cost:.4f} "
+              f"(${cost / len(latencies) * 1000:.2f} per 1k messages)")
+        for tier, tier_stats in sorted(stats['tiers'].items()):
+            print(f"    {tier:<6} calls={tier_stats['calls']} p50={tier_stats['p50_ms']:.0f}ms "
+                  f"p95={tier_stats['p95_ms']:.0f}ms cost/call=${tier_stats['cost_per_call_usd']:.5f}")
+        await service.close()
+
+    await small.stop()
+    await large.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--small-latency', type=float, default=0.15)
+    parser.add_argument('--large-latency', type=float, default=0.6)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""
+IG-Shop-Agent Prompt Assembly Benchmark
+System prompt assembly time before (string concatenation per message) and after
+(per-tenant compiled prefix) on a 200-item catalog
+
+Usage:
+    python benchmarks/prompt_assembly.py --items 200 --messages 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.catalog_ranking import synthetic_catalog, synthetic_queries
+from catalog_index import CatalogIndex
+from prompt_builder import PromptCompiler
+from token_counter import count_tokens
+
+def legacy_build_system_prompt(catalog_items: list, context: dict = None) -> str:
+    """The original per-message concatenation, kept for comparison"""
+    prompt = """أنت مساعد ذكي لمتجر إلكتروني أردني متخصص في الموضة والأزياء.
+You are an AI assistant for a Jordanian online fashion store.
+
+المعلومات الأساسية / Basic Information:
+- اسم المتجر: IG Shop Agent
+- الموقع: الأردن
+- التخصص: الأزياء والموضة
+- اللغة المفضلة: العربية، مع دعم الإنجليزية
+
+إرشادات المحادثة / Conversation Guidelines:
+1. كن ودودًا ومهذبًا دائماً
+2. استخدم اللغة العربية كلغة أساسية
+3. قدم معلومات دقيقة عن المنتجات
+4. ساعد في اتخاذ قرار الشراء
+5. اقترح منتجات مناسبة حسب الحاجة
+
+"""
+    if catalog_items:
+        prompt += "\nالمنتجات المتاحة / Available Products:\n"
+        for item in catalog_items[:10]:
+            prompt += f"- {item['name']}: {item['price_jod']} دينار أردني"
+            if item.get('description'):
+                prompt += f" - {item['description'][:50]}..."
+            if item.get('stock_quantity', 0) > 0:
+                prompt += f" (متوفر: {item['stock_quantity']} قطعة)"
+            prompt += "\n"
+    if context:
+        prompt += "\nمعلومات العميل / Customer Context:\n"
+        if context.get('previous_orders'):
+            prompt += f"- طلبات سابقة: {len(context['previous_orders'])}\n"
+        if context.get('preferences'):
+            prompt += f"- التفضيلات: {context['preferences']}\n"
+    prompt += """
+تعليمات الرد / Response Instructions:
+- أجب باللغة العربية أولاً، ثم الإنجليزية إذا لزم الأمر
+- كن مختصراً ومفيداً
+- اذكر الأسعار بالدينار الأردني
+- لا تخترع معلومات غير موجودة
+- إذا لم تجد منتج مناسب، اقترح البدائل المتاحة
+"""
+    return prompt
+
+def timed(fn, runs: list) -> list:
+    samples = []
+    for args in runs:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+def report(label: str, samples: list) -> None:
+    ordered = sorted(samples)
+    print(f"{label:<34} p50={statistics.median(ordered):7.1f}us "
+          f"p95={ordered[int(len(ordered) * 0.95)]:7.1f}us")
+
+def main(args: argparse.Namespace) -> None:
+    items = synthetic_catalog(args.items)
+    queries = synthetic_queries(args.messages)
+    index = CatalogIndex(items)
+    slices = [index.top_k(q, 10) for q in queries]
+    context = {'previous_orders': [1, 2], 'preferences': 'ألوان غامقة'}
+    compiler = PromptCompiler()
+
+    before = timed(lambda s: legacy_build_system_prompt(s, context), [(s,) for s in slices])
+    before_counted = timed(lambda s: count_tokens(legacy_build_system_prompt(s, context)), [(s,) for s in slices])
+    after = timed(lambda s: compiler.render('tenant-1', index.version, s, context), [(s,) for s in slices])
+
+    prompt, tokens = compiler.render('tenant-1', index.version, slices[0], context)
+    print(f"catalog={args.items} items, messages={args.messages}, prompt~{tokens} tokens, "
+          f"stable prefix~{compiler.compile('tenant-1', index.version).prefix_tokens} tokens")
+    report("before: concatenation", before)
+    report("before: concatenation + count", before_counted)
+    report("after: compiled prefix + count", after)
+    print(f"compilations: {compiler.compilations}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=5000)
+    main(parser.parse_args())
@@ -0,0 +1,125 @@
+"""
+IG-Shop-Agent Read Replica Benchmark
+Read routing, read-your-writes and lag eviction of the replica pools, on two local PostgreSQL instances
+
+Needs a primary and a streaming standby of it. Two local instances are enough:
+
+    initdb -D /tmp/pg-primary && pg_ctl -D /tmp/pg-primary -o "-p 5432" -l /tmp/pg-primary.log start
+    pg_basebackup -h localhost -p 5432 -D /tmp/pg-replica -R
+    pg_ctl -D /tmp/pg-replica -o "-p 5433" -l /tmp/pg-replica.log start
+
+then point the usual DATABASE_* settings at the primary and DATABASE_REPLICA_HOSTS
+at the standby (localhost:5433). The lag test pauses WAL replay on the standby
+with pg_wal_replay_pause(), which needs a superuser; replay is resumed and the
+benchmark tenants are removed at the end.
+
+Usage:
+    DATABASE_REPLICA_HOSTS=localhost:5433 DATABASE_REPLICA_MAX_LAG=2 DATABASE_REPLICA_CHECK_INTERVAL=0.5 \\
+        python benchmarks/read_replicas.py --reads 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseService, set_db_session
+
+TENANT_PREFIX = 'bench-replica-'
+
+
+async def in_session(session, work):
+    """Run work() in a fresh task, as one request of session would"""
+    async def run():
+        set_db_session(session)
+        return await work()
+    return await asyncio.create_task(run())
+
+
+async def wait_for(condition, timeout: float) -> float:
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"still waiting after {timeout:.0f}s")
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - started
+
+
+async def routing(db: DatabaseService, reads: int) -> None:
+    """Sessionless reads spread over the standby; writes stay on the primary"""
+    samples = {True: [], False: []}
+    for _ in range(reads):
+        started = time.perf_counter()
+        standby = await in_session(None, lambda: db.fetch_val("SELECT pg_is_in_recovery()"))
+        samples[standby].append((time.perf_counter() - started) * 1000)
+    written = await in_session(
+        f"{TENANT_PREFIX}routing",
+        lambda: db.fetch_val("INSERT INTO users (id, instagram_handle) VALUES ($1, $1) RETURNING id", f"{TENANT_PREFIX}routing")
+    )
+    for standby, values in samples.items():
+        if values:
+            print(f"  {'replica' if standby else 'primary'} reads={len(values)} p50={statistics.median(sorted(values)):.2f}ms")
+    print(f"routing    replica_share={len(samples[True]) / reads:.2f} write_returning={'ok' if written else 'failed'}")
+
+
+async def read_your_writes(db: DatabaseService, replica_pool, rounds: int) -> None:
+    """With replay paused, the writing session still sees its rows; others see the standby until it is evicted"""
+    replica = db.replicas.replicas[0]
+    lookup = "SELECT id FROM users WHERE id = $1"
+    await replica_pool.execute("SELECT pg_wal_replay_pause()")
+    try:
+        own, others = 0, 0
+        for i in range(rounds):
+            tenant = f"{TENANT_PREFIX}{i}"
+
+            async def write_then_read():
+                await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+                return await db.fetch_val(lookup, tenant)
+
+            own += await in_session(tenant, write_then_read) == tenant
+            # Another request of the same tenant, after the writing one finished
+            own += await in_session(tenant, lambda: db.fetch_val(lookup, tenant)) == tenant
+            others += await in_session(None, lambda: db.fetch_val(lookup, tenant)) == tenant
+        print(f"ryw        own_session_found={own}/{rounds * 2} other_sessions_found={others}/{rounds} "
+              f"(stale reads elsewhere are expected until eviction)")
+
+        evicted_after = await wait_for(lambda: not replica.in_rotation, db.replicas.max_lag * 4 + 5)
+        found = await in_session(None, lambda: db.fetch_val(lookup, f"{TENANT_PREFIX}0"))
+        print(f"evict      after={evicted_after:.1f}s (max_lag={db.replicas.max_lag}s, "
+              f"interval={db.replicas.check_interval}s) error={replica.error!r} read_after={'found' if found else 'stale'}")
+    finally:
+        await replica_pool.execute("SELECT pg_wal_replay_resume()")
+    rejoined_after = await wait_for(lambda: replica.in_rotation, db.replicas.max_lag * 4 + 5)
+    print(f"rejoin     after={rejoined_after:.1f}s lag={replica.lag:.2f}s")
+
+
+async def main(args: argparse.Namespace) -> None:
+    db = DatabaseService()
+    if not db.replicas.replicas:
+        sys.exit("Set DATABASE_REPLICA_HOSTS to the standby, e.g. localhost:5433")
+
+    async def setup():
+        await db.connect()
+        await db.initialize_schema()
+        await db.execute_query("DELETE FROM users WHERE id LIKE $1", f"{TENANT_PREFIX}%")
+    # In its own task, so the setup writes do not make this task's reads sticky
+    await asyncio.create_task(setup())
+    replica = db.replicas.replicas[0]
+    await wait_for(lambda: replica.in_rotation, 30)
+
+    await routing(db, args.reads)
+    await read_your_writes(db, replica.pool, args.rounds)
+    print(f"stats      {db.replicas.stats()}")
+
+    await asyncio.create_task(db.execute_query("DELETE FROM users WHERE id LIKE $1", f"{TENANT_PREFIX}%"))
+    await db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--reads', type=int, default=2000, help='sessionless reads for the routing test')
+    parser.add_argument('--rounds', type=int, default=50, help='write-then-read rounds with replay paused')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,274 @@
+"""
+IG-Shop-Agent Catalog Description Job
+Bulk, resumable generation of product descriptions for a tenant's catalog
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openai import APIStatusError
+
+from advanced_config import ProductionConfig
+from catalog_index import catalog_indexes
+from llm_router import is_retryable
+from usage_meter import QuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+# Generates one item's description: (item, tenant_id) -> text
+GenerateFn = Callable[[Dict[str, Any], str], Awaitable[str]]
+
+async def _service_generate(item: Dict[str, Any], tenant_id: str) -> str:
+    from azure_openai_service import azure_openai_service
+    return await azure_openai_service.generate_product_description(item, tenant_id, raise_errors=True)
+
+@dataclass
+class JobProgress:
+    """Live counters of one job (persisted counters are checkpointed per batch)"""
+    job_id: str
+    tenant_id: str
+    total: int
+    done: int = 0
+    failed: int = 0
+    status: str = 'running'
+    last_error: Optional[str] = None
+    started_at: float = 0.0
+    finished_at: Optional[float] = None
+    resumed_from: int = 0  # Items already written when this process picked the job up
+
+    def items_per_minute(self) -> float:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        processed = self.done + self.failed - self.resumed_from
+        return processed / elapsed * 60 if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop('started_at')
+        data.pop('finished_at')
+        data['items_per_minute'] = round(self.items_per_minute(), 1)
+        return data
+
+class CatalogDescriptionJobRunner:
+    """Runs description jobs with bounded concurrency and per-item retries
+
+    Items are paged by id and fanned out to a fixed pool of workers.
+    Results are written back in batches, and each batch write checkpoints
+    the job row. A job left 'running' by a restart resumes with the items
+    it has not written yet.
+
+    Every worker process resumes jobs on startup, so a worker claims a job
+    before running it and renews the claim at each checkpoint. The final
+    checkpoint releases it; a worker that dies holds it until the lease
+    runs out.
+    """
+
+    def __init__(
+        self,
+        store: Any = None,
+        generate_fn: GenerateFn = _service_generate,
+        concurrency: int = ProductionConfig.AI_DESCRIPTION_JOB_CONCURRENCY,
+        batch_size: int = ProductionConfig.AI_DESCRIPTION_JOB_BATCH_SIZE,
+        max_attempts: int = ProductionConfig.AI_DESCRIPTION_JOB_MAX_ATTEMPTS,
+        backoff: float = ProductionConfig.AI_DESCRIPTION_JOB_BACKOFF,
+        backoff_max: float = ProductionConfig.AI_DESCRIPTION_JOB_BACKOFF_MAX,
+        lease: float = ProductionConfig.AI_DESCRIPTION_JOB_LEASE,
+        worker_id: Optional[str] = None
+    ):
+        self._store = store
+        self.generate_fn = generate_fn
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self._worker_id = worker_id
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._current: Dict[str, JobProgress] = {}  # Latest job per tenant
+        self._progress: Dict[str, JobProgress] = {}
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    @property
+    def worker_id(self) -> str:
+        """Owner name written to the jobs this runner claims"""
+        # Set on first use, after a preloading server has forked the worker
+        if self._worker_id is None:
+            self._worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        return self._worker_id
+
+    async def start(self, tenant_id: str, overwrite: bool = False) -> JobProgress:
+        """Start a job for a tenant, or resume/return the one already running"""
+        task = self._tasks.get(tenant_id)
+        if task is not None and not task.done():
+            return self._current[tenant_id]
+        store = await self._get_store()
+        job = await store.get_description_job(tenant_id)
+        if job is None:
+            job = await store.create_description_job(tenant_id, overwrite, self.worker_id)
+            logger.info(f"Started description job {job['id']} for tenant {tenant_id}: {job['total']} items")
+            return self._launch(job)
+        claimed = await store.claim_description_jobs(self.worker_id, self.lease, job['id'])
+        if not claimed:
+            # Another worker runs it; report the last checkpoint
+            return JobProgress(job_id=job['id'], tenant_id=tenant_id, total=job['total'], done=job['done'],
+                               failed=job['failed'], started_at=time.monotonic(), resumed_from=job['done'])
+        return self._resume(claimed[0])
+
+    async def resume_all(self) -> List[JobProgress]:
+        """Resume the running jobs no live worker holds"""
+        store = await self._get_store()
+        return [self._resume(job) for job in await store.claim_description_jobs(self.worker_id, self.lease)]
+
+    def _resume(self, job: Dict[str, Any]) -> JobProgress:
+        logger.info(f"Resuming description job {job['id']} for tenant {job['user_id']} at {job['done']}/{job['total']}")
+        return self._launch(job)
+
+    def _launch(self, job: Dict[str, Any]) -> JobProgress:
+        """Run a job this worker has claimed"""
+        tenant_id = job['user_id']
+        progress = JobProgress(
+            job_id=job['id'],
+            tenant_id=tenant_id,
+            total=job['total'],
+            done=job['done'],
+            started_at=time.monotonic(),
+            resumed_from=job['done']  # Earlier failures are retried, so they are not carried over
+        )
+        self._progress[job['id']] = progress
+        self._current[tenant_id] = progress
+        self._tasks[tenant_id] = asyncio.create_task(self.run(tenant_id, job, progress))
+        return progress
+
+    def progress(self, job_id: str) -> Optional[JobProgress]:
+        return self._progress.get(job_id)
+
+    async def run(self, tenant_id: str, job: Dict[str, Any], progress: JobProgress) -> JobProgress:
+        """Process every pending item of a job"""
+        store = await self._get_store()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        pending: Dict[str, str] = {}
+        workers = [
+            asyncio.create_task(self._worker(tenant_id, queue, pending, progress))
+            for _ in range(self.concurrency)
+        ]
+        try:
+            after_id = None
+            while True:
+                page = await store.fetch_items_needing_description(tenant_id, job, after_id, self.batch_size)
+                if not page:
+                    break
+                for item in page:
+                    await queue.put(item)
+                after_id = page[-1]['id']
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            progress.status = 'completed'
+        except asyncio.CancelledError:
+            # Shutdown keeps the job 'running' so the next process resumes it
+            if progress.status == 'running':
+                logger.info(f"Description job {progress.job_id} interrupted at {progress.done}/{progress.total}")
+            raise
+        except Exception as e:
+            progress.status = 'failed'
+            progress.last_error = str(e)
+            logger.error(f"Description job {progress.job_id} failed: {e}")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if progress.status != 'running':
+                progress.finished_at = time.monotonic()
+            await asyncio.shield(self._flush(tenant_id, pending, progress, release=True))
+        logger.info(f"Description job {progress.job_id} {progress.status}: {progress.done} written, "
+                    f"{progress.failed} failed, {progress.items_per_minute():.0f} items/min")
+        return progress
+
+    async def _worker(
+        self,
+        tenant_id: str,
+        queue: asyncio.Queue,
+        pending: Dict[str, str],
+        progress: JobProgress
+    ) -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            try:
+                pending[item['id']] = await self._generate_with_retry(item, tenant_id)
+            except Exception as e:
+                progress.failed += 1
+                progress.last_error = f"{item.get('sku', item['id'])}: {e}"
+                logger.warning(f"Description for item {item['id']} failed: {e}")
+            if len(pending) >= self.batch_size:
+                await self._flush(tenant_id, pending, progress)
+
+    async def _generate_with_retry(self, item: Dict[str, Any], tenant_id: str) -> str:
+        for attempt in range(self.max_attempts):
+            try:
+                description = (await self.generate_fn(item, tenant_id) or '').strip()
+                if not description:
+                    raise ValueError("empty description")
+                return description
+            except Exception as e:
+                permanent = isinstance(e, QuotaExceeded) or (isinstance(e, APIStatusError) and not is_retryable(e))
+                if permanent or attempt == self.max_attempts - 1:
+                    raise
+                delay = min(self.backoff_max, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                await asyncio.sleep(delay)
+
+    async def _flush(
+        self,
+        tenant_id: str,
+        pending: Dict[str, str],
+        progress: JobProgress,
+        release: bool = False
+    ) -> None:
+        """Write buffered descriptions and checkpoint the job, renewing or releasing its claim"""
+        batch = dict(pending)
+        pending.clear()
+        store = await self._get_store()
+        if batch:
+            await store.save_generated_descriptions(tenant_id, batch)
+            # Patch the indexed items; the version bump drops cached replies quoting the old text
+            catalog_indexes.update_items(tenant_id, {
+                item_id: {'description': description} for item_id, description in batch.items()
+            })
+            progress.done += len(batch)
+        await store.update_description_job(
+            progress.job_id, progress.done, progress.failed, progress.status, progress.last_error,
+            None if release else self.worker_id
+        )
+
+    async def cancel(self, tenant_id: str) -> None:
+        """Stop a tenant's job for good (unlike shutdown, it will not resume)"""
+        task = self._tasks.get(tenant_id)
+        if task is None or task.done():
+            return
+        self._current[tenant_id].status = 'cancelled'
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        """Checkpoint and stop all jobs; they resume on the next start"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Global catalog description job runner
+description_jobs = CatalogDescriptionJobRunner()
+
+__all__ = ["CatalogDescriptionJobRunner", "JobProgress", "description_jobs"]
@@ -0,0 +1,261 @@
+"""
+IG-Shop-Agent Catalog Import
+Streams CSV or NDJSON catalogs through row validation into a COPY-based upsert
+"""
+import codecs
+import csv
+import io
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from advanced_config import ProductionConfig
+from catalog_index import catalog_indexes
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+REQUIRED_FIELDS = ('sku', 'name', 'price_jod')
+MAX_PRICE = Decimal('99999999.99')  # DECIMAL(10,2)
+
+class ImportFormatError(ValueError):
+    """The upload cannot be read as the declared format"""
+
+@dataclass
+class ImportReport:
+    """Outcome of one import, with the first row errors"""
+    tenant_id: str
+    format: str
+    rows: int = 0
+    valid: int = 0
+    failed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    errors_truncated: bool = False
+    seconds: float = 0.0
+
+    def add_error(self, row: int, sku: Optional[str], messages: List[str], max_errors: int) -> None:
+        self.failed += 1
+        if len(self.errors) < max_errors:
+            self.errors.append({'row': row, 'sku': sku, 'errors': messages})
+        else:
+            self.errors_truncated = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'tenant_id': self.tenant_id,
+            'format': self.format,
+            'rows': self.rows,
+            'valid': self.valid,
+            'failed': self.failed,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows / self.seconds) if self.seconds else 0,
+            'errors': self.errors,
+            'errors_truncated': self.errors_truncated,
+        }
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+def validate_row(raw: Dict[str, Any], row_no: int) -> Tuple[Optional[Tuple], List[str]]:
+    """Staging tuple for a raw row, or the reasons it was rejected"""
+    errors = []
+    sku = _text(raw.get('sku'))
+    name = _text(raw.get('name'))
+    if not sku:
+        errors.append("sku is required")
+    elif len(sku) > 100:
+        errors.append("sku is longer than 100 characters")
+    if not name:
+        errors.append("name is required")
+
+    price = None
+    price_raw = _text(raw.get('price_jod'))
+    if price_raw is None:
+        errors.append("price_jod is required")
+    else:
+        try:
+            price = Decimal(price_raw).quantize(Decimal('0.01'))
+            if not price.is_finite() or price < 0 or price > MAX_PRICE:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            errors.append(f"price_jod is not a valid price: {price_raw!r}")
+
+    stock = None
+    stock_raw = _text(raw.get('stock_quantity'))
+    if stock_raw is not None:
+        try:
+            stock = int(stock_raw)
+            if stock < 0:
+                raise ValueError
+        except ValueError:
+            errors.append(f"stock_quantity is not a non-negative integer: {stock_raw!r}")
+
+    media_url = _text(raw.get('media_url'))
+    if media_url and not media_url.startswith(('http://', 'https://')):
+        errors.append("media_url must be an http(s) URL")
+
+    extras = raw.get('extras')
+    extras_json = None
+    if isinstance(extras, str):
+        extras_json = extras.strip() or None
+        try:
+            extras = json.loads(extras_json) if extras_json else None
+        except ValueError:
+            errors.append("extras is not valid JSON")
+            extras = None
+    if extras is not None and not isinstance(extras, dict):
+        errors.append("extras must be a JSON object")
+    elif extras is not None and extras_json is None:
+        extras_json = json.dumps(extras, ensure_ascii=False)
+
+    if errors:
+        return None, errors
+    return (
+        row_no, sku, name, price, _text(raw.get('description')), _text(raw.get('category')),
+        stock, media_url, extras_json
+    ), []
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decoded lines of a byte stream, keeping line endings"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    async for chunk in chunks:
+        # Only \n ends a line; the last piece is carried over as a partial line
+        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def _complete_records(text: str) -> int:
+    """Length of the prefix of text that ends on a CSV record boundary"""
+    end = quotes = pos = 0
+    for line in text.split('\n')[:-1]:
+        pos += len(line) + 1
+        quotes += line.count('"')
+        # A quoted field may span lines; a record ends where quotes balance
+        if quotes % 2 == 0:
+            end = pos
+    return end
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Rows of a CSV upload as dicts keyed by the lowercased header"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    header = None
+    pending = ''
+    final = False
+    chunks = chunks.__aiter__()
+    while not final:
+        try:
+            text = pending + decoder.decode(await chunks.__anext__())
+            end = _complete_records(text)
+        except StopAsyncIteration:
+            text = pending + decoder.decode(b'', final=True)
+            final = True
+            end = len(text)
+            if text.count('"') % 2:
+                raise ImportFormatError("CSV ends inside a quoted field")
+        pending = text[end:]
+        try:
+            # One reader per chunk of complete records keeps the csv module on its fast path
+            for values in csv.reader(io.StringIO(text[:end], newline='')):
+                if not values or not any(values):
+                    continue
+                if header is None:
+                    header = [name.strip().lower() for name in values]
+                    missing = [name for name in REQUIRED_FIELDS if name not in header]
+                    if missing:
+                        raise ImportFormatError(f"CSV header is missing {', '.join(missing)}")
+                    continue
+                yield dict(zip(header, values))
+        except csv.Error as e:
+            raise ImportFormatError(f"Unreadable CSV: {e}")
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Objects of an NDJSON upload (invalid lines are yielded as None)"""
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+class CatalogImporter:
+    """Validates an uploaded catalog and bulk-upserts the valid rows
+
+    Rows are parsed and validated as the upload streams in, and valid
+    ones are COPYed into a staging table a batch at a time, so memory
+    stays flat whatever the catalog size. Invalid rows are skipped and
+    reported by row number.
+    """
+
+    def __init__(
+        self,
+        store: Any = None,
+        batch_size: int = ProductionConfig.CATALOG_IMPORT_BATCH_SIZE,
+        max_errors: int = ProductionConfig.CATALOG_IMPORT_MAX_ERRORS
+    ):
+        self._store = store
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    async def _batches(self, records: AsyncIterator[Any], report: ImportReport) -> AsyncIterator[List[Tuple]]:
+        batch = []
+        async for raw in records:
+            report.rows += 1
+            if not isinstance(raw, dict):
+                report.add_error(report.rows, None, ["row is not a JSON object"], self.max_errors)
+                continue
+            row, errors = validate_row(raw, report.rows)
+            if errors:
+                report.add_error(report.rows, _text(raw.get('sku')), errors, self.max_errors)
+                continue
+            report.valid += 1
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def run(self, tenant_id: str, chunks: AsyncIterator[bytes], fmt: str = 'csv') -> ImportReport:
+        """Import an uploaded catalog for a tenant"""
+        if fmt not in FORMATS:
+            raise ImportFormatError(f"Unsupported import format: {fmt}")
+        report = ImportReport(tenant_id=tenant_id, format=fmt)
+        started = time.perf_counter()
+        records = csv_records(chunks) if fmt == 'csv' else ndjson_records(chunks)
+        store = await self._get_store()
+        result = await store.import_catalog_items(tenant_id, self._batches(records, report))
+        report.inserted = result['inserted']
+        report.updated = result['updated']
+        report.seconds = time.perf_counter() - started
+        if result['inserted'] or result['updated']:
+            catalog_indexes.invalidate(tenant_id)
+        logger.info(f"Catalog import for tenant {tenant_id}: {report.rows} rows, {report.inserted} inserted, "
+                    f"{report.updated} updated, {report.failed} rejected in {report.seconds:.1f}s")
+        return report
+
+# Global catalog importer
+catalog_importer = CatalogImporter()
+
+__all__ = ["CatalogImporter", "ImportFormatError", "ImportReport", "catalog_importer", "csv_records",
+           "ndjson_records", "validate_row"]
@@ -0,0 +1,330 @@
+"""
+IG-Shop-Agent Catalog Index
+Per-tenant in-memory BM25 index for picking the catalog items relevant to a message
+"""
+import itertools
+import logging
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from arabic_text import search_terms
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Name tokens count more than description tokens
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+
+# Process-wide counter so a rebuilt index never reuses an old version number
+_versions = itertools.count(1)
+
+def item_key(item: Dict[str, Any]) -> str:
+    """Stable key of a catalog item (id, falling back to sku)"""
+    return str(item.get('id') or item.get('sku'))
+
+def item_fingerprint(item: Dict[str, Any]) -> Tuple:
+    """Cheap fingerprint used to detect changed items during a sync"""
+    return (
+        item.get('name'), item.get('category'), item.get('description'),
+        str(item.get('price_jod')), item.get('stock_quantity'), str(item.get('extras') or '')
+    )
+
+def item_terms(item: Dict[str, Any]) -> Counter:
+    """Weighted term frequencies of the searchable item fields"""
+    terms: Counter = Counter()
+    for token in search_terms(item.get('name') or ''):
+        terms[token] += NAME_WEIGHT
+    for token in search_terms(item.get('category') or ''):
+        terms[token] += CATEGORY_WEIGHT
+    terms.update(search_terms(item.get('sku') or '', drop_stopwords=False))
+    terms.update(search_terms(item.get('description') or ''))
+    extras = item.get('extras')
+    if isinstance(extras, dict):
+        for value in extras.values():
+            if isinstance(value, (str, int, float)):
+                terms.update(search_terms(str(value)))
+            elif isinstance(value, list):
+                terms.update(search_terms(' '.join(str(v) for v in value)))
+    return terms
+
+class CatalogIndex:
+    """Inverted BM25 index over one tenant's catalog, updated item by item
+    
+    Postings are kept as plain dicts for cheap incremental updates and
+    compiled lazily into NumPy arrays per term, so scoring a query is a
+    handful of vectorized operations instead of a Python loop per posting.
+    Other documents (KB chunks) can be indexed by passing their own terms
+    function.
+    """
+
+    def __init__(
+        self,
+        items: Iterable[Dict[str, Any]] = (),
+        terms: Callable[[Dict[str, Any]], Counter] = item_terms
+    ):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._terms = terms
+        self.version = 0
+        self._slots: Dict[str, int] = {}
+        self._slot_keys: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._doc_len = np.zeros(1024, dtype=np.float32)
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._fingerprints: Dict[str, Tuple] = {}
+        self._total_len = 0
+        for item in items:
+            self._add(item)
+        self.version = next(_versions)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _allocate_slot(self, key: str) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_keys[slot] = key
+        else:
+            slot = len(self._slot_keys)
+            self._slot_keys.append(key)
+            if slot >= len(self._doc_len):
+                self._doc_len = np.concatenate([self._doc_len, np.zeros_like(self._doc_len)])
+        self._slots[key] = slot
+        return slot
+
+    def _add(self, item: Dict[str, Any]) -> None:
+        key = item_key(item)
+        terms = self._terms(item)
+        slot = self._allocate_slot(key)
+        self.items[key] = item
+        self._doc_terms[key] = terms
+        self._fingerprints[key] = item_fingerprint(item)
+        length = sum(terms.values())
+        self._doc_len[slot] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[slot] = tf
+            self._compiled.pop(term, None)
+
+    def _remove(self, key: str) -> None:
+        terms = self._doc_terms.pop(key, None)
+        if terms is None:
+            return
+        slot = self._slots.pop(key)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(slot, None)
+                self._compiled.pop(term, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= int(self._doc_len[slot])
+        self._doc_len[slot] = 0
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+        self._fingerprints.pop(key, None)
+        del self.items[key]
+
+    def _compiled_posting(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return None
+            compiled = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def terms(self, item: Dict[str, Any]) -> Counter:
+        """Weighted terms of an item, as indexed when it is in the index"""
+        terms = self._doc_terms.get(item_key(item))
+        return terms if terms is not None else self._terms(item)
+
+    def upsert(self, item: Dict[str, Any]) -> bool:
+        """Add or replace one item; returns True if the index changed"""
+        key = item_key(item)
+        if self._fingerprints.get(key) == item_fingerprint(item):
+            self.items[key] = item
+            return False
+        self._remove(key)
+        self._add(item)
+        self.version = next(_versions)
+        return True
+
+    def remove(self, key: str) -> bool:
+        """Remove one item by id/sku; returns True if it was indexed"""
+        if key not in self.items:
+            return False
+        self._remove(key)
+        self.version = next(_versions)
+        return True
+
+    def sync(self, items: Iterable[Dict[str, Any]]) -> bool:
+        """Reconcile the index with a full catalog, touching only changed items"""
+        seen = set()
+        changed = False
+        for item in items:
+            key = item_key(item)
+            seen.add(key)
+            if self._fingerprints.get(key) != item_fingerprint(item):
+                self._remove(key)
+                self._add(item)
+                changed = True
+            else:
+                self.items[key] = item
+        for key in [k for k in self.items if k not in seen]:
+            self._remove(key)
+            changed = True
+        if changed:
+            self.version = next(_versions)
+        return changed
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to k (score, item) pairs ranked by BM25"""
+        n_docs = len(self.items)
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs or 1.0
+        all_slots = []
+        all_scores = []
+        for term in set(search_terms(query)):
+            compiled = self._compiled_posting(term)
+            if compiled is None:
+                continue
+            slots, tf = compiled
+            df = len(slots)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[slots] / avg_len)
+            all_slots.append(slots)
+            all_scores.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not all_slots:
+            return []
+        scores = np.bincount(
+            np.concatenate(all_slots),
+            weights=np.concatenate(all_scores),
+            minlength=len(self._slot_keys)
+        )
+        # Partition for the k-th best score, then order just the slots at or above it
+        kth = np.partition(scores, -k)[-k] if k < len(scores) else 0.0
+        top = np.flatnonzero(scores >= max(kth, 1e-9))
+        top = top[np.argsort(-scores[top], kind='stable')][:k]
+        return [(float(scores[slot]), self.items[self._slot_keys[slot]]) for slot in top]
+
+    def top_k(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Top-k items for a message, padded with catalog order when few match"""
+        ranked = [item for _, item in self.search(query, k)]
+        if len(ranked) < k:
+            chosen = {item_key(item) for item in ranked}
+            for key, item in self.items.items():
+                if len(ranked) >= k:
+                    break
+                if key not in chosen:
+                    ranked.append(item)
+        return ranked
+
+class CatalogIndexRegistry:
+    """Per-tenant catalog indexes kept in process memory
+    
+    Listeners are called with (tenant_id, version) whenever a tenant's
+    catalog changes so dependent caches can drop stale entries.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, CatalogIndex] = {}
+        self._listeners: List[Callable[[Optional[str], Optional[int]], None]] = []
+
+    def add_listener(self, callback: Callable[[Optional[str], Optional[int]], None]) -> None:
+        """Register a callback for catalog changes"""
+        self._listeners.append(callback)
+
+    def _notify(self, tenant_id: Optional[str], version: Optional[int]) -> None:
+        for callback in self._listeners:
+            try:
+                callback(tenant_id, version)
+            except Exception as e:
+                logger.error(f"Catalog change listener failed for tenant {tenant_id}: {e}")
+
+    def get(self, tenant_id: str) -> Optional[CatalogIndex]:
+        """Get a tenant's index if it has been built"""
+        return self._indexes.get(tenant_id)
+
+    def get_or_build(self, tenant_id: str, catalog_items: List[Dict[str, Any]]) -> CatalogIndex:
+        """Get a tenant's index, building it from catalog_items on first use"""
+        index = self._indexes.get(tenant_id)
+        if index is None:
+            index = CatalogIndex(catalog_items)
+            self._indexes[tenant_id] = index
+            logger.info(f"Built catalog index for tenant {tenant_id}: {len(index)} items")
+        return index
+
+    def sync(self, tenant_id: str, catalog_items: List[Dict[str, Any]]) -> CatalogIndex:
+        """Reconcile a tenant's index with freshly fetched catalog rows
+        
+        Items missing from catalog_items are dropped, so pass every row the
+        replies may offer. Listeners hear about the change only when an item
+        was added, edited or removed.
+        """
+        index = self._indexes.get(tenant_id)
+        if index is None:
+            return self.get_or_build(tenant_id, catalog_items)
+        if index.sync(catalog_items):
+            self._notify(tenant_id, index.version)
+        return index
+
+    def upsert_item(self, tenant_id: str, item: Dict[str, Any]) -> None:
+        """Apply a created/updated catalog item to a built index"""
+        index = self._indexes.get(tenant_id)
+        if index is not None and index.upsert(item):
+            self._notify(tenant_id, index.version)
+
+    def update_items(self, tenant_id: str, changes: Dict[str, Dict[str, Any]]) -> None:
+        """Apply field changes (item key -> fields) to the indexed items
+
+        Keys that are not indexed are skipped. Listeners hear about the
+        batch once, and only if an indexed field changed.
+        """
+        index = self._indexes.get(tenant_id)
+        if index is None:
+            return
+        changed = False
+        for key, fields in changes.items():
+            item = index.items.get(key)
+            if item is not None:
+                changed = index.upsert({**item, **fields}) or changed
+        if changed:
+            self._notify(tenant_id, index.version)
+
+    def remove_item(self, tenant_id: str, key: str) -> None:
+        """Apply a deleted catalog item to a built index"""
+        index = self._indexes.get(tenant_id)
+        if index is not None and index.remove(key):
+            self._notify(tenant_id, index.version)
+
+    def version(self, tenant_id: str) -> int:
+        """Catalog version counter for a tenant (0 when not indexed)"""
+        index = self._indexes.get(tenant_id)
+        return index.version if index else 0
+
+    def invalidate(self, tenant_id: str = None) -> None:
+        """Drop one tenant's index, or all of them"""
+        if tenant_id:
+            self._indexes.pop(tenant_id, None)
+        else:
+            self._indexes.clear()
+        self._notify(tenant_id, None)
+
+# Global catalog index registry
+catalog_indexes = CatalogIndexRegistry()
+
+__all__ = ["CatalogIndex", "CatalogIndexRegistry", "catalog_indexes", "item_key", "item_terms"]
@@ -0,0 +1,107 @@
+"""
+IG-Shop-Agent Catalog Search
+Fuzzy product search by partial name over catalog_items.search_text (pg_trgm), for the dashboard and the agent
+"""
+import logging
+import time
+from typing import Any, Dict, List, Sequence
+
+from advanced_config import ProductionConfig
+from arabic_text import arabizi_to_arabic, is_arabizi, tokenize
+
+logger = logging.getLogger(__name__)
+
+def search_queries(text: str) -> List[str]:
+    """Trigram queries for a search box or message, normalized like search_text
+
+    Stopwords and the Arabic article are dropped ("بدي الفستان الاسود" looks
+    for "فستان اسود"). When the text has Latin words that may be Arabizi,
+    a second query has them transliterated ("abaya aswad" also looks for
+    "ابي اسود"); the Latin query still matches English names and typos
+    ("abaya blk").
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return []
+    queries = [' '.join(tokens)]
+    if any(is_arabizi(token) for token in tokens):
+        transliterated = ' '.join(arabizi_to_arabic(t) if is_arabizi(t) else t for t in tokens)
+        if transliterated != queries[0]:
+            queries.append(transliterated)
+    return queries
+
+class CatalogSearch:
+    """Ranked fuzzy catalog search with typo tolerance
+
+    A search first runs with a strict similarity threshold, which lets the
+    GIN index discard most rows before they are rechecked; only when that
+    finds nothing is it repeated at the looser thresholds that tolerate
+    typos and partial words. A few close matches beat a longer list padded
+    with weak ones, and the looser passes recheck far more rows.
+    """
+
+    def __init__(
+        self,
+        store: Any = None,
+        thresholds: Sequence[float] = ProductionConfig.CATALOG_SEARCH_THRESHOLDS,
+        candidates: int = ProductionConfig.CATALOG_SEARCH_CANDIDATES,
+        name_weight: float = ProductionConfig.CATALOG_SEARCH_NAME_WEIGHT
+    ):
+        self._store = store
+        self.thresholds = tuple(thresholds)
+        self.candidates = candidates
+        self.name_weight = name_weight
+        self._metrics = {'searches': 0, 'relaxed': 0, 'empty': 0, 'errors': 0}
+        self._latencies: List[float] = []
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    async def search(self, tenant_id: str, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Up to limit items matching text, best first, each with its similarity score"""
+        queries = search_queries(text)
+        if not queries:
+            return []
+        store = await self._get_store()
+        self._metrics['searches'] += 1
+        started = time.perf_counter()
+        items: List[Dict[str, Any]] = []
+        try:
+            for attempt, threshold in enumerate(self.thresholds):
+                items = await store.search_catalog_items(
+                    tenant_id, queries, limit, threshold, self.candidates, self.name_weight
+                )
+                if items:
+                    break
+                if attempt + 1 < len(self.thresholds):
+                    self._metrics['relaxed'] += 1
+        finally:
+            self._latencies = (self._latencies + [time.perf_counter() - started])[-500:]
+        if not items:
+            self._metrics['empty'] += 1
+        return items
+
+    async def find(self, tenant_id: str, text: str, limit: int) -> List[Dict[str, Any]]:
+        """search() for the reply path: [] instead of an error"""
+        try:
+            return await self.search(tenant_id, text, limit)
+        except Exception as e:
+            self._metrics['errors'] += 1
+            logger.warning(f"Catalog search for tenant {tenant_id} failed: {e}")
+            return []
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            **self._metrics,
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if len(latencies) >= 20 else None,
+        }
+
+# Global catalog search
+catalog_search = CatalogSearch()
+
+__all__ = ["CatalogSearch", "catalog_search", "search_queries"]
@@ -3,7 +3,7 @@ IG-Shop-Agent Configuration Module
 Environment variables and settings management
 """
 import os
-from typing import Optional
+from typing import List, Optional, Tuple
 from pydantic_settings import BaseSettings
 from pydantic import Extra
 
@@ -27,6 +27,18 @@ class Settings(BaseSettings):
     DATABASE_USER: str = os.getenv("DATABASE_USER", "igshop_admin")
     DATABASE_PASSWORD: Optional[str] = os.getenv("DATABASE_PASSWORD")
     
+    # Conversation write-behind buffer
+    CONVERSATION_WRITE_BATCH: int = int(os.getenv("CONVERSATION_WRITE_BATCH", "500"))  # rows per INSERT
+    CONVERSATION_WRITE_MAX_DELAY: float = float(os.getenv("CONVERSATION_WRITE_MAX_DELAY", "0.2"))  # seconds
+    CONVERSATION_WRITE_MAX_PENDING: int = int(os.getenv("CONVERSATION_WRITE_MAX_PENDING", "20000"))  # then writers wait
+    
+    # Read replicas (streaming standbys of the primary, same database and credentials)
+    DATABASE_REPLICA_HOSTS: str = os.getenv("DATABASE_REPLICA_HOSTS", "")  # host[:port],host[:port]; empty = primary only
+    DATABASE_REPLICA_POOL_SIZE: int = int(os.getenv("DATABASE_REPLICA_POOL_SIZE", "10"))  # per replica
+    DATABASE_REPLICA_MAX_LAG: float = float(os.getenv("DATABASE_REPLICA_MAX_LAG", "5.0"))  # seconds, then out of rotation
+    DATABASE_REPLICA_CHECK_INTERVAL: float = float(os.getenv("DATABASE_REPLICA_CHECK_INTERVAL", "2.0"))  # seconds
+    DATABASE_READ_YOUR_WRITES: float = float(os.getenv("DATABASE_READ_YOUR_WRITES", "10.0"))  # seconds a writer reads the primary
+    
     # JWT Configuration
     JWT_SECRET: str = "your-secret-key-here"  # Change in production
     JWT_ALGORITHM: str = "HS256"
@@ -110,6 +122,15 @@ class Settings(BaseSettings):
         password_part = f":{self.DATABASE_PASSWORD}" if self.DATABASE_PASSWORD else ""
         return f"postgresql://{self.DATABASE_USER}{password_part}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
     
+    @property
+    def database_replica_hosts(self) -> List[Tuple[str, int]]:
+        """(host, port) of each read replica"""
+        hosts = []
+        for entry in filter(None, (part.strip() for part in self.DATABASE_REPLICA_HOSTS.split(","))):
+            host, _, port = entry.rpartition(":") if ":" in entry else (entry, "", "")
+            hosts.append((host, int(port) if port else self.DATABASE_PORT))
+        return hosts
+    
     @property
     def is_production(self) -> bool:
         """Check if running in production"""
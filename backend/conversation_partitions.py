@@ -0,0 +1,192 @@
+"""
+IG-Shop-Agent Conversation Partitions
+Keeps future monthly conversation partitions ready and archives expired months to gzip files
+"""
+import asyncio
+import gzip
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from advanced_config import ProductionConfig
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_NAME = re.compile(r'^conversations_(\d{4})_(\d{2})$')
+
+def month_start(value: date, offset: int = 0) -> date:
+    """First day of the month offset months from value's month"""
+    index = value.year * 12 + value.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+@dataclass
+class MaintenanceResult:
+    created: List[str] = field(default_factory=list)
+    archived: Dict[str, int] = field(default_factory=dict)  # Partition -> rows exported
+    moved: int = 0  # Pre-partitioning rows moved into partitions
+    errors: List[str] = field(default_factory=list)
+
+class ConversationPartitionManager:
+    """Creates upcoming partitions and archives the ones past retention
+
+    Archiving detaches a partition, COPYs it to <archive_dir>/<name>.csv.gz
+    and drops it. A partition that was detached but not dropped (a crash
+    mid-export) is picked up again on the next run.
+
+    Rows written before migration 0003 are moved into the partitions in
+    batches, one transaction each, until their old table is gone.
+    """
+
+    def __init__(
+        self,
+        db: Any = None,
+        months_ahead: int = ProductionConfig.CONVERSATIONS_PARTITIONS_AHEAD,
+        retention_months: int = ProductionConfig.CONVERSATIONS_RETENTION_MONTHS,
+        archive_dir: str = ProductionConfig.CONVERSATIONS_ARCHIVE_DIR,
+        interval: float = ProductionConfig.CONVERSATIONS_MAINTENANCE_INTERVAL,
+        move_batch_size: int = ProductionConfig.CONVERSATIONS_MOVE_BATCH_SIZE
+    ):
+        self._db = db
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.move_batch_size = move_batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def _get_db(self):
+        if self._db is None:
+            from database import get_db_connection
+            self._db = await get_db_connection()
+        return self._db
+
+    async def ensure_partitions(self, today: Optional[date] = None) -> List[str]:
+        """Create this month's partition and the next months_ahead ones"""
+        today = today or datetime.now(timezone.utc).date()
+        db = await self._get_db()
+        existing = {row['name'] for row in await self._partitions(db)}
+        created = []
+        # The function creates tables, so it runs on the primary whatever replicas are configured
+        async with db.get_connection() as conn:
+            for offset in range(self.months_ahead + 1):
+                name = await conn.fetchval("SELECT create_conversation_partition($1)", month_start(today, offset))
+                if name not in existing:
+                    created.append(name)
+        if created:
+            logger.info(f"Created conversation partitions: {', '.join(created)}")
+        return created
+
+    async def move_unpartitioned(self) -> int:
+        """Move rows left in conversations_unpartitioned into the partitions"""
+        db = await self._get_db()
+        moved, after = 0, '(0,0)'
+        # Writes and creates partitions, so it runs on the primary
+        async with db.get_connection() as conn:
+            while after is not None:
+                row = await conn.fetchrow(
+                    "SELECT moved, last_tid FROM move_unpartitioned_conversations($1, $2::tid)",
+                    self.move_batch_size, after
+                )
+                moved += row['moved']
+                after = row['last_tid']
+        if moved:
+            logger.info(f"Moved {moved} pre-partitioning conversation rows into partitions")
+        return moved
+
+    async def _partitions(self, db) -> List[Dict[str, Any]]:
+        """Monthly conversation tables, attached or left detached"""
+        return await db.fetch_all(
+            """
+            SELECT c.relname AS name, c.relispartition AS attached
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema() AND c.relkind = 'r' AND c.relname ~ '^conversations_[0-9]{4}_[0-9]{2}$'
+            ORDER BY c.relname
+            """
+        )
+
+    async def archive_expired(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Detach, export and drop partitions older than the retention window"""
+        today = today or datetime.now(timezone.utc).date()
+        cutoff = month_start(today, -self.retention_months)
+        db = await self._get_db()
+        archived = {}
+        for partition in await self._partitions(db):
+            month = partition_month(partition['name'])
+            if month is None or month >= cutoff:
+                continue
+            archived[partition['name']] = await self._archive(db, partition['name'], partition['attached'])
+        return archived
+
+    async def _archive(self, db, name: str, attached: bool) -> int:
+        async with db.get_connection() as conn:
+            if attached:
+                async with conn.transaction():
+                    # Detaching locks the parent; give up rather than queue behind long readers
+                    await conn.execute("SET LOCAL lock_timeout = '5s'")
+                    await conn.execute(f'ALTER TABLE conversations DETACH PARTITION "{name}"')
+            os.makedirs(self.archive_dir, exist_ok=True)
+            path = os.path.join(self.archive_dir, f"{name}.csv.gz")
+            partial = path + '.part'
+            archive = gzip.open(partial, 'wb')
+
+            async def write(data: bytes) -> None:
+                await asyncio.to_thread(archive.write, data)
+
+            try:
+                status = await conn.copy_from_table(name, output=write, format='csv', header=True)
+            finally:
+                await asyncio.to_thread(archive.close)
+            os.replace(partial, path)
+            await conn.execute(f'DROP TABLE "{name}"')
+        rows = int(status.split()[-1])
+        logger.info(f"Archived {rows} conversation rows from {name} to {path}")
+        return rows
+
+    async def run(self, today: Optional[date] = None) -> MaintenanceResult:
+        """One maintenance pass; failures are logged and retried next pass"""
+        result = MaintenanceResult()
+        try:
+            result.created = await self.ensure_partitions(today)
+        except Exception as e:
+            result.errors.append(f"partitions: {e}")
+            logger.error(f"Creating conversation partitions failed: {e}")
+        try:
+            result.moved = await self.move_unpartitioned()
+        except Exception as e:
+            result.errors.append(f"move: {e}")
+            logger.error(f"Moving pre-partitioning conversations failed: {e}")
+        try:
+            result.archived = await self.archive_expired(today)
+        except Exception as e:
+            result.errors.append(f"retention: {e}")
+            logger.error(f"Archiving conversation partitions failed: {e}")
+        return result
+
+    async def _loop(self) -> None:
+        while True:
+            await self.run()
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+# Global conversation partition manager
+conversation_partitions = ConversationPartitionManager()
+
+__all__ = ["ConversationPartitionManager", "MaintenanceResult", "conversation_partitions", "month_start",
+           "partition_month"]
@@ -0,0 +1,167 @@
+"""
+IG-Shop-Agent Conversation Summarizer
+Rolling per-customer summaries that replace long raw history in the prompt
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from advanced_config import ProductionConfig
+
+logger = logging.getLogger(__name__)
+
+# Folds new messages into the previous summary and returns the new summary;
+# the tenant is passed so the LLM call is scheduled and metered under it
+SummarizeFn = Callable[[str, List[Dict[str, Any]], str], Awaitable[str]]
+
+@dataclass
+class ThreadSummary:
+    """In-memory view of one (tenant, customer) thread"""
+    summary: str = ''
+    covered_count: int = 0
+    covered_until: Optional[datetime] = None
+    uncovered: int = 0  # Messages in the thread newer than the summary
+
+class ConversationSummarizer:
+    """Keeps a compact rolling summary per thread, refreshed every K messages"""
+
+    def __init__(
+        self,
+        store: Any = None,
+        summarize_fn: Optional[SummarizeFn] = None,
+        every_messages: int = ProductionConfig.AI_SUMMARY_EVERY_MESSAGES,
+        raw_turns: int = ProductionConfig.AI_SUMMARY_RAW_TURNS
+    ):
+        self._store = store
+        self._summarize_fn = summarize_fn
+        self.every_messages = every_messages
+        self.raw_turns = raw_turns
+        self._threads: "OrderedDict[Tuple[str, str], ThreadSummary]" = OrderedDict()
+        self._running: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    async def _summarize(self, tenant_id: str, previous: str, messages: List[Dict[str, Any]]) -> str:
+        if self._summarize_fn is None:
+            from azure_openai_service import azure_openai_service
+            self._summarize_fn = azure_openai_service.summarize_conversation
+        return await self._summarize_fn(previous, messages, tenant_id)
+
+    async def get_thread(self, tenant_id: str, customer: str) -> ThreadSummary:
+        """Current summary state of a thread, loaded from the store once"""
+        key = (tenant_id, customer)
+        thread = self._threads.get(key)
+        if thread is not None:
+            self._threads.move_to_end(key)
+        else:
+            store = await self._get_store()
+            row = await store.get_conversation_summary(tenant_id, customer)
+            thread = ThreadSummary()
+            if row:
+                thread.summary = row['summary']
+                thread.covered_count = row['covered_count']
+                thread.covered_until = row['covered_until']
+            thread.uncovered = await store.count_conversation_messages_after(
+                tenant_id, customer, thread.covered_until
+            )
+            self._threads[key] = thread
+            while len(self._threads) > ProductionConfig.AI_SUMMARY_MAX_THREADS:
+                self._threads.popitem(last=False)
+        return thread
+
+    async def prepare_history(
+        self,
+        tenant_id: str,
+        customer: str,
+        conversation_history: Optional[List[Dict]]
+    ) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """Return (summary, raw turns) to send instead of the full history
+
+        Without a summary the history is returned unchanged. With one, only
+        the messages the summary does not cover (at least raw_turns) are kept.
+        """
+        try:
+            thread = await self.get_thread(tenant_id, customer)
+        except Exception as e:
+            logger.warning(f"Conversation summary unavailable for {tenant_id}/{customer}: {e}")
+            return None, conversation_history
+        if not thread.summary or not conversation_history:
+            return None, conversation_history
+        keep = max(thread.uncovered, self.raw_turns)
+        return thread.summary, conversation_history[-keep:]
+
+    async def note_messages(self, tenant_id: str, customer: str, count: int = 1) -> None:
+        """Record new messages in a thread and refresh its summary every K"""
+        try:
+            thread = await self.get_thread(tenant_id, customer)
+        except Exception as e:
+            logger.warning(f"Could not track conversation {tenant_id}/{customer}: {e}")
+            return
+        thread.uncovered += count
+        if thread.uncovered >= self.every_messages + self.raw_turns:
+            self.schedule_refresh(tenant_id, customer)
+
+    def schedule_refresh(self, tenant_id: str, customer: str) -> None:
+        """Refresh a thread's summary in the background (one run per thread)"""
+        key = (tenant_id, customer)
+        if key in self._running:
+            return
+        self._running.add(key)
+        task = asyncio.create_task(self._refresh(tenant_id, customer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, tenant_id: str, customer: str) -> None:
+        key = (tenant_id, customer)
+        try:
+            await self.refresh(tenant_id, customer)
+        except Exception as e:
+            logger.error(f"Failed to refresh conversation summary for {tenant_id}/{customer}: {e}")
+        finally:
+            self._running.discard(key)
+
+    async def refresh(self, tenant_id: str, customer: str) -> bool:
+        """Fold every message except the last raw_turns into the summary"""
+        store = await self._get_store()
+        thread = await self.get_thread(tenant_id, customer)
+        messages = await store.fetch_conversation_messages_after(
+            tenant_id, customer, thread.covered_until,
+            ProductionConfig.AI_SUMMARY_MAX_FOLD_MESSAGES + self.raw_turns
+        )
+        to_fold = messages[:-self.raw_turns] if self.raw_turns else messages
+        if not to_fold:
+            return False
+
+        summary = await self._summarize(tenant_id, thread.summary, to_fold)
+        covered_until = to_fold[-1]['created_at']
+        await store.save_conversation_summary(
+            tenant_id, customer, summary, thread.covered_count + len(to_fold), covered_until
+        )
+        thread.summary = summary
+        thread.covered_count += len(to_fold)
+        thread.covered_until = covered_until
+        thread.uncovered = max(thread.uncovered - len(to_fold), 0)
+        logger.info(f"Summarized {len(to_fold)} messages for {tenant_id}/{customer} "
+                    f"({thread.covered_count} covered)")
+        return True
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Wait up to timeout seconds for background refreshes (used on shutdown)"""
+        if not self._tasks:
+            return
+        _, late = await asyncio.wait(list(self._tasks), timeout=timeout)
+        if late:
+            logger.warning(f"Abandoned {len(late)} conversation summary refreshes at shutdown")
+
+# Global conversation summarizer
+conversation_summarizer = ConversationSummarizer()
+
+__all__ = ["ConversationSummarizer", "ThreadSummary", "conversation_summarizer"]
@@ -0,0 +1,174 @@
+"""
+IG-Shop-Agent Conversation Writes
+Write-behind buffer that batches conversation inserts into few round trips
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from read_replicas import set_db_session
+
+logger = logging.getLogger(__name__)
+
+class ConversationWriteBuffer:
+    """Write-behind buffer for conversation inserts
+    
+    Messages are queued in memory and written by a single flusher, in
+    batches of up to max_batch rows, as soon as a batch is full or the
+    oldest queued message has waited max_delay. When Postgres falls behind
+    and max_pending messages are unwritten, add() waits for room. Each
+    thread's unwritten messages are merged into reads until their batch
+    commits.
+    """
+    
+    def __init__(
+        self,
+        db: Any,
+        max_batch: int = settings.CONVERSATION_WRITE_BATCH,
+        max_delay: float = settings.CONVERSATION_WRITE_MAX_DELAY,
+        max_pending: int = settings.CONVERSATION_WRITE_MAX_PENDING,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 5.0
+    ):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._pending: List[Tuple[float, Dict[str, Any]]] = []  # (queued_at, row)
+        self._unwritten = 0  # Queued plus in-flight rows
+        self._threads: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.backpressure_waits = 0
+        self.max_flush_latency = 0.0
+    
+    async def add(self, user_id: str, customer: str, message: str, is_ai_response: bool = False) -> Dict[str, Any]:
+        """Queue a message and return its row (id and created_at are set here)"""
+        if self._closed:
+            raise RuntimeError("Conversation write buffer is closed")
+        while self._unwritten >= self.max_pending:
+            self.backpressure_waits += 1
+            self._room.clear()
+            await self._room.wait()
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'customer': customer,
+            'message': message,
+            'is_ai_response': is_ai_response,
+            'created_at': datetime.now(timezone.utc),
+        }
+        self._pending.append((time.monotonic(), row))
+        self._unwritten += 1
+        self._threads.setdefault((user_id, customer), []).append(row)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._wake.set()
+        return row
+    
+    def tail(self, user_id: str, customer: str, after: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Unwritten messages of a thread, oldest first"""
+        rows = self._threads.get((user_id, customer), [])
+        return [row for row in rows if after is None or row['created_at'] > after]
+    
+    def merge(self, rows: List[Dict[str, Any]], tail: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Stored thread rows plus a tail taken before reading them, deduplicated and oldest first
+        
+        The tail has to be taken first: a batch committing mid-read leaves
+        the buffer, and may or may not be in the rows read.
+        """
+        if not tail:
+            return sorted(rows, key=lambda row: row['created_at'])
+        seen = {row['id'] for row in rows}
+        extra = [{key: row[key] for key in ('id', 'message', 'is_ai_response', 'created_at')}
+                 for row in tail if row['id'] not in seen]
+        return sorted(rows + extra, key=lambda row: row['created_at'])
+    
+    async def _run(self) -> None:
+        # This task inherited the context of whichever add() started it; its writes are noted per tenant
+        set_db_session(None)
+        backoff = self.retry_backoff
+        while True:
+            self._wake.clear()
+            if not self._pending:
+                if self._closed:
+                    return
+                await self._wake.wait()
+                continue
+            if len(self._pending) < self.max_batch and not self._closed:
+                remaining = self._pending[0][0] + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+            if await self._flush_batch():
+                backoff = self.retry_backoff
+            else:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.retry_backoff_max)
+    
+    async def _flush_batch(self) -> bool:
+        batch = self._pending[:self.max_batch]
+        del self._pending[:len(batch)]
+        try:
+            await self.db.insert_conversation_messages([row for _, row in batch])
+        except Exception as e:
+            # Put the batch back in front; backpressure holds writers while Postgres recovers
+            self._pending[:0] = batch
+            self.failures += 1
+            logger.error(f"Conversation batch insert of {len(batch)} rows failed: {e}")
+            return False
+        self.db.replicas.note_write(*{row['user_id'] for _, row in batch})
+        written = {row['id'] for _, row in batch}
+        for key in {(row['user_id'], row['customer']) for _, row in batch}:
+            remaining = [row for row in self._threads[key] if row['id'] not in written]
+            if remaining:
+                self._threads[key] = remaining
+            else:
+                del self._threads[key]
+        self._unwritten -= len(batch)
+        self.written += len(batch)
+        self.batches += 1
+        self.max_flush_latency = max(self.max_flush_latency, time.monotonic() - batch[0][0])
+        if self._unwritten < self.max_pending:
+            self._room.set()
+        return True
+    
+    async def close(self, timeout: float = 30.0) -> None:
+        """Write everything queued, giving up after timeout seconds"""
+        self._closed = True
+        if self._task is None or self._task.done():
+            return
+        self._wake.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error(f"Dropped {self._unwritten} unwritten conversation messages at shutdown")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'unwritten': self._unwritten,
+            'written': self.written,
+            'batches': self.batches,
+            'avg_batch': round(self.written / self.batches, 1) if self.batches else 0.0,
+            'failures': self.failures,
+            'backpressure_waits': self.backpressure_waits,
+            'max_flush_latency_ms': round(self.max_flush_latency * 1000, 1),
+        }
+
+__all__ = ["ConversationWriteBuffer"]
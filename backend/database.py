@@ -1,18 +1,39 @@
 """
 IG-Shop-Agent Database Module
-PostgreSQL with Row-Level Security and pgvector for multi-tenant SaaS
+PostgreSQL with Row-Level Security (and pgvector when installed) for multi-tenant SaaS
 """
 import os
 import asyncpg
 import json
-from typing import Optional, List, Dict, Any, AsyncGenerator
-from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, AsyncGenerator, AsyncIterator, Tuple
+from datetime import date, datetime, timedelta, timezone
 import logging
 from contextlib import asynccontextmanager
 from config import settings
+from conversation_writes import ConversationWriteBuffer
+from pagination import KEYSET_ORDER, keyset_condition, keyset_page
+from read_replicas import REPLICA_CONFLICT, REPLICA_UNAVAILABLE, ReadReplica, ReplicaRouter, is_read_only, set_db_session
+from schema_migrations import migrate
 
 logger = logging.getLogger(__name__)
 
+# Catalog columns returned to callers; search_text (migration 0005) is only searched
+CATALOG_COLUMNS = (
+    "id, user_id, sku, name, price_jod, media_url, extras, description, category, stock_quantity, "
+    "created_at, updated_at, description_generated_at"
+)
+
+# Tenant tables served by fetch_page and stream_table, with their select lists
+PAGINATED_TABLES = {'catalog_items': CATALOG_COLUMNS, 'orders': '*'}
+
+# Look-back windows of thread reads; None reads the whole history
+CONVERSATION_READ_HORIZONS = (timedelta(days=31), timedelta(days=183), None)
+
+# Staging columns of a catalog import, in the order import rows are built
+CATALOG_IMPORT_COLUMNS = (
+    'row_no', 'sku', 'name', 'price_jod', 'description', 'category', 'stock_quantity', 'media_url', 'extras'
+)
+
 # Global database service instance
 db_service = None
 
@@ -22,6 +43,9 @@ class DatabaseService:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
         self.is_connected = False
+        self.conversation_writes = ConversationWriteBuffer(self)
+        self.replicas = ReplicaRouter(settings.database_replica_hosts)
+        self._pgvector: Optional[Tuple[int, ...]] = None  # Set on the first KB search
     
     async def connect(self) -> None:
         """Create database connection pool"""
@@ -51,6 +75,8 @@ class DatabaseService:
             self.is_connected = True
             logger.info("Database connected successfully")
             
+            await self.replicas.start(self.pool)
+            
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             self.is_connected = False
@@ -59,6 +85,8 @@ class DatabaseService:
     async def disconnect(self) -> None:
         """Close database connection pool"""
         try:
+            await self.conversation_writes.close()
+            await self.replicas.close()
             if self.pool:
                 await self.pool.close()
                 self.pool = None
@@ -68,18 +96,72 @@ class DatabaseService:
             logger.error(f"Error disconnecting from database: {e}")
     
     @asynccontextmanager
-    async def get_connection(self) -> AsyncGenerator[asyncpg.Connection, None]:
-        """Get a database connection from the pool"""
-        if not self.pool:
-            await self.connect()
-        
-        async with self.pool.acquire() as conn:
+    async def _acquire(self, pool: asyncpg.Pool) -> AsyncGenerator[asyncpg.Connection, None]:
+        async with pool.acquire() as conn:
             try:
                 yield conn
             except Exception as e:
                 logger.error(f"Database error: {e}")
                 raise
     
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncGenerator[asyncpg.Connection, None]:
+        """Get a primary connection, for writes and transactions
+        
+        The session's reads stay on the primary for a while afterwards;
+        read-only work should use read_connection().
+        """
+        if not self.pool:
+            await self.connect()
+        
+        self.replicas.note_write()
+        async with self._acquire(self.pool) as conn:
+            yield conn
+    
+    @asynccontextmanager
+    async def read_connection(self) -> AsyncGenerator[asyncpg.Connection, None]:
+        """Get a connection for read-only statements: a replica in rotation, else the primary
+        
+        A replica that fails mid-use leaves the rotation, but the error is
+        still raised; only the single-statement fetch_* calls retry on the
+        primary.
+        """
+        if not self.pool:
+            await self.connect()
+        
+        replica = self.replicas.route()
+        if replica is None:
+            async with self._acquire(self.pool) as conn:
+                yield conn
+            return
+        try:
+            async with self._acquire(replica.pool) as conn:
+                yield conn
+        except REPLICA_UNAVAILABLE as e:
+            self.replicas.drop(replica, e)
+            raise
+    
+    async def _fetch(self, method: str, query: str, *args) -> Any:
+        """conn.<method>(query, *args) on a replica if the query only reads, else on the primary"""
+        if not is_read_only(query):
+            # fetch_* also runs INSERT ... RETURNING and friends
+            async with self.get_connection() as conn:
+                return await getattr(conn, method)(query, *args)
+        if not self.pool:
+            await self.connect()
+        replica = self.replicas.route()
+        if replica is not None:
+            try:
+                async with replica.pool.acquire() as conn:
+                    return await getattr(conn, method)(query, *args)
+            except REPLICA_UNAVAILABLE as e:
+                logger.warning(f"Replica {replica.name} failed a read, retrying on the primary: {e}")
+                self.replicas.drop(replica, e)
+            except REPLICA_CONFLICT as e:
+                logger.warning(f"Replica {replica.name} cancelled a read, retrying on the primary: {e}")
+        async with self._acquire(self.pool) as conn:
+            return await getattr(conn, method)(query, *args)
+    
     async def execute_query(self, query: str, *args) -> str:
         """Execute a query and return the result"""
         async with self.get_connection() as conn:
@@ -87,20 +169,28 @@ class DatabaseService:
     
     async def fetch_one(self, query: str, *args) -> Optional[Dict[str, Any]]:
         """Fetch one row from the database"""
-        async with self.get_connection() as conn:
-            row = await conn.fetchrow(query, *args)
-            return dict(row) if row else None
+        row = await self._fetch('fetchrow', query, *args)
+        return dict(row) if row else None
     
     async def fetch_all(self, query: str, *args) -> List[Dict[str, Any]]:
         """Fetch all rows from the database"""
-        async with self.get_connection() as conn:
-            rows = await conn.fetch(query, *args)
-            return [dict(row) for row in rows]
+        rows = await self._fetch('fetch', query, *args)
+        return [dict(row) for row in rows]
     
     async def fetch_val(self, query: str, *args) -> Any:
         """Fetch a single value from the database"""
-        async with self.get_connection() as conn:
-            return await conn.fetchval(query, *args)
+        return await self._fetch('fetchval', query, *args)
+    
+    async def stream(self, query: str, *args, chunk_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield rows in chunks from a server-side cursor
+        
+        The connection stays checked out until the iteration ends, so
+        consume the stream promptly.
+        """
+        connection = self.read_connection() if is_read_only(query) else self.get_connection()
+        async with connection as conn:
+            async for chunk in stream_rows(conn, query, *args, chunk_size=chunk_size):
+                yield chunk
     
     async def health_check(self) -> Dict[str, Any]:
         """Check database health"""
@@ -111,20 +201,21 @@ class DatabaseService:
                     "error": "Database not connected"
                 }
             
-            # Test basic query
-            result = await self.fetch_val("SELECT 1")
-            if result == 1:
+            # Test basic query on the primary
+            async with self._acquire(self.pool) as conn:
+                result = await conn.fetchval("SELECT 1")
                 # Get some basic stats
-                table_count = await self.fetch_val(
+                table_count = await conn.fetchval(
                     "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = 'public'"
                 )
-                
+            if result == 1:
                 return {
                     "status": "healthy",
                     "connected": True,
                     "tables": table_count,
                     "pool_size": self.pool.get_size() if self.pool else 0,
-                    "pool_max_size": self.pool.get_max_size() if self.pool else 0
+                    "pool_max_size": self.pool.get_max_size() if self.pool else 0,
+                    "replicas": self.replicas.stats()
                 }
             else:
                 return {
@@ -139,82 +230,13 @@ class DatabaseService:
             }
     
     async def initialize_schema(self) -> bool:
-        """Initialize database schema with required tables"""
+        """Bring the database schema up to date with the versioned migrations"""
         try:
-            logger.info("Initializing database schema...")
-            
-            # Create tables if they don't exist
-            schema_sql = """
-            -- Users table (simplified for Instagram OAuth)
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
-                instagram_handle TEXT UNIQUE NOT NULL,
-                instagram_user_id TEXT UNIQUE,
-                instagram_access_token TEXT,
-                instagram_connected BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            
-            -- Catalog items table
-            CREATE TABLE IF NOT EXISTS catalog_items (
-                id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                sku TEXT NOT NULL,
-                name TEXT NOT NULL,
-                price_jod DECIMAL(10,2) NOT NULL,
-                media_url TEXT NOT NULL DEFAULT '',
-                extras JSONB DEFAULT '{}',
-                description TEXT,
-                category TEXT,
-                stock_quantity INTEGER,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                UNIQUE(user_id, sku)
-            );
-            
-            -- Orders table
-            CREATE TABLE IF NOT EXISTS orders (
-                id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                sku TEXT NOT NULL,
-                qty INTEGER NOT NULL,
-                customer TEXT NOT NULL,
-                phone TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')),
-                total_amount DECIMAL(10,2) NOT NULL,
-                delivery_address TEXT,
-                notes TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            
-            -- Knowledge base documents table
-            CREATE TABLE IF NOT EXISTS kb_documents (
-                id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                vector_id TEXT UNIQUE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            
-            -- Conversations table
-            CREATE TABLE IF NOT EXISTS conversations (
-                id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                customer TEXT NOT NULL,
-                message TEXT NOT NULL,
-                is_ai_response BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            """
-            
-            async with self.get_connection() as conn:
-                await conn.execute(schema_sql)
-            
-            logger.info("Database schema initialized successfully")
+            applied = await migrate(self)
+            if applied:
+                logger.info(f"Database schema migrated to version {applied[-1].version}")
+            else:
+                logger.info("Database schema is current")
             return True
             
         except Exception as e:
@@ -268,6 +290,651 @@ class DatabaseService:
             logger.error(f"Failed to store Instagram tokens: {e}")
             raise
 
+    async def get_conversation_summary(self, user_id: str, customer: str) -> Optional[Dict[str, Any]]:
+        """Get the rolling summary of a customer thread"""
+        return await self.fetch_one(
+            """
+            SELECT summary, covered_count, covered_until, updated_at
+            FROM conversation_summaries
+            WHERE user_id = $1 AND customer = $2
+            """,
+            user_id, customer
+        )
+    
+    async def save_conversation_summary(
+        self,
+        user_id: str,
+        customer: str,
+        summary: str,
+        covered_count: int,
+        covered_until: datetime
+    ) -> None:
+        """Insert or replace the rolling summary of a customer thread"""
+        await self.execute_query(
+            """
+            INSERT INTO conversation_summaries (user_id, customer, summary, covered_count, covered_until)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id, customer) DO UPDATE
+            SET summary = EXCLUDED.summary,
+                covered_count = EXCLUDED.covered_count,
+                covered_until = EXCLUDED.covered_until,
+                updated_at = NOW()
+            """,
+            user_id, customer, summary, covered_count, covered_until
+        )
+    
+    async def fetch_conversation_messages_after(
+        self,
+        user_id: str,
+        customer: str,
+        after: Optional[datetime] = None,
+        limit: int = 200
+    ) -> List[Dict[str, Any]]:
+        """Fetch a thread's messages newer than a timestamp, oldest first"""
+        unwritten = self.conversation_writes.tail(user_id, customer, after)
+        rows = await self.fetch_all(
+            """
+            SELECT id, message, is_ai_response, created_at
+            FROM conversations
+            WHERE user_id = $1 AND customer = $2
+              AND created_at > COALESCE($3::timestamptz, '-infinity')
+            ORDER BY created_at ASC
+            LIMIT $4
+            """,
+            user_id, customer, after, limit
+        )
+        return self.conversation_writes.merge(rows, unwritten)[:limit]
+    
+    async def add_conversation_message(
+        self,
+        user_id: str,
+        customer: str,
+        message: str,
+        is_ai_response: bool = False
+    ) -> Dict[str, Any]:
+        """Queue a DM or AI reply for a batched insert; thread reads see it right away"""
+        return await self.conversation_writes.add(user_id, customer, message, is_ai_response)
+    
+    async def insert_conversation_messages(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert conversation rows in one statement (replaying a batch is a no-op)"""
+        await self.execute_query(
+            """
+            INSERT INTO conversations (id, user_id, customer, message, is_ai_response, created_at)
+            SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::boolean[], $6::timestamptz[])
+            ON CONFLICT DO NOTHING
+            """,
+            [row['id'] for row in rows],
+            [row['user_id'] for row in rows],
+            [row['customer'] for row in rows],
+            [row['message'] for row in rows],
+            [row['is_ai_response'] for row in rows],
+            [row['created_at'] for row in rows]
+        )
+    
+    async def fetch_recent_conversation_messages(
+        self,
+        user_id: str,
+        customer: str,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """The last messages of a thread, oldest first
+        
+        Looks back one horizon at a time so an active thread is read from
+        the newest monthly partitions only.
+        """
+        unwritten = self.conversation_writes.tail(user_id, customer)
+        for horizon in CONVERSATION_READ_HORIZONS:
+            since = datetime.now(timezone.utc) - horizon if horizon else None
+            rows = await self.fetch_all(
+                """
+                SELECT id, message, is_ai_response, created_at
+                FROM conversations
+                WHERE user_id = $1 AND customer = $2
+                  AND created_at > COALESCE($3::timestamptz, '-infinity')
+                ORDER BY created_at DESC
+                LIMIT $4
+                """,
+                user_id, customer, since, limit
+            )
+            if len(rows) >= limit:
+                break
+        return self.conversation_writes.merge(rows, unwritten)[-limit:]
+    
+    async def count_conversation_messages_after(
+        self,
+        user_id: str,
+        customer: str,
+        after: Optional[datetime] = None
+    ) -> int:
+        """Count a thread's messages newer than a timestamp"""
+        stored = await self.fetch_val(
+            """
+            SELECT COUNT(*) FROM conversations
+            WHERE user_id = $1 AND customer = $2
+              AND created_at > COALESCE($3::timestamptz, '-infinity')
+            """,
+            user_id, customer, after
+        )
+        # A batch committing during this read may be counted twice; callers only use it as a threshold
+        return stored + len(self.conversation_writes.tail(user_id, customer, after))
+    
+    async def get_tenant_plan(self, tenant_id: str) -> Optional[str]:
+        """Subscription plan of a tenant (starter, professional, enterprise), from users.plan"""
+        return await self.fetch_val("SELECT plan FROM users WHERE id = $1", tenant_id)
+    
+    async def fetch_catalog_items(self, user_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Fetch a tenant's catalog for prompt building"""
+        return await self.fetch_all(
+            """
+            SELECT id, sku, name, price_jod, description, category, stock_quantity, media_url, extras
+            FROM catalog_items
+            WHERE user_id = $1
+            ORDER BY created_at DESC
+            LIMIT $2
+            """,
+            user_id, limit
+        )
+    
+    async def delete_catalog_item(self, user_id: str, item_id: str) -> bool:
+        """Delete one of a tenant's catalog items"""
+        deleted = await self.fetch_val(
+            "DELETE FROM catalog_items WHERE id = $1 AND user_id = $2 RETURNING id", item_id, user_id
+        )
+        return deleted is not None
+    
+    async def fetch_page(
+        self,
+        table: str,
+        user_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Newest-first page of a tenant's rows and the cursor of the next page"""
+        if table not in PAGINATED_TABLES:
+            raise ValueError(f"Table {table} is not paginated")
+        condition, cursor_args = keyset_condition(cursor, 3)
+        rows = await self.fetch_all(
+            f"SELECT {PAGINATED_TABLES[table]} FROM {table} WHERE user_id = $1 AND {condition} {KEYSET_ORDER} LIMIT $2",
+            user_id, limit + 1, *cursor_args
+        )
+        return keyset_page(rows, limit)
+    
+    async def stream_table(
+        self,
+        table: str,
+        user_id: str,
+        chunk_size: int = 500
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All of a tenant's rows, newest first, in chunks"""
+        if table not in PAGINATED_TABLES:
+            raise ValueError(f"Table {table} is not paginated")
+        async for chunk in self.stream(
+            f"SELECT {PAGINATED_TABLES[table]} FROM {table} WHERE user_id = $1 {KEYSET_ORDER}", user_id,
+            chunk_size=chunk_size
+        ):
+            yield chunk
+    
+    async def search_catalog_items(
+        self,
+        user_id: str,
+        queries: List[str],
+        limit: int,
+        threshold: float,
+        candidates: int = 1000,
+        name_weight: float = 0.5
+    ) -> List[Dict[str, Any]]:
+        """A tenant's items whose search_text contains a fuzzy match of any query, best first
+        
+        Queries must already be normalized like search_text. An item matches
+        when some extent of its text has a word similarity of at least
+        threshold to a query; it is ranked by that similarity plus
+        name_weight times the similarity of its name alone. The GIN index
+        finds the matches; the candidates most similar of them are kept with
+        a top-N sort, so a word common to most of a big catalog costs no more
+        memory, and only those get the name bonus.
+        """
+        params = [f"${i + 4}" for i in range(len(queries))]
+        matches = ' OR '.join(f"{p} <% c.search_text" for p in params)
+        score = ', '.join(f"word_similarity({p}, c.search_text)" for p in params)
+        name_score = ', '.join(f"word_similarity({p}, catalog_search_text(c.name, NULL, NULL, NULL, NULL))" for p in params)
+        async with self.read_connection() as conn:
+            async with conn.transaction(readonly=True):
+                await conn.execute(f"SET LOCAL pg_trgm.word_similarity_threshold = {float(threshold)}")
+                rows = await conn.fetch(
+                    f"""
+                    WITH matches AS MATERIALIZED (
+                        SELECT c.*, GREATEST({score}) AS score
+                        FROM catalog_items c
+                        WHERE c.user_id = $1 AND ({matches})
+                        ORDER BY score DESC, c.id
+                        LIMIT $3
+                    )
+                    SELECT {CATALOG_COLUMNS}, score
+                    FROM matches c
+                    ORDER BY score + $2 * GREATEST({name_score}) DESC, id
+                    LIMIT {int(limit)}
+                    """,
+                    user_id, name_weight, candidates, *queries
+                )
+        return [dict(row) for row in rows]
+    
+    async def import_catalog_items(
+        self,
+        user_id: str,
+        batches: AsyncIterator[List[Tuple]]
+    ) -> Dict[str, int]:
+        """COPY validated rows into a staging table, then upsert them on (user_id, sku)
+        
+        Rows are tuples in CATALOG_IMPORT_COLUMNS order. Nothing reaches
+        catalog_items unless every batch was staged. When a SKU repeats,
+        the last row wins. Optional fields that are missing keep their
+        stored values, and extras are merged.
+        """
+        async with self.get_connection() as conn:
+            await conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS catalog_import_staging (
+                    row_no INTEGER NOT NULL,
+                    sku TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    price_jod DECIMAL(10,2) NOT NULL,
+                    description TEXT,
+                    category TEXT,
+                    stock_quantity INTEGER,
+                    media_url TEXT,
+                    extras JSONB
+                )
+            """)
+            try:
+                staged = 0
+                async for batch in batches:
+                    await conn.copy_records_to_table(
+                        'catalog_import_staging', records=batch, columns=CATALOG_IMPORT_COLUMNS
+                    )
+                    staged += len(batch)
+                async with conn.transaction():
+                    merged = await conn.fetchrow(
+                        """
+                        WITH merged AS (
+                            INSERT INTO catalog_items AS c (
+                                user_id, sku, name, price_jod, description, category,
+                                stock_quantity, media_url, extras
+                            )
+                            SELECT DISTINCT ON (sku)
+                                $1, sku, name, price_jod, description, category,
+                                stock_quantity, COALESCE(media_url, ''), COALESCE(extras, '{}')
+                            FROM catalog_import_staging
+                            ORDER BY sku, row_no DESC
+                            ON CONFLICT (user_id, sku) DO UPDATE
+                            SET name = EXCLUDED.name,
+                                price_jod = EXCLUDED.price_jod,
+                                description = COALESCE(EXCLUDED.description, c.description),
+                                category = COALESCE(EXCLUDED.category, c.category),
+                                stock_quantity = COALESCE(EXCLUDED.stock_quantity, c.stock_quantity),
+                                media_url = COALESCE(NULLIF(EXCLUDED.media_url, ''), c.media_url),
+                                extras = COALESCE(c.extras, '{}') || EXCLUDED.extras,
+                                updated_at = NOW()
+                            RETURNING (xmax = 0) AS inserted
+                        )
+                        SELECT COUNT(*) FILTER (WHERE inserted) AS inserted,
+                               COUNT(*) FILTER (WHERE NOT inserted) AS updated
+                        FROM merged
+                        """,
+                        user_id
+                    )
+            finally:
+                # Pooled connections keep temp tables, so leave nothing behind
+                await conn.execute("DROP TABLE IF EXISTS catalog_import_staging")
+            return {'staged': staged, 'inserted': merged['inserted'], 'updated': merged['updated']}
+    
+    async def get_customer_context(self, user_id: str, customer: str, limit: int = 10) -> Dict[str, Any]:
+        """Recent orders of a customer, in the shape the system prompt expects"""
+        orders = await self.fetch_all(
+            """
+            SELECT sku, qty, status, total_amount, created_at
+            FROM orders
+            WHERE user_id = $1 AND customer = $2
+            ORDER BY created_at DESC
+            LIMIT $3
+            """,
+            user_id, customer, limit
+        )
+        return {'previous_orders': orders} if orders else {}
+
+    async def create_description_job(
+        self,
+        user_id: str,
+        overwrite: bool = False,
+        claimed_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Start a catalog description job, counting the items it will cover"""
+        return await self.fetch_one(
+            """
+            INSERT INTO catalog_description_jobs (user_id, overwrite, total, claimed_by, claimed_at)
+            SELECT $1, $2, COUNT(*), $3, CASE WHEN $3::text IS NULL THEN NULL ELSE NOW() END
+            FROM catalog_items
+            WHERE user_id = $1 AND ($2 OR description IS NULL OR description = '')
+            RETURNING *
+            """,
+            user_id, overwrite, claimed_by
+        )
+    
+    async def get_description_job(self, user_id: str, job_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """A tenant's job by id, or its running job when job_id is None"""
+        return await self.fetch_one(
+            """
+            SELECT * FROM catalog_description_jobs
+            WHERE user_id = $1 AND (id = $2 OR ($2::text IS NULL AND status = 'running'))
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            user_id, job_id
+        )
+    
+    async def list_running_description_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs of every tenant that were still running at the last shutdown"""
+        return await self.fetch_all(
+            "SELECT * FROM catalog_description_jobs WHERE status = 'running' ORDER BY created_at"
+        )
+    
+    async def claim_description_jobs(
+        self,
+        worker: str,
+        lease: float,
+        job_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Claim running jobs that no live worker holds (or just job_id)
+        
+        A claim lapses lease seconds after its last checkpoint. Concurrent
+        claimers skip each other's locked rows, so a job goes to one worker.
+        """
+        return await self.fetch_all(
+            """
+            UPDATE catalog_description_jobs AS j
+            SET claimed_by = $1, claimed_at = NOW()
+            FROM (
+                SELECT id FROM catalog_description_jobs
+                WHERE status = 'running'
+                  AND ($3::text IS NULL OR id = $3)
+                  AND (claimed_by IS NULL OR claimed_by = $1
+                       OR claimed_at < NOW() - make_interval(secs => $2))
+                ORDER BY created_at
+                FOR UPDATE SKIP LOCKED
+            ) AS c
+            WHERE j.id = c.id
+            RETURNING j.*
+            """,
+            worker, float(lease), job_id
+        )
+    
+    async def update_description_job(
+        self,
+        job_id: str,
+        done: int,
+        failed: int,
+        status: str = 'running',
+        last_error: Optional[str] = None,
+        claimed_by: Optional[str] = None
+    ) -> None:
+        """Checkpoint a job's progress, renewing claimed_by's claim (None releases it)"""
+        await self.execute_query(
+            """
+            UPDATE catalog_description_jobs
+            SET done = $2, failed = $3, status = $4,
+                last_error = COALESCE($5, last_error),
+                claimed_by = $6,
+                claimed_at = CASE WHEN $6::text IS NULL THEN NULL ELSE NOW() END,
+                updated_at = NOW(),
+                finished_at = CASE WHEN $4 = 'running' THEN NULL ELSE NOW() END
+            WHERE id = $1
+            """,
+            job_id, done, failed, status, last_error, claimed_by
+        )
+    
+    async def fetch_items_needing_description(
+        self,
+        user_id: str,
+        job: Dict[str, Any],
+        after_id: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Next page (by id) of items a job has not written yet"""
+        return await self.fetch_all(
+            """
+            SELECT id, sku, name, category, price_jod, description
+            FROM catalog_items
+            WHERE user_id = $1
+              AND ($2 OR description IS NULL OR description = '')
+              AND (description_generated_at IS NULL OR description_generated_at < $3)
+              AND ($4::text IS NULL OR id > $4)
+            ORDER BY id
+            LIMIT $5
+            """,
+            user_id, job['overwrite'], job['created_at'], after_id, limit
+        )
+    
+    async def save_generated_descriptions(self, user_id: str, descriptions: Dict[str, str]) -> None:
+        """Write a batch of generated descriptions in one statement"""
+        if not descriptions:
+            return
+        await self.execute_query(
+            """
+            UPDATE catalog_items AS c
+            SET description = d.description,
+                description_generated_at = NOW(),
+                updated_at = NOW()
+            FROM unnest($2::text[], $3::text[]) AS d(id, description)
+            WHERE c.user_id = $1 AND c.id = d.id
+            """,
+            user_id, list(descriptions.keys()), list(descriptions.values())
+        )
+
+    async def add_llm_usage(self, period: date, usage: Dict[str, Dict[str, int]]) -> None:
+        """Add per-tenant usage deltas for a period in one statement"""
+        if not usage:
+            return
+        tenants = list(usage.keys())
+        await self.execute_query(
+            """
+            INSERT INTO llm_usage AS u (user_id, period, requests, prompt_tokens, completion_tokens, latency_ms)
+            SELECT t.user_id, $1, t.requests, t.prompt_tokens, t.completion_tokens, t.latency_ms
+            FROM unnest($2::text[], $3::bigint[], $4::bigint[], $5::bigint[], $6::bigint[])
+                AS t(user_id, requests, prompt_tokens, completion_tokens, latency_ms)
+            ON CONFLICT (user_id, period) DO UPDATE
+            SET requests = u.requests + EXCLUDED.requests,
+                prompt_tokens = u.prompt_tokens + EXCLUDED.prompt_tokens,
+                completion_tokens = u.completion_tokens + EXCLUDED.completion_tokens,
+                latency_ms = u.latency_ms + EXCLUDED.latency_ms,
+                updated_at = NOW()
+            """,
+            period,
+            tenants,
+            [usage[t]['requests'] for t in tenants],
+            [usage[t]['prompt_tokens'] for t in tenants],
+            [usage[t]['completion_tokens'] for t in tenants],
+            [usage[t]['latency_ms'] for t in tenants]
+        )
+    
+    async def fetch_llm_usage(self, user_ids: List[str], period: date) -> Dict[str, Dict[str, int]]:
+        """Stored usage totals of several tenants for a period"""
+        rows = await self.fetch_all(
+            """
+            SELECT user_id, requests, prompt_tokens, completion_tokens, latency_ms
+            FROM llm_usage
+            WHERE user_id = ANY($1::text[]) AND period = $2
+            """,
+            user_ids, period
+        )
+        return {row.pop('user_id'): row for row in rows}
+    
+    async def upsert_kb_document(
+        self,
+        user_id: str,
+        title: str,
+        content: str,
+        document_id: Optional[str] = None
+    ) -> str:
+        """Create a KB document, or replace the title and content of one; returns its id"""
+        if document_id is None:
+            return await self.fetch_val(
+                "INSERT INTO kb_documents (user_id, title, content) VALUES ($1, $2, $3) RETURNING id",
+                user_id, title, content
+            )
+        updated = await self.fetch_val(
+            """
+            UPDATE kb_documents SET title = $3, content = $4, updated_at = NOW()
+            WHERE id = $1 AND user_id = $2
+            RETURNING id
+            """,
+            document_id, user_id, title, content
+        )
+        if updated is None:
+            raise ValueError(f"KB document {document_id} not found")
+        return updated
+    
+    async def list_kb_documents(self, user_id: str) -> List[Dict[str, Any]]:
+        """A tenant's KB documents with their chunk counts"""
+        return await self.fetch_all(
+            """
+            SELECT d.id, d.title, d.created_at, d.updated_at,
+                   (SELECT COUNT(*) FROM kb_chunks c WHERE c.document_id = d.id) AS chunks
+            FROM kb_documents d
+            WHERE d.user_id = $1
+            ORDER BY d.created_at DESC
+            """,
+            user_id
+        )
+    
+    async def delete_kb_document(self, user_id: str, document_id: str) -> bool:
+        """Delete a KB document and its chunks"""
+        deleted = await self.fetch_val(
+            "DELETE FROM kb_documents WHERE id = $1 AND user_id = $2 RETURNING id", document_id, user_id
+        )
+        return deleted is not None
+    
+    async def fetch_kb_embeddings(self, content_hashes: List[str]) -> Dict[str, str]:
+        """Stored embeddings (pgvector text form) of chunk contents, by content hash"""
+        rows = await self.fetch_all(
+            """
+            SELECT DISTINCT ON (content_hash) content_hash, '[' || array_to_string(embedding, ',') || ']' AS embedding
+            FROM kb_chunks
+            WHERE content_hash = ANY($1::text[])
+            """,
+            content_hashes
+        )
+        return {row['content_hash']: row['embedding'] for row in rows}
+    
+    async def replace_kb_chunks(self, user_id: str, document_id: str, chunks: List[Tuple]) -> None:
+        """Swap a document's chunks for new ones in one transaction
+    
+        Chunks are (chunk_index, content, content_hash, token_count,
+        embedding) tuples, with embeddings in pgvector text form; they are
+        stored as real[] so no extension is needed to keep them.
+        """
+        async with self.get_connection() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "DELETE FROM kb_chunks WHERE document_id = $1 AND user_id = $2", document_id, user_id
+                )
+                await conn.execute(
+                    """
+                    INSERT INTO kb_chunks (user_id, document_id, chunk_index, content, content_hash, token_count, embedding)
+                    SELECT $1, $2, chunk_index, content, content_hash, token_count,
+                           string_to_array(btrim(embedding, '[]'), ',')::real[]
+                    FROM unnest($3::int[], $4::text[], $5::text[], $6::int[], $7::text[])
+                        AS c(chunk_index, content, content_hash, token_count, embedding)
+                    """,
+                    user_id, document_id,
+                    [c[0] for c in chunks], [c[1] for c in chunks], [c[2] for c in chunks],
+                    [c[3] for c in chunks], [c[4] for c in chunks]
+                )
+    
+    async def fetch_kb_chunks(self, user_id: str) -> List[Dict[str, Any]]:
+        """A tenant's chunks without embeddings, for lexical search"""
+        return await self.fetch_all(
+            """
+            SELECT c.document_id, d.title, c.chunk_index, c.content, c.token_count
+            FROM kb_chunks c
+            JOIN kb_documents d ON d.id = c.document_id
+            WHERE c.user_id = $1
+            """,
+            user_id
+        )
+    
+    async def stream_kb_chunk_vectors(self, user_id: str, chunk_size: int = 2000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """A tenant's chunks with their embeddings (lists of floats), for the local index"""
+        async for chunk in self.stream(
+            """
+            SELECT c.document_id, d.title, c.chunk_index, c.content, c.token_count, c.embedding
+            FROM kb_chunks c
+            JOIN kb_documents d ON d.id = c.document_id
+            WHERE c.user_id = $1
+            ORDER BY c.id
+            """,
+            user_id, chunk_size=chunk_size
+        ):
+            yield chunk
+    
+    async def count_kb_chunks(self, user_id: str) -> int:
+        return await self.fetch_val("SELECT COUNT(*) FROM kb_chunks WHERE user_id = $1", user_id)
+    
+    async def pgvector_version(self) -> Tuple[int, ...]:
+        """(major, minor) of the installed pgvector, () when it is not installed"""
+        if self._pgvector is None:
+            version = await self.fetch_val("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            self._pgvector = tuple(int(p) for p in version.split('.')[:2]) if version else ()
+        return self._pgvector
+    
+    async def search_kb_chunks(
+        self,
+        user_id: str,
+        embedding: str,
+        limit: int,
+        ef_search: int = 40
+    ) -> List[Dict[str, Any]]:
+        """Nearest KB chunks of a tenant by cosine distance, through the HNSW index (needs pgvector)"""
+        iterative_scan = await self.pgvector_version() >= (0, 8)
+        async with self.read_connection() as conn:
+            async with conn.transaction(readonly=True):
+                await conn.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+                if iterative_scan:
+                    # Keep walking the graph until enough of this tenant's chunks pass the filter
+                    await conn.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+                rows = await conn.fetch(
+                    """
+                    WITH nearest AS MATERIALIZED (
+                        -- The cast is the expression of idx_kb_chunks_embedding
+                        SELECT document_id, chunk_index, content, token_count,
+                               embedding::vector(1536) <=> $2::vector AS distance
+                        FROM kb_chunks
+                        WHERE user_id = $1
+                        ORDER BY distance
+                        LIMIT $3
+                    )
+                    SELECT n.document_id, d.title, n.chunk_index, n.content, n.token_count, 1 - n.distance AS similarity
+                    FROM nearest n
+                    JOIN kb_documents d ON d.id = n.document_id
+                    ORDER BY n.distance
+                    """,
+                    user_id, embedding, limit
+                )
+        return [dict(row) for row in rows]
+
+async def stream_rows(
+    conn: asyncpg.Connection,
+    query: str,
+    *args,
+    chunk_size: int = 500
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield chunks of rows from a cursor on an acquired connection"""
+    # Server-side cursors only live inside a transaction
+    async with conn.transaction(readonly=True):
+        cursor = await conn.cursor(query, *args)
+        while True:
+            rows = await cursor.fetch(chunk_size)
+            if not rows:
+                return
+            yield [dict(row) for row in rows]
+
 async def get_db_connection() -> DatabaseService:
     """Get the global database service instance"""
     global db_service
@@ -289,5 +956,21 @@ async def database_lifespan():
         if db_service:
             await db_service.disconnect()
 
+async def init_database() -> None:
+    """Connect and apply pending migrations (startup hook)
+
+    database_lifespan is an async generator, so registering it as a startup
+    handler never runs its body; this coroutine is awaited by the app.
+    """
+    db = await get_db_connection()
+    if not await db.initialize_schema():
+        raise RuntimeError("Database schema migration failed")
+
+async def close_database() -> None:
+    """Flush buffered writes and close the global pool (shutdown hook)"""
+    if db_service:
+        await db_service.disconnect()
+
 # Export for convenience
-__all__ = ["db_service", "get_db_connection", "database_lifespan", "DatabaseService"] 
\ No newline at end of file
+__all__ = ["db_service", "get_db_connection", "database_lifespan", "DatabaseService", "stream_rows", "CATALOG_IMPORT_COLUMNS",
+           "ConversationWriteBuffer", "init_database", "close_database", "ReplicaRouter", "ReadReplica", "is_read_only", "set_db_session"] 
\ No newline at end of file
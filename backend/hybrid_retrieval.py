@@ -0,0 +1,406 @@
+"""
+IG-Shop-Agent Hybrid Retrieval
+Fuses BM25 and vector rankings of catalog items and KB chunks, then reranks locally
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from advanced_config import ProductionConfig
+from arabic_text import search_terms
+from catalog_index import NAME_WEIGHT, CatalogIndex, catalog_indexes, item_key
+from kb_vector_index import normalize_rows, parse_vector, quantize
+from knowledge_base import KnowledgeBase, content_hash, knowledge_base
+
+logger = logging.getLogger(__name__)
+
+BUILD_RETRY_DELAY = 60  # seconds before embedding a catalog again after a failure
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = ProductionConfig.HYBRID_RRF_K) -> Dict[str, float]:
+    """RRF score of every key in any ranking: sum of 1 / (k + rank) over rankings"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+def chunk_key(chunk: Dict[str, Any]) -> str:
+    return f"{chunk['document_id']}:{chunk['chunk_index']}"
+
+def chunk_terms(chunk: Dict[str, Any]) -> Counter:
+    """Weighted terms of a KB chunk; the document title counts like an item name"""
+    terms: Counter = Counter()
+    for token in search_terms(chunk.get('title') or ''):
+        terms[token] += NAME_WEIGHT
+    terms.update(search_terms(chunk.get('content') or ''))
+    return terms
+
+def item_text(item: Dict[str, Any]) -> str:
+    """Text of a catalog item that gets embedded"""
+    parts = [item.get('name'), item.get('category'), item.get('description'), item.get('sku')]
+    return ' | '.join(str(part) for part in parts if part)
+
+def _is_code(term: str) -> bool:
+    return any(c.isdigit() for c in term) and any(c.isalpha() for c in term)
+
+@dataclass
+class Candidate:
+    """A fused candidate with the features the reranker looks at"""
+    key: str
+    doc: Dict[str, Any]
+    rrf: float
+    coverage: float = 0.0
+    query_coverage: float = 0.0
+    name_coverage: float = 0.0
+    code_match: bool = False
+    similarity: Optional[float] = None
+    score: float = 0.0
+
+def rerank(
+    query: str,
+    candidates: List[Candidate],
+    name_field: str,
+    terms: Callable[[Dict[str, Any]], Counter],
+    weights: Dict[str, float] = ProductionConfig.HYBRID_RERANK_WEIGHTS
+) -> List[Candidate]:
+    """Order fused candidates by RRF plus query-term coverage, name coverage and exact codes
+
+    Coverage counts the distinct query terms (surface forms and skeletons)
+    found in the candidate, out of those any candidate contains, so an item
+    matching every word of a dialect question beats one repeating a single
+    word. A product code typed in the query outranks everything that lacks it.
+    """
+    doc_terms = [terms(candidate.doc) for candidate in candidates]
+    all_terms = set(search_terms(query))
+    # Query terms no candidate contains ("addesh", "se3ro") cannot tell candidates apart
+    query_terms = {term for term in all_terms if any(term in found for found in doc_terms)}
+    codes = {term for term in query_terms if _is_code(term)}
+    top_rrf = max((c.rrf for c in candidates), default=0.0) or 1.0
+    for candidate, found in zip(candidates, doc_terms):
+        if query_terms:
+            name_terms = set(search_terms(str(candidate.doc.get(name_field) or '')))
+            matched = sum(1 for t in query_terms if t in found)
+            candidate.coverage = matched / len(query_terms)
+            candidate.query_coverage = matched / len(all_terms)
+            candidate.name_coverage = len(query_terms & name_terms) / len(query_terms)
+            candidate.code_match = bool(codes) and any(code in found for code in codes)
+        candidate.score = (
+            weights.get('rrf', 0.0) * candidate.rrf / top_rrf
+            + weights.get('coverage', 0.0) * candidate.coverage
+            + weights.get('name', 0.0) * candidate.name_coverage
+            + weights.get('code', 0.0) * candidate.code_match
+        )
+    return sorted(candidates, key=lambda c: -c.score)
+
+@dataclass
+class _CatalogVectorState:
+    version: int
+    keys: List[str]
+    hashes: Dict[str, int]  # content hash -> row
+    codes: np.ndarray
+    scales: np.ndarray
+
+class CatalogVectors:
+    """Embeddings of each tenant's catalog items, kept in memory as int8 rows
+
+    Built in the background on the first search after a catalog change, so
+    replies never wait for embeddings: until the build lands the catalog
+    side is lexical only. Rebuilds embed only the items whose text changed.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_tenants: int = ProductionConfig.HYBRID_CATALOG_VECTOR_TENANTS
+    ):
+        self.embed = embed
+        self.max_tenants = max_tenants
+        self._states: "OrderedDict[str, _CatalogVectorState]" = OrderedDict()
+        self._building: Dict[str, asyncio.Task] = {}
+        self._failed: Dict[str, float] = {}  # tenant -> when its last build failed
+        self.builds = 0
+
+    async def build(self, tenant_id: str, index: CatalogIndex) -> None:
+        """Embed a tenant's catalog at the index's current version"""
+        version = index.version
+        items = list(index.items.values())
+        previous = self._states.get(tenant_id)
+        texts = [(item_key(item), content_hash(item_text(item)), item_text(item)) for item in items]
+        missing = {h: text for _, h, text in texts if previous is None or h not in previous.hashes}
+        fresh = dict(zip(missing, await self.embed(list(missing.values())))) if missing else {}
+        fresh_rows = {h: i for i, h in enumerate(fresh)}
+        if fresh:
+            new_codes, new_scales = quantize(normalize_rows(np.asarray(list(fresh.values()), dtype=np.float32)), 'int8')
+
+        codes, scales = [], []
+        for _, h, _ in texts:
+            if h in fresh_rows:
+                codes.append(new_codes[fresh_rows[h]])
+                scales.append(new_scales[fresh_rows[h]])
+            else:
+                codes.append(previous.codes[previous.hashes[h]])
+                scales.append(previous.scales[previous.hashes[h]])
+        dim = codes[0].shape[0] if codes else 0
+        self._states[tenant_id] = _CatalogVectorState(
+            version=version,
+            keys=[key for key, _, _ in texts],
+            hashes={h: row for row, (_, h, _) in enumerate(texts)},
+            codes=np.asarray(codes, dtype=np.int8).reshape(len(codes), dim),
+            scales=np.asarray(scales, dtype=np.float32)
+        )
+        self._states.move_to_end(tenant_id)
+        while len(self._states) > self.max_tenants:
+            self._states.popitem(last=False)
+        self._failed.pop(tenant_id, None)
+        self.builds += 1
+        logger.info(f"Embedded catalog of tenant {tenant_id}: {len(texts)} items, {len(fresh)} new")
+
+    def _schedule(self, tenant_id: str, index: CatalogIndex) -> None:
+        if tenant_id in self._building:
+            return
+        failed = self._failed.get(tenant_id)
+        if failed is not None and time.monotonic() - failed < BUILD_RETRY_DELAY:
+            return
+        task = asyncio.ensure_future(self.build(tenant_id, index))
+        self._building[tenant_id] = task
+
+        def done(finished: asyncio.Task) -> None:
+            self._building.pop(tenant_id, None)
+            if not finished.cancelled() and finished.exception() is not None:
+                self._failed[tenant_id] = time.monotonic()
+                logger.warning(f"Catalog embedding for tenant {tenant_id} failed: {finished.exception()}")
+        task.add_done_callback(done)
+
+    def search(self, tenant_id: str, index: CatalogIndex, query: np.ndarray, k: int) -> List[Tuple[float, str]]:
+        """Up to k (similarity, item key) pairs; [] while the tenant's vectors are (re)built"""
+        state = self._states.get(tenant_id)
+        if state is None or state.version != index.version:
+            self._schedule(tenant_id, index)
+            return []
+        self._states.move_to_end(tenant_id)
+        if not state.keys:
+            return []
+        scores = (state.codes.astype(np.float32) @ query.astype(np.float32)) * state.scales
+        top = np.argsort(-scores)[:k]
+        return [(float(scores[row]), state.keys[row]) for row in top]
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+class KBLexicalIndex:
+    """Per-tenant BM25 indexes over KB chunks, loaded from kb_chunks
+
+    Reloaded after tenant_state_ttl, and dropped at once when the knowledge
+    base reports a change for the tenant.
+    """
+
+    def __init__(self, store: Any = None, ttl: float = ProductionConfig.KB_TENANT_STATE_TTL):
+        self._store = store
+        self.ttl = ttl
+        self._indexes: Dict[str, Tuple[CatalogIndex, float]] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self.loads = 0
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    async def _load(self, tenant_id: str) -> CatalogIndex:
+        store = await self._get_store()
+        chunks = [{**row, 'id': chunk_key(row)} for row in await store.fetch_kb_chunks(tenant_id)]
+        index = CatalogIndex(chunks, terms=chunk_terms)
+        self._indexes[tenant_id] = (index, time.monotonic())
+        self.loads += 1
+        return index
+
+    async def get(self, tenant_id: str) -> CatalogIndex:
+        """A tenant's chunk index; concurrent callers share one load"""
+        entry = self._indexes.get(tenant_id)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            return entry[0]
+        task = self._loading.get(tenant_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(tenant_id))
+            self._loading[tenant_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(tenant_id, None))
+        # Shielded so a reply giving up on its budget does not waste the load
+        return await asyncio.shield(task)
+
+    def invalidate(self, tenant_id: str) -> None:
+        self._indexes.pop(tenant_id, None)
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+class HybridRetriever:
+    """Catalog items and KB chunks for a reply, from BM25 and vectors fused with RRF
+
+    The lexical side (the catalog's BM25 index and a BM25 index over KB
+    chunks, both over Arabic-normalized terms with Arabizi and skeleton
+    variants) is always available. The vector side (the query embedding
+    against catalog item and KB chunk embeddings) is given what is left of
+    the KB retrieval budget; when it runs late the reply goes on with the
+    lexical rankings alone. Fused candidates are reranked locally.
+    """
+
+    def __init__(
+        self,
+        kb: Optional[KnowledgeBase] = None,
+        store: Any = None,
+        candidates: int = ProductionConfig.HYBRID_CANDIDATES,
+        rrf_k: int = ProductionConfig.HYBRID_RRF_K,
+        catalog_top_k: int = ProductionConfig.AI_CATALOG_TOP_K,
+        kb_min_coverage: float = ProductionConfig.HYBRID_KB_MIN_COVERAGE
+    ):
+        self.kb = kb or knowledge_base
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.catalog_top_k = catalog_top_k
+        self.kb_min_coverage = kb_min_coverage
+        self.catalog_vectors = CatalogVectors(self.kb.embed_vectors)
+        self.kb_lexical = KBLexicalIndex(store)
+        self.kb.add_listener(self.kb_lexical.invalidate)
+        self._metrics = {'retrievals': 0, 'vector_timeouts': 0, 'vector_errors': 0, 'lexical_errors': 0,
+                         'kb_hits': 0, 'catalog_vector_hits': 0}
+        self._latencies: List[float] = []
+
+    async def _vector_side(
+        self,
+        tenant_id: str,
+        message: str,
+        index: CatalogIndex,
+        use_kb: bool
+    ) -> Tuple[List[Tuple[float, str]], List[Dict[str, Any]]]:
+        query = parse_vector(await self.kb.query_vector(message))
+        catalog = self.catalog_vectors.search(tenant_id, index, query, self.candidates)
+        # kb.search finds the query vector in its cache
+        chunks = await self.kb.search(tenant_id, message, self.candidates) if use_kb else []
+        return catalog, chunks
+
+    def _fuse(
+        self,
+        message: str,
+        lexical: List[Tuple[float, Dict[str, Any]]],
+        vector: List[Tuple[float, Dict[str, Any]]],
+        key: Callable[[Dict[str, Any]], str],
+        name_field: str,
+        terms: Callable[[Dict[str, Any]], Counter]
+    ) -> List[Candidate]:
+        docs: Dict[str, Dict[str, Any]] = {}
+        similarity: Dict[str, float] = {}
+        for _, doc in lexical:
+            docs[key(doc)] = doc
+        for score, doc in vector:
+            docs[key(doc)] = doc
+            similarity[key(doc)] = score
+        fused = reciprocal_rank_fusion([[key(d) for _, d in lexical], [key(d) for _, d in vector]], self.rrf_k)
+        candidates = [Candidate(k, docs[k], rrf, similarity=similarity.get(k)) for k, rrf in fused.items()]
+        return rerank(message, candidates, name_field, terms)
+
+    def _select_catalog(self, index: CatalogIndex, ranked: List[Candidate]) -> List[Dict[str, Any]]:
+        """Top catalog items, padded with catalog order like CatalogIndex.top_k"""
+        selected = [c.doc for c in ranked[:self.catalog_top_k]]
+        chosen = {c.key for c in ranked[:self.catalog_top_k]}
+        for key, item in index.items.items():
+            if len(selected) >= self.catalog_top_k:
+                break
+            if key not in chosen:
+                selected.append(item)
+        return selected
+
+    def _select_knowledge(self, ranked: List[Candidate]) -> List[Dict[str, Any]]:
+        """Chunks relevant by similarity or by query-term coverage, within the KB prompt caps"""
+        selected, tokens = [], 0
+        for candidate in ranked:
+            relevant = (
+                (candidate.similarity is not None and candidate.similarity >= self.kb.min_similarity)
+                or candidate.query_coverage >= self.kb_min_coverage
+                or candidate.code_match
+            )
+            if not relevant:
+                continue
+            if len(selected) >= self.kb.top_k or tokens + candidate.doc['token_count'] > self.kb.max_context_tokens:
+                break
+            selected.append(candidate.doc)
+            tokens += candidate.doc['token_count']
+        return selected
+
+    async def retrieve(
+        self,
+        tenant_id: str,
+        message: str,
+        catalog_items: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """(catalog slice, KB chunks) for a customer message"""
+        self._metrics['retrievals'] += 1
+        started = time.perf_counter()
+        index = catalog_indexes.sync(tenant_id, catalog_items or [])
+        catalog_lexical = index.search(message, self.candidates)
+
+        use_kb = ProductionConfig.KB_RETRIEVAL_ENABLED
+        kb_task = asyncio.ensure_future(self.kb_lexical.get(tenant_id)) if use_kb else None
+        vector_task = asyncio.ensure_future(self._vector_side(tenant_id, message, index, use_kb))
+        pending = [task for task in (kb_task, vector_task) if task is not None]
+        _, late = await asyncio.wait(pending, timeout=self.kb.budget)
+        for task in late:
+            task.cancel()
+
+        kb_index = CatalogIndex(terms=chunk_terms)
+        if kb_task is not None and kb_task not in late:
+            try:
+                kb_index = kb_task.result()
+            except Exception as e:
+                self._metrics['lexical_errors'] += 1
+                logger.warning(f"KB lexical search for tenant {tenant_id} failed: {e}")
+
+        catalog_vector: List[Tuple[float, Dict[str, Any]]] = []
+        kb_vector: List[Tuple[float, Dict[str, Any]]] = []
+        if vector_task in late:
+            self._metrics['vector_timeouts'] += 1
+        else:
+            try:
+                catalog_hits, chunks = vector_task.result()
+                catalog_vector = [(score, index.items[key]) for score, key in catalog_hits if key in index.items]
+                kb_vector = [(chunk['similarity'], {**chunk, 'id': chunk_key(chunk)}) for chunk in chunks]
+            except Exception as e:
+                self._metrics['vector_errors'] += 1
+                logger.warning(f"Vector retrieval for tenant {tenant_id} failed: {e}")
+        if catalog_vector:
+            self._metrics['catalog_vector_hits'] += 1
+
+        catalog = self._select_catalog(
+            index, self._fuse(message, catalog_lexical, catalog_vector, item_key, 'name', index.terms)
+        )
+        kb_lexical = kb_index.search(message, self.candidates)
+        knowledge = self._select_knowledge(
+            self._fuse(message, kb_lexical, kb_vector, chunk_key, 'title', kb_index.terms)
+        )
+        if knowledge:
+            self._metrics['kb_hits'] += 1
+        self._latencies = (self._latencies + [time.perf_counter() - started])[-500:]
+        return catalog, knowledge
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            **self._metrics,
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if len(latencies) >= 20 else None,
+            'catalog_vector_tenants': len(self.catalog_vectors),
+            'catalog_vector_builds': self.catalog_vectors.builds,
+            'kb_lexical_tenants': len(self.kb_lexical),
+            'kb_lexical_loads': self.kb_lexical.loads,
+        }
+
+# Global hybrid retriever
+hybrid_retriever = HybridRetriever()
+
+__all__ = ["CatalogVectors", "HybridRetriever", "KBLexicalIndex", "chunk_terms", "hybrid_retriever",
+           "reciprocal_rank_fusion", "rerank"]
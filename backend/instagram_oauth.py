@@ -15,7 +15,7 @@ from requests.exceptions import RequestException
 import jwt
 from cryptography.fernet import Fernet
 
-from .config import Settings
+from config import Settings
 
 # Configure detailed logging
 logging.basicConfig(
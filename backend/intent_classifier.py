@@ -0,0 +1,206 @@
+"""
+IG-Shop-Agent Intent Classifier
+Local keyword + character n-gram intent detection ahead of the LLM
+"""
+import logging
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+from advanced_config import ProductionConfig
+from arabic_text import light_stem, normalize_arabic
+
+logger = logging.getLogger(__name__)
+
+INTENTS = ('browse', 'purchase', 'inquiry', 'support', 'complaint')
+
+# Keyword phrases per intent with their weight; written naturally and
+# normalized at import so they match normalized messages.
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    'purchase': {
+        'بدي اطلب': 2.0, 'بدي اشتري': 2.0, 'اطلب': 1.5, 'اشتري': 1.5, 'احجز': 1.5, 'احجزلي': 2.0,
+        'طلب': 1.0, 'اوردر': 1.5, 'ابعتولي': 1.5, 'ابعثولي': 1.5, 'رقمي': 1.0, 'عنواني': 1.0,
+        'الدفع عند الاستلام': 1.5, 'كاش': 1.0, 'قطعتين': 1.0, 'بدي وحدة': 1.5, 'خذيلي': 1.0, 'ثبتلي': 1.5,
+        'order': 1.5, 'buy': 1.5, 'purchase': 1.5, 'checkout': 1.5, 'i want to order': 2.0,
+        'reserve': 1.2, 'ill take': 1.5, 'i will take': 1.5, 'add to cart': 1.5, 'cash on delivery': 1.2,
+    },
+    'inquiry': {
+        'كم السعر': 2.0, 'كم سعر': 2.0, 'السعر': 1.2, 'سعر': 1.2, 'بكم': 1.5, 'متوفر': 1.5, 'في منه': 1.2,
+        'مقاس': 1.0, 'مقاسات': 1.0, 'لون': 0.8, 'الوان': 1.0, 'خامه': 1.0, 'قماش': 1.0, 'توصيل': 1.2,
+        'اجره التوصيل': 1.5, 'بيوصل': 1.2, 'امتى بيوصل': 1.5, 'كم يوم': 1.2, 'هل يوجد': 1.2, 'عندكم': 0.8,
+        'price': 1.5, 'how much': 2.0, 'cost': 1.2, 'available': 1.5, 'in stock': 1.5, 'size': 1.0,
+        'sizes': 1.0, 'color': 0.8, 'colors': 1.0, 'material': 1.0, 'delivery': 1.2, 'shipping': 1.2,
+        'do you have': 1.2, 'how long': 1.2,
+    },
+    'browse': {
+        'شو عندكم': 2.0, 'شو في': 1.5, 'جديد': 1.2, 'الجديد': 1.2, 'وصل جديد': 2.0, 'كولكشن': 1.5,
+        'تشكيله': 1.5, 'صور': 1.0, 'ابعتيلي صور': 1.5, 'كتالوج': 1.5, 'عروض': 1.2, 'خصم': 1.2,
+        'تخفيضات': 1.5, 'اقتراح': 1.2, 'اقترحي': 1.5, 'بتنصحيني': 1.5, 'شو بيلبق': 1.5, 'موديلات': 1.5,
+        'new arrivals': 2.0, 'whats new': 2.0, 'collection': 1.5, 'catalog': 1.5, 'show me': 1.5,
+        'pictures': 1.0, 'photos': 1.0, 'sale': 1.2, 'offers': 1.2, 'discount': 1.2, 'recommend': 1.5,
+        'suggest': 1.5, 'looking for': 1.2, 'browse': 1.5,
+    },
+    'support': {
+        'وين طلبي': 2.5, 'طلبي': 1.2, 'تتبع': 1.5, 'رقم الطلب': 1.5, 'تبديل': 1.5, 'ابدل': 1.5,
+        'استبدال': 1.5, 'ارجاع': 1.5, 'ارجع': 1.2, 'الغاء': 1.5, 'الغي': 1.5, 'بدي الغي': 2.0,
+        'تعديل العنوان': 1.5, 'غيرت رأيي': 1.2, 'ما وصل': 1.2, 'متى رح يوصل': 1.5, 'مساعده': 1.0,
+        'where is my order': 2.5, 'track': 1.5, 'tracking': 1.5, 'order status': 2.0, 'exchange': 1.5,
+        'return': 1.5, 'refund': 1.5, 'cancel': 1.5, 'change address': 1.5, 'help': 1.0,
+    },
+    'complaint': {
+        'سيء': 2.0, 'زفت': 2.5, 'مش مرتب': 2.0, 'مش مبسوط': 2.0, 'مش مبسوطه': 2.0, 'خربان': 2.0,
+        'مخروق': 2.0, 'مقطوع': 1.5, 'غلط': 1.2, 'متاخر': 1.5, 'تاخير': 1.5, 'نصب': 2.5, 'حرام عليكم': 2.5,
+        'ما حدا رد': 2.0, 'ما حدا بيرد': 2.0, 'مستاء': 2.0, 'شكوى': 2.5, 'مش نفس الصوره': 2.5, 'خايس': 2.0,
+        'terrible': 2.5, 'bad': 1.5, 'worst': 2.5, 'damaged': 2.0, 'broken': 2.0, 'wrong item': 2.5,
+        'not as described': 2.5, 'late': 1.2, 'scam': 2.5, 'disappointed': 2.0, 'complaint': 2.5,
+        'angry': 2.0, 'unacceptable': 2.5, 'no one replied': 2.0,
+    },
+}
+
+PRODUCT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'dress': ('فستان', 'فساتين', 'dress', 'dresses', 'فستان سهره'),
+    'abaya': ('عبايه', 'عبايات', 'abaya', 'abayas'),
+    'bag': ('شنطه', 'حقيبه', 'جزدان', 'bag', 'bags', 'handbag', 'purse'),
+    'shoes': ('كعب', 'حذاء', 'بوط', 'صندل', 'شوز', 'heels', 'shoes', 'sneakers', 'boots', 'sandals'),
+    'top': ('بلوزه', 'قميص', 'توب', 'blouse', 'shirt', 'top', 'tshirt'),
+    'bottoms': ('بنطلون', 'تنوره', 'جينز', 'pants', 'skirt', 'jeans', 'trousers'),
+    'outerwear': ('جاكيت', 'معطف', 'كبود', 'jacket', 'coat'),
+    'accessories': ('شال', 'حجاب', 'اكسسوارات', 'scarf', 'hijab', 'accessories', 'jewelry'),
+}
+
+URGENT_KEYWORDS = (
+    'ضروري', 'بسرعه', 'مستعجل', 'اليوم', 'هلا', 'هسا', 'حالا', 'فورا', 'لبكره',
+    'urgent', 'asap', 'today', 'now', 'immediately', 'tomorrow',
+)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_ARABIC_LETTER = re.compile(r'[ء-يٱ-ۓ]')
+_LATIN_LETTER = re.compile(r'[A-Za-z]')
+# Arabizi: Latin words using digits for Arabic letters (3=ع, 7=ح, 2=ء, 5=خ)
+_ARABIZI = re.compile(r'\b[a-z]*[2357][a-z]+\b|\b[a-z]+[2357][a-z]*\b')
+
+def _normalize(text: str) -> str:
+    text = normalize_arabic(text).replace("'", '')
+    return ' '.join(light_stem(token) for token in _WORD.findall(text))
+
+def _trigrams(token: str) -> FrozenSet[str]:
+    padded = f" {token} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def detect_language(text: str) -> str:
+    """'ar' or 'en' by Arabic/Latin letter ratio (Arabizi counts as Arabic)"""
+    arabic = len(_ARABIC_LETTER.findall(text))
+    latin = len(_LATIN_LETTER.findall(text))
+    if arabic == 0 and latin == 0:
+        return ProductionConfig.DEFAULT_LANGUAGE
+    if arabic / (arabic + latin) >= 0.5:
+        return 'ar'
+    if _ARABIZI.search(text.lower()):
+        return 'ar'
+    return 'en'
+
+class IntentClassifier:
+    """Scores intents from keyword phrases and fuzzy single-word matches
+
+    Multi-word phrases must appear verbatim (after normalization); single
+    keywords also match misspelled variants through character trigram
+    similarity, which covers dialect spelling and typos.
+    """
+
+    def __init__(self, fuzzy_threshold: float = 0.6):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._phrases: List[Tuple[str, str, float]] = []
+        self._words: Dict[str, List[Tuple[str, float]]] = {}
+        self._word_trigrams: Dict[str, FrozenSet[str]] = {}
+        self._trigram_index: Dict[str, set] = {}
+        for intent, keywords in INTENT_KEYWORDS.items():
+            for phrase, weight in keywords.items():
+                normalized = _normalize(phrase)
+                if ' ' in normalized:
+                    self._phrases.append((f" {normalized} ", intent, weight))
+                else:
+                    weights = dict(self._words.get(normalized, []))
+                    weights[intent] = max(weights.get(intent, 0.0), weight)
+                    self._words[normalized] = list(weights.items())
+        for word in self._words:
+            grams = _trigrams(word)
+            self._word_trigrams[word] = grams
+            for gram in grams:
+                self._trigram_index.setdefault(gram, set()).add(word)
+        self._products = {
+            product: frozenset(_normalize(k) for k in keywords)
+            for product, keywords in PRODUCT_KEYWORDS.items()
+        }
+        self._urgent = frozenset(_normalize(k) for k in URGENT_KEYWORDS)
+        self._word_cache: Dict[str, List[Tuple[str, float]]] = {}
+
+    def _match_word(self, token: str) -> List[Tuple[str, float]]:
+        cached = self._word_cache.get(token)
+        if cached is not None:
+            return cached
+        exact = self._words.get(token)
+        if exact is not None:
+            matches = exact
+        else:
+            matches = []
+            if len(token) >= 4:
+                grams = _trigrams(token)
+                candidates = set()
+                for gram in grams:
+                    candidates |= self._trigram_index.get(gram, set())
+                best, best_sim = None, 0.0
+                for word in candidates:
+                    other = self._word_trigrams[word]
+                    sim = len(grams & other) / len(grams | other)
+                    if sim > best_sim:
+                        best, best_sim = word, sim
+                if best is not None and best_sim >= self.fuzzy_threshold:
+                    matches = [(intent, weight * best_sim) for intent, weight in self._words[best]]
+        if len(self._word_cache) < 50000:
+            self._word_cache[token] = matches
+        return matches
+
+    def scores(self, message: str) -> Dict[str, float]:
+        """Raw score per intent"""
+        normalized = _normalize(message)
+        padded = f" {normalized} "
+        scores = dict.fromkeys(INTENTS, 0.0)
+        for phrase, intent, weight in self._phrases:
+            if phrase in padded:
+                scores[intent] += weight
+        for token in set(normalized.split()):
+            for intent, weight in self._match_word(token):
+                scores[intent] += weight
+        return scores
+
+    def classify(self, message: str) -> Dict[str, object]:
+        """Intent analysis in the analyze_customer_intent schema plus confidence"""
+        scores = self.scores(message)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        (intent, top), (_, second) = ranked[0], ranked[1]
+        if top <= 0:
+            intent, confidence = 'inquiry', 0.0
+        else:
+            # Margin over the runner-up, damped when the evidence itself is thin
+            confidence = (top - second) / top * min(1.0, top / 1.5)
+
+        tokens = set(_normalize(message).split())
+        products = [p for p, keywords in self._products.items() if tokens & keywords]
+        if intent == 'complaint' or tokens & self._urgent:
+            urgency = 'high'
+        elif intent == 'browse':
+            urgency = 'low'
+        else:
+            urgency = 'medium'
+
+        return {
+            'intent': intent,
+            'products_mentioned': products,
+            'urgency': urgency,
+            'language': detect_language(message),
+            'confidence': round(confidence, 3),
+        }
+
+# Global intent classifier
+intent_classifier = IntentClassifier()
+
+__all__ = ["IntentClassifier", "intent_classifier", "detect_language", "INTENTS"]
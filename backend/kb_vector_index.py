@@ -0,0 +1,339 @@
+"""
+IG-Shop-Agent KB Vector Index
+In-process, memory-mapped vector index over a tenant's KB chunks
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from advanced_config import ProductionConfig
+
+logger = logging.getLogger(__name__)
+
+DTYPES = ('float16', 'int8')
+BLOCK_ROWS = 16384  # Rows normalized/quantized at a time while building
+SCORE_BLOCK_ROWS = 1024  # Rows converted to float32 at a time while scoring; small enough to stay in cache
+MANIFEST = 'manifest.json'
+GENERATION = 'generation'  # Replaced on every KB change; a manifest built for another one is stale
+STALE_BUILD_AGE = 60  # seconds; younger files may belong to a build still being written
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+def read_generation(path: str) -> str:
+    """Current generation of the index directory at path, '' before the first change"""
+    try:
+        with open(os.path.join(path, GENERATION), encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ''
+
+def parse_vector(text: str) -> np.ndarray:
+    """A pgvector text value ('[0.1,0.2,...]') as float32"""
+    return np.array(text[1:-1].split(','), dtype=np.float32)
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def quantize(block: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Stored form of unit vectors: float16, or int8 with one scale per row"""
+    if dtype == 'float16':
+        return block.astype(np.float16), None
+    scales = np.maximum(np.abs(block).max(axis=1), 1e-12) / 127.0
+    return np.round(block / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+def _kmeans(sample: np.ndarray, lists: int, iterations: int, seed: int) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=lists) == 0
+        # Re-seed empty lists so no centroid is wasted
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+@dataclass
+class BuildInfo:
+    rows: int
+    dimensions: int
+    dtype: str
+    lists: int  # 0 for brute force
+    bytes: int
+
+class LocalVectorIndex:
+    """Cosine top-k over one tenant's chunk embeddings, read from memory-mapped files
+
+    Vectors are stored as int8 (one float scale per row) or float16. int8
+    scores several times faster, as NumPy has no fast float16 conversion;
+    float16 keeps more precision. Up
+    to ivf_threshold rows every vector is scored; above it the vectors are
+    clustered into about sqrt(n) lists stored contiguously, and a search
+    scores only the nprobe lists nearest to the query. Every process that
+    opens the same files shares their page cache; that includes the rows
+    (chunk contents), which are decoded only for the hits of a search.
+    """
+
+    def __init__(self, path: str, manifest: Dict[str, Any]):
+        self.path = path
+        self.manifest = manifest
+        build = manifest['build']
+        self.dtype = manifest['dtype']
+        self.vectors = np.load(os.path.join(path, f"{build}-vectors.npy"), mmap_mode='r')
+        self.scales = self._optional(f"{build}-scales.npy")
+        self.centroids = self._optional(f"{build}-centroids.npy")
+        self.offsets = self._optional(f"{build}-offsets.npy")
+        self.ids = np.load(os.path.join(path, f"{build}-ids.npy"), mmap_mode='r')
+        self.generation: str = manifest.get('generation', '')
+        self._rows = np.load(os.path.join(path, f"{build}-rows.npy"), mmap_mode='r')
+        self._row_offsets = np.load(os.path.join(path, f"{build}-row_offsets.npy"), mmap_mode='r')
+
+    def _optional(self, name: str) -> Optional[np.ndarray]:
+        file = os.path.join(self.path, name)
+        return np.load(file, mmap_mode='r') if os.path.exists(file) else None
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """The row stored for vector i"""
+        return json.loads(bytes(self._rows[self._row_offsets[i]:self._row_offsets[i + 1]]))
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        vectors: np.ndarray,
+        rows: Optional[List[Dict[str, Any]]] = None,
+        dtype: str = ProductionConfig.KB_LOCAL_INDEX_DTYPE,
+        ivf_threshold: int = ProductionConfig.KB_LOCAL_IVF_THRESHOLD,
+        seed: int = 7,
+        generation: Optional[str] = None
+    ) -> "LocalVectorIndex":
+        """Write an index for vectors (one per row) under path and open it
+
+        A build writes new files and then swaps the manifest, so processes
+        reading the previous build are never disturbed. A build for a
+        generation that has been replaced meanwhile (its rows were read
+        before a KB change) is returned but not published.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        count, dimensions = vectors.shape
+        build = uuid.uuid4().hex[:12]
+        lists = int(math.sqrt(count)) if count > ivf_threshold else 0
+
+        order = np.arange(count)
+        centroids = offsets = None
+        if lists:
+            rng = np.random.default_rng(seed)
+            sample_ids = np.sort(rng.choice(count, min(count, lists * 32), replace=False))
+            centroids = _kmeans(normalize_rows(vectors[sample_ids]), lists, 10, seed)
+            assign = np.empty(count, dtype=np.int32)
+            for start in range(0, count, BLOCK_ROWS):
+                block = normalize_rows(vectors[start:start + BLOCK_ROWS])
+                assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            order = np.argsort(assign, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=lists))]).astype(np.int64)
+
+        def target(name: str) -> str:
+            return os.path.join(path, f"{build}-{name}.npy")
+
+        stored = np.lib.format.open_memmap(
+            target('vectors'), mode='w+', dtype=np.float16 if dtype == 'float16' else np.int8, shape=(count, dimensions)
+        )
+        scales = np.empty(count, dtype=np.float32) if dtype == 'int8' else None
+        for start in range(0, count, BLOCK_ROWS):
+            block, block_scales = quantize(normalize_rows(vectors[order[start:start + BLOCK_ROWS]]), dtype)
+            stored[start:start + len(block)] = block
+            if scales is not None:
+                scales[start:start + len(block)] = block_scales
+        stored.flush()
+        del stored
+        np.save(target('ids'), order.astype(np.int64))
+        encoded = [json.dumps(row, ensure_ascii=False, default=str).encode('utf-8') for row in rows or [{}] * count]
+        np.save(target('rows'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(target('row_offsets'), np.concatenate([[0], np.cumsum([len(e) for e in encoded])]).astype(np.int64))
+        del encoded
+        if scales is not None:
+            np.save(target('scales'), scales)
+        if lists:
+            np.save(target('centroids'), centroids.astype(np.float32))
+            np.save(target('offsets'), offsets)
+
+        if generation is None:
+            generation = read_generation(path)
+        manifest = {'build': build, 'dtype': dtype, 'count': count, 'lists': lists, 'generation': generation}
+        if read_generation(path) != generation:
+            logger.info(f"Not publishing local index build {build} under {path}: the KB changed while it was built")
+            return cls(path, manifest)
+        partial = os.path.join(path, f"{MANIFEST}.{build}")
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(partial, os.path.join(path, MANIFEST))
+        # Readers keep their mapping of a removed build, so unlinking is safe
+        for name in os.listdir(path):
+            file = os.path.join(path, name)
+            if name not in (MANIFEST, GENERATION) and not name.startswith(build) and time.time() - os.path.getmtime(file) > STALE_BUILD_AGE:
+                os.remove(file)
+        return cls(path, manifest)
+
+    @classmethod
+    def open(cls, path: str, generation: Optional[str] = None) -> Optional["LocalVectorIndex"]:
+        """The published index under path; None when missing or built for another generation"""
+        try:
+            with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if generation is not None and manifest.get('generation') != generation:
+            return None
+        return cls(path, manifest)
+
+    def info(self) -> BuildInfo:
+        size = self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return BuildInfo(len(self), self.vectors.shape[1], self.dtype, self.manifest.get('lists', 0), size)
+
+    def _score(self, start: int, end: int, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(end - start, dtype=np.float32)
+        for a in range(start, end, SCORE_BLOCK_ROWS):
+            b = min(a + SCORE_BLOCK_ROWS, end)
+            scores[a - start:b - start] = self.vectors[a:b].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[start:end]
+        return scores
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = ProductionConfig.KB_LOCAL_IVF_NPROBE) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the k nearest rows, most similar first"""
+        query = normalize_rows(query)
+        if self.centroids is None:
+            ranges = [(0, len(self))]
+        else:
+            probed = _top_k(self.centroids @ query, nprobe)
+            ranges = [(int(self.offsets[i]), int(self.offsets[i + 1])) for i in np.sort(probed)]
+        positions = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.empty(0, dtype=np.int64)
+        scores = np.concatenate([self._score(a, b, query) for a, b in ranges]) if ranges else np.empty(0)
+        top = _top_k(scores, k)
+        return [(int(self.ids[positions[i]]), float(scores[i])) for i in top]
+
+class LocalIndexRegistry:
+    """Per-tenant local indexes under one directory, rebuilt from kb_chunks on demand
+
+    Every KB change replaces the tenant's generation file, which all
+    processes check before using an index; builds that read the chunks
+    before the change are not published.
+    """
+
+    def __init__(
+        self,
+        root: str = ProductionConfig.KB_LOCAL_INDEX_DIR,
+        dtype: str = ProductionConfig.KB_LOCAL_INDEX_DTYPE,
+        ivf_threshold: int = ProductionConfig.KB_LOCAL_IVF_THRESHOLD,
+        nprobe: int = ProductionConfig.KB_LOCAL_IVF_NPROBE
+    ):
+        self.root = root
+        self.dtype = dtype
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._indexes: Dict[str, Tuple[LocalVectorIndex, Tuple[Optional[int], str]]] = {}  # tenant -> (index, (manifest mtime, generation))
+        self._builds: Dict[str, asyncio.Task] = {}
+        self.builds = 0
+
+    def path(self, tenant_id: str) -> str:
+        return os.path.join(self.root, _UNSAFE.sub('_', tenant_id))
+
+    def _manifest_mtime(self, tenant_id: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.path(tenant_id), MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    async def get(self, tenant_id: str, store: Any) -> LocalVectorIndex:
+        """The tenant's index, reopened when another process rebuilt it, built when missing or stale"""
+        generation = read_generation(self.path(tenant_id))
+        mtime = self._manifest_mtime(tenant_id)
+        cached = self._indexes.get(tenant_id)
+        if cached is not None and cached[1] == (mtime, generation):
+            return cached[0]
+        index = LocalVectorIndex.open(self.path(tenant_id), generation) if mtime is not None else None
+        if index is None:
+            task = self._builds.get(tenant_id)
+            if task is None:
+                task = self._builds[tenant_id] = asyncio.create_task(self.build(tenant_id, store, generation))
+
+                def done(finished: asyncio.Task) -> None:
+                    # invalidate() may have already let a newer build take the slot
+                    if self._builds.get(tenant_id) is finished:
+                        del self._builds[tenant_id]
+                task.add_done_callback(done)
+            # A search that runs out of budget must not cancel the build
+            index = await asyncio.shield(task)
+            mtime = self._manifest_mtime(tenant_id)
+        self._indexes[tenant_id] = (index, (mtime, generation))
+        return index
+
+    async def build(self, tenant_id: str, store: Any, generation: Optional[str] = None) -> LocalVectorIndex:
+        """Build a tenant's index from kb_chunks; generation is read before the chunks when not given"""
+        # invalidate() only marks directories that exist, so one is made before the chunks are read
+        os.makedirs(self.path(tenant_id), exist_ok=True)
+        if generation is None:
+            generation = read_generation(self.path(tenant_id))
+        rows, vectors = [], []
+        async for chunk in store.stream_kb_chunk_vectors(tenant_id):
+            for row in chunk:
+                vectors.append(np.asarray(row.pop('embedding'), dtype=np.float32))
+                rows.append(row)
+        matrix = np.stack(vectors) if vectors else np.zeros((0, ProductionConfig.KB_EMBEDDING_DIMENSIONS), np.float32)
+        index = await asyncio.to_thread(
+            LocalVectorIndex.build, self.path(tenant_id), matrix, rows, self.dtype, self.ivf_threshold,
+            generation=generation
+        )
+        self.builds += 1
+        logger.info(f"Built local KB index for tenant {tenant_id}: {len(rows)} chunks ({self.dtype})")
+        return index
+
+    def invalidate(self, tenant_id: str) -> None:
+        """Start a new generation of a tenant's index; the next search (in any process) rebuilds it"""
+        path = self.path(tenant_id)
+        self._indexes.pop(tenant_id, None)
+        # Searches from now on must not wait for a build of the old chunks
+        self._builds.pop(tenant_id, None)
+        if not os.path.isdir(path):
+            return
+        partial = os.path.join(path, f"{GENERATION}.{uuid.uuid4().hex[:12]}")
+        with open(partial, 'w', encoding='utf-8') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(partial, os.path.join(path, GENERATION))
+        try:
+            os.remove(os.path.join(path, MANIFEST))
+        except FileNotFoundError:
+            pass
+
+    async def search(self, tenant_id: str, store: Any, query: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        """Nearest chunks in the same shape as DatabaseService.search_kb_chunks"""
+        index = await self.get(tenant_id, store)
+        if not len(index):
+            return []
+        return [{**index.row(row), 'similarity': score} for row, score in index.search(query, k, self.nprobe)]
+
+__all__ = ["LocalIndexRegistry", "LocalVectorIndex", "normalize_rows", "parse_vector", "quantize", "read_generation"]
@@ -0,0 +1,350 @@
+"""
+IG-Shop-Agent Knowledge Base
+Chunks and embeds tenant KB documents into kb_chunks and retrieves them for replies
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from advanced_config import ProductionConfig
+from kb_vector_index import LocalIndexRegistry, parse_vector
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Takes a batch of texts, returns one vector per text in the same order
+BatchEmbedder = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+BACKENDS = ('pgvector', 'local', 'auto')
+
+_PARAGRAPHS = re.compile(r'\n\s*\n')
+_SENTENCES = re.compile(r'(?<=[.!?؟。\n])\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text with whitespace collapsed, used to reuse embeddings"""
+    return hashlib.sha256(_WHITESPACE.sub(' ', text).strip().encode('utf-8')).hexdigest()
+
+def vector_literal(vector: Sequence[float]) -> str:
+    """pgvector text form of a vector"""
+    return '[' + ','.join(f"{float(x):.7g}" for x in vector) + ']'
+
+def _sentences(text: str) -> List[str]:
+    pieces = []
+    for paragraph in _PARAGRAPHS.split(text):
+        pieces.extend(s.strip() for s in _SENTENCES.split(paragraph) if s.strip())
+    return pieces
+
+def chunk_text(
+    text: str,
+    max_tokens: int = ProductionConfig.KB_CHUNK_TOKENS,
+    overlap_tokens: int = ProductionConfig.KB_CHUNK_OVERLAP_TOKENS
+) -> List[str]:
+    """Split a document into chunks of whole sentences of up to max_tokens
+
+    Each chunk starts with the last sentences of the previous one, up to
+    overlap_tokens, so an answer split across a boundary is still found.
+    A single sentence longer than max_tokens becomes a chunk of its own.
+    """
+    chunks: List[str] = []
+    current: List[Tuple[str, int]] = []
+    size = 0
+    for sentence in _sentences(text):
+        tokens = count_tokens(sentence)
+        if current and size + tokens > max_tokens:
+            chunks.append(' '.join(s for s, _ in current).strip())
+            carried, size = [], 0
+            for s, t in reversed(current):
+                if size + t > overlap_tokens:
+                    break
+                carried.insert(0, (s, t))
+                size += t
+            current = carried
+        current.append((sentence, tokens))
+        size += tokens
+    if current:
+        chunks.append(' '.join(s for s, _ in current).strip())
+    return chunks
+
+class OpenAIEmbedder:
+    """Batched embeddings from the first configured OpenAI/Azure deployment"""
+
+    def __init__(self, model: str = ProductionConfig.KB_EMBEDDING_DEPLOYMENT):
+        self.model = model
+        self._client = None
+        self._http_client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            from llm_router import build_client
+            self._http_client = httpx.AsyncClient(timeout=ProductionConfig.AI_REQUEST_TIMEOUT)
+            self._client = build_client(ProductionConfig.get_llm_deployments()[0], self._http_client)
+        return self._client
+
+    async def __call__(self, texts: List[str]) -> List[List[float]]:
+        response = await self._get_client().embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def close(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._client = self._http_client = None
+
+@dataclass
+class IndexResult:
+    document_id: str
+    chunks: int
+    embedded: int  # Chunks whose embedding was requested
+    reused: int  # Chunks whose embedding was already stored or repeated in the batch
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'document_id': self.document_id, 'chunks': self.chunks, 'embedded': self.embedded,
+                'reused': self.reused}
+
+class KnowledgeBase:
+    """Indexes KB documents into kb_chunks and retrieves the closest chunks
+
+    Embedding requests are batched and deduplicated by content hash, both
+    within an indexing run and against chunks already stored. Retrieval in
+    the reply path is bounded by a latency budget: when embedding the
+    question or searching takes longer, the reply goes on without KB
+    context.
+
+    Searches go to pgvector, or to the in-process index of
+    kb_vector_index (backend 'local'); 'auto' uses the local index for
+    tenants small enough that the database round trip dominates. Without
+    the pgvector extension, tenants the local index does not serve get no
+    vector search; hybrid_retrieval then ranks their chunks lexically.
+    """
+
+    def __init__(
+        self,
+        store: Any = None,
+        embedder: Optional[BatchEmbedder] = None,
+        batch_size: int = ProductionConfig.KB_EMBEDDING_BATCH_SIZE,
+        top_k: int = ProductionConfig.KB_TOP_K,
+        max_context_tokens: int = ProductionConfig.KB_MAX_CONTEXT_TOKENS,
+        min_similarity: float = ProductionConfig.KB_MIN_SIMILARITY,
+        ef_search: int = ProductionConfig.KB_HNSW_EF_SEARCH,
+        budget: float = ProductionConfig.KB_RETRIEVAL_BUDGET,
+        query_cache_size: int = ProductionConfig.KB_QUERY_CACHE_SIZE,
+        tenant_state_ttl: float = ProductionConfig.KB_TENANT_STATE_TTL,
+        backend: str = ProductionConfig.KB_VECTOR_BACKEND,
+        local_max_chunks: int = ProductionConfig.KB_LOCAL_INDEX_MAX_CHUNKS,
+        local_indexes: Optional[LocalIndexRegistry] = None
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown KB vector backend: {backend}")
+        self._store = store
+        self.embedder = embedder or OpenAIEmbedder()
+        self.batch_size = batch_size
+        self.top_k = top_k
+        self.max_context_tokens = max_context_tokens
+        self.min_similarity = min_similarity
+        self.ef_search = ef_search
+        self.budget = budget
+        self.query_cache_size = query_cache_size
+        self.tenant_state_ttl = tenant_state_ttl
+        self.backend = backend
+        self.local_max_chunks = local_max_chunks
+        self.local_indexes = local_indexes or LocalIndexRegistry()
+        self._query_vectors: "OrderedDict[str, str]" = OrderedDict()
+        self._chunk_counts: Dict[str, Tuple[int, float]] = {}  # tenant -> (chunks, checked at)
+        self._metrics = {'retrievals': 0, 'hits': 0, 'timeouts': 0, 'errors': 0, 'skipped_empty': 0,
+                         'local_searches': 0, 'pgvector_searches': 0, 'no_pgvector': 0,
+                         'embedding_requests': 0, 'embedded_texts': 0, 'reused_embeddings': 0}
+        self._latencies: List[float] = []
+        self._listeners: List[Callable[[str], None]] = []
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    async def embed_vectors(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings of texts, one request per batch_size texts"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            result = await self.embedder(batch)
+            if len(result) != len(batch):
+                raise ValueError(f"Embedder returned {len(result)} vectors for {len(batch)} texts")
+            self._metrics['embedding_requests'] += 1
+            self._metrics['embedded_texts'] += len(batch)
+            vectors.extend(result)
+        return vectors
+
+    async def embed(self, texts: List[str]) -> List[str]:
+        """Embeddings of texts in pgvector text form"""
+        return [vector_literal(v) for v in await self.embed_vectors(texts)]
+
+    async def index_documents(self, tenant_id: str, documents: List[Dict[str, Any]]) -> List[IndexResult]:
+        """Store documents ({'title', 'content', optional 'id'}) and (re)index their chunks
+
+        Every chunk of every document is hashed first, so a text repeated
+        across documents or already embedded for any document is embedded
+        once. Documents are only written once all embeddings are in hand.
+        """
+        store = await self._get_store()
+        prepared = [
+            (document, [(chunk, content_hash(chunk)) for chunk in chunk_text(document['content'])])
+            for document in documents
+        ]
+
+        hashes = list({h for _, chunks in prepared for _, h in chunks})
+        known = await store.fetch_kb_embeddings(hashes) if hashes else {}
+        missing: Dict[str, str] = {}
+        for _, chunks in prepared:
+            for text, h in chunks:
+                if h not in known:
+                    missing.setdefault(h, text)
+        if missing:
+            known.update(zip(missing, await self.embed(list(missing.values()))))
+
+        results = []
+        for document, chunks in prepared:
+            document_id = await store.upsert_kb_document(
+                tenant_id, document['title'], document['content'], document.get('id')
+            )
+            rows = [(i, text, h, count_tokens(text), known[h]) for i, (text, h) in enumerate(chunks)]
+            await store.replace_kb_chunks(tenant_id, document_id, rows)
+            embedded = sum(1 for _, h in chunks if missing.pop(h, None) is not None)
+            results.append(IndexResult(document_id, len(chunks), embedded, len(chunks) - embedded))
+            self._metrics['reused_embeddings'] += len(chunks) - embedded
+        self._forget(tenant_id)
+        logger.info(f"Indexed {len(results)} KB documents for tenant {tenant_id}: "
+                    f"{sum(r.chunks for r in results)} chunks, {sum(r.embedded for r in results)} embedded")
+        return results
+
+    async def index_document(
+        self,
+        tenant_id: str,
+        title: str,
+        content: str,
+        document_id: Optional[str] = None
+    ) -> IndexResult:
+        return (await self.index_documents(tenant_id, [{'id': document_id, 'title': title, 'content': content}]))[0]
+
+    async def delete_document(self, tenant_id: str, document_id: str) -> bool:
+        store = await self._get_store()
+        deleted = await store.delete_kb_document(tenant_id, document_id)
+        if deleted:
+            self._forget(tenant_id)
+        return deleted
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """Register a callback for KB changes, called with the tenant id"""
+        self._listeners.append(callback)
+
+    def _forget(self, tenant_id: str) -> None:
+        """Drop what was derived from a tenant's old KB, cached replies included"""
+        from response_cache import response_cache
+        self._chunk_counts.pop(tenant_id, None)
+        self.local_indexes.invalidate(tenant_id)
+        response_cache.invalidate(tenant_id)
+        for callback in self._listeners:
+            try:
+                callback(tenant_id)
+            except Exception as e:
+                logger.error(f"KB change listener failed for tenant {tenant_id}: {e}")
+
+    async def _chunk_count(self, store: Any, tenant_id: str) -> int:
+        state = self._chunk_counts.get(tenant_id)
+        if state is None or time.monotonic() - state[1] > self.tenant_state_ttl:
+            state = (await store.count_kb_chunks(tenant_id), time.monotonic())
+            self._chunk_counts[tenant_id] = state
+        return state[0]
+
+    def _use_local(self, chunks: int) -> bool:
+        return self.backend == 'local' or (self.backend == 'auto' and chunks <= self.local_max_chunks)
+
+    async def query_vector(self, query: str) -> str:
+        """Embedding of a query in pgvector text form, from an LRU cache when asked before"""
+        key = content_hash(query)
+        vector = self._query_vectors.get(key)
+        if vector is not None:
+            self._query_vectors.move_to_end(key)
+            return vector
+        vector = (await self.embed([query]))[0]
+        self._query_vectors[key] = vector
+        if len(self._query_vectors) > self.query_cache_size:
+            self._query_vectors.popitem(last=False)
+        return vector
+
+    async def search(self, tenant_id: str, query: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Closest chunks of a tenant's KB to a query, most similar first"""
+        store = await self._get_store()
+        chunks = await self._chunk_count(store, tenant_id)
+        if not chunks:
+            self._metrics['skipped_empty'] += 1
+            return []
+        if self._use_local(chunks):
+            self._metrics['local_searches'] += 1
+            vector = await self.query_vector(query)
+            return await self.local_indexes.search(tenant_id, store, parse_vector(vector), k or self.top_k)
+        if not await store.pgvector_version():
+            self._metrics['no_pgvector'] += 1
+            return []
+        self._metrics['pgvector_searches'] += 1
+        vector = await self.query_vector(query)
+        return await store.search_kb_chunks(tenant_id, vector, k or self.top_k, self.ef_search)
+
+    async def retrieve(self, tenant_id: Optional[str], query: str) -> List[Dict[str, Any]]:
+        """Relevant chunks for a reply within the latency budget; [] when none, slow or failing"""
+        if not tenant_id or not ProductionConfig.KB_RETRIEVAL_ENABLED:
+            return []
+        self._metrics['retrievals'] += 1
+        started = time.perf_counter()
+        try:
+            chunks = await asyncio.wait_for(self.search(tenant_id, query), self.budget)
+        except asyncio.TimeoutError:
+            self._metrics['timeouts'] += 1
+            logger.warning(f"KB retrieval for tenant {tenant_id} exceeded {self.budget * 1000:.0f}ms")
+            return []
+        except Exception as e:
+            self._metrics['errors'] += 1
+            logger.warning(f"KB retrieval for tenant {tenant_id} failed: {e}")
+            return []
+        finally:
+            self._latencies = (self._latencies + [time.perf_counter() - started])[-500:]
+
+        selected, tokens = [], 0
+        for chunk in chunks:
+            if chunk['similarity'] < self.min_similarity:
+                break
+            if tokens + chunk['token_count'] > self.max_context_tokens:
+                break
+            selected.append(chunk)
+            tokens += chunk['token_count']
+        if selected:
+            self._metrics['hits'] += 1
+        return selected
+
+    async def close(self) -> None:
+        """Release the embedder's HTTP client (shutdown hook)"""
+        close = getattr(self.embedder, 'close', None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            **self._metrics,
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if len(latencies) >= 20 else None,
+            'query_cache': len(self._query_vectors),
+            'local_index_builds': self.local_indexes.builds,
+        }
+
+# Global knowledge base
+knowledge_base = KnowledgeBase()
+
+__all__ = ["IndexResult", "KnowledgeBase", "OpenAIEmbedder", "chunk_text", "content_hash", "knowledge_base",
+           "vector_literal"]
@@ -0,0 +1,376 @@
+"""
+IG-Shop-Agent LLM Router
+Routes completions across several deployments with latency tracking, circuit breaking and hedging
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set
+
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncAzureOpenAI, AsyncOpenAI
+
+from advanced_config import ProductionConfig
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+class NoDeploymentAvailable(Exception):
+    """Every deployment is open, throttled or already tried"""
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether another deployment may succeed where this one failed"""
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (APIConnectionError, asyncio.TimeoutError))
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay requested by a 429/503 response, capped at AI_RETRY_AFTER_MAX"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            delay = float(headers['retry-after-ms']) / 1000
+        elif headers.get('retry-after'):
+            value = headers['retry-after']
+            try:
+                delay = float(value)
+            except ValueError:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return min(max(delay, 0.0), ProductionConfig.AI_RETRY_AFTER_MAX)
+
+@dataclass
+class Completion:
+    """Completion text with the deployment that produced it and its token usage"""
+    text: str
+    deployment: str
+    tier: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+class Deployment:
+    """One LLM backend and its rolling health"""
+
+    def __init__(self, name: str, client: Any, model: str, tier: str = 'large',
+                 window: int = ProductionConfig.AI_ROUTER_WINDOW,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.tier = tier
+        self._clock = clock
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self.throttled_until = 0.0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+
+    def available(self) -> bool:
+        """Accepts traffic now (half-open circuits admit a single probe)"""
+        now = self._clock()
+        if now < self.throttled_until:
+            return False
+        if self.state == OPEN and now >= self.opened_until:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.probing
+        return self.state == CLOSED
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self) -> float:
+        """Expected cost of sending a call here; unmeasured deployments score 0 so they get sampled"""
+        p50 = self.percentile(0.5) or 0.0
+        return p50 * (1 + self.in_flight) * (1 + 4 * self.error_rate())
+
+    def record_success(self, latency: Optional[float]) -> None:
+        if latency is not None:
+            self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info(f"LLM deployment {self.name} recovered, closing circuit")
+            self.state = CLOSED
+            self.outcomes.clear()
+            self.outcomes.append(True)
+
+    def record_failure(self, error: BaseException) -> None:
+        self.failures += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        delay = retry_after_seconds(error)
+        if delay:
+            self.throttled_until = self._clock() + delay
+            logger.warning(f"LLM deployment {self.name} throttled for {delay:.1f}s")
+        too_many = self.consecutive_failures >= ProductionConfig.AI_CIRCUIT_FAILURE_THRESHOLD
+        too_often = (len(self.outcomes) >= ProductionConfig.AI_CIRCUIT_MIN_SAMPLES
+                     and self.error_rate() >= ProductionConfig.AI_CIRCUIT_ERROR_RATE)
+        if self.state == HALF_OPEN or too_many or too_often:
+            self.state = OPEN
+            self.opened_until = self._clock() + ProductionConfig.AI_CIRCUIT_COOLDOWN
+            logger.warning(f"LLM deployment {self.name} circuit opened: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tier': self.tier,
+            'state': self.state,
+            'requests': self.requests,
+            'failures': self.failures,
+            'error_rate': round(self.error_rate(), 3),
+            'p50_ms': round((self.percentile(0.5) or 0) * 1000, 1),
+            'p95_ms': round((self.percentile(0.95) or 0) * 1000, 1),
+            'in_flight': self.in_flight,
+            'throttled': self._clock() < self.throttled_until,
+        }
+
+def build_client(config: Dict[str, Any], http_client: httpx.AsyncClient) -> Any:
+    """OpenAI SDK client for a deployment config; retries are left to the router"""
+    if config.get('kind', 'azure') == 'azure':
+        return AsyncAzureOpenAI(
+            azure_endpoint=config['endpoint'],
+            api_key=config['api_key'],
+            api_version=config.get('api_version', ProductionConfig.AZURE_OPENAI_API_VERSION),
+            http_client=http_client,
+            max_retries=0
+        )
+    return AsyncOpenAI(
+        api_key=config.get('api_key'),
+        base_url=config.get('endpoint'),
+        http_client=http_client,
+        max_retries=0
+    )
+
+class LLMRouter:
+    """Sends each completion to the healthiest deployment
+
+    Failed calls fail over to the next deployment, slow calls are hedged
+    once they pass the primary's p95 latency, circuits open on repeated
+    errors, and Retry-After pauses a throttled deployment.
+    """
+
+    def __init__(self, deployments: List[Deployment]):
+        if not deployments:
+            raise ValueError("LLMRouter needs at least one deployment")
+        self.deployments = deployments
+        self.completions = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @classmethod
+    def from_config(cls, configs: List[Dict[str, Any]], http_client: httpx.AsyncClient) -> "LLMRouter":
+        return cls([
+            Deployment(
+                config.get('name') or f"deployment-{i}",
+                build_client(config, http_client),
+                config['model'],
+                config.get('tier', 'large')
+            )
+            for i, config in enumerate(configs)
+        ])
+
+    def tiers(self) -> Set[str]:
+        return {d.tier for d in self.deployments}
+
+    def _pick(self, exclude: Set[Deployment], tier: Optional[str] = None) -> Optional[Deployment]:
+        candidates = [d for d in self.deployments if d not in exclude and d.available()]
+        if tier is not None:
+            # Another tier still beats the fallback reply when this one is down
+            candidates = [d for d in candidates if d.tier == tier] or candidates
+        if not candidates:
+            return None
+        best = min(d.score() for d in candidates)
+        # Randomize among near-equal deployments so warm-up traffic spreads out
+        near = [d for d in candidates if d.score() <= best * 1.1]
+        return random.choice(near)
+
+    def _hedge_delay(self, deployment: Deployment) -> Optional[float]:
+        if not ProductionConfig.AI_HEDGE_ENABLED or len(self.deployments) < 2:
+            return None
+        if self.hedges >= ProductionConfig.AI_HEDGE_MAX_RATIO * max(self.completions, 1):
+            return None
+        if len(deployment.latencies) < ProductionConfig.AI_CIRCUIT_MIN_SAMPLES:
+            return ProductionConfig.AI_HEDGE_DEFAULT_DELAY
+        return max(deployment.percentile(ProductionConfig.AI_HEDGE_PERCENTILE), ProductionConfig.AI_HEDGE_MIN_DELAY)
+
+    async def _attempt(self, deployment: Deployment, **kwargs) -> Completion:
+        deployment.requests += 1
+        deployment.in_flight += 1
+        probe = deployment.state == HALF_OPEN
+        deployment.probing = deployment.probing or probe
+        started = time.perf_counter()
+        try:
+            response = await deployment.client.chat.completions.create(model=deployment.model, **kwargs)
+            deployment.record_success(time.perf_counter() - started)
+            usage = getattr(response, 'usage', None)
+            return Completion(
+                text=response.choices[0].message.content.strip(),
+                deployment=deployment.name,
+                tier=deployment.tier,
+                prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+                completion_tokens=getattr(usage, 'completion_tokens', 0) or 0
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                deployment.record_failure(e)
+            raise
+        finally:
+            deployment.in_flight -= 1
+            if probe:
+                deployment.probing = False
+
+    async def complete(self, messages: List[Dict], tier: Optional[str] = None, **kwargs) -> str:
+        """Chat completion text from the first deployment to answer"""
+        return (await self.complete_detailed(messages, tier, **kwargs)).text
+
+    async def complete_detailed(self, messages: List[Dict], tier: Optional[str] = None, **kwargs) -> Completion:
+        """Like complete(), with the serving deployment and token usage"""
+        self.completions += 1
+        tried: Set[Deployment] = set()
+        pending: Dict[asyncio.Task, Deployment] = {}
+        hedged: Set[asyncio.Task] = set()
+        last_error: Optional[BaseException] = None
+
+        def launch() -> Optional[asyncio.Task]:
+            if len(tried) >= ProductionConfig.AI_ROUTER_MAX_ATTEMPTS:
+                return None
+            deployment = self._pick(tried, tier)
+            if deployment is None:
+                return None
+            tried.add(deployment)
+            task = asyncio.create_task(self._attempt(deployment, messages=messages, **kwargs))
+            pending[task] = deployment
+            return task
+
+        try:
+            if launch() is None:
+                raise NoDeploymentAvailable("No LLM deployment is available")
+            while pending:
+                primary = next(iter(pending.values()))
+                delay = self._hedge_delay(primary) if len(pending) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge = launch()
+                    if hedge is not None:
+                        hedged.add(hedge)
+                        self.hedges += 1
+                        logger.info(f"Hedging slow LLM call on {primary.name} after {delay:.2f}s")
+                    else:
+                        await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                for task in done:
+                    deployment = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if task in hedged:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = error
+                    if not is_retryable(error):
+                        raise error
+                    logger.warning(f"LLM deployment {deployment.name} failed: {error}")
+                if not pending and launch() is not None:
+                    self.failovers += 1
+            raise last_error or NoDeploymentAvailable("No LLM deployment is available")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(
+        self,
+        messages: List[Dict],
+        tier: Optional[str] = None,
+        on_served: Optional[Callable[[Deployment], None]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream content deltas; fails over only until the first token is sent
+
+        on_served is called with the deployment that produced the stream, once
+        it can no longer fail over, so callers can account the tier actually used.
+        """
+        tried: Set[Deployment] = set()
+        last_error: Optional[BaseException] = None
+        while len(tried) < ProductionConfig.AI_ROUTER_MAX_ATTEMPTS:
+            deployment = self._pick(tried, tier)
+            if deployment is None:
+                break
+            tried.add(deployment)
+            deployment.requests += 1
+            deployment.in_flight += 1
+            probe = deployment.state == HALF_OPEN
+            deployment.probing = deployment.probing or probe
+            started = time.perf_counter()
+            sent = False
+            try:
+                stream = await deployment.client.chat.completions.create(
+                    model=deployment.model, messages=messages, stream=True, **kwargs
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if not sent:
+                            # Time to first token is what a streaming caller waits on
+                            deployment.record_success(time.perf_counter() - started)
+                            sent = True
+                            if on_served:
+                                on_served(deployment)
+                        yield chunk.choices[0].delta.content
+                if not sent:
+                    deployment.record_success(None)
+                    if on_served:
+                        on_served(deployment)
+                return
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                deployment.record_failure(e)
+                if sent:
+                    raise
+                last_error = e
+                logger.warning(f"LLM deployment {deployment.name} failed before streaming: {e}")
+            finally:
+                deployment.in_flight -= 1
+                if probe:
+                    deployment.probing = False
+        raise last_error or NoDeploymentAvailable("No LLM deployment is available")
+
+    def stats(self) -> Dict[str, Any]:
+        """Router counters and per-deployment health"""
+        return {
+            'completions': self.completions,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'failovers': self.failovers,
+            'deployments': {d.name: d.stats() for d in self.deployments},
+        }
+
+    async def close(self) -> None:
+        for deployment in self.deployments:
+            await deployment.client.close()
+
+__all__ = ["LLMRouter", "Deployment", "Completion", "NoDeploymentAvailable", "build_client", "is_retryable"]
@@ -0,0 +1,189 @@
+"""
+IG-Shop-Agent LLM Scheduler
+Weighted fair queueing of LLM calls across tenants under a global concurrency cap
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from advanced_config import ProductionConfig
+
+logger = logging.getLogger(__name__)
+
+# Resolves a tenant's plan name (None when unknown)
+PlanResolver = Callable[[str], Awaitable[Optional[str]]]
+
+ANONYMOUS_TENANT = '_anonymous'
+
+class SchedulerQueueFull(Exception):
+    """A tenant already has AI_SCHEDULER_MAX_QUEUE_PER_TENANT calls waiting"""
+
+async def tenant_plan(tenant_id: str) -> Optional[str]:
+    """Plan of a tenant from users.plan (migration 0007)"""
+    from database import get_db_connection
+    db = await get_db_connection()
+    return await db.get_tenant_plan(tenant_id)
+
+@dataclass
+class TenantQueue:
+    """Waiting calls of one tenant with its virtual finish time"""
+    weight: float = ProductionConfig.AI_SCHEDULER_DEFAULT_WEIGHT
+    weight_loaded_at: float = float('-inf')
+    last_finish: float = 0.0
+    waiting: Deque[Tuple[float, asyncio.Future, float]] = field(default_factory=deque)
+    in_flight: int = 0
+    dispatched: int = 0
+    rejected: int = 0
+    wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=ProductionConfig.AI_SCHEDULER_METRICS_WINDOW))
+
+class FairScheduler:
+    """Per-tenant queues drained in weighted fair order
+
+    Each queued call gets a virtual finish tag of max(virtual clock, the
+    tenant's previous tag) + 1/weight, and a freed slot goes to the lowest
+    tag. A tenant flooding the queue only delays its own later calls, and
+    backlogged tenants share capacity in proportion to their plan weight.
+    """
+
+    def __init__(
+        self,
+        capacity: int = ProductionConfig.AI_MAX_CONCURRENT_REQUESTS,
+        plan_resolver: Optional[PlanResolver] = tenant_plan,
+        plan_weights: Optional[Dict[str, float]] = None,
+        max_queue_per_tenant: int = ProductionConfig.AI_SCHEDULER_MAX_QUEUE_PER_TENANT,
+        weight_ttl: float = ProductionConfig.AI_SCHEDULER_WEIGHT_TTL
+    ):
+        self.capacity = capacity
+        self.plan_resolver = plan_resolver
+        self.plan_weights = plan_weights or ProductionConfig.AI_PLAN_WEIGHTS
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.weight_ttl = weight_ttl
+        self.active = 0
+        self._queued = 0
+        self._virtual_time = 0.0
+        self._tenants: Dict[str, TenantQueue] = {}
+
+    def _tenant(self, tenant_id: str) -> TenantQueue:
+        queue = self._tenants.get(tenant_id)
+        if queue is None:
+            queue = self._tenants[tenant_id] = TenantQueue()
+        return queue
+
+    async def _refresh_weight(self, tenant_id: str, queue: TenantQueue) -> None:
+        now = time.monotonic()
+        if self.plan_resolver is None or tenant_id == ANONYMOUS_TENANT or now - queue.weight_loaded_at < self.weight_ttl:
+            return
+        queue.weight_loaded_at = now
+        try:
+            plan = await self.plan_resolver(tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not resolve plan for tenant {tenant_id}: {e}")
+            return
+        queue.weight = self.plan_weights.get(plan, ProductionConfig.AI_SCHEDULER_DEFAULT_WEIGHT)
+
+    def set_weight(self, tenant_id: str, weight: float) -> None:
+        """Pin a tenant's weight (skips plan lookups until the TTL expires)"""
+        queue = self._tenant(tenant_id)
+        queue.weight = weight
+        queue.weight_loaded_at = time.monotonic()
+
+    def queued(self) -> int:
+        return self._queued
+
+    async def acquire(self, tenant_id: Optional[str]) -> None:
+        """Wait for a slot; tenants are served in weighted fair order"""
+        tenant_id = tenant_id or ANONYMOUS_TENANT
+        queue = self._tenant(tenant_id)
+        await self._refresh_weight(tenant_id, queue)
+
+        if self.active < self.capacity and not self._queued:
+            self._grant(queue, 0.0)
+            return
+        if len(queue.waiting) >= self.max_queue_per_tenant:
+            queue.rejected += 1
+            raise SchedulerQueueFull(f"LLM queue full for tenant {tenant_id}")
+
+        queue.last_finish = max(self._virtual_time, queue.last_finish) + 1 / queue.weight
+        future = asyncio.get_running_loop().create_future()
+        entry = (queue.last_finish, future, time.perf_counter())
+        queue.waiting.append(entry)
+        self._queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted between the dispatch and this wakeup; hand the slot on
+                self.release(tenant_id)
+            else:
+                try:
+                    queue.waiting.remove(entry)
+                    self._queued -= 1
+                except ValueError:
+                    pass
+            raise
+
+    def _grant(self, queue: TenantQueue, waited: float) -> None:
+        self.active += 1
+        queue.in_flight += 1
+        queue.dispatched += 1
+        queue.wait_times.append(waited)
+
+    def release(self, tenant_id: Optional[str]) -> None:
+        """Free a slot and hand it to the waiting call with the lowest tag"""
+        queue = self._tenants.get(tenant_id or ANONYMOUS_TENANT)
+        if queue is not None:
+            queue.in_flight -= 1
+        self.active -= 1
+        while self.active < self.capacity:
+            head = None
+            for candidate in self._tenants.values():
+                if candidate.waiting and (head is None or candidate.waiting[0][0] < head.waiting[0][0]):
+                    head = candidate
+            if head is None:
+                return
+            tag, future, enqueued_at = head.waiting.popleft()
+            self._queued -= 1
+            if future.cancelled():
+                continue
+            self._virtual_time = tag
+            self._grant(head, time.perf_counter() - enqueued_at)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: Optional[str]) -> AsyncIterator[None]:
+        """Hold one LLM concurrency slot for the duration of a call"""
+        await self.acquire(tenant_id)
+        try:
+            yield
+        finally:
+            self.release(tenant_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Global and per-tenant queue depth, in-flight calls and wait times"""
+        tenants = {}
+        for tenant_id, queue in self._tenants.items():
+            waits = sorted(queue.wait_times)
+            tenants[tenant_id] = {
+                'weight': queue.weight,
+                'queued': len(queue.waiting),
+                'in_flight': queue.in_flight,
+                'dispatched': queue.dispatched,
+                'rejected': queue.rejected,
+                'wait_p50_ms': round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                'wait_p95_ms': round(waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000, 1) if waits else 0.0,
+            }
+        return {
+            'capacity': self.capacity,
+            'active': self.active,
+            'queued': self.queued(),
+            'tenants': tenants,
+        }
+
+# Global LLM scheduler
+llm_scheduler = FairScheduler()
+
+__all__ = ["FairScheduler", "SchedulerQueueFull", "llm_scheduler", "tenant_plan"]
@@ -0,0 +1,170 @@
+"""
+IG-Shop-Agent Message Coalescer
+Merges bursts of consecutive customer messages into a single LLM turn
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from advanced_config import ProductionConfig
+
+logger = logging.getLogger(__name__)
+
+# Answers one merged turn: (tenant_id, customer, message, **kwargs) -> result
+TurnHandler = Callable[..., Awaitable[Any]]
+
+# Stores one raw message as it arrives: (tenant_id, customer, message)
+MessageRecorder = Callable[[str, str, str], Awaitable[None]]
+
+async def _pipeline_handler(tenant_id: str, customer: str, message: str, **kwargs) -> Any:
+    from message_pipeline import message_pipeline
+    # Every raw message was recorded by submit(); the merged text must not be stored again
+    return await message_pipeline.handle(tenant_id, message, customer, record_message=False, **kwargs)
+
+async def _pipeline_recorder(tenant_id: str, customer: str, message: str) -> None:
+    from message_pipeline import message_pipeline
+    await message_pipeline.record_inbound(tenant_id, customer, message)
+
+@dataclass
+class PendingConversation:
+    """Messages of one thread waiting for, or being answered by, a turn"""
+    messages: List[str] = field(default_factory=list)
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    first_at: float = 0.0
+    timer: Optional[asyncio.TimerHandle] = None
+    generation: Optional[asyncio.Task] = None
+    in_flight: Tuple[List[str], List[asyncio.Future], float] = ([], [], 0.0)
+
+class MessageCoalescer:
+    """Per-conversation debounce in front of reply generation
+
+    Every message restarts the thread's window; when it elapses the
+    buffered messages go to the LLM as one turn. A message that arrives
+    while that turn is still generating cancels it and is answered together
+    with the messages it superseded, so replies never arrive out of order.
+    The caller of the last message gets the result, earlier callers get None.
+    Each message is recorded once, on arrival, however many turns cover it.
+    """
+
+    def __init__(
+        self,
+        handler: TurnHandler = _pipeline_handler,
+        window: float = ProductionConfig.AI_COALESCE_WINDOW,
+        max_wait: float = ProductionConfig.AI_COALESCE_MAX_WAIT,
+        recorder: Optional[MessageRecorder] = _pipeline_recorder
+    ):
+        self.handler = handler
+        self.recorder = recorder
+        self.window = window
+        self.max_wait = max_wait
+        self._windows: Dict[str, float] = {}
+        self._conversations: Dict[Tuple[str, str], PendingConversation] = {}
+        self._metrics: Dict[str, int] = {'messages': 0, 'llm_calls': 0, 'superseded': 0}
+
+    def set_window(self, tenant_id: str, window: Optional[float]) -> None:
+        """Override a tenant's debounce window in seconds (None restores the default)"""
+        if window is None:
+            self._windows.pop(tenant_id, None)
+        else:
+            self._windows[tenant_id] = max(0.0, window)
+
+    def window_for(self, tenant_id: str) -> float:
+        return self._windows.get(tenant_id, self.window)
+
+    async def submit(self, tenant_id: str, customer: str, message: str, **kwargs) -> Optional[Any]:
+        """Queue a message; resolves once the turn covering it is answered"""
+        if self.recorder is not None:
+            await self.recorder(tenant_id, customer, message)
+        key = (tenant_id, customer)
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            conversation = self._conversations[key] = PendingConversation()
+        now = time.monotonic()
+        self._metrics['messages'] += 1
+
+        if conversation.generation is not None and not conversation.generation.done():
+            # The running turn is stale now; answer its messages with this one
+            conversation.generation.cancel()
+            self._metrics['superseded'] += 1
+            messages, waiters, first_at = conversation.in_flight
+            conversation.messages = messages + conversation.messages
+            conversation.waiters = waiters + conversation.waiters
+            conversation.first_at = first_at
+            conversation.generation = None
+        if not conversation.messages:
+            conversation.first_at = now
+
+        future = asyncio.get_running_loop().create_future()
+        conversation.messages.append(message)
+        conversation.waiters.append(future)
+        conversation.kwargs = kwargs
+
+        if conversation.timer is not None:
+            conversation.timer.cancel()
+        waited = now - conversation.first_at
+        delay = max(0.0, min(self.window_for(tenant_id), self.max_wait - waited))
+        conversation.timer = asyncio.get_running_loop().call_later(delay, self._start_turn, key)
+        return await future
+
+    def _start_turn(self, key: Tuple[str, str]) -> None:
+        conversation = self._conversations.get(key)
+        if conversation is None or not conversation.messages:
+            return
+        conversation.timer = None
+        batch = (conversation.messages, conversation.waiters, conversation.first_at)
+        conversation.messages, conversation.waiters = [], []
+        conversation.in_flight = batch
+        self._metrics['llm_calls'] += 1
+        conversation.generation = asyncio.create_task(self._run_turn(key, conversation, batch))
+
+    async def _run_turn(
+        self,
+        key: Tuple[str, str],
+        conversation: PendingConversation,
+        batch: Tuple[List[str], List[asyncio.Future], float]
+    ) -> None:
+        messages, waiters, _ = batch
+        tenant_id, customer = key
+        try:
+            result = await self.handler(tenant_id, customer, '\n'.join(messages), **conversation.kwargs)
+        except asyncio.CancelledError:
+            # Superseded: submit() already moved this batch into the next turn
+            return
+        except Exception as e:
+            logger.error(f"Coalesced turn failed for {tenant_id}/{customer}: {e}")
+            self._resolve(waiters, error=e)
+        else:
+            self._resolve(waiters, result=result)
+        if conversation.generation is asyncio.current_task():
+            conversation.generation = None
+            conversation.in_flight = ([], [], 0.0)
+        if not conversation.messages and conversation.generation is None:
+            self._conversations.pop(key, None)
+
+    @staticmethod
+    def _resolve(waiters: List[asyncio.Future], result: Any = None, error: Optional[Exception] = None) -> None:
+        for waiter in waiters[:-1]:
+            if not waiter.done():
+                waiter.set_result(None)
+        last = waiters[-1]
+        if not last.done():
+            if error is not None:
+                last.set_exception(error)
+            else:
+                last.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Messages received, LLM turns started and calls saved by coalescing"""
+        return {
+            **self._metrics,
+            'calls_saved': self._metrics['messages'] - self._metrics['llm_calls'],
+            'pending_conversations': len(self._conversations),
+        }
+
+# Global message coalescer
+message_coalescer = MessageCoalescer()
+
+__all__ = ["MessageCoalescer", "message_coalescer"]
@@ -0,0 +1,178 @@
+"""
+IG-Shop-Agent Message Pipeline
+Runs intent analysis, context fetches and reply generation for one message concurrently
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+from advanced_config import ProductionConfig
+from catalog_index import catalog_indexes
+from catalog_search import catalog_search
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class StageTimings:
+    """Wall time of each stage in milliseconds (stages overlap, so they do not sum to total)"""
+    intent_ms: float = 0.0
+    catalog_ms: float = 0.0
+    context_ms: float = 0.0
+    reply_ms: float = 0.0
+    total_ms: float = 0.0
+
+@dataclass
+class MessageResult:
+    """Reply and intent for one customer message"""
+    reply: str
+    intent: Dict[str, Any]
+    catalog_items: int = 0
+    timings: StageTimings = field(default_factory=StageTimings)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+async def _timed(awaitable: Awaitable[Any]) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = await awaitable
+    return result, (time.perf_counter() - started) * 1000
+
+class MessagePipeline:
+    """One entry point for a customer message
+
+    The intent call starts immediately and runs alongside the catalog and
+    customer-context queries and then the reply completion, so a message
+    costs one LLM round trip instead of two sequential ones.
+    """
+
+    def __init__(self, store: Any = None, ai_service: Any = None, search: Any = None):
+        self._store = store
+        self._ai_service = ai_service
+        self._search = search or catalog_search
+        self._large_catalogs: set = set()  # Tenants with more items than one catalog fetch returns
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    def _get_ai_service(self):
+        if self._ai_service is None:
+            from azure_openai_service import azure_openai_service
+            self._ai_service = azure_openai_service
+        return self._ai_service
+
+    async def _fetch_catalog(self, tenant_id: str, message: str) -> List[Dict[str, Any]]:
+        """The newest catalog items, plus items matching the message when the catalog is bigger than that
+
+        The tenant's catalog index is synced with the rows fetched, so edits
+        and deletes made by any worker reach it, and matches from beyond the
+        newest AI_PIPELINE_CATALOG_LIMIT items can be offered in the reply.
+        """
+        limit = ProductionConfig.AI_PIPELINE_CATALOG_LIMIT
+        try:
+            store = await self._get_store()
+            if tenant_id in self._large_catalogs:
+                items, matches = await asyncio.gather(
+                    store.fetch_catalog_items(tenant_id, limit),
+                    self._search.find(tenant_id, message, ProductionConfig.AI_CATALOG_TOP_K)
+                )
+            else:
+                items = await store.fetch_catalog_items(tenant_id, limit)
+                if len(items) < limit:
+                    catalog_indexes.sync(tenant_id, items)
+                    return items
+                self._large_catalogs.add(tenant_id)
+                matches = await self._search.find(tenant_id, message, ProductionConfig.AI_CATALOG_TOP_K)
+        except Exception as e:
+            logger.warning(f"Catalog fetch failed for tenant {tenant_id}: {e}")
+            return []
+
+        known = {item['id'] for item in items}
+        fields = items[0].keys() if items else ()
+        extra = [{key: match[key] for key in fields} for match in matches if match['id'] not in known]
+        catalog_indexes.sync(tenant_id, items + extra)
+        return items + extra
+
+    async def _fetch_context(self, tenant_id: str, customer: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not customer:
+            return None
+        try:
+            store = await self._get_store()
+            return await store.get_customer_context(tenant_id, customer) or None
+        except Exception as e:
+            logger.warning(f"Customer context fetch failed for {tenant_id}/{customer}: {e}")
+            return None
+
+    async def _record(self, tenant_id: str, customer: Optional[str], message: str, is_ai_response: bool) -> None:
+        """Queue a message of the thread for the conversation write buffer"""
+        if not customer:
+            return
+        try:
+            store = await self._get_store()
+            await store.add_conversation_message(tenant_id, customer, message, is_ai_response)
+        except Exception as e:
+            logger.warning(f"Could not store message for {tenant_id}/{customer}: {e}")
+
+    async def record_inbound(self, tenant_id: str, customer: Optional[str], message: str) -> None:
+        """Store one raw customer message, before it is merged into a turn"""
+        await self._record(tenant_id, customer, message, False)
+
+    async def handle(
+        self,
+        tenant_id: str,
+        message: str,
+        customer: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        catalog_items: Optional[List[Dict]] = None,
+        record_message: bool = True
+    ) -> MessageResult:
+        """Analyze and answer a message; catalog_items skips the catalog query
+
+        record_message=False is for turns whose raw messages were already
+        stored (the coalescer records each message as it arrives), so merged
+        or superseded turns do not store them again.
+        """
+        from database import set_db_session
+        # Thread reads must see the tenant's flushed messages, so they follow its writes to the primary
+        set_db_session(tenant_id)
+        ai = self._get_ai_service()
+        started = time.perf_counter()
+        timings = StageTimings()
+        if record_message:
+            await self.record_inbound(tenant_id, customer, message)
+
+        intent_task = asyncio.create_task(_timed(ai.analyze_customer_intent(message, tenant_id)))
+        try:
+            if catalog_items is None:
+                catalog_stage = _timed(self._fetch_catalog(tenant_id, message))
+            else:
+                catalog_stage = _timed(asyncio.sleep(0, catalog_items))
+            (catalog_items, timings.catalog_ms), (context, timings.context_ms) = await asyncio.gather(
+                catalog_stage, _timed(self._fetch_context(tenant_id, customer))
+            )
+
+            reply, timings.reply_ms = await _timed(ai.generate_response(
+                message, catalog_items, conversation_history, context, tenant_id, customer
+            ))
+            intent, timings.intent_ms = await intent_task
+        finally:
+            if not intent_task.done():
+                intent_task.cancel()
+
+        await self._record(tenant_id, customer, reply, True)
+        timings.total_ms = (time.perf_counter() - started) * 1000
+        return MessageResult(
+            reply=reply,
+            intent=intent,
+            catalog_items=len(catalog_items),
+            timings=timings
+        )
+
+# Global message pipeline
+message_pipeline = MessagePipeline()
+
+__all__ = ["MessagePipeline", "MessageResult", "StageTimings", "message_pipeline"]
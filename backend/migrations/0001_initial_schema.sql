@@ -0,0 +1,107 @@
+-- Baseline: the schema initialize_schema used to create on every startup
+
+-- Users table (simplified for Instagram OAuth)
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
+    instagram_handle TEXT UNIQUE NOT NULL,
+    instagram_user_id TEXT UNIQUE,
+    instagram_access_token TEXT,
+    instagram_connected BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Catalog items table
+CREATE TABLE IF NOT EXISTS catalog_items (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    sku TEXT NOT NULL,
+    name TEXT NOT NULL,
+    price_jod DECIMAL(10,2) NOT NULL,
+    media_url TEXT NOT NULL DEFAULT '',
+    extras JSONB DEFAULT '{}',
+    description TEXT,
+    category TEXT,
+    stock_quantity INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(user_id, sku)
+);
+
+-- Orders table
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    sku TEXT NOT NULL,
+    qty INTEGER NOT NULL,
+    customer TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')),
+    total_amount DECIMAL(10,2) NOT NULL,
+    delivery_address TEXT,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Knowledge base documents table
+CREATE TABLE IF NOT EXISTS kb_documents (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    vector_id TEXT UNIQUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Conversations table
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    customer TEXT NOT NULL,
+    message TEXT NOT NULL,
+    is_ai_response BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Rolling per-customer conversation summaries
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    customer TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    covered_count INTEGER NOT NULL DEFAULT 0,
+    covered_until TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, customer)
+);
+
+-- Set when a catalog description job writes an item's description
+ALTER TABLE catalog_items ADD COLUMN IF NOT EXISTS description_generated_at TIMESTAMP WITH TIME ZONE;
+
+-- Monthly LLM usage per tenant, incremented by batched flushes
+CREATE TABLE IF NOT EXISTS llm_usage (
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    period DATE NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_ms BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, period)
+);
+
+-- Bulk catalog description jobs and their checkpointed progress
+CREATE TABLE IF NOT EXISTS catalog_description_jobs (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed', 'cancelled')),
+    overwrite BOOLEAN NOT NULL DEFAULT FALSE,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE
+);
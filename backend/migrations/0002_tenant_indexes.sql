@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Indexes for the tenant-scoped hot queries, built without blocking writes
+
+-- Newest-first keyset pagination of catalog and orders
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_items_user_created ON catalog_items (user_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at DESC, id DESC);
+
+-- A customer's thread, read in order and after a summary watermark
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_user_customer_created ON conversations (user_id, customer, created_at);
+
+-- Knowledge base documents of a tenant
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kb_documents_user ON kb_documents (user_id);
@@ -0,0 +1,98 @@
+-- Monthly range partitions for conversations, so thread reads prune to recent months
+-- and old months can be detached and archived by conversation_partitions.py
+
+ALTER TABLE conversations RENAME TO conversations_unpartitioned;
+ALTER INDEX IF EXISTS idx_conversations_user_customer_created RENAME TO idx_conversations_unpartitioned_thread;
+
+-- The partition key has to be part of the primary key
+CREATE TABLE conversations (
+    id TEXT NOT NULL DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    customer TEXT NOT NULL,
+    message TEXT NOT NULL,
+    is_ai_response BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Partition holding the UTC month of a date, created if missing; returns its name
+CREATE OR REPLACE FUNCTION create_conversation_partition(month DATE) RETURNS TEXT AS $$
+DECLARE
+    start_at DATE := date_trunc('month', month)::date;
+    partition_name TEXT := 'conversations_' || to_char(start_at, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF conversations FOR VALUES FROM (%L) TO (%L)',
+        partition_name,
+        start_at::timestamp AT TIME ZONE 'UTC',
+        (start_at + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC'
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- This month's partition and the next three; older months are created as
+-- their rows are moved over
+DO $$
+DECLARE
+    month DATE := date_trunc('month', NOW() AT TIME ZONE 'UTC')::date;
+BEGIN
+    FOR i IN 0..3 LOOP
+        PERFORM create_conversation_partition((month + make_interval(months => i))::date);
+    END LOOP;
+END $$;
+
+-- Existing rows stay in conversations_unpartitioned and are moved in batches
+-- after the cutover (conversation_partitions.py), so this migration does not
+-- copy the table while it holds the lock on it. Each call moves up to
+-- batch_size rows past ctid `after` in its own transaction, creating the
+-- partitions they need, and drops the table once it is empty. last_tid is
+-- where the next call continues; NULL once the scan reached the end.
+CREATE OR REPLACE FUNCTION move_unpartitioned_conversations(
+    batch_size INTEGER,
+    after TID DEFAULT '(0,0)',
+    OUT moved INTEGER,
+    OUT last_tid TEXT
+) AS $$
+DECLARE
+    tids TID[];
+    month DATE;
+BEGIN
+    moved := 0;
+    IF to_regclass('conversations_unpartitioned') IS NULL THEN
+        RETURN;
+    END IF;
+    -- Workers moving at the same time skip each other's rows
+    SELECT array_agg(ctid ORDER BY ctid) INTO tids FROM (
+        SELECT ctid FROM conversations_unpartitioned
+        WHERE ctid > after
+        ORDER BY ctid
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) batch;
+    IF tids IS NULL THEN
+        IF NOT EXISTS (SELECT 1 FROM conversations_unpartitioned) THEN
+            DROP TABLE conversations_unpartitioned;
+        END IF;
+        RETURN;
+    END IF;
+    last_tid := tids[array_length(tids, 1)]::text;
+    FOR month IN
+        SELECT DISTINCT date_trunc('month', COALESCE(created_at, NOW()) AT TIME ZONE 'UTC')::date
+        FROM conversations_unpartitioned WHERE ctid = ANY(tids)
+    LOOP
+        PERFORM create_conversation_partition(month);
+    END LOOP;
+    WITH batch AS (
+        DELETE FROM conversations_unpartitioned WHERE ctid = ANY(tids)
+        RETURNING id, user_id, customer, message, is_ai_response, COALESCE(created_at, NOW()) AS created_at
+    )
+    INSERT INTO conversations (id, user_id, customer, message, is_ai_response, created_at)
+    SELECT * FROM batch
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Created on the parent so every partition, present and future, gets it
+CREATE INDEX IF NOT EXISTS idx_conversations_user_customer_created ON conversations (user_id, customer, created_at);
@@ -0,0 +1,35 @@
+-- Knowledge base chunks with their embeddings, searched by knowledge_base.py
+--
+-- Embeddings are real[] so the table works without pgvector. Where the
+-- extension can be installed, an HNSW index over the vector cast serves
+-- search_kb_chunks; elsewhere KB search is lexical only (and the local index)
+
+CREATE TABLE IF NOT EXISTS kb_chunks (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    document_id TEXT NOT NULL REFERENCES kb_documents(id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    token_count INTEGER NOT NULL,
+    -- text-embedding-ada-002; KB_EMBEDDING_DIMENSIONS must match
+    embedding REAL[] NOT NULL,
+    UNIQUE (document_id, chunk_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kb_chunks_user ON kb_chunks (user_id);
+-- Embeddings are reused by content hash instead of being requested again
+CREATE INDEX IF NOT EXISTS idx_kb_chunks_content_hash ON kb_chunks (content_hash);
+
+-- One HNSW graph for every tenant; searches filter on user_id and use
+-- iterative scans so a small tenant still gets k matches
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'vector') THEN
+        CREATE EXTENSION IF NOT EXISTS vector;
+        -- Dynamic, as the vector type does not exist when this block is parsed
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_kb_chunks_embedding ON kb_chunks USING hnsw ((embedding::vector(1536)) vector_cosine_ops)';
+    END IF;
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'pgvector is available but cannot be created by this role; KB search stays lexical';
+END $$;
@@ -0,0 +1,41 @@
+-- Normalized search text of catalog items, searched with pg_trgm by catalog_search.py
+--
+-- pg_trgm only takes trigrams from characters the database's LC_CTYPE
+-- classifies as letters: Arabic text needs a UTF-8 locale (C.UTF-8,
+-- en_US.UTF-8, ...), under plain "C" it yields no trigrams at all.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+-- Lets the trigram GIN index also hold user_id, so a search only visits one tenant's rows
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- Same folding as arabic_text.normalize_arabic: diacritics and tatweel removed,
+-- alef/yaa/waw/taa marbuta variants and Arabic-Indic digits folded, lowercased.
+-- extras contributes its string and number values, not its keys. Declared
+-- IMMUTABLE (concat_ws is only STABLE in general) as every input is text.
+CREATE OR REPLACE FUNCTION catalog_search_text(name TEXT, category TEXT, sku TEXT, description TEXT, extras JSONB)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT lower(translate(
+        regexp_replace(
+            concat_ws(' ', name, category, sku, description,
+                      jsonb_path_query_array(extras, 'strict $.** ? (@.type() == "string" || @.type() == "number")')::text),
+            '[\u064B-\u065F\u0670\u0640]', '', 'g'
+        ),
+        'أإآٱىئؤة٠١٢٣٤٥٦٧٨٩',
+        'ااااييوه0123456789'
+    ))
+$$;
+
+-- Rewrites catalog_items once; later writes keep the column current
+ALTER TABLE catalog_items ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (catalog_search_text(name, category, sku, description, extras)) STORED;
+
+DO $$
+BEGIN
+    IF similarity('فستان', 'فستان') = 0 THEN
+        RAISE WARNING 'pg_trgm extracts no trigrams from Arabic text under LC_CTYPE %; catalog search will only match Latin text',
+            current_setting('lc_ctype');
+    END IF;
+END
+$$;
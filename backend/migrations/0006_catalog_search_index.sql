@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Trigram index of catalog_items.search_text (migration 0005), built without blocking writes
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_catalog_items_search ON catalog_items USING gin (user_id, search_text gin_trgm_ops);
@@ -0,0 +1,6 @@
+-- Subscription plan of each tenant (a users row), read by the LLM scheduler for
+-- its fair-share weight and by the usage meter for the monthly token quota.
+-- Plan names are the keys of AI_PLAN_WEIGHTS and AI_PLAN_MONTHLY_TOKEN_QUOTAS.
+
+-- A constant default makes this a catalog-only change on PostgreSQL 11+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS plan TEXT NOT NULL DEFAULT 'starter';
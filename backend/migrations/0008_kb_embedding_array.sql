@@ -0,0 +1,15 @@
+-- kb_chunks.embedding as real[] (see 0004) on databases that created it as
+-- vector(1536), so the same queries run with and without pgvector. The HNSW
+-- index moves to the vector cast that search_kb_chunks orders by.
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'kb_chunks' AND column_name = 'embedding' AND udt_name = 'vector'
+    ) THEN
+        DROP INDEX IF EXISTS idx_kb_chunks_embedding;
+        EXECUTE 'ALTER TABLE kb_chunks ALTER COLUMN embedding TYPE REAL[] USING embedding::real[]';
+        EXECUTE 'CREATE INDEX idx_kb_chunks_embedding ON kb_chunks USING hnsw ((embedding::vector(1536)) vector_cosine_ops)';
+    END IF;
+END $$;
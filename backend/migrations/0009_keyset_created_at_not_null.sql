@@ -0,0 +1,9 @@
+-- Keyset pages (pagination.py) order by (created_at, id) and their cursors
+-- carry created_at, so a NULL there would end a listing early. Rows that
+-- have none take their updated_at, or sort last as the oldest.
+
+UPDATE catalog_items SET created_at = COALESCE(updated_at, TIMESTAMPTZ 'epoch') WHERE created_at IS NULL;
+ALTER TABLE catalog_items ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE orders SET created_at = COALESCE(updated_at, TIMESTAMPTZ 'epoch') WHERE created_at IS NULL;
+ALTER TABLE orders ALTER COLUMN created_at SET NOT NULL;
@@ -0,0 +1,7 @@
+-- Every worker resumes running description jobs on startup. A worker claims
+-- a job before running it and refreshes claimed_at at each checkpoint; a
+-- claim older than AI_DESCRIPTION_JOB_LEASE belongs to a worker that died
+-- and may be taken over.
+
+ALTER TABLE catalog_description_jobs ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE catalog_description_jobs ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,141 @@
+"""
+IG-Shop-Agent Model Routing
+Sends simple turns to a small model tier and complex ones to the large tier
+"""
+import logging
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from advanced_config import ProductionConfig
+from intent_classifier import intent_classifier
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SMALL, LARGE = 'small', 'large'
+
+# How much each intent alone pushes a message towards the large model
+INTENT_WEIGHTS = {'browse': 0.1, 'inquiry': 0.15, 'purchase': 0.3, 'support': 0.3, 'complaint': 0.45}
+
+# Order numbers, phone numbers and explicit order references
+_ORDER_REFERENCE = re.compile(
+    r'\d{4,}|[٠-٩]{4,}|#\s?\d+|\b(?:order|tracking|refund|invoice)\b|رقم الطلب|طلبي|الفاتوره|الفاتورة',
+    re.IGNORECASE
+)
+_QUESTION = re.compile(r'[?؟]')
+
+@dataclass
+class RouteDecision:
+    """Tier chosen for a message and the score behind it"""
+    tier: str
+    score: float
+    reason: str = 'score'
+
+@dataclass
+class TierStats:
+    """Latency, token and cost totals of one tier"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=ProductionConfig.AI_ROUTER_WINDOW * 10))
+
+def complexity_score(message: str, history_turns: int = 0) -> float:
+    """0..1 estimate of how much reasoning a reply needs, computed locally"""
+    analysis = intent_classifier.classify(message)
+    score = min(count_tokens(message) / 60, 1.0) * 0.35
+    if analysis['confidence'] > 0:
+        score += INTENT_WEIGHTS.get(analysis['intent'], 0.15)
+    score += min(len(analysis['products_mentioned']), 3) * 0.08
+    if _ORDER_REFERENCE.search(message):
+        score += 0.2
+    if len(_QUESTION.findall(message)) > 1:
+        score += 0.1
+    if history_turns > 6:
+        score += 0.05
+    return min(score, 1.0)
+
+class ComplexityRouter:
+    """Picks a model tier per message, with per-tenant overrides
+
+    A tenant can pin every turn to one tier or move the score threshold.
+    Completed calls are recorded per tier for latency and cost reporting.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ProductionConfig.AI_COMPLEXITY_THRESHOLD,
+        costs: Optional[Dict[str, Dict[str, float]]] = None,
+        enabled: bool = ProductionConfig.AI_MODEL_ROUTING_ENABLED
+    ):
+        self.threshold = threshold
+        self.costs = costs or ProductionConfig.AI_TIER_COSTS
+        self.enabled = enabled
+        self._overrides: Dict[str, Dict[str, Any]] = {}
+        self._stats: Dict[str, TierStats] = {}
+        self._decisions: Dict[str, int] = {SMALL: 0, LARGE: 0}
+
+    def set_override(self, tenant_id: str, tier: Optional[str] = None, threshold: Optional[float] = None) -> None:
+        """Pin a tenant to a tier and/or change its threshold (both None clears it)"""
+        if tier is None and threshold is None:
+            self._overrides.pop(tenant_id, None)
+            return
+        if tier not in (None, SMALL, LARGE):
+            raise ValueError(f"Unknown model tier: {tier}")
+        self._overrides[tenant_id] = {'tier': tier, 'threshold': threshold}
+
+    def get_override(self, tenant_id: str) -> Dict[str, Any]:
+        return self._overrides.get(tenant_id, {'tier': None, 'threshold': None})
+
+    def route(
+        self,
+        message: str,
+        tenant_id: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> RouteDecision:
+        """Tier for a customer message"""
+        override = self._overrides.get(tenant_id) if tenant_id else None
+        if override and override['tier']:
+            decision = RouteDecision(override['tier'], 0.0, 'tenant override')
+        elif not self.enabled:
+            decision = RouteDecision(LARGE, 1.0, 'routing disabled')
+        else:
+            threshold = override['threshold'] if override and override['threshold'] is not None else self.threshold
+            score = complexity_score(message, len(conversation_history or []))
+            decision = RouteDecision(SMALL if score < threshold else LARGE, score)
+        self._decisions[decision.tier] = self._decisions.get(decision.tier, 0) + 1
+        return decision
+
+    def record(self, tier: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """Account a finished call to the tier that served it"""
+        stats = self._stats.setdefault(tier, TierStats())
+        stats.calls += 1
+        stats.latencies.append(latency)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        price = self.costs.get(tier, {})
+        stats.cost_usd += (prompt_tokens * price.get('prompt', 0.0)
+                           + completion_tokens * price.get('completion', 0.0)) / 1000
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing decisions and per-tier latency, tokens and cost"""
+        tiers = {}
+        for tier, stats in self._stats.items():
+            ordered = sorted(stats.latencies)
+            tiers[tier] = {
+                'calls': stats.calls,
+                'p50_ms': round(ordered[len(ordered) // 2] * 1000, 1) if ordered else 0.0,
+                'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 1) if ordered else 0.0,
+                'prompt_tokens': stats.prompt_tokens,
+                'completion_tokens': stats.completion_tokens,
+                'cost_usd': round(stats.cost_usd, 6),
+                'cost_per_call_usd': round(stats.cost_usd / stats.calls, 6) if stats.calls else 0.0,
+            }
+        return {'decisions': dict(self._decisions), 'tiers': tiers}
+
+# Global complexity router
+complexity_router = ComplexityRouter()
+
+__all__ = ["ComplexityRouter", "RouteDecision", "complexity_router", "complexity_score", "SMALL", "LARGE"]
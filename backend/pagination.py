@@ -0,0 +1,52 @@
+"""
+IG-Shop-Agent Pagination
+Opaque keyset cursors over (created_at, id) for newest-first list queries
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Matches the (user_id, created_at DESC, id DESC) indexes, so each page is an index range scan
+# created_at is NOT NULL in every paginated table (migration 0009); cursors carry it
+KEYSET_ORDER = "ORDER BY created_at DESC, id DESC"
+
+class InvalidCursor(ValueError):
+    """A cursor that was not produced by encode_cursor"""
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Cursor pointing just past a row"""
+    payload = json.dumps([row['created_at'].isoformat(), str(row['id'])], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(created_at, id) of the last row of the previous page"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+def keyset_condition(cursor: Optional[str], first_param: int) -> Tuple[str, List[Any]]:
+    """WHERE fragment and arguments selecting rows after a cursor
+
+    first_param is the number of the first placeholder to use.
+    """
+    if not cursor:
+        return "TRUE", []
+    created_at, row_id = decode_cursor(cursor)
+    return f"(created_at, id) < (${first_param}, ${first_param + 1})", [created_at, row_id]
+
+def keyset_page(rows: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """Page from a query that fetched limit + 1 rows"""
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
+
+async def ndjson_lines(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """One JSON object per line, encoded a chunk at a time"""
+    async for chunk in chunks:
+        yield ''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in chunk).encode()
+
+__all__ = ["InvalidCursor", "KEYSET_ORDER", "decode_cursor", "encode_cursor", "keyset_condition", "keyset_page", "ndjson_lines"]
@@ -53,7 +53,7 @@ app.add_middleware(
 )
 
 # Database configuration moved to unified database service
-from database import db_service, get_db_connection, database_lifespan
+from database import db_service, get_db_connection, init_database
 
 # LIVE OpenAI configuration
 from openai import OpenAI
@@ -229,8 +229,42 @@ async def instagram_callback(request: Request):
         logger.error(f"Instagram callback error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Add database lifespan
-app.add_event_handler("startup", database_lifespan)
+# API routers, imported by module name so they share this process's singletons
+from routers import catalog, conversations, kb, orders
+app.include_router(catalog.router, prefix="/api/catalog", tags=["catalog"])
+app.include_router(orders.router, prefix="/api/orders", tags=["orders"])
+app.include_router(conversations.router, prefix="/api/conversations", tags=["conversations"])
+app.include_router(kb.router, prefix="/api/kb", tags=["knowledge-base"])
+
+# Connect and apply pending schema migrations before serving
+app.add_event_handler("startup", init_database)
+
+# Resume catalog description jobs interrupted by the last restart
+from catalog_description_job import description_jobs
+app.add_event_handler("startup", description_jobs.resume_all)
+app.add_event_handler("shutdown", description_jobs.shutdown)
+
+# Finish summary refreshes in flight; they are metered and saved, so before the usage flush and pool close
+from conversation_summarizer import conversation_summarizer
+app.add_event_handler("shutdown", conversation_summarizer.drain)
+
+# Flush per-tenant LLM usage periodically and once more on shutdown
+from usage_meter import usage_meter
+app.add_event_handler("startup", usage_meter.start)
+app.add_event_handler("shutdown", usage_meter.stop)
+
+# Keep future conversation partitions ready and archive expired months
+from conversation_partitions import conversation_partitions
+app.add_event_handler("startup", conversation_partitions.start)
+app.add_event_handler("shutdown", conversation_partitions.stop)
+
+# Close the knowledge base embedder's HTTP client
+from knowledge_base import knowledge_base
+app.add_event_handler("shutdown", knowledge_base.close)
+
+# Registered last: flushes buffered conversation writes, then closes the pool
+from database import close_database
+app.add_event_handler("shutdown", close_database)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,193 @@
+"""
+IG-Shop-Agent Prompt Builder
+Per-tenant compiled system prompts, invalidated by catalog/profile version
+"""
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from catalog_index import item_key
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Identical for every tenant and every message, so it leads the prompt and
+# forms the longest possible prefix for provider-side prompt caching.
+STATIC_PROMPT = """أنت مساعد ذكي لمتجر إلكتروني أردني متخصص في الموضة والأزياء.
+You are an AI assistant for a Jordanian online fashion store.
+
+إرشادات المحادثة / Conversation Guidelines:
+1. كن ودودًا ومهذبًا دائماً
+2. استخدم اللغة العربية كلغة أساسية
+3. قدم معلومات دقيقة عن المنتجات
+4. ساعد في اتخاذ قرار الشراء
+5. اقترح منتجات مناسبة حسب الحاجة
+
+تعليمات الرد / Response Instructions:
+- أجب باللغة العربية أولاً، ثم الإنجليزية إذا لزم الأمر
+- كن مختصراً ومفيداً
+- اذكر الأسعار بالدينار الأردني
+- لا تخترع معلومات غير موجودة
+- إذا لم تجد منتج مناسب، اقترح البدائل المتاحة
+"""
+
+PRODUCTS_HEADER = "\nالمنتجات المتاحة / Available Products:\n"
+
+DEFAULT_PROFILE = {
+    'display_name': 'IG Shop Agent',
+    'location': 'الأردن',
+    'specialty': 'الأزياء والموضة',
+    'language': 'العربية، مع دعم الإنجليزية',
+}
+
+# Process-wide counter so profile versions never repeat across tenants
+_profile_versions = itertools.count(1)
+
+def format_catalog_item(item: Dict[str, Any]) -> str:
+    """Render one catalog item as a prompt line"""
+    line = f"- {item['name']}: {item['price_jod']} دينار أردني"
+    if item.get('description'):
+        line += f" - {item['description'][:50]}..."
+    if (item.get('stock_quantity') or 0) > 0:
+        line += f" (متوفر: {item['stock_quantity']} قطعة)"
+    return line + "\n"
+
+def format_customer_context(context: Optional[Dict[str, Any]]) -> str:
+    """Render the customer context section"""
+    if not context:
+        return ""
+    section = "\nمعلومات العميل / Customer Context:\n"
+    if context.get('previous_orders'):
+        section += f"- طلبات سابقة: {len(context['previous_orders'])}\n"
+    if context.get('preferences'):
+        section += f"- التفضيلات: {context['preferences']}\n"
+    return section
+
+def format_conversation_summary(summary: Optional[str]) -> str:
+    """Render the rolling conversation summary section"""
+    if not summary:
+        return ""
+    return f"\nملخص المحادثة السابقة / Earlier Conversation Summary:\n{summary}\n"
+
+def format_knowledge(chunks: Optional[List[Dict[str, Any]]]) -> str:
+    """Render retrieved knowledge base chunks (return policy, size guide, ...)"""
+    if not chunks:
+        return ""
+    section = "\nمعلومات المتجر / Store Information:\n"
+    for chunk in chunks:
+        section += f"- [{chunk['title']}] {chunk['content']}\n"
+    return section
+
+@dataclass
+class CompiledPrompt:
+    """Tenant prompt prefix with its precomputed token count"""
+    prefix: str
+    prefix_tokens: int
+    catalog_version: int
+    profile_version: int
+    item_lines: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+
+    def item_line(self, item: Dict[str, Any]) -> Tuple[str, int]:
+        """Formatted catalog line and its token count, memoized per item"""
+        key = item_key(item)
+        cached = self.item_lines.get(key)
+        if cached is None:
+            line = format_catalog_item(item)
+            cached = (line, count_tokens(line))
+            self.item_lines[key] = cached
+        return cached
+
+class PromptCompiler:
+    """Keeps one compiled prompt per tenant, rebuilt when its versions move"""
+
+    def __init__(self):
+        self._compiled: Dict[str, CompiledPrompt] = {}
+        self._profiles: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._static_tokens = count_tokens(STATIC_PROMPT)
+        self._header_tokens = count_tokens(PRODUCTS_HEADER)
+        self.compilations = 0
+
+    def set_profile(self, tenant_id: str, profile: Dict[str, Any]) -> int:
+        """Set a tenant's shop profile and bump its profile version"""
+        version = next(_profile_versions)
+        self._profiles[tenant_id] = (version, {**DEFAULT_PROFILE, **profile})
+        return version
+
+    def profile_version(self, tenant_id: Optional[str]) -> int:
+        """Current profile version of a tenant (0 for the default profile)"""
+        return self._profiles.get(tenant_id, (0, DEFAULT_PROFILE))[0]
+
+    def compile(self, tenant_id: Optional[str], catalog_version: int = 0) -> CompiledPrompt:
+        """Get the tenant's compiled prefix, rebuilding it if stale"""
+        profile_version, profile = self._profiles.get(tenant_id, (0, DEFAULT_PROFILE))
+        compiled = self._compiled.get(tenant_id) if tenant_id else None
+        if (compiled is not None and compiled.catalog_version == catalog_version
+                and compiled.profile_version == profile_version):
+            return compiled
+
+        shop_section = (
+            "\nالمعلومات الأساسية / Basic Information:\n"
+            f"- اسم المتجر: {profile['display_name']}\n"
+            f"- الموقع: {profile['location']}\n"
+            f"- التخصص: {profile['specialty']}\n"
+            f"- اللغة المفضلة: {profile['language']}\n"
+        )
+        prefix = STATIC_PROMPT + shop_section
+        compiled = CompiledPrompt(
+            prefix=prefix,
+            prefix_tokens=self._static_tokens + count_tokens(shop_section),
+            catalog_version=catalog_version,
+            profile_version=profile_version
+        )
+        # Item lines are only memoized when a tenant's catalog version is tracked
+        if tenant_id:
+            self._compiled[tenant_id] = compiled
+        self.compilations += 1
+        return compiled
+
+    def render(
+        self,
+        tenant_id: Optional[str],
+        catalog_version: int,
+        catalog_items: List[Dict[str, Any]],
+        context: Optional[Dict[str, Any]] = None,
+        summary: Optional[str] = None,
+        knowledge: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[str, int]:
+        """Assemble the full system prompt and its token count"""
+        compiled = self.compile(tenant_id, catalog_version)
+        parts = [compiled.prefix]
+        tokens = compiled.prefix_tokens
+        if catalog_items:
+            parts.append(PRODUCTS_HEADER)
+            tokens += self._header_tokens
+            for item in catalog_items:
+                line, line_tokens = compiled.item_line(item)
+                parts.append(line)
+                tokens += line_tokens
+        knowledge_section = format_knowledge(knowledge)
+        if knowledge_section:
+            parts.append(knowledge_section)
+            tokens += count_tokens(knowledge_section)
+        customer_section = format_customer_context(context)
+        if customer_section:
+            parts.append(customer_section)
+            tokens += count_tokens(customer_section)
+        summary_section = format_conversation_summary(summary)
+        if summary_section:
+            parts.append(summary_section)
+            tokens += count_tokens(summary_section)
+        return ''.join(parts), tokens
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        """Drop a tenant's compiled prompt (all tenants when tenant_id is None)"""
+        if tenant_id:
+            self._compiled.pop(tenant_id, None)
+        else:
+            self._compiled.clear()
+
+# Global prompt compiler
+prompt_compiler = PromptCompiler()
+
+__all__ = ["PromptCompiler", "CompiledPrompt", "prompt_compiler", "STATIC_PROMPT"]
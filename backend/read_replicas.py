@@ -0,0 +1,275 @@
+"""
+IG-Shop-Agent Read Replicas
+Routes read-only queries to streaming standbys that keep up with the primary
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from config import settings
+from schema_migrations import load_migrations
+
+logger = logging.getLogger(__name__)
+
+# Statements a replica may run: one SELECT (or WITH, VALUES, TABLE, SHOW) ...
+_READ_SQL = re.compile(r"^\s*(SELECT|WITH|VALUES|TABLE|SHOW)\b", re.IGNORECASE)
+# ... that neither writes, locks nor changes session state anywhere in it
+_WRITE_SQL = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|CREATE|ALTER|DROP|TRUNCATE|COPY|LOCK|GRANT|REVOKE|VACUUM|ANALYZE|REFRESH|CALL|INTO|"
+    r"NEXTVAL|SETVAL|SET_CONFIG|PG_(TRY_)?ADVISORY_\w+|FOR\s+(KEY\s+)?SHARE)\b",
+    re.IGNORECASE
+)
+
+# A function created by the migrations, up to the end of its definition ($$-quoted body skipped)
+_FUNCTION_DEF = re.compile(r"CREATE\s+(?:OR\s+REPLACE\s+)?FUNCTION\s+(\w+)\s*\((.*?)\$\$.*?\$\$(.*?);", re.IGNORECASE | re.DOTALL)
+_READ_ONLY_VOLATILITY = re.compile(r"\b(IMMUTABLE|STABLE)\b", re.IGNORECASE)
+
+# A replica that cannot serve the read at all; the read is retried on the primary
+REPLICA_UNAVAILABLE = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError, asyncpg.CannotConnectNowError)
+# A standby cancelling a read that conflicts with WAL replay; also retried on the primary
+REPLICA_CONFLICT = (asyncpg.SerializationError,)
+
+# Session of the current request or task, usually its tenant id; its reads follow its writes to the primary
+_db_session: ContextVar[Optional[str]] = ContextVar('db_session', default=None)
+# When the current task last wrote (monotonic), for sessionless jobs
+_wrote_at: ContextVar[float] = ContextVar('db_wrote_at', default=float('-inf'))
+
+def _volatile_functions() -> "re.Pattern":
+    """Calls of the migrations' own functions that are not declared STABLE or IMMUTABLE
+
+    Those may write (create_conversation_partition runs CREATE TABLE), and a
+    standby would reject them with a read-only error that is not retried.
+    """
+    names = set()
+    for migration in load_migrations():
+        for match in _FUNCTION_DEF.finditer(migration.sql):
+            if not _READ_ONLY_VOLATILITY.search(match.group(2) + match.group(3)):
+                names.add(match.group(1).lower())
+    if not names:
+        return re.compile(r"(?!)")
+    return re.compile(r"\b(" + "|".join(sorted(names)) + r")\s*\(", re.IGNORECASE)
+
+_VOLATILE_CALL = _volatile_functions()
+
+@lru_cache(maxsize=2048)
+def is_read_only(query: str) -> bool:
+    """Whether a query only reads, so a replica may run it (when unsure, it does not)"""
+    return (
+        bool(_READ_SQL.match(query))
+        and not _WRITE_SQL.search(query)
+        and not _VOLATILE_CALL.search(query)
+        and ';' not in query.strip().rstrip(';')
+    )
+
+def set_db_session(key: Optional[str]) -> None:
+    """Name the session of the current request or task for read-your-writes"""
+    _db_session.set(key)
+
+def _lsn(text: str) -> int:
+    high, low = text.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+class ReadReplica:
+    """A streaming standby of the primary, its pool and its last lag check"""
+    
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.pool: Optional[asyncpg.Pool] = None
+        self.in_rotation = False
+        self.lag: Optional[float] = None  # Seconds behind the primary, None if unknown
+        self.error: Optional[str] = None
+        self.reads = 0
+    
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_rotation': self.in_rotation,
+            'lag_s': round(self.lag, 2) if self.lag is not None else None,
+            'error': self.error,
+            'reads': self.reads,
+            'pool_size': self.pool.get_size() if self.pool else 0,
+        }
+
+class ReplicaRouter:
+    """Read replicas of the primary, and which of them may serve a read
+    
+    Every check_interval seconds each replica's replay position is compared
+    with the primary's WAL positions of earlier checks; a replica more than
+    max_lag seconds behind, not in recovery, or unreachable leaves the
+    rotation until a later check finds it caught up. Replicas in rotation
+    take reads in turn.
+    
+    After a write, the writing task and its session (see set_db_session)
+    read from the primary for read_your_writes seconds. The window is never
+    shorter than max_lag, the most a replica in rotation can miss. Write
+    times are kept per process.
+    """
+    
+    def __init__(
+        self,
+        hosts: List[Tuple[str, int]],
+        pool_size: int = settings.DATABASE_REPLICA_POOL_SIZE,
+        max_lag: float = settings.DATABASE_REPLICA_MAX_LAG,
+        check_interval: float = settings.DATABASE_REPLICA_CHECK_INTERVAL,
+        read_your_writes: float = settings.DATABASE_READ_YOUR_WRITES,
+        max_sessions: int = 10000
+    ):
+        self.replicas = [ReadReplica(host, port) for host, port in hosts]
+        self.pool_size = pool_size
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.read_your_writes = max(read_your_writes, max_lag)
+        self.max_sessions = max_sessions
+        self._primary: Optional[asyncpg.Pool] = None
+        self._wal: List[Tuple[float, int]] = []  # (checked_at, primary WAL position), oldest first
+        self._last_write: OrderedDict[str, float] = OrderedDict()
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {'replica_reads': 0, 'primary_reads': 0, 'sticky_reads': 0, 'fallbacks': 0, 'checks': 0}
+    
+    async def start(self, primary: asyncpg.Pool) -> None:
+        """Open the replica pools and start the lag checks; a failing replica stays out of rotation"""
+        if not self.replicas or self._task is not None:
+            return
+        self._primary = primary
+        try:
+            await self.check()
+        except Exception as e:
+            logger.error(f"Replica lag check failed: {e}")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Read replicas in rotation: {sum(r.in_rotation for r in self.replicas)}/{len(self.replicas)}")
+    
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            replica.in_rotation = False
+            if replica.pool:
+                await replica.pool.close()
+                replica.pool = None
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Replica lag check failed: {e}")
+    
+    async def check(self) -> None:
+        """Measure every replica's lag and update the rotation"""
+        self._metrics['checks'] += 1
+        now = time.monotonic()
+        position = _lsn(await self._primary.fetchval("SELECT pg_current_wal_lsn()::text"))
+        horizon = max(self.max_lag * 4, self.check_interval * 4)
+        self._wal = [(at, lsn) for at, lsn in self._wal if now - at <= horizon] + [(now, position)]
+        await asyncio.gather(*(self._check(replica, now) for replica in self.replicas))
+    
+    async def _check(self, replica: ReadReplica, now: float) -> None:
+        try:
+            if replica.pool is None:
+                replica.pool = await asyncpg.create_pool(
+                    host=replica.host,
+                    port=replica.port,
+                    user=settings.DATABASE_USER,
+                    password=settings.DATABASE_PASSWORD,
+                    database=settings.DATABASE_NAME,
+                    min_size=1,
+                    max_size=self.pool_size,
+                    command_timeout=60,
+                    ssl='require' if settings.is_production else 'prefer'
+                )
+            row = await asyncio.wait_for(
+                replica.pool.fetchrow("SELECT pg_is_in_recovery() AS standby, pg_last_wal_replay_lsn()::text AS replayed"),
+                self.check_interval
+            )
+        except Exception as e:
+            replica.lag = None
+            self._set_rotation(replica, False, f"unreachable: {e}")
+            return
+        if not row['standby'] or row['replayed'] is None:
+            replica.lag = None
+            self._set_rotation(replica, False, "not a standby")
+            return
+        # Everything the primary had written at a check is on the replica once replayed past it
+        replayed = _lsn(row['replayed'])
+        caught_up = [at for at, lsn in self._wal if lsn <= replayed]
+        # Behind every position still remembered: at least that far behind, and the lag is unknown
+        replica.lag = now - max(caught_up) if caught_up else now - self._wal[0][0] + self.check_interval
+        if not caught_up or replica.lag > self.max_lag:
+            self._set_rotation(replica, False, f"{'' if caught_up else 'over '}{replica.lag:.1f}s behind")
+        else:
+            self._set_rotation(replica, True, None)
+    
+    def _set_rotation(self, replica: ReadReplica, in_rotation: bool, error: Optional[str]) -> None:
+        if in_rotation != replica.in_rotation:
+            if in_rotation:
+                logger.info(f"Replica {replica.name} back in rotation")
+            else:
+                logger.warning(f"Replica {replica.name} out of rotation: {error}")
+        replica.in_rotation = in_rotation
+        replica.error = error
+    
+    def drop(self, replica: ReadReplica, error: Exception) -> None:
+        """Take a replica that failed a read out of rotation until its next check"""
+        self._metrics['fallbacks'] += 1
+        self._set_rotation(replica, False, f"read failed: {error}")
+    
+    def note_write(self, *sessions: str) -> None:
+        """Send the given sessions' reads (by default the current task's and session's) to the primary for a while"""
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        if not sessions:
+            _wrote_at.set(now)
+            sessions = tuple(filter(None, [_db_session.get()]))
+        for session in sessions:
+            self._last_write[session] = now
+            self._last_write.move_to_end(session)
+        while len(self._last_write) > self.max_sessions:
+            self._last_write.popitem(last=False)
+    
+    def wrote_recently(self) -> bool:
+        since = time.monotonic() - self.read_your_writes
+        session = _db_session.get()
+        return _wrote_at.get() > since or (session is not None and self._last_write.get(session, since) > since)
+    
+    def route(self) -> Optional[ReadReplica]:
+        """The replica for the next read, or None to read from the primary"""
+        if not self.replicas:
+            return None
+        if self.wrote_recently():
+            self._metrics['sticky_reads'] += 1
+            return None
+        healthy = [replica for replica in self.replicas if replica.in_rotation]
+        if not healthy:
+            self._metrics['primary_reads'] += 1
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        replica = healthy[self._next]
+        replica.reads += 1
+        self._metrics['replica_reads'] += 1
+        return replica
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._metrics,
+            'in_rotation': sum(replica.in_rotation for replica in self.replicas),
+            'sessions': len(self._last_write),
+            'replicas': {replica.name: replica.stats() for replica in self.replicas},
+        }
+
+__all__ = ["REPLICA_CONFLICT", "REPLICA_UNAVAILABLE", "ReadReplica", "ReplicaRouter", "is_read_only",
+           "set_db_session"]
@@ -0,0 +1,188 @@
+"""
+IG-Shop-Agent Response Cache
+Per-tenant cache of AI replies for repeated customer questions
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from arabic_text import tokenize
+from advanced_config import ProductionConfig
+from catalog_index import catalog_indexes
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+def normalize_message(message: str) -> str:
+    """Canonical form of a customer message (Arabic folding, no punctuation)"""
+    return ' '.join(tokenize(message, drop_stopwords=False))
+
+def context_digest(conversation_history: Optional[List[Dict]], turns: int) -> str:
+    """Digest of the last few turns so replies are only reused in the same context"""
+    if not conversation_history or turns <= 0:
+        return ''
+    recent = conversation_history[-turns:]
+    joined = '\x1f'.join(normalize_message(msg.get('text', '')) for msg in recent)
+    return hashlib.blake2b(joined.encode('utf-8'), digest_size=8).hexdigest()
+
+@dataclass
+class CacheEntry:
+    response: str
+    created_at: float
+    catalog_version: int
+    context: str
+    embedding: Optional[np.ndarray] = None
+
+class ResponseCache:
+    """LRU + TTL cache of replies, keyed by normalized text and catalog version"""
+
+    def __init__(
+        self,
+        max_entries: int = ProductionConfig.AI_RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = ProductionConfig.AI_RESPONSE_CACHE_TTL,
+        context_turns: int = ProductionConfig.AI_RESPONSE_CACHE_CONTEXT_TURNS,
+        similarity_threshold: float = ProductionConfig.AI_RESPONSE_CACHE_SIMILARITY,
+        embedder: Optional[Embedder] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.context_turns = context_turns
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder
+        self._clock = clock
+        self._entries: Dict[str, "OrderedDict[Tuple[str, str], CacheEntry]"] = {}
+        self._metrics: Dict[str, int] = {
+            'hits': 0, 'semantic_hits': 0, 'misses': 0,
+            'stores': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0
+        }
+
+    def _tenant_entries(self, tenant_id: str) -> "OrderedDict[Tuple[str, str], CacheEntry]":
+        return self._entries.setdefault(tenant_id, OrderedDict())
+
+    def _is_fresh(self, entry: CacheEntry, catalog_version: int) -> bool:
+        return entry.catalog_version == catalog_version and self._clock() - entry.created_at < self.ttl
+
+    async def get(
+        self,
+        tenant_id: str,
+        catalog_version: int,
+        message: str,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Optional[str]:
+        """Look up a cached reply; exact normalized match first, then embeddings"""
+        entries = self._entries.get(tenant_id)
+        key = (normalize_message(message), context_digest(conversation_history, self.context_turns))
+        if not key[0] or not entries:
+            self._metrics['misses'] += 1
+            return None
+
+        entry = entries.get(key)
+        if entry is not None:
+            if self._is_fresh(entry, catalog_version):
+                entries.move_to_end(key)
+                self._metrics['hits'] += 1
+                return entry.response
+            del entries[key]
+            self._metrics['expirations'] += 1
+
+        if self.embedder is not None:
+            match = await self._semantic_lookup(entries, key, catalog_version)
+            if match is not None:
+                self._metrics['semantic_hits'] += 1
+                return match
+
+        self._metrics['misses'] += 1
+        return None
+
+    async def _semantic_lookup(
+        self,
+        entries: "OrderedDict[Tuple[str, str], CacheEntry]",
+        key: Tuple[str, str],
+        catalog_version: int
+    ) -> Optional[str]:
+        candidates = [
+            (entry_key, entry) for entry_key, entry in entries.items()
+            if entry.embedding is not None and entry.context == key[1] and self._is_fresh(entry, catalog_version)
+        ]
+        if not candidates:
+            return None
+        try:
+            query = self._unit(await self.embedder(key[0]))
+        except Exception as e:
+            logger.warning(f"Response cache embedding failed: {e}")
+            return None
+        matrix = np.stack([entry.embedding for _, entry in candidates])
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        entry_key, entry = candidates[best]
+        entries.move_to_end(entry_key)
+        return entry.response
+
+    async def put(
+        self,
+        tenant_id: str,
+        catalog_version: int,
+        message: str,
+        response: str,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> None:
+        """Store a reply, evicting the least recently used entry when full"""
+        key = (normalize_message(message), context_digest(conversation_history, self.context_turns))
+        if not key[0]:
+            return
+        embedding = None
+        if self.embedder is not None:
+            try:
+                embedding = self._unit(await self.embedder(key[0]))
+            except Exception as e:
+                logger.warning(f"Response cache embedding failed: {e}")
+
+        entries = self._tenant_entries(tenant_id)
+        entries[key] = CacheEntry(response, self._clock(), catalog_version, key[1], embedding)
+        entries.move_to_end(key)
+        self._metrics['stores'] += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self._metrics['evictions'] += 1
+
+    def invalidate(self, tenant_id: str = None, catalog_version: int = None) -> None:
+        """Drop a tenant's cached replies (all tenants when tenant_id is None)"""
+        if tenant_id is None:
+            count = sum(len(entries) for entries in self._entries.values())
+            self._entries.clear()
+        else:
+            entries = self._entries.pop(tenant_id, None)
+            count = len(entries) if entries else 0
+        self._metrics['invalidations'] += count
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        lookups = self._metrics['hits'] + self._metrics['semantic_hits'] + self._metrics['misses']
+        hits = self._metrics['hits'] + self._metrics['semantic_hits']
+        return {
+            **self._metrics,
+            'entries': sum(len(entries) for entries in self._entries.values()),
+            'tenants': len(self._entries),
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+# Global response cache, emptied for a tenant whenever its catalog changes
+response_cache = ResponseCache()
+catalog_indexes.add_listener(response_cache.invalidate)
+
+__all__ = ["ResponseCache", "response_cache", "normalize_message"]
@@ -1 +1 @@
-from . import auth, catalog, orders, conversations, kb 
\ No newline at end of file
+"""API routers, imported one by one by the app that mounts them"""
@@ -1,7 +1,88 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from catalog_description_job import description_jobs
+from catalog_import import ImportFormatError, catalog_importer
+from catalog_index import catalog_indexes
+from catalog_search import catalog_search
+from database import get_db_connection
+from pagination import InvalidCursor, ndjson_lines
 
 router = APIRouter()
 
+class DescriptionJobRequest(BaseModel):
+    overwrite: bool = False
+
 @router.get("/")
-async def list_catalog():
-    return {"message": "Catalog endpoint working"} 
\ No newline at end of file
+async def list_catalog(
+    x_tenant_id: str = Header(...),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
+):
+    """A page of catalog items, newest first; pass next_cursor for the next page"""
+    db = await get_db_connection()
+    try:
+        return await db.fetch_page('catalog_items', x_tenant_id, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/search")
+async def search_catalog(
+    x_tenant_id: str = Header(...),
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Items matching a partial or misspelled name ("فستان اسود", "abaya blk"), best first"""
+    return {"items": await catalog_search.search(x_tenant_id, q, limit)}
+
+@router.get("/export")
+async def export_catalog(x_tenant_id: str = Header(...)):
+    """The whole catalog as NDJSON, streamed from a server-side cursor"""
+    db = await get_db_connection()
+    return StreamingResponse(
+        ndjson_lines(db.stream_table('catalog_items', x_tenant_id)),
+        media_type="application/x-ndjson"
+    )
+
+@router.delete("/{item_id}")
+async def delete_catalog_item(item_id: str, x_tenant_id: str = Header(...)):
+    """Delete an item; the agent stops offering it right away"""
+    db = await get_db_connection()
+    if not await db.delete_catalog_item(x_tenant_id, item_id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    catalog_indexes.remove_item(x_tenant_id, item_id)
+    return {"deleted": True}
+
+@router.post("/import")
+async def import_catalog(
+    request: Request,
+    x_tenant_id: str = Header(...),
+    format: str = Query("csv")
+):
+    """Bulk upsert a CSV or NDJSON catalog upload by SKU, with a per-row error report"""
+    try:
+        report = await catalog_importer.run(x_tenant_id, request.stream(), format)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return report.to_dict()
+
+@router.post("/descriptions/jobs")
+async def start_description_job(body: DescriptionJobRequest, x_tenant_id: str = Header(...)):
+    """Generate descriptions for the tenant's catalog in the background"""
+    progress = await description_jobs.start(x_tenant_id, body.overwrite)
+    return progress.to_dict()
+
+@router.get("/descriptions/jobs/{job_id}")
+async def get_description_job(job_id: str, x_tenant_id: str = Header(...)):
+    """Progress of a description job, including items per minute"""
+    progress = description_jobs.progress(job_id)
+    if progress is None or progress.tenant_id != x_tenant_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return progress.to_dict()
+
+@router.delete("/descriptions/jobs")
+async def cancel_description_job(x_tenant_id: str = Header(...)):
+    """Cancel the tenant's running description job"""
+    await description_jobs.cancel(x_tenant_id)
+    return {"cancelled": True}
@@ -1,7 +1,122 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from azure_openai_service import azure_openai_service
+from message_pipeline import message_pipeline
+from message_coalescer import message_coalescer
+from model_routing import complexity_router
+from usage_meter import usage_meter
+from knowledge_base import knowledge_base
+from hybrid_retrieval import hybrid_retriever
+from catalog_search import catalog_search
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+import json
 
 router = APIRouter()
 
+class StreamReplyRequest(BaseModel):
+    message: str
+    customer: Optional[str] = None
+    catalog_items: List[Dict] = []
+    conversation_history: List[Dict] = []
+    customer_context: Optional[Dict] = None
+
+class ReplyRequest(BaseModel):
+    message: str
+    customer: Optional[str] = None
+    conversation_history: List[Dict] = []
+
+class CoalescingSettings(BaseModel):
+    window_seconds: Optional[float] = None
+
+class ModelRoutingSettings(BaseModel):
+    tier: Optional[str] = None
+    threshold: Optional[float] = None
+
 @router.get("/")
 async def list_conversations():
-    return {"message": "Conversations endpoint working"} 
\ No newline at end of file
+    return {"message": "Conversations endpoint working"}
+
+@router.post("/stream")
+async def stream_reply(body: StreamReplyRequest, x_tenant_id: str = Header(...)):
+    """Stream a live agent reply as Server-Sent Events
+    
+    Like /reply, the completion is scheduled, metered and quota-checked
+    under the tenant and grounded in its knowledge base.
+    """
+    async def events():
+        async for token in azure_openai_service.generate_response_stream(
+            body.message,
+            body.catalog_items,
+            body.conversation_history,
+            body.customer_context,
+            tenant_id=x_tenant_id,
+            customer_id=body.customer
+        ):
+            yield f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/reply")
+async def reply(body: ReplyRequest, x_tenant_id: str = Header(...)):
+    """Reply to a customer message with its intent and per-stage timings
+    
+    Messages from the same customer within the tenant's coalescing window
+    are answered as one turn; the earlier requests return coalesced=true.
+    """
+    if body.customer:
+        result = await message_coalescer.submit(
+            x_tenant_id,
+            body.customer,
+            body.message,
+            conversation_history=body.conversation_history
+        )
+        if result is None:
+            return {"coalesced": True}
+    else:
+        result = await message_pipeline.handle(
+            x_tenant_id,
+            body.message,
+            body.customer,
+            body.conversation_history
+        )
+    return result.to_dict()
+
+@router.put("/coalescing")
+async def set_coalescing(body: CoalescingSettings, x_tenant_id: str = Header(...)):
+    """Set the tenant's message coalescing window (null restores the default)"""
+    message_coalescer.set_window(x_tenant_id, body.window_seconds)
+    return {"window_seconds": message_coalescer.window_for(x_tenant_id)}
+
+@router.put("/model-routing")
+async def set_model_routing(body: ModelRoutingSettings, x_tenant_id: str = Header(...)):
+    """Pin the tenant to a model tier ('small'/'large') or change its complexity threshold"""
+    try:
+        complexity_router.set_override(x_tenant_id, body.tier, body.threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return complexity_router.get_override(x_tenant_id)
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """LLM scheduler queues and per-deployment router health"""
+    return {
+        "scheduler": azure_openai_service.scheduler.stats(),
+        "router": azure_openai_service.router.stats(),
+        "coalescer": message_coalescer.stats(),
+        "model_routing": complexity_router.stats(),
+        "usage": usage_meter.stats(),
+        "knowledge_base": knowledge_base.stats(),
+        "hybrid_retrieval": hybrid_retriever.stats(),
+        "catalog_search": catalog_search.stats()
+    }
+
+@router.get("/llm/usage")
+async def llm_usage(x_tenant_id: str = Header(...)):
+    """Month-to-date token usage of the tenant against its plan quota"""
+    return await usage_meter.usage(x_tenant_id)
@@ -1,7 +1,42 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException, Query
+from pydantic import BaseModel
+from database import get_db_connection
+from knowledge_base import knowledge_base
 
 router = APIRouter()
 
+class KBDocumentRequest(BaseModel):
+    title: str
+    content: str
+
 @router.get("/")
-async def list_kb_documents():
-    return {"message": "Knowledge Base endpoint working"} 
\ No newline at end of file
+async def list_kb_documents(x_tenant_id: str = Header(...)):
+    """The tenant's knowledge base documents with their chunk counts"""
+    db = await get_db_connection()
+    return {"documents": await db.list_kb_documents(x_tenant_id)}
+
+@router.post("/")
+async def create_kb_document(body: KBDocumentRequest, x_tenant_id: str = Header(...)):
+    """Add a document (return policy, size guide, ...) and index it for replies"""
+    result = await knowledge_base.index_document(x_tenant_id, body.title, body.content)
+    return result.to_dict()
+
+@router.put("/{document_id}")
+async def update_kb_document(document_id: str, body: KBDocumentRequest, x_tenant_id: str = Header(...)):
+    """Replace a document's text; unchanged chunks keep their embeddings"""
+    try:
+        result = await knowledge_base.index_document(x_tenant_id, body.title, body.content, document_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return result.to_dict()
+
+@router.delete("/{document_id}")
+async def delete_kb_document(document_id: str, x_tenant_id: str = Header(...)):
+    if not await knowledge_base.delete_document(x_tenant_id, document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"deleted": True}
+
+@router.get("/search")
+async def search_kb(q: str, x_tenant_id: str = Header(...), k: int = Query(5, ge=1, le=20)):
+    """Closest chunks to a question, as the reply path would see them (without its cutoffs)"""
+    return {"chunks": await knowledge_base.search(x_tenant_id, q, k)}
@@ -1,7 +1,29 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from database import get_db_connection
+from pagination import InvalidCursor, ndjson_lines
 
 router = APIRouter()
 
 @router.get("/")
-async def list_orders():
-    return {"message": "Orders endpoint working"} 
\ No newline at end of file
+async def list_orders(
+    x_tenant_id: str = Header(...),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
+):
+    """A page of orders, newest first; pass next_cursor for the next page"""
+    db = await get_db_connection()
+    try:
+        return await db.fetch_page('orders', x_tenant_id, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/export")
+async def export_orders(x_tenant_id: str = Header(...)):
+    """All orders as NDJSON, streamed from a server-side cursor"""
+    db = await get_db_connection()
+    return StreamingResponse(
+        ndjson_lines(db.stream_table('orders', x_tenant_id)),
+        media_type="application/x-ndjson"
+    )
@@ -0,0 +1,230 @@
+"""
+IG-Shop-Agent Schema Migrations
+Ordered SQL migration files applied once each and tracked in a version table
+
+Usage:
+    python schema_migrations.py status|migrate|explain
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Files that must run outside a transaction, e.g. for CREATE INDEX CONCURRENTLY
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+# Serializes workers that start at the same time
+ADVISORY_LOCK_KEY = 0x16_5409
+LOCK_POLL_INTERVAL = 1.0  # seconds
+
+# Index builds on big tables outlast the pool's 60s command timeout
+STATEMENT_TIMEOUT = 3600
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+_STATEMENT_END = re.compile(r';\s*$', re.MULTILINE)
+_CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE)
+
+class MigrationError(Exception):
+    """Migration files that cannot be applied as they are"""
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+    @property
+    def transactional(self) -> bool:
+        return NO_TRANSACTION not in self.sql
+
+    def statements(self) -> List[str]:
+        """Statements of a no-transaction file, split on line-ending semicolons"""
+        return [stmt.strip() for stmt in _STATEMENT_END.split(self.sql) if _strip_comments(stmt)]
+
+def _strip_comments(sql: str) -> str:
+    return '\n'.join(line for line in sql.splitlines() if not line.strip().startswith('--')).strip()
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Migration files in version order"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            migrations.append(Migration(int(match.group(1)), match.group(2), f.read()))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+async def applied_versions(conn) -> Dict[int, str]:
+    """Checksums of applied migrations by version"""
+    if not await conn.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL"):
+        return {}
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {row['version']: row['checksum'] for row in rows}
+
+async def migrate(db: Any, directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Apply pending migrations; a current schema costs two catalog lookups"""
+    migrations = load_migrations(directory)
+    async with db.get_connection() as conn:
+        applied = await applied_versions(conn)
+        if all(m.version in applied for m in migrations):
+            return []
+        # Poll rather than block: a session stuck in pg_advisory_lock would hold a
+        # snapshot that the lock holder's CREATE INDEX CONCURRENTLY waits on
+        while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", ADVISORY_LOCK_KEY):
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                )
+            """)
+            # Another worker may have applied some while we waited for the lock
+            applied = await applied_versions(conn)
+            done = []
+            for migration in migrations:
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        logger.warning(f"Migration {migration.version}_{migration.name} changed after it was applied")
+                    continue
+                await _apply(conn, migration)
+                done.append(migration)
+            return done
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+
+async def _apply(conn, migration: Migration) -> None:
+    logger.info(f"Applying migration {migration.version}_{migration.name}")
+    if migration.transactional:
+        async with conn.transaction():
+            await conn.execute(migration.sql, timeout=STATEMENT_TIMEOUT)
+            await _record(conn, migration)
+        return
+    # A concurrent build interrupted earlier leaves an invalid index that IF NOT EXISTS would keep
+    names = _CONCURRENT_INDEX.findall(migration.sql)
+    if names:
+        invalid = await conn.fetch(
+            """
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY($1::text[])
+            """,
+            names
+        )
+        for row in invalid:
+            logger.warning(f"Dropping invalid index {row['relname']} left by an interrupted build")
+            await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{row["relname"]}"', timeout=STATEMENT_TIMEOUT)
+    for statement in migration.statements():
+        await conn.execute(statement, timeout=STATEMENT_TIMEOUT)
+    await _record(conn, migration)
+
+async def _record(conn, migration: Migration) -> None:
+    await conn.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+        migration.version, migration.name, migration.checksum
+    )
+
+# Tenant-scoped queries on the request path, with sample arguments
+HOT_QUERIES = {
+    'catalog_page': (
+        "SELECT * FROM catalog_items WHERE user_id = $1 ORDER BY created_at DESC, id DESC LIMIT 100",
+        ['tenant'],
+    ),
+    'orders_page': (
+        "SELECT * FROM orders WHERE user_id = $1 ORDER BY created_at DESC, id DESC LIMIT 100",
+        ['tenant'],
+    ),
+    'conversation_thread': (
+        "SELECT message, is_ai_response, created_at FROM conversations "
+        "WHERE user_id = $1 AND customer = $2 AND created_at > NOW() - INTERVAL '7 days' "
+        "ORDER BY created_at ASC LIMIT 50",
+        ['tenant', 'customer'],
+    ),
+    'catalog_search': (
+        "SELECT id FROM catalog_items WHERE user_id = $1 AND $2 <% search_text LIMIT 20",
+        ['tenant', 'فستان اسود'],
+    ),
+    'kb_documents': (
+        "SELECT id, title FROM kb_documents WHERE user_id = $1",
+        ['tenant'],
+    ),
+}
+
+def _plan_nodes(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+async def explain_hot_queries(db: Any) -> Dict[str, Dict[str, Any]]:
+    """Index usage of each hot query
+
+    Sequential scans are disabled while planning, so a query that still
+    plans one has no index it can use (small tables would otherwise be
+    seq-scanned by choice). Plans come from where reads run: a replica in
+    rotation, else the primary.
+    """
+    results = {}
+    async with db.read_connection() as conn:
+        for name, (sql, args) in HOT_QUERIES.items():
+            async with conn.transaction():
+                await conn.execute("SET LOCAL enable_seqscan = off")
+                raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args)
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+            nodes = list(_plan_nodes(plan))
+            seq_scans = [n['Relation Name'] for n in nodes if n['Node Type'] == 'Seq Scan']
+            indexes = [n['Index Name'] for n in nodes if 'Index Name' in n]
+            results[name] = {'indexes': indexes, 'seq_scans': seq_scans, 'ok': bool(indexes) and not seq_scans}
+    return results
+
+async def _main(command: str) -> int:
+    from database import DatabaseService
+    db = DatabaseService()
+    await db.connect()
+    try:
+        if command == 'migrate':
+            applied = await migrate(db)
+            logger.info(f"applied {len(applied)} migration(s)" + ''.join(f"\n  {m.version}_{m.name}" for m in applied))
+        elif command == 'status':
+            async with db.read_connection() as conn:
+                applied = await applied_versions(conn)
+            for migration in load_migrations():
+                state = 'applied' if migration.version in applied else 'pending'
+                logger.info(f"{migration.version:04d}_{migration.name:<30} {state}")
+        else:
+            results = await explain_hot_queries(db)
+            for name, result in results.items():
+                verdict = 'index' if result['ok'] else 'SEQ SCAN'
+                logger.info(f"{name:<20} {verdict:<8} {', '.join(result['indexes'] or result['seq_scans'])}")
+            return 0 if all(r['ok'] for r in results.values()) else 1
+        return 0
+    finally:
+        await db.disconnect()
+
+__all__ = ["HOT_QUERIES", "Migration", "MigrationError", "applied_versions", "explain_hot_queries",
+           "load_migrations", "migrate"]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['status', 'migrate', 'explain'])
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.exit(asyncio.run(_main(parser.parse_args().command)))
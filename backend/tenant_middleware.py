@@ -3,13 +3,16 @@ IG-Shop-Agent Multi-Tenant Middleware
 Request-level tenant identification and data isolation
 """
 import logging
-from typing import Optional, Dict, Any, Callable
+from typing import Optional, Dict, Any, Callable, AsyncIterator, List
 from functools import wraps
 import asyncio
+from contextlib import asynccontextmanager
 from contextvars import ContextVar
 
-from database import db
+from database import CATALOG_COLUMNS, get_db_connection, set_db_session, stream_rows
 from instagram_oauth import verify_session_token
+from catalog_index import catalog_indexes
+from pagination import KEYSET_ORDER, keyset_condition, keyset_page
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,7 @@ class TenantContext:
     def set_tenant(self, tenant_id: str) -> None:
         """Set current tenant ID in context"""
         current_tenant_id.set(tenant_id)
+        set_db_session(tenant_id)
         logger.debug(f"Tenant context set to: {tenant_id}")
     
     def get_tenant_id(self) -> Optional[str]:
@@ -34,6 +38,7 @@ class TenantContext:
     def clear_tenant(self) -> None:
         """Clear tenant context"""
         current_tenant_id.set(None)
+        set_db_session(None)
         logger.debug("Tenant context cleared")
     
     async def get_tenant_info(self, tenant_id: str) -> Optional[Dict[str, Any]]:
@@ -43,13 +48,14 @@ class TenantContext:
         
         try:
             # Get tenant from database
+            db = await get_db_connection()
             tenant_info = await db.get_tenant_by_handle(tenant_id)
             if tenant_info:
                 self._tenant_cache[tenant_id] = tenant_info
                 return tenant_info
             
             # Try by actual tenant ID
-            async with db.get_connection() as conn:
+            async with db.read_connection() as conn:
                 row = await conn.fetchrow("""
                     SELECT id, instagram_handle, display_name, plan, status, created_at
                     FROM tenants 
@@ -275,13 +281,29 @@ def with_tenant(tenant_id: str):
 class TenantAwareDatabase:
     """Database operations with automatic tenant isolation"""
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager=None):
         self.db = db_manager
     
+    async def _get_db(self):
+        if self.db is None:
+            self.db = await get_db_connection()
+        return self.db
+    
+    @asynccontextmanager
     async def get_connection(self):
-        """Get database connection with tenant context"""
-        tenant_id = tenant_context.get_tenant_id()
-        return self.db.get_connection(tenant_id)
+        """Get a primary connection with tenant context"""
+        db = await self._get_db()
+        set_db_session(tenant_context.get_tenant_id())
+        async with db.get_connection() as conn:
+            yield conn
+    
+    @asynccontextmanager
+    async def read_connection(self):
+        """Get a read-only connection (a replica unless the tenant wrote recently) with tenant context"""
+        db = await self._get_db()
+        set_db_session(tenant_context.get_tenant_id())
+        async with db.read_connection() as conn:
+            yield conn
     
     @require_tenant
     async def create_catalog_item(self, item_data: Dict[str, Any]) -> str:
@@ -308,20 +330,36 @@ class TenantAwareDatabase:
                 item_data.get('extras', {})
             )
             
+            catalog_indexes.upsert_item(tenant_id, {**item_data, 'id': str(item_id)})
+            
             logger.info(f"Created catalog item {item_id} for tenant {tenant_id}")
             return str(item_id)
     
     @require_tenant
-    async def get_catalog_items(self, limit: int = 100, offset: int = 0) -> list:
-        """Get catalog items for current tenant"""
-        async with self.get_connection() as conn:
-            rows = await conn.fetch("""
-                SELECT * FROM catalog_items 
-                ORDER BY created_at DESC 
-                LIMIT $1 OFFSET $2
-            """, limit, offset)
+    async def get_catalog_items(self, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of catalog items for current tenant, newest first
+        
+        Pass the returned next_cursor to get the following page.
+        """
+        condition, cursor_args = keyset_condition(cursor, 2)
+        async with self.read_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT {CATALOG_COLUMNS} FROM catalog_items 
+                WHERE {condition}
+                {KEYSET_ORDER} 
+                LIMIT $1
+            """, limit + 1, *cursor_args)
             
-            return [dict(row) for row in rows]
+            return keyset_page([dict(row) for row in rows], limit)
+    
+    async def stream_catalog_items(self, chunk_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream all catalog items for current tenant in chunks"""
+        # require_tenant awaits its function, which an async generator cannot be
+        if not tenant_context.get_tenant_id():
+            raise ValueError("Tenant context required but not set")
+        async with self.read_connection() as conn:
+            async for chunk in stream_rows(conn, f"SELECT {CATALOG_COLUMNS} FROM catalog_items {KEYSET_ORDER}", chunk_size=chunk_size):
+                yield chunk
     
     @require_tenant
     async def create_order(self, order_data: Dict[str, Any]) -> str:
@@ -352,19 +390,33 @@ class TenantAwareDatabase:
             return str(order_id)
     
     @require_tenant
-    async def get_orders(self, limit: int = 100, offset: int = 0) -> list:
-        """Get orders for current tenant"""
-        async with self.get_connection() as conn:
-            rows = await conn.fetch("""
+    async def get_orders(self, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of orders for current tenant, newest first
+        
+        Pass the returned next_cursor to get the following page.
+        """
+        condition, cursor_args = keyset_condition(cursor, 2)
+        async with self.read_connection() as conn:
+            rows = await conn.fetch(f"""
                 SELECT * FROM orders 
-                ORDER BY created_at DESC 
-                LIMIT $1 OFFSET $2
-            """, limit, offset)
+                WHERE {condition}
+                {KEYSET_ORDER} 
+                LIMIT $1
+            """, limit + 1, *cursor_args)
             
-            return [dict(row) for row in rows]
+            return keyset_page([dict(row) for row in rows], limit)
+    
+    async def stream_orders(self, chunk_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream all orders for current tenant in chunks"""
+        # require_tenant awaits its function, which an async generator cannot be
+        if not tenant_context.get_tenant_id():
+            raise ValueError("Tenant context required but not set")
+        async with self.read_connection() as conn:
+            async for chunk in stream_rows(conn, f"SELECT * FROM orders {KEYSET_ORDER}", chunk_size=chunk_size):
+                yield chunk
 
 # Global tenant-aware database instance
-tenant_db = TenantAwareDatabase(db)
+tenant_db = TenantAwareDatabase()
 
 # Utility functions
 def get_current_tenant_id() -> Optional[str]:
@@ -0,0 +1,48 @@
+"""
+Test setup: backend modules are imported as top-level modules, as production_app runs them
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# azure_openai_service builds its OpenAI client at import time
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """Run work(db) against a local PostgreSQL, connected and disconnected in one event loop
+
+    Opt-in with TEST_DATABASE_HOST (plus TEST_DATABASE_PORT/NAME/USER/PASSWORD);
+    the tests never fall back to the configured DATABASE_* servers.
+    """
+    host = os.getenv("TEST_DATABASE_HOST")
+    if not host:
+        pytest.skip("TEST_DATABASE_HOST is not set")
+    from config import settings
+    monkeypatch.setattr(settings, "DATABASE_HOST", host)
+    monkeypatch.setattr(settings, "DATABASE_PORT", int(os.getenv("TEST_DATABASE_PORT", "5432")))
+    monkeypatch.setattr(settings, "DATABASE_NAME", os.getenv("TEST_DATABASE_NAME", "igshop_test"))
+    monkeypatch.setattr(settings, "DATABASE_USER", os.getenv("TEST_DATABASE_USER", "postgres"))
+    monkeypatch.setattr(settings, "DATABASE_PASSWORD", os.getenv("TEST_DATABASE_PASSWORD"))
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_HOSTS", os.getenv("TEST_DATABASE_REPLICA_HOSTS", ""))
+
+    def run(work):
+        from database import DatabaseService
+
+        async def session():
+            db = DatabaseService()
+            try:
+                await asyncio.wait_for(db.connect(), 10)
+            except Exception as e:
+                pytest.skip(f"PostgreSQL at {host} is unreachable: {e}")
+            try:
+                return await work(db)
+            finally:
+                await db.disconnect()
+        return asyncio.run(session())
+    return run
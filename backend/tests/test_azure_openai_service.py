@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from advanced_config import ProductionConfig
+from azure_openai_service import azure_openai_service, split_sentences
+from llm_router import LLMRouter
+from llm_scheduler import FairScheduler
+
+
+async def tokens(*parts):
+    for part in parts:
+        yield part
+
+
+def sentences(*parts):
+    async def run():
+        return [s async for s in split_sentences(tokens(*parts))]
+    return asyncio.run(run())
+
+
+def test_tokens_are_regrouped_into_sentences():
+    assert sentences('أهلا', ' وسهلا', '! الفستان', ' متوفر', '؟ نعم', ' بالأسود') == [
+        'أهلا وسهلا!', 'الفستان متوفر؟', 'نعم بالأسود'
+    ]
+
+
+def test_a_token_with_several_boundaries_is_cut_at_the_last_one():
+    assert sentences('Yes. It is 25 JOD.\nWe', ' deliver') == ['Yes. It is 25 JOD.', 'We deliver']
+
+
+def test_blank_pieces_are_not_sentences():
+    assert sentences('\n', ' ', '.') == ['.']
+    assert sentences() == []
+
+
+def stream():
+    async def run():
+        return [t async for t in azure_openai_service.generate_response_stream('بكم الفستان؟', [])]
+    return asyncio.run(run())
+
+
+def test_a_stream_failing_midway_ends_with_the_fallback(monkeypatch):
+    async def call_openai_stream(messages, tenant_id=None, tier=None):
+        yield 'الفستان'
+        raise ConnectionError('stream reset')
+
+    monkeypatch.setattr(azure_openai_service, '_call_openai_stream', call_openai_stream)
+    first, fallback = stream()
+
+    assert first == 'الفستان'
+    assert fallback.startswith('\n') and fallback[1:] in ProductionConfig.AI_FALLBACK_RESPONSES
+
+
+def test_a_stream_failing_before_any_token_is_only_the_fallback(monkeypatch):
+    async def call_openai_stream(messages, tenant_id=None, tier=None):
+        raise ConnectionError('refused')
+        yield
+
+    monkeypatch.setattr(azure_openai_service, '_call_openai_stream', call_openai_stream)
+
+    [reply] = stream()
+    assert reply in ProductionConfig.AI_FALLBACK_RESPONSES
+
+
+def test_non_streaming_replies_fall_back_when_the_completion_fails(monkeypatch):
+    async def call_openai(messages, max_tokens=None, tenant_id=None, tier=None, customer_reply=False):
+        raise ConnectionError('refused')
+
+    monkeypatch.setattr(azure_openai_service, '_call_openai', call_openai)
+
+    reply = asyncio.run(azure_openai_service.generate_response('بكم الفستان؟', []))
+    assert reply in ProductionConfig.AI_FALLBACK_RESPONSES
+
+
+class CompletionServer:
+    """Chat completions answered after delay seconds, counting the requests in flight"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+
+    async def __call__(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return httpx.Response(200, json={
+            'id': 'c', 'object': 'chat.completion', 'created': 0, 'model': json.loads(request.content)['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': 'أهلا'}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 2, 'total_tokens': 12},
+        })
+
+
+def concurrent_completions(monkeypatch, calls, capacity, delay=0.1):
+    """Run calls completions at once through the service's async path; returns (replies, seconds, server)"""
+    server = CompletionServer(delay)
+    pool = httpx.AsyncClient(transport=httpx.MockTransport(server))
+    config = {'name': 'fake', 'kind': 'openai', 'api_key': 'k', 'endpoint': 'http://llm.test/v1', 'model': 'm'}
+    monkeypatch.setattr(azure_openai_service, 'router', LLMRouter.from_config([config], pool))
+    monkeypatch.setattr(azure_openai_service, 'scheduler', FairScheduler(capacity=capacity, plan_resolver=None))
+
+    async def run():
+        started = time.perf_counter()
+        replies = await asyncio.gather(*[
+            azure_openai_service._call_openai([{'role': 'user', 'content': 'مرحبا'}], tenant_id=f"tenant-{i % 3}")
+            for i in range(calls)
+        ])
+        await pool.aclose()
+        return replies, time.perf_counter() - started
+
+    replies, elapsed = asyncio.run(run())
+    return replies, elapsed, server
+
+
+def test_completions_overlap_on_the_shared_pool(monkeypatch):
+    replies, elapsed, server = concurrent_completions(monkeypatch, calls=8, capacity=8)
+
+    assert replies == ['أهلا'] * 8
+    # Awaiting one completion does not hold up the others
+    assert server.peak == 8 and elapsed < 0.4
+
+
+def test_in_flight_completions_are_capped(monkeypatch):
+    replies, elapsed, server = concurrent_completions(monkeypatch, calls=6, capacity=2)
+
+    assert replies == ['أهلا'] * 6
+    assert server.peak == 2 and elapsed >= 0.3
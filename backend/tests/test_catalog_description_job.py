@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+
+from catalog_description_job import CatalogDescriptionJobRunner, JobProgress
+from catalog_index import catalog_indexes
+
+
+def catalog(count):
+    return [{'id': f"{i:03d}", 'sku': f"SKU-{i}", 'name': f"فستان {i}", 'category': 'فساتين',
+             'price_jod': 30, 'description': None} for i in range(count)]
+
+
+class JobStore:
+    """The description job store methods of DatabaseService over dicts; leases never lapse"""
+
+    def __init__(self, items):
+        self.items = {item['id']: dict(item) for item in items}
+        self.jobs = {}
+        self.saves = []
+        self.checkpoints = []
+        self._ids = itertools.count(1)
+
+    def add_job(self, user_id, claimed_by=None, done=0):
+        job = {'id': f"job-{next(self._ids)}", 'user_id': user_id, 'status': 'running', 'overwrite': False,
+               'total': len(self.items), 'done': done, 'failed': 0, 'created_at': 0, 'claimed_by': claimed_by}
+        self.jobs[job['id']] = job
+        return dict(job)
+
+    async def create_description_job(self, user_id, overwrite=False, claimed_by=None):
+        return self.add_job(user_id, claimed_by)
+
+    async def get_description_job(self, user_id, job_id=None):
+        for job in self.jobs.values():
+            if job['user_id'] == user_id and (job['id'] == job_id or (job_id is None and job['status'] == 'running')):
+                return dict(job)
+        return None
+
+    async def claim_description_jobs(self, worker, lease, job_id=None):
+        claimed = []
+        for job in self.jobs.values():
+            if job['status'] == 'running' and job_id in (None, job['id']) and job['claimed_by'] in (None, worker):
+                job['claimed_by'] = worker
+                claimed.append(dict(job))
+        return claimed
+
+    async def update_description_job(self, job_id, done, failed, status='running', last_error=None, claimed_by=None):
+        self.jobs[job_id].update(done=done, failed=failed, status=status, claimed_by=claimed_by)
+        self.checkpoints.append((done, claimed_by))
+
+    async def fetch_items_needing_description(self, user_id, job, after_id=None, limit=100):
+        pending = [dict(item) for key, item in sorted(self.items.items())
+                   if not item['description'] and (after_id is None or key > after_id)]
+        return pending[:limit]
+
+    async def save_generated_descriptions(self, user_id, descriptions):
+        self.saves.append(dict(descriptions))
+        for item_id, description in descriptions.items():
+            if item_id in self.items:  # UPDATE ... FROM unnest skips unknown ids
+                self.items[item_id]['description'] = description
+
+
+def flaky_generate(failures):
+    """Fails each item's first `failures` attempts, then describes it"""
+    attempts = {}
+
+    async def generate(item, tenant_id):
+        attempts[item['id']] = attempts.get(item['id'], 0) + 1
+        await asyncio.sleep(0)
+        if attempts[item['id']] <= failures:
+            raise ConnectionError("injected failure")
+        return f"وصف {item['name']}"
+    return generate
+
+
+def runner(store, **kwargs):
+    kwargs.setdefault('generate_fn', flaky_generate(0))
+    kwargs.setdefault('worker_id', 'worker-a')
+    return CatalogDescriptionJobRunner(store=store, concurrency=3, batch_size=4, backoff=0, backoff_max=0, **kwargs)
+
+
+def test_a_job_writes_every_item_in_batches_with_retries():
+    store = JobStore(catalog(10))
+    jobs = runner(store, generate_fn=flaky_generate(1), max_attempts=2)
+
+    async def run():
+        progress = await jobs.start('t')
+        await jobs._tasks['t']
+        return progress
+
+    progress = asyncio.run(run())
+
+    assert (progress.status, progress.done, progress.failed) == ('completed', 10, 0)
+    assert all(item['description'] == f"وصف {item['name']}" for item in store.items.values())
+    assert all(len(batch) <= 4 for batch in store.saves) and sum(map(len, store.saves)) == 10
+    # Checkpoints renew the claim; the last one releases it
+    assert store.checkpoints[-1] == (10, None)
+    assert all(worker == 'worker-a' for _, worker in store.checkpoints[:-1])
+    assert store.jobs[progress.job_id]['status'] == 'completed'
+
+
+def test_items_that_keep_failing_are_counted_not_retried_forever():
+    store = JobStore(catalog(3))
+    jobs = runner(store, generate_fn=flaky_generate(5), max_attempts=2)
+
+    async def run():
+        progress = await jobs.start('t')
+        await jobs._tasks['t']
+        return progress
+
+    progress = asyncio.run(run())
+
+    assert (progress.status, progress.done, progress.failed) == ('completed', 0, 3)
+    assert 'injected failure' in progress.last_error
+
+
+def test_written_descriptions_patch_the_built_index_in_place():
+    tenant = 'test-description-job-index'
+    items = catalog(3)
+    index = catalog_indexes.sync(tenant, items)
+    version = index.version
+    heard = []
+    listener = lambda tenant_id, v: heard.append(v) if tenant_id == tenant else None
+    catalog_indexes.add_listener(listener)
+    store = JobStore(items)
+    progress = JobProgress(job_id=store.add_job(tenant)['id'], tenant_id=tenant, total=3)
+    written = {'000': 'عباية قطنية', '001': 'فستان قطني', 'x': 'not indexed'}
+    try:
+        asyncio.run(runner(store)._flush(tenant, written, progress))
+    finally:
+        catalog_indexes._listeners.remove(listener)
+
+    # The same index, patched: one version bump for the batch, no rebuild
+    assert catalog_indexes.get(tenant) is index and index.version > version
+    assert heard == [index.version]
+    assert index.items['000']['description'] == 'عباية قطنية' and index.items['002']['description'] is None
+    assert {item['id'] for item in index.top_k('قطنية', 2)} == {'000', '001'}
+    catalog_indexes.invalidate(tenant)
+
+
+def test_resume_all_runs_only_jobs_no_other_worker_holds():
+    store = JobStore(catalog(6))
+    mine = store.add_job('tenant-1', done=2)
+    store.add_job('tenant-2', claimed_by='worker-b')
+    store.add_job('tenant-3', claimed_by='worker-a')  # Left by this worker's previous run
+
+    async def run():
+        jobs = runner(store)
+        resumed = await jobs.resume_all()
+        await asyncio.gather(*jobs._tasks.values())
+        return resumed
+
+    resumed = asyncio.run(run())
+
+    assert sorted(p.tenant_id for p in resumed) == ['tenant-1', 'tenant-3']
+    assert next(p for p in resumed if p.job_id == mine['id']).resumed_from == 2
+    assert [j['status'] for j in store.jobs.values()] == ['completed', 'running', 'completed']
+    assert store.jobs['job-2']['claimed_by'] == 'worker-b'
+
+
+def test_start_reports_a_job_another_worker_is_running():
+    store = JobStore(catalog(6))
+    store.add_job('t', claimed_by='worker-b', done=4)
+    jobs = runner(store)
+
+    progress = asyncio.run(jobs.start('t'))
+
+    assert (progress.job_id, progress.done, progress.status) == ('job-1', 4, 'running')
+    assert jobs._tasks == {} and store.saves == []
+
+
+def test_shutdown_releases_the_claim_for_the_next_worker():
+    store = JobStore(catalog(20))
+    release = asyncio.Event()
+
+    async def slow_after_first_batch(item, tenant_id):
+        if item['id'] >= '004':
+            await release.wait()
+        return f"وصف {item['name']}"
+
+    async def run():
+        first = runner(store, generate_fn=slow_after_first_batch)
+        progress = await first.start('t')
+        while store.jobs[progress.job_id]['done'] < 4:
+            await asyncio.sleep(0.01)
+        await first.shutdown()
+        interrupted = dict(store.jobs[progress.job_id])
+
+        release.set()
+        second = runner(store, worker_id='worker-b')
+        resumed = await second.resume_all()
+        await second._tasks['t']
+        return interrupted, resumed
+
+    interrupted, resumed = asyncio.run(run())
+
+    assert interrupted['status'] == 'running' and interrupted['claimed_by'] is None
+    assert [p.resumed_from for p in resumed] == [interrupted['done']]
+    assert resumed[0].done == 20 and store.jobs['job-1']['status'] == 'completed'
+
+
+def test_postgres_jobs_are_claimed_once(postgres):
+    tenant = 'test-description-job-claims'
+
+    async def work(db):
+        from schema_migrations import migrate
+        await migrate(db)
+        await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+        try:
+            job = await db.create_description_job(tenant)
+            await db.update_description_job(job['id'], 0, 0)  # Released, as after a shutdown
+            first, second = await asyncio.gather(
+                db.claim_description_jobs('worker-a', 600, job['id']),
+                db.claim_description_jobs('worker-b', 600, job['id'])
+            )
+            taken = await db.claim_description_jobs('worker-c', 600, job['id'])
+            await db.execute_query(
+                "UPDATE catalog_description_jobs SET claimed_at = NOW() - INTERVAL '20 minutes' WHERE id = $1",
+                job['id']
+            )
+            expired = await db.claim_description_jobs('worker-c', 600, job['id'])
+            return first, second, taken, expired
+        finally:
+            await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+
+    first, second, taken, expired = postgres(work)
+
+    assert len(first) + len(second) == 1
+    assert taken == []
+    assert [j['claimed_by'] for j in expired] == ['worker-c']
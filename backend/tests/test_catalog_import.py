@@ -0,0 +1,111 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from catalog_import import CatalogImporter, ImportFormatError, csv_records, ndjson_records, validate_row
+
+
+async def pieces(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def collect(records):
+    async def run():
+        return [record async for record in records]
+    return asyncio.run(run())
+
+
+def test_validate_row_builds_the_staging_tuple():
+    row, errors = validate_row({
+        'sku': ' DR-1 ', 'name': 'فستان', 'price_jod': '45.5', 'stock_quantity': '3',
+        'media_url': 'https://cdn.example.com/1.jpg', 'extras': '{"sizes": ["S", "M"]}', 'category': ''
+    }, 7)
+
+    assert errors == []
+    assert row == (7, 'DR-1', 'فستان', Decimal('45.50'), None, None, 3, 'https://cdn.example.com/1.jpg',
+                   '{"sizes": ["S", "M"]}')
+
+
+def test_validate_row_serializes_object_extras():
+    row, _ = validate_row({'sku': 'A', 'name': 'عباية', 'price_jod': 10, 'extras': {'لون': 'أسود'}}, 1)
+
+    assert row[-1] == '{"لون": "أسود"}'
+
+
+@pytest.mark.parametrize('raw, message', [
+    ({'name': 'x', 'price_jod': '1'}, "sku is required"),
+    ({'sku': 'A' * 101, 'name': 'x', 'price_jod': '1'}, "sku is longer than 100 characters"),
+    ({'sku': 'A', 'price_jod': '1'}, "name is required"),
+    ({'sku': 'A', 'name': 'x'}, "price_jod is required"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': 'free'}, "price_jod is not a valid price: 'free'"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': '-1'}, "price_jod is not a valid price: '-1'"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': 'NaN'}, "price_jod is not a valid price: 'NaN'"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': '1', 'stock_quantity': '2.5'},
+     "stock_quantity is not a non-negative integer: '2.5'"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': '1', 'media_url': 'ftp://x'}, "media_url must be an http(s) URL"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': '1', 'extras': '{bad'}, "extras is not valid JSON"),
+    ({'sku': 'A', 'name': 'x', 'price_jod': '1', 'extras': '[1]'}, "extras must be a JSON object"),
+])
+def test_validate_row_rejects(raw, message):
+    row, errors = validate_row(raw, 1)
+
+    assert row is None
+    assert message in errors
+
+
+def test_csv_records_with_bom_and_quoted_multiline_fields():
+    data = (
+        '\ufeffSKU,Name,price_jod,description\r\n'
+        'DR-1,"فستان ""سهرة""",45,"سطر أول\nسطر ثاني"\r\n'
+        '\r\n'
+        'AB-1,عباية,30,\r\n'
+    ).encode('utf-8')
+
+    # Tiny chunks split the BOM, multi-byte letters and the quoted newline
+    records = collect(csv_records(pieces(data, 3)))
+
+    assert records == [
+        {'sku': 'DR-1', 'name': 'فستان "سهرة"', 'price_jod': '45', 'description': 'سطر أول\nسطر ثاني'},
+        {'sku': 'AB-1', 'name': 'عباية', 'price_jod': '30', 'description': ''},
+    ]
+
+
+def test_csv_records_requires_the_header_fields():
+    with pytest.raises(ImportFormatError, match="price_jod"):
+        collect(csv_records(pieces(b'sku,name\nA,b\n', 64)))
+
+
+def test_csv_records_rejects_an_unclosed_quote():
+    with pytest.raises(ImportFormatError, match="quoted field"):
+        collect(csv_records(pieces(b'sku,name,price_jod\nA,"open,1\n', 64)))
+
+
+def test_ndjson_records_yield_none_for_bad_lines():
+    data = '{"sku": "A"}\nnot json\n\n{"sku": "ب"}'.encode('utf-8')
+
+    assert collect(ndjson_records(pieces(data, 5))) == [{'sku': 'A'}, None, {'sku': 'ب'}]
+
+
+class ImportStore:
+    def __init__(self):
+        self.rows = []
+
+    async def import_catalog_items(self, tenant_id, batches):
+        async for batch in batches:
+            self.rows.extend(batch)
+        return {'inserted': len(self.rows), 'updated': 0}
+
+
+def test_importer_reports_rejected_rows():
+    store = ImportStore()
+    importer = CatalogImporter(store=store, batch_size=2, max_errors=1)
+    data = b'sku,name,price_jod\nA,a,1\nB,,2\nC,c,x\nD,d,4\n'
+
+    report = asyncio.run(importer.run('test-import', pieces(data, 7), 'csv'))
+
+    assert [row[1] for row in store.rows] == ['A', 'D']
+    assert (report.rows, report.valid, report.failed, report.inserted) == (4, 2, 2, 2)
+    assert report.errors == [{'row': 2, 'sku': 'B', 'errors': ['name is required']}]
+    assert report.errors_truncated
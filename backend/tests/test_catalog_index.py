@@ -0,0 +1,91 @@
+import asyncio
+
+from catalog_index import CatalogIndexRegistry, catalog_indexes
+from message_pipeline import MessagePipeline
+
+
+def catalog():
+    return [
+        {'id': '1', 'sku': 'DR-1', 'name': 'فستان سهرة أحمر', 'category': 'فساتين', 'price_jod': 45, 'stock_quantity': 3},
+        {'id': '2', 'sku': 'AB-1', 'name': 'عباية سوداء', 'category': 'عبايات', 'price_jod': 30, 'stock_quantity': 5},
+        {'id': '3', 'sku': 'BG-1', 'name': 'حقيبة جلد', 'category': 'حقائب', 'price_jod': 25, 'stock_quantity': 2},
+    ]
+
+
+def test_sync_reindexes_an_edited_item():
+    registry = CatalogIndexRegistry()
+    items = catalog()
+    assert registry.sync('t', items).top_k('فستان احمر', 1)[0]['id'] == '1'
+
+    items[0] = {**items[0], 'name': 'بنطلون جينز'}
+    items[2] = {**items[2], 'name': 'فستان أحمر قصير'}
+    index = registry.sync('t', items)
+
+    assert index.top_k('فستان احمر', 1)[0]['id'] == '3'
+    assert index.top_k('بنطلون', 1)[0]['id'] == '1'
+
+
+def test_sync_returns_the_edited_price():
+    registry = CatalogIndexRegistry()
+    items = catalog()
+    registry.sync('t', items)
+
+    items[1] = {**items[1], 'price_jod': 22}
+    top = registry.sync('t', items).top_k('عباية', 1)[0]
+
+    assert top['price_jod'] == 22
+
+
+def test_sync_drops_items_missing_from_the_fetch():
+    registry = CatalogIndexRegistry()
+    registry.sync('t', catalog())
+
+    index = registry.sync('t', catalog()[1:])
+
+    assert '1' not in {item['id'] for item in index.top_k('فستان احمر', 10)}
+
+
+def test_remove_item_takes_it_out_of_top_k():
+    registry = CatalogIndexRegistry()
+    registry.sync('t', catalog())
+
+    registry.remove_item('t', '1')
+
+    assert [item['id'] for item in registry.get('t').top_k('فستان احمر', 10)] == ['2', '3']
+
+
+def test_listeners_hear_only_real_changes():
+    registry = CatalogIndexRegistry()
+    changes = []
+    registry.add_listener(lambda tenant_id, version: changes.append((tenant_id, version)))
+    registry.sync('t', catalog())
+    registry.sync('t', catalog())
+    assert changes == []
+
+    items = catalog()
+    items[2]['stock_quantity'] = 0
+    registry.sync('t', items)
+    registry.remove_item('t', '2')
+    registry.remove_item('t', 'missing')
+
+    assert [tenant for tenant, _ in changes] == ['t', 't']
+    assert changes[-1][1] == registry.version('t')
+
+
+class FakeStore:
+    def __init__(self, items):
+        self.items = items
+
+    async def fetch_catalog_items(self, tenant_id, limit):
+        return self.items[:limit]
+
+
+def test_pipeline_syncs_the_index_with_fetched_rows():
+    store = FakeStore(catalog())
+    pipeline = MessagePipeline(store=store)
+    asyncio.run(pipeline._fetch_catalog('test-pipeline-sync', 'فستان'))
+
+    store.items = catalog()[1:]
+    asyncio.run(pipeline._fetch_catalog('test-pipeline-sync', 'فستان'))
+
+    assert set(catalog_indexes.get('test-pipeline-sync').items) == {'2', '3'}
@@ -0,0 +1,83 @@
+import asyncio
+
+from catalog_search import CatalogSearch, search_queries
+
+
+def test_search_queries_normalize_like_search_text():
+    assert search_queries("بدي الفستان الاسود") == ['فستان اسود']
+    assert search_queries("فستان أسود") == ['فستان اسود']
+
+
+def test_search_queries_add_a_transliterated_arabizi_query():
+    assert search_queries("abaya aswad") == ['abaya aswad', 'ابي اسود']
+
+
+def test_search_queries_without_words():
+    assert search_queries("") == []
+    assert search_queries("و في") == []
+
+
+class SearchStore:
+    def __init__(self, results):
+        self.results = results  # threshold -> items
+        self.calls = []
+
+    async def search_catalog_items(self, user_id, queries, limit, threshold, candidates, name_weight):
+        self.calls.append((queries, threshold))
+        return self.results.get(threshold, [])
+
+
+def test_search_relaxes_the_threshold_only_when_nothing_matches():
+    store = SearchStore({0.6: [{'id': '1'}], 0.3: [{'id': '1'}, {'id': '2'}]})
+    search = CatalogSearch(store=store, thresholds=(0.6, 0.3))
+
+    # Fewer strict matches than asked for are still the answer
+    assert asyncio.run(search.search('t', 'فستان', 2)) == [{'id': '1'}]
+    assert [threshold for _, threshold in store.calls] == [0.6]
+
+    store.calls.clear()
+    store.results.pop(0.6)
+    assert asyncio.run(search.search('t', 'فسان', 2)) == [{'id': '1'}, {'id': '2'}]
+    assert [threshold for _, threshold in store.calls] == [0.6, 0.3]
+    assert search.stats()['relaxed'] == 1
+
+
+def test_find_swallows_store_errors():
+    class BrokenStore:
+        async def search_catalog_items(self, *args):
+            raise ConnectionError("down")
+
+    search = CatalogSearch(store=BrokenStore())
+
+    assert asyncio.run(search.find('t', 'فستان', 5)) == []
+    assert search.stats()['errors'] == 1
+
+
+def test_the_best_match_survives_the_candidate_cap(postgres):
+    tenant = 'test-catalog-search'
+
+    async def work(db):
+        from schema_migrations import migrate
+        await migrate(db)
+        await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+        try:
+            # Many weak matches inserted before the exact one
+            await db.execute_query(
+                """
+                INSERT INTO catalog_items (user_id, sku, name, price_jod)
+                SELECT $1, 'SKU-' || i, 'فستان طويل مطرز بالخرز موديل ' || i, 30 FROM generate_series(1, 200) AS i
+                """,
+                tenant
+            )
+            await db.execute_query(
+                "INSERT INTO catalog_items (user_id, sku, name, price_jod) VALUES ($1, 'EXACT', 'فستان اسود', 25)",
+                tenant
+            )
+            return await db.search_catalog_items(tenant, ['فستان اسود'], 3, 0.3, candidates=10)
+        finally:
+            await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+
+    items = postgres(work)
+
+    assert items[0]['sku'] == 'EXACT'
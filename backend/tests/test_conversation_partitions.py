@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+from contextlib import asynccontextmanager
+from datetime import date
+
+from conversation_partitions import ConversationPartitionManager, month_start, partition_month
+
+
+def test_month_start():
+    assert month_start(date(2026, 10, 17)) == date(2026, 10, 1)
+    assert month_start(date(2026, 10, 17), 3) == date(2027, 1, 1)
+    assert month_start(date(2026, 1, 31), -1) == date(2025, 12, 1)
+    assert month_start(date(2026, 3, 5), -26) == date(2024, 1, 1)
+
+
+def test_partition_month():
+    assert partition_month('conversations_2026_02') == date(2026, 2, 1)
+    assert partition_month('conversations') is None
+    assert partition_month('conversations_2026_02_old') is None
+
+
+class FakeConnection:
+    def __init__(self, statements, batches=()):
+        self.statements = statements
+        self.batches = batches
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, sql):
+        self.statements.append(sql)
+
+    async def fetchval(self, query, month):
+        return f"conversations_{month.year}_{month.month:02d}"
+
+    async def fetchrow(self, query, batch_size, after):
+        self.statements.append(after)
+        return self.batches.pop(0)
+
+    async def copy_from_table(self, name, output, format, header):
+        await output(b'id,message\n1,hello\n2,bye\n')
+        return 'COPY 2'
+
+
+class FakeDb:
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.statements = []
+        self.batches = []
+
+    async def fetch_all(self, query, *args):
+        return self.partitions
+
+    @asynccontextmanager
+    async def get_connection(self):
+        yield FakeConnection(self.statements, self.batches)
+
+
+def test_ensure_partitions_creates_only_missing_months():
+    db = FakeDb([{'name': 'conversations_2026_10', 'attached': True}])
+    manager = ConversationPartitionManager(db=db, months_ahead=2)
+
+    created = asyncio.run(manager.ensure_partitions(date(2026, 10, 17)))
+
+    assert created == ['conversations_2026_11', 'conversations_2026_12']
+
+
+def test_archive_expired_exports_and_drops_old_months(tmp_path):
+    db = FakeDb([
+        {'name': 'conversations_2025_09', 'attached': True},
+        {'name': 'conversations_2025_10', 'attached': False},   # Detached by an interrupted run
+        {'name': 'conversations_2025_11', 'attached': True},
+    ])
+    manager = ConversationPartitionManager(db=db, retention_months=12, archive_dir=str(tmp_path))
+
+    archived = asyncio.run(manager.archive_expired(date(2026, 11, 3)))
+
+    assert archived == {'conversations_2025_09': 2, 'conversations_2025_10': 2}
+    assert [s for s in db.statements if 'DETACH' in s] == ['ALTER TABLE conversations DETACH PARTITION "conversations_2025_09"']
+    assert [s for s in db.statements if s.startswith('DROP')] == [
+        'DROP TABLE "conversations_2025_09"', 'DROP TABLE "conversations_2025_10"'
+    ]
+    with gzip.open(tmp_path / 'conversations_2025_09.csv.gz') as archive:
+        assert archive.read() == b'id,message\n1,hello\n2,bye\n'
+    assert not list(tmp_path.glob('*.part'))
+
+
+def test_pre_partitioning_rows_are_moved_batch_by_batch():
+    db = FakeDb([])
+    db.batches.extend([
+        {'moved': 2, 'last_tid': '(0,2)'},
+        {'moved': 1, 'last_tid': '(1,1)'},  # A row locked by another worker was skipped
+        {'moved': 0, 'last_tid': None},
+    ])
+    manager = ConversationPartitionManager(db=db, move_batch_size=2)
+
+    assert asyncio.run(manager.move_unpartitioned()) == 3
+    assert db.statements == ['(0,0)', '(0,2)', '(1,1)']
+
+
+def test_postgres_moves_pre_partitioning_rows_and_drops_their_table(postgres):
+    tenant = 'test-partitions-move'
+
+    async def work(db):
+        from schema_migrations import migrate
+        await migrate(db)
+        await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+        try:
+            # As migration 0003 leaves it on a database with history
+            await db.execute_query("""
+                CREATE TABLE conversations_unpartitioned (
+                    id TEXT PRIMARY KEY, user_id TEXT, customer TEXT, message TEXT,
+                    is_ai_response BOOLEAN, created_at TIMESTAMP WITH TIME ZONE
+                )
+            """)
+            await db.execute_query("""
+                INSERT INTO conversations_unpartitioned
+                SELECT 'move-' || i, $1, 'c', 'm', FALSE,
+                       CASE WHEN i % 3 = 0 THEN NULL ELSE TIMESTAMPTZ '2019-01-15' + i * INTERVAL '20 days' END
+                FROM generate_series(1, 7) i
+            """, tenant)
+            moved = await ConversationPartitionManager(db=db, move_batch_size=2).move_unpartitioned()
+            rows = await db.fetch_val("SELECT COUNT(*) FROM conversations WHERE user_id = $1", tenant)
+            left = await db.fetch_val("SELECT to_regclass('conversations_unpartitioned') IS NOT NULL")
+            partitions = await db.fetch_all(
+                "SELECT relname FROM pg_class WHERE relname LIKE 'conversations\\_2019\\_%'"
+            )
+            return moved, rows, left, len(partitions)
+        finally:
+            await db.execute_query("DROP TABLE IF EXISTS conversations_unpartitioned")
+            await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+            await db.execute_query("DROP TABLE IF EXISTS conversations_2019_02, conversations_2019_04, "
+                                   "conversations_2019_06")
+
+    # Dated rows land in partitions created for Feb, Apr and Jun 2019; undated ones in this month
+    assert postgres(work) == (7, 7, False, 3)
@@ -0,0 +1,79 @@
+import asyncio
+
+from conversation_summarizer import ConversationSummarizer
+
+
+def test_drain_waits_for_refreshes_in_flight():
+    summarizer = ConversationSummarizer(store=object())
+    finished = []
+
+    async def refresh(tenant_id, customer):
+        await asyncio.sleep(0.01)
+        finished.append((tenant_id, customer))
+
+    summarizer.refresh = refresh
+
+    async def run():
+        summarizer.schedule_refresh('t', 'c1')
+        summarizer.schedule_refresh('t', 'c1')  # One run per thread
+        summarizer.schedule_refresh('t', 'c2')
+        await summarizer.drain()
+
+    asyncio.run(run())
+
+    assert sorted(finished) == [('t', 'c1'), ('t', 'c2')]
+
+
+def test_drain_gives_up_after_its_timeout():
+    summarizer = ConversationSummarizer(store=object())
+
+    async def refresh(tenant_id, customer):
+        await asyncio.sleep(10)
+
+    summarizer.refresh = refresh
+
+    async def run():
+        summarizer.schedule_refresh('t', 'c')
+        started = asyncio.get_running_loop().time()
+        await summarizer.drain(timeout=0.01)
+        return asyncio.get_running_loop().time() - started, len(summarizer._tasks)
+
+    elapsed, pending = asyncio.run(run())
+
+    assert elapsed < 1
+    assert pending == 1
+
+
+class SummaryStore:
+    def __init__(self, messages):
+        self.messages = messages
+        self.saved = []
+
+    async def get_conversation_summary(self, tenant_id, customer):
+        return None
+
+    async def count_conversation_messages_after(self, tenant_id, customer, after=None):
+        return len(self.messages)
+
+    async def fetch_conversation_messages_after(self, tenant_id, customer, after, limit):
+        return self.messages[:limit]
+
+    async def save_conversation_summary(self, tenant_id, customer, summary, covered_count, covered_until):
+        self.saved.append((tenant_id, customer, summary, covered_count))
+
+
+def test_refresh_summarizes_under_the_tenant():
+    calls = []
+
+    async def summarize(previous, messages, tenant_id):
+        calls.append((tenant_id, len(messages)))
+        return 'summary'
+
+    store = SummaryStore([
+        {'message': f'm{i}', 'is_ai_response': i % 2 == 1, 'created_at': i} for i in range(6)
+    ])
+    summarizer = ConversationSummarizer(store=store, summarize_fn=summarize, raw_turns=2)
+
+    assert asyncio.run(summarizer.refresh('tenant-1', 'c')) is True
+    assert calls == [('tenant-1', 4)]
+    assert store.saved == [('tenant-1', 'c', 'summary', 4)]
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from catalog_index import item_key, item_terms
+from hybrid_retrieval import Candidate, HybridRetriever, reciprocal_rank_fusion, rerank
+from knowledge_base import KnowledgeBase
+from test_knowledge_base import DELIVERY, RETURN_POLICY, FakeEmbedder, MemoryKBStore
+
+CATALOG = [
+    {'id': '1', 'sku': 'AB-1', 'name': 'عباية سوداء', 'category': 'عبايات', 'price_jod': 30},
+    {'id': '2', 'sku': 'DR-12', 'name': 'فستان سهرة', 'category': 'فساتين', 'price_jod': 45},
+    {'id': '3', 'sku': 'DR-13', 'name': 'فستان صيفي', 'category': 'فساتين', 'price_jod': 25},
+]
+
+
+def candidates(*docs):
+    """Candidates in the given (fused) order, with falling RRF scores"""
+    return [Candidate(item_key(doc), doc, reciprocal_rank_fusion([[item_key(d) for d in docs]])[item_key(doc)])
+            for doc in docs]
+
+
+def test_rrf_rewards_keys_ranked_by_both_sides():
+    scores = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd']], k=60)
+
+    assert scores['b'] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores['a'] == pytest.approx(1 / 61)
+    assert sorted(scores, key=lambda key: -scores[key]) == ['b', 'a', 'd', 'c']
+    assert reciprocal_rank_fusion([]) == {}
+
+
+def test_rerank_puts_the_typed_product_code_first():
+    evening, summer = CATALOG[1], CATALOG[2]
+
+    ranked = rerank('بدي فستان DR-12 لو سمحت', candidates(summer, evening), 'name', item_terms)
+
+    assert [c.key for c in ranked] == ['2', '3']
+    assert ranked[0].code_match and not ranked[1].code_match
+
+
+def test_rerank_prefers_covering_every_query_word_over_repeating_one():
+    black = {'id': 'a', 'name': 'عباية سوداء', 'description': 'قطن ناعم'}
+    repeated = {'id': 'b', 'name': 'عباية', 'description': 'عباية عباية عباية'}
+
+    ranked = rerank('عباية سوداء قطن', candidates(repeated, black), 'name', item_terms)
+
+    assert [c.key for c in ranked] == ['a', 'b']
+    assert ranked[0].coverage == 1.0 and ranked[1].coverage < 0.5
+    assert ranked[0].name_coverage > ranked[1].name_coverage
+
+
+def test_query_words_no_candidate_contains_do_not_count():
+    ranked = rerank('addesh se3ro فستان', candidates(CATALOG[2], CATALOG[1]), 'name', item_terms)
+
+    assert all(c.coverage == 1.0 for c in ranked)
+    assert [c.key for c in ranked] == ['3', '2']  # Tied on coverage, RRF decides
+
+
+def indexed_kb_store(tenant):
+    store = MemoryKBStore()
+    asyncio.run(KnowledgeBase(store=store, embedder=FakeEmbedder(), backend='pgvector').index_documents(tenant, [
+        {'title': 'Returns', 'content': RETURN_POLICY},
+        {'title': 'Delivery', 'content': DELIVERY},
+    ]))
+    return store
+
+
+def test_a_late_vector_side_leaves_the_lexical_results():
+    tenant = 'test-hybrid-late'
+    store = indexed_kb_store(tenant)
+    kb = KnowledgeBase(store=store, embedder=FakeEmbedder(delay=1.0), backend='pgvector', budget=0.05)
+    retriever = HybridRetriever(kb=kb, store=store)
+
+    async def run():
+        return (await retriever.retrieve(tenant, 'فستان سهرة', CATALOG),
+                await retriever.retrieve(tenant, 'التوصيل للمحافظات', CATALOG))
+
+    started = time.perf_counter()
+    (catalog, _), (_, knowledge) = asyncio.run(run())
+
+    assert time.perf_counter() - started < 0.5
+    assert catalog[0]['id'] == '2'
+    assert [c['title'] for c in knowledge] == ['Delivery']
+    assert retriever.stats()['vector_timeouts'] == 2
+
+
+def test_a_failing_vector_side_leaves_the_lexical_results():
+    tenant = 'test-hybrid-error'
+    store = indexed_kb_store(tenant)
+
+    async def embedder(texts):
+        raise ConnectionError("embedding deployment unavailable")
+
+    retriever = HybridRetriever(kb=KnowledgeBase(store=store, embedder=embedder, backend='pgvector'), store=store)
+
+    catalog, knowledge = asyncio.run(retriever.retrieve(tenant, 'هل يمكن إرجاع القطعة؟', CATALOG))
+
+    assert len(catalog) == len(CATALOG)
+    assert [c['title'] for c in knowledge] == ['Returns']
+    assert retriever.stats()['vector_errors'] == 1
+
+
+def test_catalog_vectors_join_once_built():
+    tenant = 'test-hybrid-vectors'
+    store = indexed_kb_store(tenant)
+    retriever = HybridRetriever(kb=KnowledgeBase(store=store, embedder=FakeEmbedder(), backend='pgvector'), store=store)
+
+    async def run():
+        await retriever.retrieve(tenant, 'فستان', CATALOG)
+        # The first search only schedules the catalog embedding
+        while retriever.catalog_vectors.builds == 0:
+            await asyncio.sleep(0.01)
+        return await retriever.retrieve(tenant, 'فستان', CATALOG)
+
+    catalog, _ = asyncio.run(run())
+
+    assert {item['id'] for item in catalog[:2]} == {'2', '3'}
+    assert retriever.stats()['catalog_vector_hits'] == 1
@@ -0,0 +1,52 @@
+import pytest
+
+from intent_classifier import INTENTS, detect_language, intent_classifier
+
+
+@pytest.mark.parametrize('message, intent', [
+    ("بكم الفستان الاسود؟", 'inquiry'),
+    ("how much is the abaya", 'inquiry'),
+    ("بدي اطلب قطعتين الدفع عند الاستلام", 'purchase'),
+    ("I want to order the black dress", 'purchase'),
+    ("شو عندكم جديد؟ ابعتيلي صور", 'browse'),
+    ("show me your new arrivals", 'browse'),
+    ("وين طلبي؟ رقم الطلب 1234", 'support'),
+    ("where is my order", 'support'),
+    ("وصلني غلط ومخروق، مش مبسوطه", 'complaint'),
+    ("worst service, wrong item and damaged", 'complaint'),
+])
+def test_classify_intent(message, intent):
+    assert intent_classifier.classify(message)['intent'] == intent
+
+
+def test_classify_tolerates_typos():
+    assert intent_classifier.classify("hw much is the pricee")['intent'] == 'inquiry'
+
+
+def test_classify_schema_and_confidence():
+    result = intent_classifier.classify("بدي اطلب فستان مع حقيبة اليوم")
+
+    assert set(result) == {'intent', 'products_mentioned', 'urgency', 'language', 'confidence'}
+    assert result['intent'] in INTENTS
+    assert set(result['products_mentioned']) == {'dress', 'bag'}
+    assert result['urgency'] == 'high'
+    assert result['language'] == 'ar'
+    assert 0 < result['confidence'] <= 1
+
+
+def test_classify_without_evidence_is_an_unconfident_inquiry():
+    result = intent_classifier.classify("؟؟")
+
+    assert result['intent'] == 'inquiry'
+    assert result['confidence'] == 0.0
+
+
+def test_complaints_are_urgent_and_browsing_is_not():
+    assert intent_classifier.classify("terrible, I am disappointed")['urgency'] == 'high'
+    assert intent_classifier.classify("show me the collection")['urgency'] == 'low'
+
+
+def test_detect_language():
+    assert detect_language("مرحبا") == 'ar'
+    assert detect_language("hello there") == 'en'
+    assert detect_language("kifak, 2addesh el fustan") == 'ar'
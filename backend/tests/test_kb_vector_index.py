@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from kb_vector_index import MANIFEST, LocalIndexRegistry, LocalVectorIndex, normalize_rows
+
+DIMENSIONS = 64
+
+
+def vectors(count, seed=1):
+    return normalize_rows(np.random.default_rng(seed).standard_normal((count, DIMENSIONS)))
+
+
+def rows(count, label='chunk'):
+    return [{'document_id': f"doc-{i // 10}", 'title': f"Doc {i // 10}", 'chunk_index': i % 10,
+             'content': f"{label} {i}", 'token_count': 5} for i in range(count)]
+
+
+class ChunkStore:
+    """stream_kb_chunk_vectors over a list; waits for release when gated"""
+
+    def __init__(self, count, label='chunk'):
+        self.set(count, label)
+        self.gate = None
+        self.streams = 0
+
+    def set(self, count, label):
+        self.rows = [{**row, 'embedding': v.tolist()} for row, v in zip(rows(count, label), vectors(count))]
+
+    async def stream_kb_chunk_vectors(self, tenant_id):
+        self.streams += 1
+        snapshot = [dict(row) for row in self.rows]
+        if self.gate is not None:
+            await self.gate.wait()
+        yield snapshot
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+@pytest.mark.parametrize('ivf_threshold', [10000, 100])
+def test_search_finds_stored_vectors(tmp_path, dtype, ivf_threshold):
+    data = vectors(1000)
+    LocalVectorIndex.build(str(tmp_path), data, rows(1000), dtype=dtype, ivf_threshold=ivf_threshold)
+    index = LocalVectorIndex.open(str(tmp_path))
+
+    for i in (0, 17, 999):
+        (row, score), *_ = index.search(data[i], 3)
+        assert row == i and score == pytest.approx(1.0, abs=0.02)
+        assert index.row(row)['content'] == f"chunk {i}"
+    assert index.info().lists == (31 if ivf_threshold == 100 else 0)
+
+
+def test_rows_live_in_the_index_files_not_the_manifest(tmp_path):
+    LocalVectorIndex.build(str(tmp_path), vectors(50), rows(50, 'سياسة الإرجاع'))
+
+    with open(os.path.join(tmp_path, MANIFEST), encoding='utf-8') as f:
+        manifest = f.read()
+    index = LocalVectorIndex.open(str(tmp_path))
+
+    assert 'سياسة' not in manifest and 'rows' not in json.loads(manifest)
+    assert index.row(49) == rows(50, 'سياسة الإرجاع')[49]
+
+
+def test_an_empty_kb_builds_an_empty_index(tmp_path):
+    registry = LocalIndexRegistry(root=str(tmp_path))
+
+    assert asyncio.run(registry.search('t', ChunkStore(0), vectors(1)[0], 3)) == []
+
+
+def test_a_build_overtaken_by_a_kb_change_is_not_published(tmp_path):
+    registry = LocalIndexRegistry(root=str(tmp_path))
+    store = ChunkStore(20, 'old')
+
+    async def run():
+        store.gate = asyncio.Event()
+        stale = asyncio.create_task(registry.search('t', store, vectors(20)[3], 1))
+        await asyncio.sleep(0.01)  # The build has read the old chunks
+        store.set(20, 'new')
+        registry.invalidate('t')
+        store.gate.set()
+        await stale
+        published = LocalVectorIndex.open(registry.path('t'))
+        fresh = await registry.search('t', store, vectors(20)[3], 1)
+        return published, fresh
+
+    published, fresh = asyncio.run(run())
+
+    assert published is None
+    assert [c['content'] for c in fresh] == ['new 3']
+    assert registry.builds == 2
+
+
+def test_changes_in_another_process_are_picked_up(tmp_path):
+    worker, other = LocalIndexRegistry(root=str(tmp_path)), LocalIndexRegistry(root=str(tmp_path))
+    store = ChunkStore(20, 'old')
+    query = vectors(20)[5]
+
+    assert asyncio.run(worker.search('t', store, query, 1))[0]['content'] == 'old 5'
+    # Another worker indexes a document: its registry starts a new generation
+    store.set(20, 'new')
+    other.invalidate('t')
+
+    assert asyncio.run(worker.search('t', store, query, 1))[0]['content'] == 'new 5'
+    assert asyncio.run(other.search('t', store, query, 1))[0]['content'] == 'new 5'
+    assert store.streams == 2
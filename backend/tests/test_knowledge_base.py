@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+
+from knowledge_base import KnowledgeBase, content_hash
+from kb_vector_index import parse_vector
+from response_cache import response_cache
+
+DIMENSIONS = 1536  # kb_chunks.embedding
+
+RETURN_POLICY = "يمكن إرجاع القطعة خلال 7 أيام من الاستلام. يجب أن تكون القطعة بحالتها الأصلية."
+DELIVERY = "التوصيل داخل عمان خلال يومين. التوصيل للمحافظات خلال 3 أيام."
+
+
+class FakeEmbedder:
+    """Deterministic unit vectors per text; records every batch it is asked for"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    async def __call__(self, texts):
+        self.batches.append(list(texts))
+        await asyncio.sleep(self.delay)
+        return [self.vector(text) for text in texts]
+
+    @staticmethod
+    def vector(text):
+        seed = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).standard_normal(DIMENSIONS)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def texts(self):
+        return [text for batch in self.batches for text in batch]
+
+
+class MemoryKBStore:
+    """The kb_* store methods of DatabaseService over dicts"""
+
+    def __init__(self):
+        self.documents = {}
+        self.chunks = {}  # document_id -> [(chunk_index, content, content_hash, token_count, embedding)]
+        self.counts = 0
+        self.pgvector = (0, 8)  # () as on a server without the extension
+
+    async def fetch_kb_embeddings(self, hashes):
+        return {c[2]: c[4] for rows in self.chunks.values() for c in rows if c[2] in hashes}
+
+    async def upsert_kb_document(self, tenant_id, title, content, document_id=None):
+        document_id = document_id or f"doc-{len(self.documents) + 1}"
+        self.documents[document_id] = (tenant_id, title, content)
+        return document_id
+
+    async def replace_kb_chunks(self, tenant_id, document_id, rows):
+        self.chunks[document_id] = list(rows)
+
+    async def delete_kb_document(self, tenant_id, document_id):
+        self.chunks.pop(document_id, None)
+        return self.documents.pop(document_id, None) is not None
+
+    async def count_kb_chunks(self, tenant_id):
+        self.counts += 1
+        return sum(len(rows) for d, rows in self.chunks.items() if self.documents[d][0] == tenant_id)
+
+    async def stream_kb_chunk_vectors(self, tenant_id):
+        yield [
+            {'document_id': d, 'title': self.documents[d][1], 'chunk_index': c[0], 'content': c[1],
+             'token_count': c[3], 'embedding': parse_vector(c[4]).tolist()}
+            for d, rows in self.chunks.items() if self.documents[d][0] == tenant_id for c in rows
+        ]
+
+    async def pgvector_version(self):
+        return self.pgvector
+
+    async def fetch_kb_chunks(self, tenant_id):
+        return [
+            {'document_id': d, 'title': self.documents[d][1], 'chunk_index': c[0], 'content': c[1], 'token_count': c[3]}
+            for d, rows in self.chunks.items() if self.documents[d][0] == tenant_id for c in rows
+        ]
+
+    async def search_kb_chunks(self, tenant_id, embedding, limit, ef_search=40):
+        query = np.array(parse_vector(embedding))
+        scored = [
+            {'document_id': d, 'title': self.documents[d][1], 'chunk_index': c[0], 'content': c[1],
+             'token_count': c[3], 'similarity': float(query @ np.array(parse_vector(c[4])))}
+            for d, rows in self.chunks.items() if self.documents[d][0] == tenant_id for c in rows
+        ]
+        return sorted(scored, key=lambda c: -c['similarity'])[:limit]
+
+
+def knowledge_base(store, embedder, **kwargs):
+    return KnowledgeBase(store=store, embedder=embedder, backend='pgvector', **kwargs)
+
+
+def test_repeated_chunks_are_embedded_once():
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    kb = knowledge_base(store, embedder)
+
+    first, second = asyncio.run(kb.index_documents('t', [
+        {'title': 'Returns', 'content': RETURN_POLICY},
+        {'title': 'Returns (copy)', 'content': RETURN_POLICY},
+    ]))
+
+    assert len(embedder.batches) == 1
+    assert sorted(embedder.texts()) == sorted(set(embedder.texts()))
+    assert (first.embedded, second.embedded) == (first.chunks, 0)
+    assert second.reused == second.chunks
+
+
+def test_reindexing_reuses_stored_embeddings_by_content_hash():
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    kb = knowledge_base(store, embedder, tenant_state_ttl=3600)
+    document_id = asyncio.run(kb.index_document('t', 'Returns', RETURN_POLICY)).document_id
+    embedder.batches.clear()
+
+    # Whitespace-only edits hash the same, so nothing is embedded again
+    result = asyncio.run(kb.index_document('t', 'Returns', RETURN_POLICY.replace(' ', '  '), document_id))
+
+    assert embedder.batches == []
+    assert result.embedded == 0 and result.reused == result.chunks
+    assert [c[2] for c in store.chunks[document_id]] == [content_hash(RETURN_POLICY)]
+
+
+def test_reindexing_replaces_the_document_chunks():
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    kb = knowledge_base(store, embedder)
+    document_id = asyncio.run(kb.index_document('t', 'Policy', RETURN_POLICY)).document_id
+
+    asyncio.run(kb.index_document('t', 'Policy', DELIVERY, document_id))
+
+    assert [c[1] for c in store.chunks[document_id]] == [DELIVERY]
+    assert embedder.texts() == [RETURN_POLICY, DELIVERY]
+
+
+def test_retrieval_gives_up_after_the_budget():
+    store = MemoryKBStore()
+    asyncio.run(knowledge_base(store, FakeEmbedder()).index_document('t', 'Returns', RETURN_POLICY))
+    kb = knowledge_base(store, FakeEmbedder(delay=1.0), budget=0.05)
+
+    started = time.perf_counter()
+    chunks = asyncio.run(kb.retrieve('t', 'هل يمكن إرجاع الفستان؟'))
+
+    assert chunks == []
+    assert time.perf_counter() - started < 0.5
+    assert kb.stats()['timeouts'] == 1
+
+
+def test_retrieval_returns_the_matching_chunk():
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    kb = knowledge_base(store, embedder)
+    asyncio.run(kb.index_documents('t', [
+        {'title': 'Returns', 'content': RETURN_POLICY},
+        {'title': 'Delivery', 'content': DELIVERY},
+    ]))
+
+    chunks = asyncio.run(kb.retrieve('t', DELIVERY))
+
+    assert [c['title'] for c in chunks] == ['Delivery']
+
+
+def test_kb_changes_invalidate_cached_state():
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    kb = knowledge_base(store, embedder, tenant_state_ttl=3600)
+    changed = []
+    kb.add_listener(changed.append)
+    tenant = 'test-kb-invalidate'
+
+    # An empty KB is remembered for tenant_state_ttl...
+    assert asyncio.run(kb.retrieve(tenant, DELIVERY)) == []
+    asyncio.run(response_cache.put(tenant, 1, 'وين التوصيل', 'cached reply'))
+
+    document_id = asyncio.run(kb.index_document(tenant, 'Delivery', DELIVERY)).document_id
+
+    # ...until the KB changes: the count, cached replies and listeners are all refreshed
+    assert [c['title'] for c in asyncio.run(kb.retrieve(tenant, DELIVERY))] == ['Delivery']
+    assert asyncio.run(response_cache.get(tenant, 1, 'وين التوصيل')) is None
+    assert changed == [tenant]
+
+    asyncio.run(kb.delete_document(tenant, document_id))
+
+    assert changed == [tenant, tenant]
+    assert asyncio.run(kb.retrieve(tenant, DELIVERY)) == []
+    assert store.counts == 3
+
+
+def test_without_pgvector_large_kbs_are_searched_lexically():
+    from hybrid_retrieval import HybridRetriever
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    store.pgvector = ()
+    kb = knowledge_base(store, embedder)
+    asyncio.run(kb.index_documents('t', [
+        {'title': 'Returns', 'content': RETURN_POLICY},
+        {'title': 'Delivery', 'content': DELIVERY},
+    ]))
+    embedder.batches.clear()
+
+    assert asyncio.run(kb.retrieve('t', DELIVERY)) == []
+    assert embedder.batches == []
+    assert kb.stats()['no_pgvector'] == 1
+
+    catalog = [{'id': 'item-1', 'name': 'فستان سهرة', 'price_jod': 30}]
+    _, knowledge = asyncio.run(HybridRetriever(kb=kb, store=store).retrieve('t', 'التوصيل للمحافظات', catalog))
+
+    assert [c['title'] for c in knowledge] == ['Delivery']
+
+
+def test_local_index_serves_searches_without_pgvector(tmp_path):
+    from kb_vector_index import LocalIndexRegistry
+    store, embedder = MemoryKBStore(), FakeEmbedder()
+    store.pgvector = ()
+    kb = KnowledgeBase(store=store, embedder=embedder, backend='auto',
+                       local_indexes=LocalIndexRegistry(root=str(tmp_path)))
+    asyncio.run(kb.index_document('t', 'Delivery', DELIVERY))
+
+    assert [c['title'] for c in asyncio.run(kb.retrieve('t', DELIVERY))] == ['Delivery']
+    assert kb.stats()['no_pgvector'] == 0
+
+
+def test_postgres_chunks_are_replaced_and_embeddings_reused(postgres):
+    tenant = 'test-kb-postgres'
+    embedder = FakeEmbedder()
+
+    async def work(db):
+        from schema_migrations import migrate
+        await migrate(db)
+        await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+        try:
+            kb = knowledge_base(db, embedder)
+            first = await kb.index_document(tenant, 'Policy', RETURN_POLICY)
+            copy = await kb.index_document(tenant, 'Policy (copy)', RETURN_POLICY)
+            await kb.index_document(tenant, 'Policy', DELIVERY, first.document_id)
+            chunks = await db.fetch_all(
+                "SELECT document_id, content FROM kb_chunks WHERE user_id = $1 ORDER BY document_id", tenant
+            )
+            # Without the extension the chunks are still stored; only the vector search is skipped
+            found = await kb.search(tenant, DELIVERY) if await db.pgvector_version() else None
+            return first, copy, chunks, found
+        finally:
+            await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+
+    first, copy, chunks, found = postgres(work)
+
+    assert copy.embedded == 0
+    assert sorted((c['document_id'], c['content']) for c in chunks) == sorted([
+        (first.document_id, DELIVERY), (copy.document_id, RETURN_POLICY)
+    ])
+    assert embedder.texts() == [RETURN_POLICY, DELIVERY, DELIVERY]
+    if found is not None:
+        assert found[0]['document_id'] == first.document_id
+        assert found[0]['similarity'] > 0.99
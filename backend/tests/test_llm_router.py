@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from azure_openai_service import azure_openai_service
+from llm_router import Deployment, LLMRouter
+from model_routing import complexity_router
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeClient:
+    """Streams the given tokens, or times out before the first one when tokens is None"""
+
+    def __init__(self, tokens):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.tokens = tokens
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        if self.tokens is None:
+            raise asyncio.TimeoutError()
+
+        async def deltas():
+            for token in self.tokens:
+                yield chunk(token)
+        return deltas()
+
+
+def router(small_tokens, large_tokens):
+    return LLMRouter([
+        Deployment('small-1', FakeClient(small_tokens), 'mini', 'small'),
+        Deployment('large-1', FakeClient(large_tokens), 'big', 'large'),
+    ])
+
+
+def test_stream_reports_the_deployment_that_served_it():
+    served = []
+
+    async def run():
+        return [t async for t in router(None, ['مرحبا', '!']).stream(
+            [{'role': 'user', 'content': 'hi'}], 'small', on_served=served.append
+        )]
+
+    assert asyncio.run(run()) == ['مرحبا', '!']
+    assert [d.name for d in served] == ['large-1']
+
+
+def test_streamed_usage_is_recorded_under_the_served_tier(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(azure_openai_service, 'router', router(None, ['ok']))
+    monkeypatch.setattr(complexity_router, 'record', lambda tier, *args: recorded.append(tier))
+
+    async def run():
+        return [t async for t in azure_openai_service._call_openai_stream(
+            [{'role': 'user', 'content': 'hi'}], 'test-stream-tier', 'small'
+        )]
+
+    assert asyncio.run(run()) == ['ok']
+    assert recorded == ['large']
+
+
+def test_summaries_are_called_under_the_tenant(monkeypatch):
+    tenants = []
+
+    async def call_openai(messages, max_tokens=None, tenant_id=None, tier=None, customer_reply=False):
+        tenants.append(tenant_id)
+        return 'summary'
+
+    monkeypatch.setattr(azure_openai_service, '_call_openai', call_openai)
+    messages = [{'message': 'بدي فستان', 'is_ai_response': False}]
+
+    assert asyncio.run(azure_openai_service.summarize_conversation('', messages, 'tenant-1')) == 'summary'
+    assert tenants == ['tenant-1']
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import FairScheduler, SchedulerQueueFull
+
+WEIGHTS = {'starter': 1, 'professional': 3}
+
+
+def scheduler(plans, **kwargs):
+    async def resolve(tenant_id):
+        plan = plans[tenant_id]
+        if isinstance(plan, Exception):
+            raise plan
+        return plan
+    return FairScheduler(capacity=1, plan_resolver=resolve, plan_weights=WEIGHTS, **kwargs)
+
+
+def dispatch_order(fair, calls):
+    """Tenants in the order their calls got the single slot, all queued behind one holder"""
+    order = []
+
+    async def call(tenant_id):
+        async with fair.slot(tenant_id):
+            order.append(tenant_id)
+
+    async def run():
+        await fair.acquire('holder')
+        tasks = []
+        for tenant_id in calls:
+            tasks.append(asyncio.create_task(call(tenant_id)))
+            await asyncio.sleep(0)
+        while fair.queued() < len(calls):
+            await asyncio.sleep(0)
+        fair.release('holder')
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return order
+
+
+def test_backlogged_tenants_are_served_by_plan_weight():
+    fair = scheduler({'holder': 'starter', 'shop-a': 'starter', 'shop-b': 'professional'})
+
+    order = dispatch_order(fair, ['shop-a'] * 4 + ['shop-b'] * 4)
+
+    # Tags: shop-a 1, 2, 3, 4; shop-b 1/3, 2/3, 1, 4/3
+    assert order == ['shop-b', 'shop-b', 'shop-a', 'shop-b', 'shop-b', 'shop-a', 'shop-a', 'shop-a']
+    assert fair.stats()['tenants']['shop-b']['weight'] == 3
+
+
+def test_unknown_or_failing_plans_get_the_default_weight():
+    fair = scheduler({'holder': None, 'shop-a': 'gold', 'shop-b': RuntimeError('db down')})
+
+    order = dispatch_order(fair, ['shop-a', 'shop-a', 'shop-b', 'shop-b'])
+
+    assert order == ['shop-a', 'shop-b', 'shop-a', 'shop-b']
+    assert {t['weight'] for t in fair.stats()['tenants'].values()} == {1}
+
+
+def test_pinned_weight_skips_the_plan_lookup():
+    fair = scheduler({'holder': 'starter', 'shop-a': 'starter', 'shop-b': 'starter'})
+    fair.set_weight('shop-a', 3)
+
+    order = dispatch_order(fair, ['shop-a'] * 3 + ['shop-b'] * 3)
+
+    # Tags: shop-a 1/3, 2/3, 1; shop-b 1, 2, 3
+    assert order == ['shop-a'] * 3 + ['shop-b'] * 3
+
+
+def test_a_full_tenant_queue_rejects_only_that_tenant():
+    fair = scheduler({'holder': 'starter', 'shop-a': 'starter', 'shop-b': 'starter'}, max_queue_per_tenant=1)
+
+    async def run():
+        await fair.acquire('holder')
+        waiting = asyncio.create_task(fair.acquire('shop-a'))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerQueueFull):
+            await fair.acquire('shop-a')
+        other = asyncio.create_task(fair.acquire('shop-b'))
+        await asyncio.sleep(0)
+        fair.release('holder')
+        await waiting
+        fair.release('shop-a')
+        await other
+        fair.release('shop-b')
+
+    asyncio.run(run())
+
+    tenants = fair.stats()['tenants']
+    assert (tenants['shop-a']['rejected'], tenants['shop-b']['rejected']) == (1, 0)
+    assert fair.stats()['active'] == 0
+
+
+def test_tenant_plans_are_stored_on_users(postgres):
+    tenant = 'test-plan-tenant'
+
+    async def work(db):
+        from schema_migrations import migrate
+        await migrate(db)
+        await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+        try:
+            default = await db.get_tenant_plan(tenant)
+            await db.execute_query("UPDATE users SET plan = 'professional' WHERE id = $1", tenant)
+            return default, await db.get_tenant_plan(tenant)
+        finally:
+            await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+
+    assert postgres(work) == ('starter', 'professional')
@@ -0,0 +1,86 @@
+import asyncio
+
+from message_coalescer import MessageCoalescer
+from message_pipeline import MessagePipeline
+
+
+class ThreadStore:
+    def __init__(self):
+        self.rows = []
+
+    async def add_conversation_message(self, tenant_id, customer, message, is_ai_response):
+        self.rows.append((message, is_ai_response))
+
+    async def get_customer_context(self, tenant_id, customer):
+        return None
+
+
+class FakeAI:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.turns = []
+
+    async def analyze_customer_intent(self, message, tenant_id=None):
+        return {'intent': 'inquiry'}
+
+    async def generate_response(self, message, catalog_items, history, context, tenant_id, customer):
+        self.turns.append(message)
+        await asyncio.sleep(self.delay)
+        return f"reply to {message!r}"
+
+
+def burst(coalescer, messages, gap, ready=lambda sent: True):
+    """Submit messages gap seconds apart, each once ready(number already sent) holds"""
+    async def run():
+        tasks = []
+        for message in messages:
+            while not ready(len(tasks)):
+                await asyncio.sleep(0.005)
+            tasks.append(asyncio.create_task(coalescer.submit('t', 'c', message)))
+            await asyncio.sleep(gap)
+        return await asyncio.gather(*tasks)
+    return asyncio.run(run())
+
+
+def pipeline_coalescer(store, ai, window):
+    pipeline = MessagePipeline(store=store, ai_service=ai)
+
+    async def handler(tenant_id, customer, message, **kwargs):
+        return await pipeline.handle(tenant_id, message, customer, catalog_items=[], record_message=False, **kwargs)
+
+    async def recorder(tenant_id, customer, message):
+        await pipeline.record_inbound(tenant_id, customer, message)
+
+    return MessageCoalescer(handler=handler, window=window, max_wait=1.0, recorder=recorder)
+
+
+def test_superseded_turn_records_each_message_once():
+    store, ai = ThreadStore(), FakeAI(delay=0.2)
+    # The second message lands while the first turn is generating and cancels it
+    results = burst(
+        pipeline_coalescer(store, ai, window=0.01), ['بدي فستان', 'مقاس M'], gap=0, ready=lambda sent: not sent or ai.turns
+    )
+
+    assert ai.turns == ['بدي فستان', 'بدي فستان\nمقاس M']
+    assert results[0] is None
+    assert store.rows == [
+        ('بدي فستان', False),
+        ('مقاس M', False),
+        ("reply to 'بدي فستان\\nمقاس M'", True),
+    ]
+
+
+def test_merged_burst_records_raw_messages_not_the_merged_text():
+    store, ai = ThreadStore(), FakeAI()
+    burst(pipeline_coalescer(store, ai, window=0.05), ['مرحبا', 'كم سعر العباية'], gap=0.01)
+
+    assert ai.turns == ['مرحبا\nكم سعر العباية']
+    assert [row for row in store.rows if not row[1]] == [('مرحبا', False), ('كم سعر العباية', False)]
+
+
+def test_handle_records_the_message_by_default():
+    store = ThreadStore()
+    pipeline = MessagePipeline(store=store, ai_service=FakeAI())
+    asyncio.run(pipeline.handle('t', 'hello', 'c', catalog_items=[]))
+
+    assert store.rows == [('hello', False), ("reply to 'hello'", True)]
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import message_pipeline
+from catalog_index import catalog_indexes
+from message_pipeline import MessagePipeline
+
+
+def catalog(count):
+    return [{'id': f"{i:04d}", 'sku': f"SKU-{i}", 'name': f"فستان {i}", 'price_jod': 30} for i in range(count)]
+
+
+class PipelineStore:
+    def __init__(self, items=(), context=None, fail=False):
+        self.items = list(items)
+        self.context = context
+        self.fail = fail
+        self.rows = []
+        self.catalog_fetches = 0
+
+    async def fetch_catalog_items(self, tenant_id, limit):
+        self.catalog_fetches += 1
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return [dict(item) for item in self.items[:limit]]
+
+    async def get_customer_context(self, tenant_id, customer):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return self.context
+
+    async def add_conversation_message(self, tenant_id, customer, message, is_ai_response):
+        self.rows.append((message, is_ai_response))
+
+
+class SlowAI:
+    """Intent and reply calls that take intent_delay and delay seconds; records what the reply saw"""
+
+    def __init__(self, delay=0.0, intent_delay=None, reply_error=None):
+        self.delay = delay
+        self.intent_delay = delay if intent_delay is None else intent_delay
+        self.reply_error = reply_error
+        self.intent_cancelled = False
+        self.seen = None
+
+    async def analyze_customer_intent(self, message, tenant_id=None):
+        try:
+            await asyncio.sleep(self.intent_delay)
+        except asyncio.CancelledError:
+            self.intent_cancelled = True
+            raise
+        return {'intent': 'inquiry'}
+
+    async def generate_response(self, message, catalog_items, history, context, tenant_id, customer):
+        self.seen = (catalog_items, context)
+        await asyncio.sleep(self.delay)
+        if self.reply_error:
+            raise self.reply_error
+        return f"reply to {message!r}"
+
+
+class Search:
+    def __init__(self, matches):
+        self.matches = matches
+        self.queries = []
+
+    async def find(self, tenant_id, text, limit):
+        self.queries.append(text)
+        return self.matches
+
+
+def test_intent_runs_alongside_the_reply():
+    ai = SlowAI(delay=0.1)
+    pipeline = MessagePipeline(store=PipelineStore(catalog(3), context={'previous_orders': []}), ai_service=ai)
+
+    result = asyncio.run(pipeline.handle('test-pipeline-overlap', 'بدي فستان', 'c'))
+
+    # One round trip, not two back to back
+    assert result.timings.intent_ms >= 90 and result.timings.reply_ms >= 90
+    assert result.timings.total_ms < 180
+    assert result.intent == {'intent': 'inquiry'} and result.reply == "reply to 'بدي فستان'"
+    assert result.catalog_items == 3
+    assert ai.seen[1] == {'previous_orders': []}
+
+
+def test_fetched_catalog_syncs_the_tenant_index():
+    tenant = 'test-pipeline-sync'
+    store = PipelineStore(catalog(3))
+    pipeline = MessagePipeline(store=store, ai_service=SlowAI())
+
+    asyncio.run(pipeline.handle(tenant, 'مرحبا'))
+    store.items[1]['price_jod'] = 25
+    asyncio.run(pipeline.handle(tenant, 'مرحبا'))
+
+    assert catalog_indexes.get(tenant).items['0001']['price_jod'] == 25
+    catalog_indexes.invalidate(tenant)
+
+
+def test_large_catalogs_add_search_matches_beyond_the_fetched_rows(monkeypatch):
+    monkeypatch.setattr(message_pipeline.ProductionConfig, 'AI_PIPELINE_CATALOG_LIMIT', 5)
+    tenant = 'test-pipeline-large'
+    store = PipelineStore(catalog(8))
+    search = Search([{**catalog(8)[7], 'score': 0.9}, {**catalog(8)[0], 'score': 0.5}])
+    ai = SlowAI()
+    pipeline = MessagePipeline(store=store, ai_service=ai, search=search)
+
+    asyncio.run(pipeline.handle(tenant, 'فستان 7'))
+    asyncio.run(pipeline.handle(tenant, 'فستان 7'))
+
+    items = ai.seen[0]
+    assert [item['id'] for item in items] == ['0000', '0001', '0002', '0003', '0004', '0007']
+    assert 'score' not in items[-1]  # Matches take the shape of the fetched rows
+    # The first fetch finds the catalog is large; later messages search alongside the fetch
+    assert search.queries == ['فستان 7', 'فستان 7'] and store.catalog_fetches == 2
+    catalog_indexes.invalidate(tenant)
+
+
+def test_failed_fetches_do_not_stop_the_reply():
+    ai = SlowAI()
+    store = PipelineStore(catalog(3), fail=True)
+
+    result = asyncio.run(MessagePipeline(store=store, ai_service=ai).handle('t', 'مرحبا', 'c'))
+
+    assert result.reply == "reply to 'مرحبا'" and result.catalog_items == 0
+    assert ai.seen == ([], None)
+
+
+def test_a_failed_reply_cancels_the_intent_call_and_stores_no_reply():
+    ai = SlowAI(delay=0.05, intent_delay=1.0, reply_error=ConnectionError("LLM unavailable"))
+    store = PipelineStore()
+    pipeline = MessagePipeline(store=store, ai_service=ai)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(pipeline.handle('t', 'مرحبا', 'c', catalog_items=[]))
+
+    assert ai.intent_cancelled
+    assert store.rows == [('مرحبا', False)]
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from azure_openai_service import azure_openai_service
+from llm_router import Completion
+from model_routing import LARGE, SMALL, ComplexityRouter, complexity_router
+
+COMPLAINT = "وصلني الطلب رقم 123456 ناقص قطعة وبدي ارجع الفستان؟ وكيف بترجعولي المصاري؟"
+
+
+def test_simple_turns_go_small_and_complex_ones_large():
+    router = ComplexityRouter(threshold=0.4, enabled=True)
+
+    assert router.route("مرحبا").tier == SMALL
+    assert router.route(COMPLAINT).tier == LARGE
+    assert router.stats()['decisions'] == {SMALL: 1, LARGE: 1}
+
+
+def test_tenant_overrides():
+    router = ComplexityRouter(threshold=0.4, enabled=True)
+
+    router.set_override('shop-1', tier=LARGE)
+    assert router.route("مرحبا", 'shop-1').reason == 'tenant override'
+    assert router.route("مرحبا", 'shop-1').tier == LARGE
+    router.set_override('shop-2', threshold=0.95)
+    assert router.route(COMPLAINT, 'shop-2').tier == SMALL
+    router.set_override('shop-1')
+    assert router.route("مرحبا", 'shop-1').tier == SMALL
+    with pytest.raises(ValueError):
+        router.set_override('shop-1', tier='medium')
+
+
+def test_disabled_routing_uses_the_large_tier():
+    assert ComplexityRouter(enabled=False).route("مرحبا").tier == LARGE
+
+
+def test_costs_are_accounted_per_tier():
+    router = ComplexityRouter(costs={SMALL: {'prompt': 0.1, 'completion': 0.2}})
+    router.record(SMALL, 0.2, prompt_tokens=1000, completion_tokens=500)
+
+    assert router.stats()['tiers'][SMALL]['cost_usd'] == pytest.approx(0.2)
+
+
+class TierRouter:
+    """Answers from whichever tier was asked for"""
+
+    def __init__(self):
+        self.asked = []
+
+    def tiers(self):
+        return {SMALL, LARGE}
+
+    async def complete_detailed(self, messages, tier=None, **kwargs):
+        self.asked.append(tier)
+        return Completion('{"intent": "inquiry"}', f"{tier}-1", tier, 100, 20)
+
+
+@pytest.fixture
+def tier_router(monkeypatch):
+    router = TierRouter()
+    monkeypatch.setattr(azure_openai_service, 'router', router)
+    monkeypatch.setattr(complexity_router, '_stats', {})
+    return router
+
+
+def test_internal_calls_are_pinned_to_their_tier(tier_router):
+    async def run():
+        await azure_openai_service.generate_product_description({'name': 'فستان'})
+        await azure_openai_service.summarize_conversation('', [{'message': 'بدي فستان'}])
+        # Too vague for the local classifier
+        await azure_openai_service.analyze_customer_intent('ممكن تحكيلي عن الشي هاد')
+
+    asyncio.run(run())
+
+    assert tier_router.asked == [LARGE, SMALL, SMALL]
+
+
+def test_only_customer_replies_count_in_tier_stats(tier_router):
+    async def run():
+        await azure_openai_service.generate_product_description({'name': 'فستان'})
+        await azure_openai_service.generate_response(COMPLAINT, [])
+
+    asyncio.run(run())
+
+    assert tier_router.asked[-1] == LARGE
+    assert {tier: s['calls'] for tier, s in complexity_router.stats()['tiers'].items()} == {LARGE: 1}
@@ -0,0 +1,97 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_condition, keyset_page, ndjson_lines
+
+NOW = datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc)
+
+
+def rows(count):
+    return [{'id': f'id-{i}', 'created_at': NOW - timedelta(minutes=i)} for i in range(count)]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({'id': 'a1', 'created_at': NOW})
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (NOW, 'a1')
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'e30', encode_cursor({'id': 1, 'created_at': NOW})[:-3]])
+def test_decode_rejects_foreign_cursors(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_keyset_condition():
+    assert keyset_condition(None, 3) == ("TRUE", [])
+
+    condition, args = keyset_condition(encode_cursor({'id': 'a1', 'created_at': NOW}), 3)
+
+    assert condition == "(created_at, id) < ($3, $4)"
+    assert args == [NOW, 'a1']
+
+
+def test_keyset_page_has_a_cursor_only_when_more_rows_exist():
+    page = keyset_page(rows(11), 10)
+
+    assert len(page['items']) == 10
+    assert decode_cursor(page['next_cursor']) == (page['items'][-1]['created_at'], 'id-9')
+    assert keyset_page(rows(10), 10)['next_cursor'] is None
+
+
+def test_ndjson_lines():
+    async def chunks():
+        yield [{'id': 1, 'name': 'فستان'}]
+        yield [{'id': 2, 'created_at': NOW}]
+
+    async def collect():
+        return b''.join([line async for line in ndjson_lines(chunks())])
+
+    lines = asyncio.run(collect()).decode().splitlines()
+
+    assert [json.loads(line)['id'] for line in lines] == [1, 2]
+    assert 'فستان' in lines[0]
+
+
+def test_pages_cover_every_row_once(postgres):
+    tenant = 'test-pagination'
+
+    async def work(db):
+        from schema_migrations import migrate
+        await migrate(db)
+        await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+        await db.execute_query("INSERT INTO users (id, instagram_handle) VALUES ($1, $1)", tenant)
+        try:
+            # Two rows share a timestamp, so the id breaks the tie
+            await db.execute_query(
+                """
+                INSERT INTO orders (user_id, sku, qty, customer, phone, total_amount, created_at)
+                SELECT $1, 'SKU', 1, 'c', '0790000000', 10, $2::timestamptz - (i / 2) * INTERVAL '1 minute'
+                FROM generate_series(0, 6) AS i
+                """,
+                tenant, NOW
+            )
+            nullable = await db.fetch_all(
+                """
+                SELECT table_name FROM information_schema.columns
+                WHERE table_name IN ('catalog_items', 'orders') AND column_name = 'created_at' AND is_nullable = 'YES'
+                """
+            )
+            seen, cursor = [], None
+            while True:
+                page = await db.fetch_page('orders', tenant, 3, cursor)
+                seen.extend(row['id'] for row in page['items'])
+                cursor = page['next_cursor']
+                if cursor is None:
+                    return nullable, seen
+        finally:
+            await db.execute_query("DELETE FROM users WHERE id = $1", tenant)
+
+    nullable, seen = postgres(work)
+
+    assert nullable == []
+    assert len(seen) == len(set(seen)) == 7
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import azure_openai_service
+import catalog_index
+import knowledge_base
+import production_app
+from routers import catalog, conversations, kb
+
+
+@pytest.fixture
+def client():
+    # No startup hooks: the routes under test do not touch the database
+    return TestClient(production_app.app)
+
+
+def test_routers_share_the_app_singletons():
+    assert conversations.azure_openai_service is azure_openai_service.azure_openai_service
+    assert catalog.catalog_indexes is catalog_index.catalog_indexes
+    assert kb.knowledge_base is knowledge_base.knowledge_base
+
+
+def test_catalog_orders_and_kb_routes_are_mounted():
+    paths = {route.path for route in production_app.app.routes}
+
+    assert {'/api/catalog/', '/api/catalog/search', '/api/catalog/{item_id}', '/api/catalog/import',
+            '/api/orders/', '/api/orders/export', '/api/kb/', '/api/kb/search'} <= paths
+
+
+def test_deleted_items_leave_the_shared_catalog_index(client, monkeypatch):
+    class Store:
+        async def delete_catalog_item(self, tenant_id, item_id):
+            return item_id == 'item-2'
+
+    async def get_db_connection():
+        return Store()
+
+    monkeypatch.setattr(catalog, 'get_db_connection', get_db_connection)
+    catalog_index.catalog_indexes.sync('shop-delete', [
+        {'id': 'item-1', 'name': 'فستان أسود'}, {'id': 'item-2', 'name': 'عباية سوداء'}
+    ])
+
+    assert client.delete('/api/catalog/item-2', headers={'X-Tenant-ID': 'shop-delete'}).json() == {'deleted': True}
+    assert client.delete('/api/catalog/item-9', headers={'X-Tenant-ID': 'shop-delete'}).status_code == 404
+    assert list(catalog_index.catalog_indexes.get('shop-delete').items) == ['item-1']
+
+
+def test_replies_stream_as_server_sent_events(client, monkeypatch):
+    calls = []
+
+    async def generate_response_stream(message, catalog_items, history, context, tenant_id=None, customer_id=None):
+        calls.append((message, tenant_id, customer_id))
+        for token in ('أهلا', ' بك'):
+            yield token
+
+    monkeypatch.setattr(azure_openai_service.azure_openai_service, 'generate_response_stream', generate_response_stream)
+
+    response = client.post(
+        '/api/conversations/stream', json={'message': 'مرحبا', 'customer': 'c-1'}, headers={'X-Tenant-ID': 'shop-1'}
+    )
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert response.text == (
+        'data: {"token": "أهلا"}\n\n'
+        'data: {"token": " بك"}\n\n'
+        'event: done\ndata: {}\n\n'
+    )
+    assert calls == [('مرحبا', 'shop-1', 'c-1')]
+
+
+def test_conversation_routes_require_a_tenant(client):
+    assert client.post('/api/conversations/stream', json={'message': 'مرحبا'}).status_code == 422
+    assert client.get('/api/conversations/llm/usage').status_code == 422
@@ -0,0 +1,75 @@
+from prompt_builder import PRODUCTS_HEADER, STATIC_PROMPT, PromptCompiler
+from token_counter import count_tokens
+
+ITEMS = [
+    {'id': '1', 'name': 'عباية سوداء', 'price_jod': 30, 'description': 'قماش كريب خفيف', 'stock_quantity': 5},
+    {'id': '2', 'name': 'فستان سهرة', 'price_jod': 45, 'stock_quantity': 0},
+]
+KNOWLEDGE = [{'title': 'Returns', 'content': 'يمكن إرجاع القطعة خلال 7 أيام'}]
+CONTEXT = {'previous_orders': [{'id': 'o-1'}], 'preferences': 'مقاس M'}
+
+
+def test_sections_follow_the_static_prefix_in_order():
+    prompt, tokens = PromptCompiler().render('t', 1, ITEMS, CONTEXT, 'سألت عن العبايات', KNOWLEDGE)
+
+    positions = [prompt.index(marker) for marker in (
+        'Basic Information', 'Available Products', 'عباية سوداء', 'فستان سهرة',
+        'Store Information', 'Customer Context', 'Earlier Conversation Summary'
+    )]
+    assert prompt.startswith(STATIC_PROMPT)
+    assert positions == sorted(positions)
+    assert "- عباية سوداء: 30 دينار أردني - قماش كريب خفيف... (متوفر: 5 قطعة)\n" in prompt
+    assert "- فستان سهرة: 45 دينار أردني\n" in prompt
+    assert abs(tokens - count_tokens(prompt)) <= 2
+
+
+def test_empty_sections_are_left_out():
+    compiler = PromptCompiler()
+
+    prompt, tokens = compiler.render('t', 1, [])
+
+    assert prompt == compiler.compile('t', 1).prefix
+    assert PRODUCTS_HEADER not in prompt and 'Customer Context' not in prompt
+    assert tokens == compiler.compile('t', 1).prefix_tokens
+
+
+def test_the_prefix_is_shared_by_every_message_of_a_tenant():
+    compiler = PromptCompiler()
+    compiler.set_profile('a', {'display_name': 'Shop A'})
+
+    first, _ = compiler.render('a', 1, ITEMS, CONTEXT, 'summary one')
+    second, _ = compiler.render('a', 1, ITEMS[:1], None, 'summary two', KNOWLEDGE)
+    other, _ = compiler.render('b', 1, ITEMS)
+
+    prefix = compiler.compile('a', 1).prefix
+    assert first.startswith(prefix) and second.startswith(prefix)
+    # Tenants share the static part, the longest prefix a provider cache can reuse across them
+    assert other.startswith(STATIC_PROMPT) and not other.startswith(prefix)
+    assert 'Shop A' in prefix
+    assert compiler.compilations == 2
+
+
+def test_catalog_and_profile_versions_recompile_the_prefix():
+    compiler = PromptCompiler()
+    compiled = compiler.compile('t', 1)
+    compiled.item_line(ITEMS[0])
+
+    assert compiler.compile('t', 1) is compiled
+    recompiled = compiler.compile('t', 2)
+    assert recompiled is not compiled and recompiled.item_lines == {}
+
+    compiler.set_profile('t', {'location': 'إربد'})
+    assert 'إربد' in compiler.compile('t', 2).prefix
+    assert compiler.compilations == 3
+
+
+def test_item_lines_are_formatted_once_per_catalog_version():
+    compiler = PromptCompiler()
+    compiler.render('t', 1, ITEMS)
+    compiled = compiler.compile('t', 1)
+    compiled.item_lines['1'] = ('- cached line\n', 3)
+
+    prompt, _ = compiler.render('t', 1, ITEMS)
+
+    assert '- cached line\n' in prompt
+    assert sorted(compiled.item_lines) == ['1', '2']
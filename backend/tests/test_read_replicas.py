@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
+
+import asyncpg
+import pytest
+
+import read_replicas
+from database import DatabaseService
+from read_replicas import ReplicaRouter, is_read_only, set_db_session
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def _run(self, query, *args):
+        self.pool.queries.append(query)
+        if isinstance(self.pool.result, Exception):
+            raise self.pool.result
+        return self.pool.result
+
+    fetch = fetchrow = fetchval = execute = _run
+
+
+class FakePool:
+    """Answers every statement with result, or raises it when it is an exception"""
+
+    def __init__(self, result):
+        self.result = result
+        self.queries = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+    async def fetchval(self, query, *args):
+        return await FakeConnection(self).fetchval(query, *args)
+
+    async def fetchrow(self, query, *args):
+        return await FakeConnection(self).fetchrow(query, *args)
+
+    def get_size(self):
+        return 1
+
+
+def in_context(fn, *args):
+    """Run fn in a fresh context, as a new request or task would"""
+    return contextvars.Context().run(fn, *args)
+
+
+def router(replicas=2, **kwargs):
+    kwargs.setdefault('max_lag', 5.0)
+    kwargs.setdefault('read_your_writes', 10.0)
+    replica_router = ReplicaRouter([(f"replica-{i}", 5433 + i) for i in range(replicas)], **kwargs)
+    for replica in replica_router.replicas:
+        replica.in_rotation = True
+    return replica_router
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM catalog_items WHERE user_id = $1",
+    "  select count(*) from orders;",
+    "WITH recent AS (SELECT id FROM orders) SELECT * FROM recent",
+    "SHOW server_version",
+])
+def test_reads_may_go_to_a_replica(query):
+    assert is_read_only(query)
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT INTO users (id) VALUES ($1) RETURNING id",
+    "WITH moved AS (DELETE FROM orders RETURNING *) SELECT * FROM moved",
+    "SELECT * FROM orders WHERE id = $1 FOR UPDATE",
+    "SELECT * FROM orders FOR KEY SHARE",
+    "SELECT nextval('orders_id_seq')",
+    "SELECT pg_advisory_lock(1)",
+    "SELECT * INTO archive FROM orders",
+    "SELECT 1; DELETE FROM orders",
+])
+def test_writes_and_locks_stay_on_the_primary(query):
+    assert not is_read_only(query)
+
+
+def test_reads_rotate_over_replicas_in_rotation():
+    replicas = router(replicas=3)
+    replicas.replicas[1].in_rotation = False
+
+    names = [in_context(replicas.route).name for _ in range(4)]
+
+    assert sorted(set(names)) == ['replica-0:5433', 'replica-2:5435']
+    assert names[0] != names[1]
+    for replica in replicas.replicas:
+        replica.in_rotation = False
+    assert in_context(replicas.route) is None
+    assert replicas.stats()['primary_reads'] == 1
+
+
+def test_reads_follow_writes_of_the_task_and_its_session():
+    replicas = router()
+
+    def write_then_read(session):
+        set_db_session(session)
+        replicas.note_write()
+        return replicas.route()
+
+    def read(session):
+        set_db_session(session)
+        return replicas.route()
+
+    assert in_context(write_then_read, 'tenant-1') is None
+    # A later request of the same tenant still reads its writes; others do not wait for them
+    assert in_context(read, 'tenant-1') is None
+    assert in_context(read, 'tenant-2') is not None
+    # Sessionless jobs are sticky in their own task only
+    assert in_context(write_then_read, None) is None
+    assert in_context(read, None) is not None
+    assert replicas.stats()['sticky_reads'] == 3
+
+
+def test_stickiness_expires_and_covers_named_sessions(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(read_replicas.time, 'monotonic', lambda: now[0])
+    replicas = router(max_lag=2.0, read_your_writes=1.0)
+
+    def read(session):
+        set_db_session(session)
+        return replicas.route()
+
+    # The write buffer notes the tenants of a batch, not its own task
+    in_context(replicas.note_write, 'tenant-1', 'tenant-2')
+    assert in_context(read, 'tenant-2') is None
+    assert in_context(read, None) is not None
+
+    # The window is never shorter than max_lag
+    now[0] += 1.5
+    assert in_context(read, 'tenant-1') is None
+    now[0] += 1.0
+    assert in_context(read, 'tenant-1') is not None
+
+
+def test_lag_checks_move_replicas_out_of_and_back_into_rotation(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(read_replicas.time, 'monotonic', lambda: now[0])
+    replicas = router(replicas=1, max_lag=5.0, check_interval=1.0)
+    replica = replicas.replicas[0]
+    primary = FakePool('0/100')
+    replica.pool = FakePool({'standby': True, 'replayed': '0/100'})
+    replicas._primary = primary
+
+    def check(at, primary_lsn, replayed='0/100', standby=True):
+        now[0] = at
+        primary.result = primary_lsn
+        replica.pool.result = {'standby': standby, 'replayed': replayed}
+        asyncio.run(replicas.check())
+        return replica.in_rotation
+
+    assert check(0, '0/100') and replica.lag == 0
+    assert check(3, '0/200')  # Replayed what the primary had 3s ago
+    assert not check(6, '0/300') and replica.lag == 6
+    assert 'behind' in replica.error
+    assert check(7, '0/300', replayed='1/0') and replica.lag == 0
+    assert not check(8, '1/10', replayed='1/10', standby=False)
+    assert replica.error == 'not a standby'
+
+    replica.pool.result = OSError('connection refused')
+    now[0] = 9
+    asyncio.run(replicas.check())
+    assert not replica.in_rotation and replica.error.startswith('unreachable')
+
+
+def test_lsn_parsing():
+    assert read_replicas._lsn('0/16B3740') == 0x16B3740
+    assert read_replicas._lsn('1/0') == 1 << 32
+
+
+def database(replica_result, primary_result='primary'):
+    db = DatabaseService()
+    db.pool = FakePool(primary_result)
+    db.replicas = router(replicas=1)
+    db.replicas.replicas[0].pool = FakePool(replica_result)
+    return db
+
+
+def test_unavailable_replica_falls_back_to_the_primary():
+    db = database(asyncpg.CannotConnectNowError('the database system is starting up'))
+
+    assert in_context(asyncio.run, db.fetch_val("SELECT 1")) == 'primary'
+    assert not db.replicas.replicas[0].in_rotation
+    assert db.replicas.stats()['fallbacks'] == 1
+
+
+def test_replay_conflict_retries_on_the_primary_and_keeps_the_replica():
+    db = database(asyncpg.SerializationError('canceling statement due to conflict with recovery'))
+
+    assert in_context(asyncio.run, db.fetch_val("SELECT 1")) == 'primary'
+    assert db.replicas.replicas[0].in_rotation
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary():
+    db = database('replica')
+
+    async def run():
+        read = await db.fetch_val("SELECT 1")
+        written = await db.fetch_val("INSERT INTO users (id) VALUES ($1) RETURNING id", 'u')
+        after = await db.fetch_val("SELECT 1")
+        return read, written, after
+
+    assert in_context(asyncio.run, run()) == ('replica', 'primary', 'primary')
+
+
+def test_read_connection_does_not_make_reads_sticky():
+    db = database('replica')
+
+    async def run():
+        async with db.read_connection() as conn:
+            await conn.fetchval("SELECT version FROM schema_migrations")
+        first = db.replicas.wrote_recently()
+        async with db.get_connection() as conn:
+            await conn.execute("UPDATE users SET updated_at = NOW()")
+        return first, db.replicas.wrote_recently()
+
+    assert in_context(asyncio.run, run()) == (False, True)
+
+
+def test_standby_serves_sessionless_reads(postgres):
+    async def work(db):
+        if not db.replicas.replicas:
+            pytest.skip("TEST_DATABASE_REPLICA_HOSTS is not set")
+        if not db.replicas.replicas[0].in_rotation:
+            pytest.skip(f"Standby is out of rotation: {db.replicas.replicas[0].error}")
+
+        async def read():
+            set_db_session(None)
+            return await db.fetch_val("SELECT pg_is_in_recovery()")
+
+        async def write_then_read():
+            set_db_session('test-replica-session')
+            await db.execute_query("SELECT 1")
+            return await db.fetch_val("SELECT pg_is_in_recovery()")
+
+        return await asyncio.create_task(read()), await asyncio.create_task(write_then_read())
+
+    assert postgres(work) == (True, False)
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT create_conversation_partition($1)",
+    "select CREATE_CONVERSATION_PARTITION ($1::date)",
+])
+def test_calls_of_writing_functions_stay_on_the_primary(query):
+    # create_conversation_partition runs CREATE TABLE; a standby would reject it
+    assert not is_read_only(query)
+
+
+def test_read_only_functions_may_go_to_a_replica():
+    # Declared IMMUTABLE in migration 0005
+    assert is_read_only("SELECT id FROM catalog_items WHERE search_text = catalog_search_text($1, NULL, NULL, NULL, NULL)")
+
+
+def test_partition_creation_runs_on_the_primary():
+    from conversation_partitions import ConversationPartitionManager
+    db = database('replica')
+    db.pool = FakePool('conversations_2026_11')
+    db.fetch_all = lambda *args: asyncio.sleep(0, [])
+
+    created = in_context(asyncio.run, ConversationPartitionManager(db=db, months_ahead=0).ensure_partitions())
+
+    assert created == ['conversations_2026_11']
+    assert db.replicas.replicas[0].pool.queries == []
+    assert db.pool.queries == ["SELECT create_conversation_partition($1)"]
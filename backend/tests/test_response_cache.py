@@ -0,0 +1,76 @@
+import asyncio
+
+from azure_openai_service import azure_openai_service
+from catalog_description_job import CatalogDescriptionJobRunner, JobProgress
+from catalog_index import catalog_indexes
+from response_cache import ResponseCache, response_cache
+
+
+def catalog(price=30):
+    return [
+        {'id': '1', 'sku': 'AB-1', 'name': 'عباية سوداء', 'category': 'عبايات', 'price_jod': price, 'stock_quantity': 5},
+        {'id': '2', 'sku': 'DR-1', 'name': 'فستان سهرة', 'category': 'فساتين', 'price_jod': 45, 'stock_quantity': 1},
+    ]
+
+
+def test_exact_and_normalized_hits():
+    cache = ResponseCache()
+
+    async def run():
+        await cache.put('t', 1, 'بكم العباية؟', 'ب 30 دينار')
+        return await cache.get('t', 1, 'بكم  العبايه'), await cache.get('t', 2, 'بكم العباية؟')
+
+    assert asyncio.run(run()) == ('ب 30 دينار', None)
+
+
+def test_entries_expire_after_ttl():
+    now = [0.0]
+    cache = ResponseCache(ttl=60, clock=lambda: now[0])
+    asyncio.run(cache.put('t', 1, 'hello', 'hi'))
+    now[0] = 61
+
+    assert asyncio.run(cache.get('t', 1, 'hello')) is None
+
+
+def test_edited_item_misses_the_cache(monkeypatch):
+    calls = []
+
+    async def call_openai(messages, max_tokens=None, tenant_id=None, tier=None, customer_reply=False):
+        calls.append(messages)
+        return f"reply {len(calls)}"
+
+    async def retrieve(tenant_id, message, catalog_items):
+        return None, []
+
+    monkeypatch.setattr(azure_openai_service, '_call_openai', call_openai)
+    monkeypatch.setattr(azure_openai_service, '_retrieve', retrieve)
+    tenant = 'test-cache-edit'
+
+    async def ask(items):
+        return await azure_openai_service.generate_response('بكم العباية', items, tenant_id=tenant)
+
+    assert asyncio.run(ask(catalog())) == 'reply 1'
+    assert asyncio.run(ask(catalog())) == 'reply 1'
+    assert asyncio.run(ask(catalog(price=25))) == 'reply 2'
+    assert len(calls) == 2
+
+
+class DescriptionStore:
+    async def save_generated_descriptions(self, tenant_id, descriptions):
+        pass
+
+    async def update_description_job(self, job_id, done, failed, status, last_error, claimed_by):
+        pass
+
+
+def test_description_job_write_drops_cached_replies():
+    tenant = 'test-cache-descriptions'
+    catalog_indexes.sync(tenant, catalog())
+    version = catalog_indexes.version(tenant)
+    asyncio.run(response_cache.put(tenant, version, 'بكم العباية', 'ب 30 دينار'))
+
+    runner = CatalogDescriptionJobRunner(store=DescriptionStore())
+    progress = JobProgress(job_id='job', tenant_id=tenant, total=1)
+    asyncio.run(runner._flush(tenant, {'1': 'عباية قطنية مريحة'}, progress))
+
+    assert asyncio.run(response_cache.get(tenant, version, 'بكم العباية')) is None
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import database
+from schema_migrations import HOT_QUERIES, MigrationError, explain_hot_queries, load_migrations, migrate
+
+
+def write(directory, name, sql):
+    (directory / name).write_text(sql, encoding='utf-8')
+
+
+def test_migrations_load_in_version_order(tmp_path):
+    write(tmp_path, '0002_second.sql', 'SELECT 2;')
+    write(tmp_path, '0001_first.sql', 'SELECT 1;')
+    write(tmp_path, 'README.md', 'not a migration')
+
+    assert [(m.version, m.name) for m in load_migrations(str(tmp_path))] == [(1, 'first'), (2, 'second')]
+
+
+def test_duplicate_versions_are_rejected(tmp_path):
+    write(tmp_path, '0001_first.sql', 'SELECT 1;')
+    write(tmp_path, '001_again.sql', 'SELECT 1;')
+
+    with pytest.raises(MigrationError):
+        load_migrations(str(tmp_path))
+
+
+def test_no_transaction_files_split_into_statements(tmp_path):
+    write(tmp_path, '0001_index.sql', (
+        "-- migrate: no-transaction\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS a ON t (x);\n"
+        "-- trailing comment\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS b ON t (y);\n"
+    ))
+    migration = load_migrations(str(tmp_path))[0]
+
+    assert not migration.transactional
+    assert [s.splitlines()[-1] for s in migration.statements()] == [
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS a ON t (x)',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS b ON t (y)',
+    ]
+
+
+def test_startup_hook_fails_when_migrations_fail(monkeypatch):
+    class BrokenSchema:
+        async def initialize_schema(self):
+            return False
+
+    async def get_db_connection():
+        return BrokenSchema()
+
+    monkeypatch.setattr(database, 'get_db_connection', get_db_connection)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(database.init_database())
+
+
+def test_migrate_is_idempotent(postgres):
+    async def work(db):
+        await migrate(db)
+        return await migrate(db), await db.fetch_val("SELECT max(version) FROM schema_migrations")
+
+    applied, version = postgres(work)
+
+    assert applied == []
+    assert version == load_migrations()[-1].version
+
+
+def test_hot_queries_plan_index_scans(postgres):
+    async def work(db):
+        await migrate(db)
+        return await explain_hot_queries(db)
+
+    results = postgres(work)
+
+    assert set(results) == set(HOT_QUERIES)
+    for name, result in results.items():
+        assert result['ok'], f"{name} plans {result['seq_scans']}"
@@ -0,0 +1,78 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+import read_replicas
+from tenant_middleware import TenantAwareDatabase, tenant_context
+
+
+class TenantConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, query, *args):
+        return self.rows[:args[0]]
+
+
+class RoutingDb:
+    """Records which connection each call took and the database session it ran under"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.used = []
+
+    @asynccontextmanager
+    async def read_connection(self):
+        self.used.append(('read', read_replicas._db_session.get()))
+        yield TenantConnection(self.rows)
+
+    @asynccontextmanager
+    async def get_connection(self):
+        self.used.append(('primary', read_replicas._db_session.get()))
+        yield TenantConnection(self.rows)
+
+
+def rows(n):
+    return [{'id': str(i), 'created_at': datetime(2026, 10, 1, tzinfo=timezone.utc)} for i in range(n, 0, -1)]
+
+
+def in_tenant(tenant_id, work):
+    async def run():
+        tenant_context.set_tenant(tenant_id)
+        return await work()
+    return asyncio.run(run())
+
+
+def test_listings_use_read_connections_under_the_tenant_session():
+    db = RoutingDb(rows(3))
+    tenant_db = TenantAwareDatabase(db)
+
+    catalog = in_tenant('tenant-1', lambda: tenant_db.get_catalog_items(limit=2))
+    orders = in_tenant('tenant-2', lambda: tenant_db.get_orders(limit=5))
+
+    assert [item['id'] for item in catalog['items']] == ['3', '2']
+    assert catalog['next_cursor'] is not None
+    assert orders['next_cursor'] is None
+    assert db.used == [('read', 'tenant-1'), ('read', 'tenant-2')]
+
+
+def test_listings_require_a_tenant():
+    tenant_db = TenantAwareDatabase(RoutingDb([]))
+
+    with pytest.raises(ValueError):
+        in_tenant(None, lambda: tenant_db.get_orders())
+
+
+def test_primary_connection_carries_the_tenant_session():
+    db = RoutingDb([])
+    tenant_db = TenantAwareDatabase(db)
+
+    async def write():
+        async with tenant_db.get_connection():
+            pass
+
+    in_tenant('tenant-1', write)
+
+    assert db.used == [('primary', 'tenant-1')]
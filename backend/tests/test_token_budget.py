@@ -0,0 +1,70 @@
+from token_budget import TRUNCATION_MARKER, TokenBudgetManager, truncate_to_tokens
+from token_counter import MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMING_TOKENS, count_message_tokens, count_tokens
+
+
+def render(items):
+    text = "You are a shop assistant.\n" + "\n".join(f"- {item['name']} {item['price_jod']} JOD" for item in items)
+    return text, count_tokens(text)
+
+
+def test_count_tokens_by_script():
+    assert count_tokens('') == 0
+    assert count_tokens('hello') == 2          # 5 Latin chars at 4 per token
+    assert count_tokens('مرحبا') == 2          # 5 Arabic chars at 2.5 per token
+    assert count_tokens('12345') == 2
+    assert count_tokens('?') == 1
+    assert count_tokens('فستان dress 45') == count_tokens('فستان') + count_tokens('dress') + count_tokens('45')
+
+
+def test_count_message_tokens_adds_chat_overhead():
+    messages = [{'role': 'system', 'content': 'hello'}, {'role': 'user', 'content': None}]
+
+    assert count_message_tokens(messages) == 2 + 2 * MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMING_TOKENS
+
+
+def test_truncate_keeps_the_requested_end():
+    text = ' '.join(f'word{i}' for i in range(100))
+
+    tail = truncate_to_tokens(text, 10)
+    head = truncate_to_tokens(text, 10, keep='start')
+
+    assert tail.startswith(TRUNCATION_MARKER) and text.endswith(tail[1:])
+    assert head.endswith(TRUNCATION_MARKER) and text.startswith(head[:-1])
+    assert count_tokens(tail) <= 10 and count_tokens(head) <= 10
+    assert truncate_to_tokens('short', 10) == 'short'
+    assert truncate_to_tokens(text, 0) == ''
+
+
+def test_build_fits_the_budget_and_drops_oldest_turns_first():
+    manager = TokenBudgetManager(budget=120, max_turn_tokens=40, min_turn_tokens=5, max_turns=20)
+    history = [{'text': f'old message number {i} ' * 3, 'ai_generated': i % 2 == 1} for i in range(12)]
+
+    messages, account = manager.build(render, [], history, 'بكم الفستان؟')
+
+    assert account.total <= 120
+    assert account.dropped_turns > 0
+    assert messages[0]['role'] == 'system' and messages[-1] == {'role': 'user', 'content': 'بكم الفستان؟'}
+    # The newest turns survive, in order
+    assert messages[-2]['content'].endswith(history[-1]['text'])
+    assert messages[-2]['role'] == 'assistant'
+
+
+def test_build_drops_lowest_ranked_catalog_items_first():
+    items = [{'name': f'item {i} ' + 'x' * 40, 'price_jod': i} for i in range(10)]
+    manager = TokenBudgetManager(budget=80, max_turn_tokens=40, min_turn_tokens=5, max_turns=20)
+
+    messages, account = manager.build(render, items, [], 'hi')
+
+    assert account.dropped_catalog_items > 0
+    assert 'item 0 ' in messages[0]['content']
+    assert 'item 9 ' not in messages[0]['content']
+    assert account.total <= 80
+
+
+def test_build_caps_the_current_message():
+    manager = TokenBudgetManager(budget=1000, max_turn_tokens=10, min_turn_tokens=5, max_turns=20)
+
+    messages, account = manager.build(render, [], [], 'word ' * 200)
+
+    assert count_tokens(messages[-1]['content']) <= 10
+    assert account.message == count_tokens(messages[-1]['content']) + MESSAGE_OVERHEAD_TOKENS
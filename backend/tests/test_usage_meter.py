@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from usage_meter import QuotaExceeded, UsageMeter, current_period
+
+
+class UsageStore:
+    """add_llm_usage/fetch_llm_usage over a dict of stored totals per tenant"""
+
+    def __init__(self, fail=False):
+        self.totals = {}
+        self.batches = []
+        self.fail = fail
+
+    async def add_llm_usage(self, period, usage):
+        if self.fail:
+            raise ConnectionError('database down')
+        self.batches.append((period, usage))
+        for tenant_id, delta in usage.items():
+            stored = self.totals.setdefault(tenant_id, dict.fromkeys(delta, 0))
+            for key, value in delta.items():
+                stored[key] += value
+
+    async def fetch_llm_usage(self, tenant_ids, period):
+        return {t: dict(self.totals[t]) for t in tenant_ids if t in self.totals}
+
+
+def meter(store, plans, quotas=None):
+    async def resolve(tenant_id):
+        return plans.get(tenant_id)
+    return UsageMeter(store=store, plan_resolver=resolve, quotas=quotas or {'starter': 100, 'enterprise': None})
+
+
+def test_quota_is_enforced_once_the_plan_is_loaded():
+    usage = meter(UsageStore(), {'shop-a': 'starter', 'shop-b': 'enterprise'})
+
+    async def run():
+        # Unknown tenants go through while their plan loads in the background
+        usage.check('shop-a')
+        usage.check('shop-b')
+        await asyncio.sleep(0.01)
+        usage.record('shop-a', 60, 40, 0.5)
+        usage.record('shop-b', 600, 400, 0.5)
+        usage.check('shop-b')
+        with pytest.raises(QuotaExceeded) as exceeded:
+            usage.check('shop-a')
+        return exceeded.value, await usage.usage('shop-a')
+
+    error, report = asyncio.run(run())
+
+    assert (error.used, error.quota) == (100, 100)
+    assert report['plan'] == 'starter'
+    assert (report['remaining_tokens'], report['rejected']) == (0, 1)
+
+
+def test_usage_is_flushed_in_one_batch_and_read_back():
+    store = UsageStore()
+    store.totals['shop-a'] = {'requests': 5, 'prompt_tokens': 500, 'completion_tokens': 100, 'latency_ms': 50}
+    usage = meter(store, {})
+
+    async def run():
+        usage.record('shop-a', 10, 5, 0.1)
+        usage.record('shop-a', 20, 5, 0.1)
+        usage.record('shop-b', 7, 3, 0.2)
+        written = await usage.flush()
+        return written, await usage.usage('shop-a')
+
+    written, report = asyncio.run(run())
+
+    assert written == 2
+    assert store.batches == [(current_period(), {
+        'shop-a': {'requests': 2, 'prompt_tokens': 30, 'completion_tokens': 10, 'latency_ms': 200},
+        'shop-b': {'requests': 1, 'prompt_tokens': 7, 'completion_tokens': 3, 'latency_ms': 200},
+    })]
+    # Stored totals from other workers are picked up by the read-back
+    assert (report['requests'], report['total_tokens'], report['unflushed_requests']) == (7, 640, 0)
+
+
+def test_failed_flush_keeps_the_deltas_for_the_next_one():
+    store = UsageStore(fail=True)
+    usage = meter(store, {})
+
+    async def run():
+        usage.record('shop-a', 10, 5, 0.1)
+        first = await usage.flush()
+        usage.record('shop-a', 1, 1, 0.1)
+        store.fail = False
+        return first, await usage.flush()
+
+    assert asyncio.run(run()) == (0, 1)
+    assert store.totals['shop-a']['requests'] == 2
+    assert usage.stats()['flush_errors'] == 1
@@ -0,0 +1,146 @@
+"""
+IG-Shop-Agent Token Budget
+Fits system prompt, catalog slice and conversation history into a prompt token budget
+"""
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Tuple
+
+from advanced_config import ProductionConfig
+from token_counter import MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMING_TOKENS, count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Renders the system prompt for a catalog slice and returns (text, tokens)
+SystemRenderer = Callable[[List[Dict]], Tuple[str, int]]
+
+TRUNCATION_MARKER = "…"
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = 'end') -> str:
+    """Cut text to at most max_tokens, keeping its start or its end"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    marker_tokens = count_tokens(TRUNCATION_MARKER)
+    low, high = 0, len(text)
+    # Longest slice (in characters) whose estimate still fits
+    while low < high:
+        mid = (low + high + 1) // 2
+        piece = text[-mid:] if keep == 'end' else text[:mid]
+        if count_tokens(piece) + marker_tokens <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    if keep == 'end':
+        return TRUNCATION_MARKER + text[-low:] if low else ""
+    return text[:low] + TRUNCATION_MARKER if low else ""
+
+@dataclass
+class TokenAccount:
+    """Per-request prompt token accounting"""
+    budget: int
+    system: int = 0
+    catalog_items: int = 0
+    history: int = 0
+    message: int = 0
+    total: int = 0
+    history_turns: int = 0
+    dropped_turns: int = 0
+    truncated_turns: int = 0
+    dropped_catalog_items: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class TokenBudgetManager:
+    """Deterministic prompt assembly under a token budget
+
+    Priority order: system instructions, the current message, the catalog
+    slice (lowest-ranked items dropped first), then history newest-first,
+    so the oldest turns are the first to be truncated or dropped.
+    """
+
+    def __init__(
+        self,
+        budget: int = ProductionConfig.AI_PROMPT_TOKEN_BUDGET,
+        max_turn_tokens: int = ProductionConfig.AI_MAX_TOKENS_PER_TURN,
+        min_turn_tokens: int = ProductionConfig.AI_MIN_TRUNCATED_TURN_TOKENS,
+        max_turns: int = ProductionConfig.AI_CONTEXT_WINDOW
+    ):
+        self.budget = budget
+        self.max_turn_tokens = max_turn_tokens
+        self.min_turn_tokens = min_turn_tokens
+        self.max_turns = max_turns
+
+    def build(
+        self,
+        render_system: SystemRenderer,
+        catalog_slice: List[Dict],
+        conversation_history: List[Dict],
+        message: str
+    ) -> Tuple[List[Dict], TokenAccount]:
+        """Build chat messages that fit the budget, with their accounting"""
+        account = TokenAccount(budget=self.budget)
+
+        # The current message is never dropped, only capped like any turn
+        message = truncate_to_tokens(message, self.max_turn_tokens, keep='start')
+        account.message = count_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+        remaining = self.budget - account.message - REPLY_PRIMING_TOKENS
+
+        items = list(catalog_slice or [])
+        system_prompt, system_tokens = render_system(items)
+        while items and system_tokens + MESSAGE_OVERHEAD_TOKENS > remaining:
+            items.pop()
+            account.dropped_catalog_items += 1
+            system_prompt, system_tokens = render_system(items)
+        if items:
+            base_tokens = render_system([])[1]
+            account.catalog_items = system_tokens - base_tokens
+            account.system = base_tokens + MESSAGE_OVERHEAD_TOKENS
+        else:
+            account.system = system_tokens + MESSAGE_OVERHEAD_TOKENS
+        remaining -= system_tokens + MESSAGE_OVERHEAD_TOKENS
+
+        history = (conversation_history or [])[-self.max_turns:] if self.max_turns else []
+        account.dropped_turns = len(conversation_history or []) - len(history)
+        kept: List[Dict] = []
+        for position, msg in enumerate(reversed(history)):
+            text = msg.get('text') or ''
+            truncated = count_tokens(text) > self.max_turn_tokens
+            if truncated:
+                text = truncate_to_tokens(text, self.max_turn_tokens)
+            cost = count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+            if cost > remaining:
+                room = remaining - MESSAGE_OVERHEAD_TOKENS
+                if room < self.min_turn_tokens:
+                    account.dropped_turns += len(history) - position
+                    break
+                text = truncate_to_tokens(text, room)
+                cost = count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+                truncated = True
+            kept.append({"role": self._role(msg), "content": text})
+            remaining -= cost
+            account.history += cost
+            if truncated:
+                account.truncated_turns += 1
+
+        kept.reverse()
+        account.history_turns = len(kept)
+        account.total = account.system + account.catalog_items + account.history + account.message + REPLY_PRIMING_TOKENS
+        if account.total > self.budget:
+            logger.warning(f"Prompt exceeds token budget: {account.total}/{self.budget}")
+
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(kept)
+        messages.append({"role": "user", "content": message})
+        return messages, account
+
+    @staticmethod
+    def _role(msg: Dict) -> str:
+        return "user" if not msg.get('ai_generated') else "assistant"
+
+# Global token budget manager
+token_budget = TokenBudgetManager()
+
+__all__ = ["TokenBudgetManager", "TokenAccount", "token_budget", "truncate_to_tokens"]
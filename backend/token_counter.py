@@ -0,0 +1,55 @@
+"""
+IG-Shop-Agent Token Counter
+Deterministic offline token estimates for prompt budgeting
+"""
+import math
+import re
+from typing import Dict, List
+
+# Pieces roughly matching how BPE tokenizers split mixed Arabic/English text
+_PIECES = re.compile(
+    r'[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]+'  # Arabic run
+    r'|[A-Za-z]+'                                              # Latin word
+    r'|\d+'                                                    # Digits
+    r'|\S',                                                    # Any other symbol
+    re.UNICODE
+)
+
+# Average characters per token by script (cl100k/o200k on shop conversations)
+ARABIC_CHARS_PER_TOKEN = 2.5
+LATIN_CHARS_PER_TOKEN = 4.0
+DIGITS_PER_TOKEN = 3.0
+
+# Fixed overhead the chat format adds per message and per reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+def count_tokens(text: str) -> int:
+    """Estimate the token count of a text
+    
+    The estimate is deterministic and needs no tokenizer files, which keeps
+    budgeting and tests offline; it errs slightly high for Arabic.
+    """
+    if not text:
+        return 0
+    total = 0
+    for piece in _PIECES.findall(text):
+        first = piece[0]
+        if first.isdigit():
+            total += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+        elif 'A' <= first <= 'z':
+            total += math.ceil(len(piece) / LATIN_CHARS_PER_TOKEN)
+        elif len(piece) > 1:
+            total += math.ceil(len(piece) / ARABIC_CHARS_PER_TOKEN)
+        else:
+            total += 1
+    return total
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Estimate the prompt tokens of a chat completion request"""
+    return sum(
+        MESSAGE_OVERHEAD_TOKENS + count_tokens(msg.get('content') or '')
+        for msg in messages
+    ) + REPLY_PRIMING_TOKENS
+
+__all__ = ["count_tokens", "count_message_tokens", "MESSAGE_OVERHEAD_TOKENS"]
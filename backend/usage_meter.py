@@ -0,0 +1,247 @@
+"""
+IG-Shop-Agent Usage Meter
+Per-tenant LLM token metering with batched persistence and in-memory plan quotas
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from advanced_config import ProductionConfig
+from llm_scheduler import PlanResolver, tenant_plan
+
+logger = logging.getLogger(__name__)
+
+class QuotaExceeded(Exception):
+    """A tenant has used its plan's monthly token quota"""
+
+    def __init__(self, tenant_id: str, used: int, quota: int):
+        super().__init__(f"Tenant {tenant_id} used {used}/{quota} tokens this month")
+        self.tenant_id = tenant_id
+        self.used = used
+        self.quota = quota
+
+def current_period() -> date:
+    """First day of the current UTC month"""
+    today = datetime.now(timezone.utc).date()
+    return today.replace(day=1)
+
+@dataclass
+class UsageCounters:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: 'UsageCounters') -> None:
+        self.requests += other.requests
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.latency_ms += other.latency_ms
+
+@dataclass
+class TenantUsage:
+    """Month-to-date usage of a tenant as seen by this worker"""
+    period: date
+    used: UsageCounters = field(default_factory=UsageCounters)  # Stored totals plus unflushed local usage
+    plan: Optional[str] = None
+    loaded_at: float = float('-inf')
+    rejected: int = 0
+
+class UsageMeter:
+    """Counts tokens, requests and latency per tenant in memory
+
+    Recording and quota checks never touch the database. Deltas are
+    written in one upsert per flush interval and added to the stored
+    totals, so several workers can flush the same tenant. After each
+    flush the totals are read back, which picks up other workers' usage
+    and restores the counters after a restart.
+    """
+
+    def __init__(
+        self,
+        store: Any = None,
+        plan_resolver: Optional[PlanResolver] = tenant_plan,
+        quotas: Optional[Dict[str, Optional[int]]] = None,
+        flush_interval: float = ProductionConfig.AI_USAGE_FLUSH_INTERVAL,
+        refresh_ttl: float = ProductionConfig.AI_USAGE_PLAN_TTL
+    ):
+        self._store = store
+        self.plan_resolver = plan_resolver
+        self.quotas = quotas if quotas is not None else ProductionConfig.AI_PLAN_MONTHLY_TOKEN_QUOTAS
+        self.flush_interval = flush_interval
+        self.refresh_ttl = refresh_ttl
+        self._tenants: Dict[str, TenantUsage] = {}
+        self._pending: Dict[date, Dict[str, UsageCounters]] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flush_errors = 0
+
+    async def _get_store(self):
+        if self._store is None:
+            from database import get_db_connection
+            self._store = await get_db_connection()
+        return self._store
+
+    def _tenant(self, tenant_id: str) -> TenantUsage:
+        period = current_period()
+        usage = self._tenants.get(tenant_id)
+        if usage is None or usage.period != period:
+            # A new month starts from zero; the plan is kept until the next refresh
+            usage = TenantUsage(period=period, plan=usage.plan if usage else None,
+                                loaded_at=usage.loaded_at if usage else float('-inf'))
+            self._tenants[tenant_id] = usage
+        return usage
+
+    def quota_for(self, tenant_id: str) -> Optional[int]:
+        usage = self._tenants.get(tenant_id)
+        return self.quotas.get(usage.plan) if usage and usage.plan else None
+
+    def check(self, tenant_id: Optional[str]) -> None:
+        """Raise QuotaExceeded if the tenant is over its plan quota
+
+        Runs from memory; a tenant not seen yet (or seen long ago) is loaded
+        in the background and allowed through meanwhile.
+        """
+        if not tenant_id:
+            return
+        usage = self._tenant(tenant_id)
+        if time.monotonic() - usage.loaded_at > self.refresh_ttl and tenant_id not in self._loading:
+            self._loading[tenant_id] = asyncio.create_task(self._load_tenant(tenant_id))
+        quota = self.quotas.get(usage.plan) if usage.plan else None
+        if quota is not None and usage.used.total_tokens >= quota:
+            usage.rejected += 1
+            raise QuotaExceeded(tenant_id, usage.used.total_tokens, quota)
+
+    def record(
+        self,
+        tenant_id: Optional[str],
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: float
+    ) -> None:
+        """Count one finished LLM call"""
+        if not tenant_id:
+            return
+        usage = self._tenant(tenant_id)
+        delta = UsageCounters(1, prompt_tokens, completion_tokens, int(latency * 1000))
+        usage.used.add(delta)
+        self._pending.setdefault(usage.period, {}).setdefault(tenant_id, UsageCounters()).add(delta)
+
+    async def _load_tenant(self, tenant_id: str) -> None:
+        try:
+            plan = await self.plan_resolver(tenant_id) if self.plan_resolver else None
+            self._tenant(tenant_id).plan = plan
+            await self._refresh([tenant_id])
+        except Exception as e:
+            logger.warning(f"Could not load usage for tenant {tenant_id}: {e}")
+        finally:
+            self._loading.pop(tenant_id, None)
+
+    async def _refresh(self, tenant_ids: List[str]) -> None:
+        """Replace in-memory totals with stored totals plus unflushed usage"""
+        async with self._lock:
+            period = current_period()
+            store = await self._get_store()
+            stored = await store.fetch_llm_usage(tenant_ids, period)
+            pending = self._pending.get(period, {})
+            now = time.monotonic()
+            for tenant_id in tenant_ids:
+                usage = self._tenant(tenant_id)
+                usage.used = UsageCounters(**stored.get(tenant_id, {}))
+                if tenant_id in pending:
+                    usage.used.add(pending[tenant_id])
+                usage.loaded_at = now
+
+    async def flush(self) -> int:
+        """Write pending deltas in one statement per period, then re-read totals"""
+        async with self._lock:
+            batches, self._pending = self._pending, {}
+            if not batches:
+                return 0
+            store = await self._get_store()
+            written = 0
+            for period, deltas in batches.items():
+                try:
+                    await store.add_llm_usage(period, {t: asdict(c) for t, c in deltas.items()})
+                    written += len(deltas)
+                except Exception as e:
+                    # Keep the deltas for the next flush
+                    self.flush_errors += 1
+                    logger.error(f"Usage flush for {period} failed: {e}")
+                    pending = self._pending.setdefault(period, {})
+                    for tenant_id, counters in deltas.items():
+                        pending.setdefault(tenant_id, UsageCounters()).add(counters)
+            self.flushes += 1
+        current = batches.get(current_period())
+        if current:
+            try:
+                await self._refresh(list(current))
+            except Exception as e:
+                logger.warning(f"Usage refresh failed: {e}")
+        return written
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Usage flush loop error: {e}")
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def usage(self, tenant_id: str) -> Dict[str, Any]:
+        """Month-to-date usage and quota of a tenant"""
+        if self._tenant(tenant_id).loaded_at == float('-inf'):
+            await self._load_tenant(tenant_id)
+        usage = self._tenant(tenant_id)
+        used = usage.used
+        quota = self.quota_for(tenant_id)
+        pending = self._pending.get(usage.period, {}).get(tenant_id)
+        return {
+            'tenant_id': tenant_id,
+            'period': usage.period.isoformat(),
+            'plan': usage.plan,
+            'requests': used.requests,
+            'prompt_tokens': used.prompt_tokens,
+            'completion_tokens': used.completion_tokens,
+            'total_tokens': used.total_tokens,
+            'avg_latency_ms': round(used.latency_ms / used.requests, 1) if used.requests else 0.0,
+            'quota_tokens': quota,
+            'remaining_tokens': max(quota - used.total_tokens, 0) if quota is not None else None,
+            'rejected': usage.rejected,
+            'unflushed_requests': pending.requests if pending else 0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tenants': len(self._tenants),
+            'pending_tenants': sum(len(deltas) for deltas in self._pending.values()),
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'rejected': sum(usage.rejected for usage in self._tenants.values()),
+        }
+
+# Global usage meter
+usage_meter = UsageMeter()
+
+__all__ = ["QuotaExceeded", "UsageCounters", "UsageMeter", "current_period", "usage_meter"]